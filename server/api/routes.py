@@ -1,19 +1,96 @@
 from flask import Blueprint, request, jsonify, Response, stream_with_context
-from typing import Dict, Any
+from typing import Any, Dict, Optional
 from services.writing_service import WritingService
+from core.usage import usage_stats as get_usage_stats
+from core.metrics import register_collector, render_prometheus
+from core.transport import transport_stats
+from core.rate_limit import RateLimited, admission_retry_after
+from core.workload import client_key, get_workload_recorder
+from core.story_store import StoryNotFound, get_story_store
+from services.prefetch import FollowUps
 import json
 
 api = Blueprint('api', __name__, url_prefix='/api/v1')
 
+@api.before_request
+def record_workload():
+	recorder = get_workload_recorder()
+	if recorder is not None and request.method == "POST":
+		recorder.record(
+			client_key(request.headers, request.remote_addr),
+			request.path[len(api.url_prefix):],
+			request.get_json(silent=True),
+		)
+
+def too_many_requests(retry_after: int):
+	return jsonify({'error': 'Too many requests waiting for the LLM provider', 'retry_after': retry_after}), 429, {'Retry-After': str(retry_after)}
+
+def rate_limited(e: Exception) -> Optional[RateLimited]:
+	"""The error from WritingService if the rate limiter turned its call away."""
+	return e if isinstance(e, RateLimited) else None
+
+@api.before_request
+def admit_request():
+	"""Turn generation requests away with a retry hint while the host's queues for every LLM provider are full."""
+	if request.method != "POST":
+		return None
+	retry_after = admission_retry_after()
+	if retry_after is None:
+		return None
+	return too_many_requests(retry_after)
+
 def init_routes(
 	writing_service: WritingService
 ) -> None:
+	llm_client = writing_service.llm_client
+
+	def collect_runtime_metrics():
+		cache = llm_client.cache.stats()
+		flights = llm_client.flights.stats()
+		speculation = llm_client.speculator.stats()
+		rate_limit = llm_client.limiter.stats()
+		providers = llm_client.router.stats()
+		return [
+			("llm_response_cache_events_total", "counter", "Response cache lookups and maintenance by event.",
+				[({"event": event}, cache[event]) for event in ("hits", "memory_hits", "disk_hits", "misses", "stores", "evictions")]),
+			("llm_response_cache_entries", "gauge", "Entries in the in-memory tier of the response cache.", [({}, cache["entries"])]),
+			("llm_coalesced_calls_total", "counter", "LLM calls that joined an identical call already in flight.", [({}, flights["coalesced"])]),
+			("llm_calls_in_flight", "gauge", "Distinct upstream LLM calls currently in flight.", [({}, flights["in_flight"])]),
+			("llm_connections_opened_total", "counter", "TCP connections opened by the shared LLM transport.", [({}, transport_stats()["connections_opened"])]),
+			("llm_speculative_events_total", "counter", "Speculative follow-up work by event: submitted, skipped over budget, calls made, hits, discarded unused, failed.",
+				[({"event": event}, speculation[event]) for event in ("submitted", "skipped", "calls", "hits", "discarded", "failed")]),
+			("llm_speculative_tokens_total", "counter", "Prompt and completion tokens spent on speculative calls.", [({}, speculation["tokens"])]),
+			("llm_speculative_wasted_tokens_total", "counter", "Tokens of speculative results discarded without being used.", [({}, speculation["wasted_tokens"])]),
+			("llm_speculative_hit_rate", "gauge", "Share of speculative results that were used rather than discarded.", [({}, speculation["hit_rate"])]),
+			("llm_admission_queue_depth", "gauge", "Upstream calls waiting for the rate limit, across the workers on this host.", [({}, rate_limit["queue_depth"])]),
+			("llm_admission_paused_seconds", "gauge", "Time left of a pause the provider asked for with a 429.", [({}, rate_limit["blocked_for"])]),
+			("llm_rate_limit_capacity", "gauge", "Per-minute limit of each shared bucket (0: unlimited).",
+				[({"bucket": name}, bucket["capacity"]) for name, bucket in rate_limit["buckets"].items()]),
+			("llm_rate_limit_available", "gauge", "What each shared bucket can admit right now.",
+				[({"bucket": name}, bucket["level"]) for name, bucket in rate_limit["buckets"].items()]),
+			("llm_provider_circuit_state", "gauge", "Circuit breaker of each provider: 1 for the state it is in (closed, open, half_open).",
+				[({"provider": name, "state": state}, int(provider["state"] == state)) for name, provider in providers.items() for state in ("closed", "open", "half_open")]),
+			("llm_provider_latency_seconds", "gauge", "Moving average latency of each provider: to the first token of streamed calls, to the response of whole ones.",
+				[({"provider": name, "call": call}, provider[key]) for name, provider in providers.items() for call, key in (("streamed", "latency"), ("whole", "whole_latency")) if provider[key] is not None]),
+			("llm_provider_error_rate", "gauge", "Moving average share of each provider's calls that failed.",
+				[({"provider": name}, provider["error_rate"]) for name, provider in providers.items()]),
+		]
+
+	register_collector(collect_runtime_metrics)
+
+	@api.route("/metrics", methods=["GET"])
+	def metrics():
+		"""
+		LLM token usage, latency histograms and cache counters of this worker, in Prometheus text format.
+		"""
+		return Response(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 	@api.route("/parameters/suggestions", methods=["POST"])
-	def generate_parameter_suggestions():
+	def generate_parameter_suggestions(data: Optional[Dict[str, Any]] = None):
 		"""
 		Generate parameter suggestions for ebook.
 		"""
-		data: Dict[str, Any] = request.get_json()
+		data = data if data is not None else request.get_json()
 		
 		field_type = data.get('fieldType')
 		current_value = data.get('currentValue')
@@ -34,27 +111,50 @@ def init_routes(
 			return jsonify({'error': str(ve)}), 400
 		
 		except Exception as e:
+			limited = rate_limited(e)
+			if limited:
+				return too_many_requests(limited.retry_after)
 			# Handle unexpected errors
 			return jsonify({'error': 'An unexpected error occurred', 'details': str(e)}), 500
 
 	@api.route("/chapters/suggestions", methods=["POST"])
-	def generate_chapter_suggestions():
+	def generate_chapter_suggestions(data: Optional[Dict[str, Any]] = None):
 		"""
 		Generate suggestions for new chapters based on the current story context.
 		"""
-		data: Dict[str, Any] = request.get_json()
+		data = data if data is not None else request.get_json()
 		
 		chapters = data.get('chapters', [])
 		parameters = data.get('parameters', {})
 		number_of_chapters = data.get('number_of_chapters', 3)
 		total_chapters = data.get('total_chapters', 10)
+		mode = data.get('mode', 'single')
+		stream = data.get('stream', False)
+
+		if stream:
+			def generate():
+				try:
+					for chunk in writing_service.generate_chapter_suggestions(
+						chapters=chapters,
+						parameters=parameters,
+						number_of_chapters=number_of_chapters,
+						total_chapters=total_chapters,
+						mode=mode,
+						stream=True
+					):
+						yield json.dumps(chunk) + '\n'
+				except Exception as e:
+					yield json.dumps({'error': str(e)}) + '\n'
+
+			return Response(stream_with_context(generate()), content_type='application/x-ndjson')
 
 		try:
 			suggestions = writing_service.generate_chapter_suggestions(
 				chapters=chapters,
 				parameters=parameters,
 				number_of_chapters=number_of_chapters,
-				total_chapters=total_chapters
+				total_chapters=total_chapters,
+				mode=mode
 			)
 			
 			# Clean the JSON string to ensure it's properly formatted
@@ -67,15 +167,18 @@ def init_routes(
 			return jsonify({'error': str(ve)}), 400
 		
 		except Exception as e:
+			limited = rate_limited(e)
+			if limited:
+				return too_many_requests(limited.retry_after)
 			# Handle unexpected errors
 			return jsonify({'error': 'An unexpected error occurred', 'details': str(e)}), 500
 
 	@api.route("/chapters/summary", methods=["POST"])
-	def generate_section_summary():
+	def generate_section_summary(data: Optional[Dict[str, Any]] = None):
 		"""
 		Generate section summary.
 		"""
-		data: Dict[str, Any] = request.get_json()
+		data = data if data is not None else request.get_json()
 		
 		context = data.get('context', {})
 
@@ -91,25 +194,47 @@ def init_routes(
 			return jsonify({'error': str(ve)}), 400
 		
 		except Exception as e:
+			limited = rate_limited(e)
+			if limited:
+				return too_many_requests(limited.retry_after)
 			# Handle unexpected errors
 			return jsonify({'error': 'An unexpected error occurred', 'details': str(e)}), 500
 	
 	@api.route("/chapters/outlines", methods=["POST"])
-	def generate_chapter_outlines():
+	def generate_chapter_outlines(data: Optional[Dict[str, Any]] = None):
 		"""
 		Generate outlines for continuing a chapter.
 		"""
-		data: Dict[str, Any] = request.get_json()
+		data = data if data is not None else request.get_json()
 		
 		context = data.get('context', {})
 		instruction = data.get('instruction', '')
 		num_outlines = data.get('count', 3)
+		mode = data.get('mode', 'single')
+		stream = data.get('stream', False)
+
+		if stream:
+			def generate():
+				try:
+					for chunk in writing_service.generate_chapter_outlines(
+						context=context,
+						instruction=instruction,
+						num_outlines=num_outlines,
+						mode=mode,
+						stream=True
+					):
+						yield json.dumps(chunk) + '\n'
+				except Exception as e:
+					yield json.dumps({'error': str(e)}) + '\n'
+
+			return Response(stream_with_context(generate()), content_type='application/x-ndjson')
 
 		try:
 			outlines = writing_service.generate_chapter_outlines(
 				context=context,
 				instruction=instruction,
-				num_outlines=num_outlines
+				num_outlines=num_outlines,
+				mode=mode
 			)
 			
 			return jsonify({'outlines': outlines})
@@ -119,16 +244,20 @@ def init_routes(
 			return jsonify({'error': str(ve)}), 400
 		
 		except Exception as e:
+			limited = rate_limited(e)
+			if limited:
+				return too_many_requests(limited.retry_after)
 			# Handle unexpected errors
 			return jsonify({'error': 'An unexpected error occurred', 'details': str(e)}), 500
 	
 	@api.route("/chapters/scene/new", methods=["POST"])
-	def generate_new_scene():
-		data = request.get_json()
+	def generate_new_scene(data: Optional[Dict[str, Any]] = None):
+		data = data if data is not None else request.get_json()
 		context = data.get('context', {})
 		instruction = data.get('instruction', '')
 		num_elements = data.get('count', 10)
 		stream = data.get('stream', False)
+		partial = data.get('partial', False)
 
 		print("generate_new_scene " + str(num_elements) + " streaming: " + str(stream))
 
@@ -139,7 +268,8 @@ def init_routes(
 						context=context,
 						instruction=instruction,
 						num_elements=num_elements,
-						stream=True
+						stream=True,
+						partial=partial
 					):
 						yield json.dumps(chunk) + '\n'
 				except Exception as e:
@@ -156,18 +286,23 @@ def init_routes(
 				)
 				return jsonify(scene)
 			except Exception as e:
+				limited = rate_limited(e)
+				if limited:
+					return too_many_requests(limited.retry_after)
 				return jsonify({'error': str(e)}), 500
 		
 	@api.route("/chapters/scene/rewrite", methods=["POST"])
-	def rewrite_scene():
+	def rewrite_scene(data: Optional[Dict[str, Any]] = None):
 		"""
 		Rewrite an existing scene in a chapter.
 		"""
-		data = request.get_json()
+		data = data if data is not None else request.get_json()
 		context = data.get('context', {})
 		instruction = data.get('instruction', '')
 		num_elements = data.get('count', 10)
 		stream = data.get('stream', False)
+		partial = data.get('partial', False)
+		mode = data.get('mode', 'full')
 
 		print("rewrite_scene " + str(num_elements) + " streaming: " + str(stream))
 
@@ -178,7 +313,9 @@ def init_routes(
 						context=context,
 						instruction=instruction,
 						num_elements=num_elements,
-						stream=True
+						stream=True,
+						partial=partial,
+						mode=mode
 					):
 						yield json.dumps(chunk) + '\n'
 				except Exception as e:
@@ -191,22 +328,27 @@ def init_routes(
 					context=context,
 					instruction=instruction,
 					num_elements=num_elements,
-					stream=False
+					stream=False,
+					mode=mode
 				)
 				return jsonify(scene)
 			except Exception as e:
+				limited = rate_limited(e)
+				if limited:
+					return too_many_requests(limited.retry_after)
 				return jsonify({'error': str(e)}), 500
 			
 	@api.route("/chapters/scene/continue", methods=["POST"])
-	def continue_scene():
+	def continue_scene(data: Optional[Dict[str, Any]] = None):
 		"""
 		Continue an existing scene in a chapter.
 		"""
-		data = request.get_json()
+		data = data if data is not None else request.get_json()
 		context = data.get('context', {})
 		instruction = data.get('instruction', '')
 		num_elements = data.get('count', 10)
 		stream = data.get('stream', False)
+		partial = data.get('partial', False)
 
 		print("continue_scene " + str(num_elements) + " streaming: " + str(stream))
 
@@ -217,7 +359,8 @@ def init_routes(
 						context=context,
 						instruction=instruction,
 						num_elements=num_elements,
-						stream=True
+						stream=True,
+						partial=partial
 					):
 						yield json.dumps(chunk) + '\n'
 				except Exception as e:
@@ -234,14 +377,17 @@ def init_routes(
 				)
 				return jsonify(scene)
 			except Exception as e:
+				limited = rate_limited(e)
+				if limited:
+					return too_many_requests(limited.retry_after)
 				return jsonify({'error': str(e)}), 500
 
 	@api.route("/chapters/scene/insert", methods=["POST"])
-	def insert_scene():
+	def insert_scene(data: Optional[Dict[str, Any]] = None):
 		"""
 		Insert into existing scene in a chapter.
 		"""
-		data = request.get_json()
+		data = data if data is not None else request.get_json()
 		context = data.get('context', {})
 		instruction = data.get('instruction', '')
 		num_elements = data.get('count', 10)
@@ -266,11 +412,11 @@ def init_routes(
 
 
 	@api.route("/chapters/scene/paragraph/new", methods=["POST"])
-	def generate_scene_paragraphs():
+	def generate_scene_paragraphs(data: Optional[Dict[str, Any]] = None):
 		"""
 		Generate paragraphs for a scene.
 		"""
-		data = request.get_json()
+		data = data if data is not None else request.get_json()
 		context = data.get('context', {})
 		instruction = data.get('instruction', '')
 		num_paragraphs = data.get('count', 10)
@@ -302,19 +448,23 @@ def init_routes(
 				)
 				return jsonify(scene)
 			except Exception as e:
+				limited = rate_limited(e)
+				if limited:
+					return too_many_requests(limited.retry_after)
 				return jsonify({'error': str(e)}), 500
 			
 	@api.route("/chapters/scene/paragraph/rewrite", methods=["POST"])
-	def rewrite_scene_paragraphs():
+	def rewrite_scene_paragraphs(data: Optional[Dict[str, Any]] = None):
 		"""
 		Rewrite paragraphs for a scene.
 		"""
-		data = request.get_json()
+		data = data if data is not None else request.get_json()
 		context = data.get('context')
 		instruction = data.get('instruction')
 		num_paragraphs = data.get('count', 1)
 		stream = data.get('stream', False)
 		isNsfw = data.get('isNsfw', False)
+		mode = data.get('mode', 'edits')
 		print("rewrite_scene_paragraphs " + str(num_paragraphs) + " streaming: " + str(stream))
 
 		if stream:
@@ -324,7 +474,8 @@ def init_routes(
 						context=context,
 						instruction=instruction,
 						num_paragraphs=num_paragraphs,
-						stream=True
+						stream=True,
+						mode=mode
 					):
 						yield json.dumps(chunk) + '\n'
 				except Exception as e:
@@ -337,18 +488,22 @@ def init_routes(
 					context=context,
 					instruction=instruction,
 					num_paragraphs=num_paragraphs,
-					stream=False
+					stream=False,
+					mode=mode
 				)
 				return jsonify(scene)
 			except Exception as e:
+				limited = rate_limited(e)
+				if limited:
+					return too_many_requests(limited.retry_after)
 				return jsonify({'error': str(e)}), 500
 	
 	@api.route("/chapters/scene/paragraph/insert", methods=["POST"])
-	def insert_scene_paragraphs():
+	def insert_scene_paragraphs(data: Optional[Dict[str, Any]] = None):
 		"""
 		Insert paragraphs for a scene.
 		"""
-		data = request.get_json()
+		data = data if data is not None else request.get_json()
 		context = data.get('context')
 		instruction = data.get('instruction')
 		num_paragraphs = data.get('count', 1)
@@ -380,6 +535,9 @@ def init_routes(
 				)
 				return jsonify(scene)
 			except Exception as e:
+				limited = rate_limited(e)
+				if limited:
+					return too_many_requests(limited.retry_after)
 				return jsonify({'error': str(e)}), 500
 		
 	@api.route("/chapters/scene/paragraph/continue", methods=["POST"])
@@ -387,4 +545,97 @@ def init_routes(
 		"""
 		Continue writing paragraphs for a scene.
 		"""
-		pass
\ No newline at end of file
+		pass
+
+	@api.route("/cache/stats", methods=["GET"])
+	def cache_stats():
+		"""
+		Hit/miss counters of the LLM response cache in this worker.
+		"""
+		return jsonify(writing_service.llm_client.cache.stats())
+
+	@api.route("/coalescing/stats", methods=["GET"])
+	def coalescing_stats():
+		"""
+		How many LLM calls in this worker joined an identical call already in flight.
+		"""
+		return jsonify(writing_service.llm_client.flights.stats())
+
+	@api.route("/usage/stats", methods=["GET"])
+	def usage_stats():
+		"""
+		Prompt, cached and completion tokens per endpoint, with the provider prompt-cache hit rate.
+		"""
+		return jsonify(get_usage_stats())
+
+	# the story variant of each route above: /stories/<id>/<route> with {"delta", "target", ...}
+	story_views = {
+		"/parameters/suggestions": generate_parameter_suggestions,
+		"/chapters/suggestions": generate_chapter_suggestions,
+		"/chapters/summary": generate_section_summary,
+		"/chapters/outlines": generate_chapter_outlines,
+		"/chapters/scene/new": generate_new_scene,
+		"/chapters/scene/rewrite": rewrite_scene,
+		"/chapters/scene/continue": continue_scene,
+		"/chapters/scene/insert": insert_scene,
+		"/chapters/scene/paragraph/new": generate_scene_paragraphs,
+		"/chapters/scene/paragraph/rewrite": rewrite_scene_paragraphs,
+		"/chapters/scene/paragraph/insert": insert_scene_paragraphs,
+	}
+
+	@api.route("/stories/<story_id>", methods=["PUT"])
+	def put_story(story_id: str):
+		"""
+		Store a whole story (parameters and chapters with their sections, scenes and paragraphs).
+		"""
+		try:
+			get_story_store().replace_story(story_id, request.get_json())
+		except (KeyError, TypeError, ValueError) as e:
+			return jsonify({'error': f'Invalid story: {e}'}), 400
+		return jsonify({'id': story_id})
+
+	@api.route("/stories/<story_id>", methods=["PATCH"])
+	def patch_story(story_id: str):
+		"""
+		Apply the changed pieces of a stored story.
+		"""
+		try:
+			get_story_store().apply(story_id, request.get_json())
+		except StoryNotFound:
+			return jsonify({'error': f'Unknown story {story_id}'}), 404
+		except (KeyError, IndexError, TypeError, ValueError) as e:
+			return jsonify({'error': f'Invalid delta: {e}'}), 400
+		return jsonify({'id': story_id})
+
+	@api.route("/stories/<story_id>", methods=["GET"])
+	def get_story(story_id: str):
+		"""
+		A stored story in the shape it was sent.
+		"""
+		try:
+			return jsonify(get_story_store().story(story_id))
+		except StoryNotFound:
+			return jsonify({'error': f'Unknown story {story_id}'}), 404
+
+	@api.route("/stories/<story_id>/<path:route>", methods=["POST"])
+	def story_request(story_id: str, route: str):
+		"""
+		Serve a route for a stored story: apply the request's delta, assemble the context for its
+		target server-side and hand the result to the plain route. With speculation on, the
+		requests that usually follow are started once it completes (services/prefetch.py).
+		"""
+		view = story_views.get("/" + route)
+		if view is None:
+			return jsonify({'error': f'No story variant of /{route}'}), 404
+		body = request.get_json() or {}
+		if not isinstance(body, dict):
+			return jsonify({'error': 'Expected a JSON object'}), 400
+		try:
+			data = get_story_store().resolve(story_id, "/" + route, body)
+		except StoryNotFound:
+			return jsonify({'error': f'Unknown story {story_id}'}), 404
+		except (KeyError, IndexError, TypeError, ValueError) as e:
+			return jsonify({'error': f'Invalid target or delta: {e}'}), 400
+		follow_ups = FollowUps.start(writing_service, story_id, "/" + route, body, client_key(request.headers, request.remote_addr))
+		response = view(data=data)
+		return follow_ups.watch(response) if follow_ups is not None else response
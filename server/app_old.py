@@ -7,7 +7,7 @@ import random
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify,Response, stream_with_context
 from flask_cors import CORS
-from openai import OpenAI
+from core.transport import create_openai_client
 
 # Load environment variables from .env file
 load_dotenv()
@@ -143,9 +143,7 @@ def improved_ai_output(prompt, num_plans=4):
 	return final_response
 
 def openai_output(prompt, system_prompt, examples, parameters):
-    client = OpenAI(
-        api_key=openai_api_key,
-    )
+    client = create_openai_client(api_key=openai_api_key)
     model = "gpt-4o-mini"
     # model = "wrong-model"
     system_prompt = system_prompt + "\n\n" + parameters
@@ -190,9 +188,7 @@ def hermes_ai_output(prompt, system_prompt, examples, parameters):
     # model = "hermes-3-llama-3.1-405b-fp8"
     # model = "wrong-model"
 
-    client = OpenAI(
-        api_key=openai_api_key,
-    )
+    client = create_openai_client(api_key=openai_api_key)
     model = "gpt-4o-mini"
 
     system_prompt = system_prompt + "\n\n" + parameters
@@ -274,17 +270,12 @@ def process_json_chunks(chunk, json_buffer):
 
 def hermes_ai_streamed_output(prompt, system_prompt, examples, parameters, response_type="sentence", isNsfw=False):
     if not isNsfw:
-        client = OpenAI(
-            api_key=openai_api_key,
-        )
+        client = create_openai_client(api_key=openai_api_key)
         # model = "gpt-4o-2024-08-06"
         model = "gpt-4o-mini"
         print("using gpt4o")
     else:
-        client = OpenAI(
-            api_key=lambda_hermes_api_key,
-            base_url=openai_api_base,
-        )        
+        client = create_openai_client(api_key=lambda_hermes_api_key, base_url=openai_api_base)
         model = "hermes-3-llama-3.1-405b-fp8"
         print("using hermes-3")
     
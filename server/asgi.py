@@ -0,0 +1,249 @@
+"""
+ASGI entry point for the server.
+
+Streamed requests (`"stream": true`) to the scene and paragraph routes of the /api/v1
+blueprint are served on the event loop through AsyncLLMClient, so one worker can hold
+hundreds of open upstream streams, as are their /api/v1/stories/<id>/ variants once the
+story store has assembled their body (and, with speculation on, start their follow-ups once
+the stream completes; services/prefetch.py). Every other request falls through to the Flask
+app from app.py unchanged, on a pool of ASGI_FLASK_THREADS threads.
+
+A client going away (an author pressing stop, or leaving the page) ends its stream at once:
+a native one is cancelled mid-read, which closes the upstream call, and a Flask one is sent
+ClientDisconnected on its next chunk, which closes its generators and so the upstream call.
+
+Run with:
+    gunicorn -k uvicorn.workers.UvicornWorker --workers 4 --timeout 120 --bind 0.0.0.0:5000 asgi:app
+"""
+import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from app import app as flask_app, writing_service
+from config import ASGI_FLASK_THREADS
+from core.async_llm_client import AsyncLLMClient
+from core.transport import aprewarm
+from core.rate_limit import admission_retry_after
+from core.workload import client_key, get_workload_recorder
+from core.story_store import StoryNotFound, get_story_store
+from services.prefetch import FollowUps
+from services.writing_service import WritingService
+
+logger = logging.getLogger(__name__)
+
+SCENE_DEFAULTS = {"context": {}, "instruction": "", "count": 10}
+PARAGRAPH_DEFAULTS = {"context": None, "instruction": None, "count": 1}
+
+# path -> (WritingService method, count keyword, request defaults, optional keys passed through), mirroring api/routes.py
+STREAMING_ROUTES = {
+	"/api/v1/chapters/scene/new": ("generate_new_scene", "num_elements", SCENE_DEFAULTS, ("partial",)),
+	"/api/v1/chapters/scene/rewrite": ("rewrite_scene", "num_elements", SCENE_DEFAULTS, ("partial", "mode")),
+	"/api/v1/chapters/scene/continue": ("continue_scene", "num_elements", SCENE_DEFAULTS, ("partial",)),
+	"/api/v1/chapters/scene/insert": ("insert_scene", "num_elements", SCENE_DEFAULTS, ()),
+	"/api/v1/chapters/scene/paragraph/new": ("new_scene_paragraphs", "num_paragraphs", SCENE_DEFAULTS, ()),
+	"/api/v1/chapters/scene/paragraph/rewrite": ("rewrite_scene_paragraphs", "num_paragraphs", PARAGRAPH_DEFAULTS, ("mode",)),
+	"/api/v1/chapters/scene/paragraph/insert": ("insert_scene_paragraphs", "num_paragraphs", PARAGRAPH_DEFAULTS, ()),
+}
+
+STORY_PREFIX = "/api/v1/stories/"
+
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+	# asgiref runs every WSGI request on one thread per event loop (thread_sensitive=True)
+	run_wsgi_app = sync_to_async(
+		WsgiToAsgiInstance.run_wsgi_app.__wrapped__,
+		thread_sensitive=False,
+		executor=ThreadPoolExecutor(ASGI_FLASK_THREADS, thread_name_prefix="flask"),
+	)
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+	"""WsgiToAsgi running each request on a pool of ASGI_FLASK_THREADS threads, as a threaded WSGI server does."""
+
+	async def __call__(self, scope, receive, send):
+		await _PooledWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+wsgi_app = PooledWsgiToAsgi(flask_app)
+async_writing_service = WritingService(AsyncLLMClient())
+
+
+class ClientDisconnected(OSError):
+	"""Raised into the Flask app by send once the client has gone, as a WSGI server's failed write is."""
+
+
+async def _read_body(receive):
+	body = b""
+	while True:
+		message = await receive()
+		body += message.get("body", b"")
+		if not message.get("more_body", False):
+			return body
+
+
+async def _disconnected(receive):
+	"""Returns when the client goes away; started once the request body has been read."""
+	while (await receive())["type"] != "http.disconnect":
+		pass
+
+
+def _until_disconnected(send, disconnected):
+	async def checked_send(message):
+		if disconnected.done():
+			raise ClientDisconnected("Client disconnected")
+		await send(message)
+
+	return checked_send
+
+
+def _replay(body, receive):
+	"""Hand an already-consumed request body to the WSGI app, then defer to the real channel."""
+	sent = False
+
+	async def replay_receive():
+		nonlocal sent
+		if not sent:
+			sent = True
+			return {"type": "http.request", "body": body, "more_body": False}
+		return await receive()
+
+	return replay_receive
+
+
+async def _stream_response(path, data, send, disconnected, follow_ups=None):
+	method_name, count_key, defaults, optional_keys = STREAMING_ROUTES[path]
+	kwargs = {
+		"context": data.get("context", defaults["context"]),
+		"instruction": data.get("instruction", defaults["instruction"]),
+		count_key: data.get("count", defaults["count"]),
+		"stream": True,
+	}
+	kwargs.update({key: data[key] for key in optional_keys if key in data})
+	logger.info(f"{method_name} {kwargs[count_key]} streaming: True (asgi)")
+
+	await send({
+		"type": "http.response.start",
+		"status": 200,
+		"headers": [
+			(b"content-type", b"application/x-ndjson"),
+			(b"access-control-allow-origin", b"*"),
+		],
+	})
+	stream = asyncio.ensure_future(_send_chunks(method_name, kwargs, send, follow_ups))
+	await asyncio.wait({stream, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+	if not stream.done():
+		# the cancellation lands in the upstream read, and closing the generators closes the call
+		stream.cancel()
+		await asyncio.wait({stream})
+		logger.info(f"Client went away from {method_name} stream; upstream call cancelled")
+		return
+	stream.result()
+	await send({"type": "http.response.body", "body": b"", "more_body": False})
+	if follow_ups is not None:
+		follow_ups.done()
+
+
+async def _send_chunks(method_name, kwargs, send, follow_ups):
+	try:
+		async for chunk in getattr(async_writing_service, method_name)(**kwargs):
+			await send({"type": "http.response.body", "body": (json.dumps(chunk) + "\n").encode(), "more_body": True})
+			if follow_ups is not None:
+				follow_ups.feed(chunk)
+	except Exception as e:
+		logger.error(f"Error in {method_name} stream: {e}")
+		await send({"type": "http.response.body", "body": (json.dumps({"error": str(e)}) + "\n").encode(), "more_body": True})
+
+
+async def _rate_limited(send, retry_after):
+	# as the blueprint's admit_request answers the requests handed to Flask
+	body = json.dumps({"error": "Too many requests waiting for the LLM provider", "retry_after": retry_after}).encode()
+	await send({
+		"type": "http.response.start",
+		"status": 429,
+		"headers": [
+			(b"content-type", b"application/json"),
+			(b"retry-after", str(retry_after).encode()),
+			(b"access-control-allow-origin", b"*"),
+		],
+	})
+	await send({"type": "http.response.body", "body": body, "more_body": False})
+
+
+def _client_key(scope):
+	headers = {name.decode("latin-1").title(): value.decode("latin-1") for name, value in scope["headers"]}
+	remote_addr = scope["client"][0] if scope.get("client") else None
+	return client_key(headers, remote_addr)
+
+
+def _record_workload(scope, data):
+	# requests handed to the Flask app are recorded by the blueprint itself
+	recorder = get_workload_recorder()
+	if recorder is not None:
+		recorder.record(_client_key(scope), scope["path"][len("/api/v1"):], data)
+
+
+async def _lifespan(receive, send):
+	while True:
+		message = await receive()
+		if message["type"] == "lifespan.startup":
+			await aprewarm()
+			await send({"type": "lifespan.startup.complete"})
+		elif message["type"] == "lifespan.shutdown":
+			await send({"type": "lifespan.shutdown.complete"})
+			return
+
+
+async def app(scope, receive, send):
+	if scope["type"] == "lifespan":
+		await _lifespan(receive, send)
+		return
+
+	path = scope.get("path", "")
+	story_id, story_route = None, None
+	if path.startswith(STORY_PREFIX) and "/" in path[len(STORY_PREFIX):]:
+		story_id, story_route = path[len(STORY_PREFIX):].split("/", 1)
+		story_route = "/" + story_route
+	route_path = "/api/v1" + story_route if story_route else path
+
+	if scope["type"] != "http" or scope["method"] != "POST":
+		await wsgi_app(scope, receive, send)
+		return
+
+	body = await _read_body(receive)
+	disconnected = asyncio.ensure_future(_disconnected(receive))
+	try:
+		if route_path in STREAMING_ROUTES and await _stream_natively(scope, body, route_path, story_id, story_route, send, disconnected):
+			return
+		try:
+			await wsgi_app(scope, _replay(body, receive), _until_disconnected(send, disconnected))
+		except ClientDisconnected:
+			logger.info(f"Client went away from {path}; its response was closed")
+	finally:
+		disconnected.cancel()
+
+
+async def _stream_natively(scope, body, route_path, story_id, story_route, send, disconnected):
+	"""Serve a streamed request on the event loop; False when it is for the Flask app after all."""
+	try:
+		data = json.loads(body or b"{}")
+	except ValueError:
+		data = {}
+	if not (isinstance(data, dict) and data.get("stream", False)):
+		return False
+	_record_workload(scope, data)
+	retry_after = admission_retry_after()
+	if retry_after is not None:
+		await _rate_limited(send, retry_after)
+		return True
+	follow_ups = None
+	if story_id is not None:
+		follow_ups = FollowUps.start(writing_service, story_id, story_route, data, _client_key(scope))
+		try:
+			data = get_story_store().resolve(story_id, story_route, data)
+		except (StoryNotFound, KeyError, IndexError, TypeError, ValueError):
+			# the Flask route answers with the matching 404/400
+			return False
+	await _stream_response(route_path, data, send, disconnected, follow_ups)
+	return True
@@ -0,0 +1,106 @@
+"""
+Concurrent-stream capacity of a single worker: gunicorn sync worker (app:app, 2 threads,
+as in docker-compose.prod.yml) versus the uvicorn worker serving asgi:app.
+
+The fake_openai stand-in runs in-process and streams its canned scene; it records how
+many completions are open at once. The script fires N concurrent streamed
+/chapters/scene/new requests at each server and reports the peak number of upstream
+streams held open and how many requests finished inside the measurement window.
+
+Usage (from server/):
+    python -m benchmarks.bench_concurrent_streams --requests 200 --window 10
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+import httpx
+from fake_openai import FakeOpenAI, serve_in_thread, tokenize
+from fake_openai.outputs import scene
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _wait_for_port(port: int, timeout: float = 20.0):
+	deadline = time.time() + timeout
+	while time.time() < deadline:
+		with socket.socket() as s:
+			if s.connect_ex(("127.0.0.1", port)) == 0:
+				return
+		time.sleep(0.1)
+	raise RuntimeError(f"nothing listening on port {port}")
+
+
+async def _fire(port: int, num_requests: int, window: float):
+	completed = 0
+	last_completion = 0.0
+
+	async def one(client, i):
+		nonlocal completed, last_completion
+		# distinct instructions, so single-flight coalescing does not merge the streams
+		body = {"context": {}, "instruction": f"bench {i}", "count": 10, "stream": True}
+		async with client.stream("POST", f"http://127.0.0.1:{port}/api/v1/chapters/scene/new", json=body) as response:
+			async for _ in response.aiter_lines():
+				pass
+		completed += 1
+		last_completion = time.perf_counter() - start
+
+	limits = httpx.Limits(max_connections=num_requests, max_keepalive_connections=num_requests)
+	async with httpx.AsyncClient(limits=limits, timeout=None) as client:
+		start = time.perf_counter()
+		tasks = [asyncio.create_task(one(client, i)) for i in range(num_requests)]
+		done, pending = await asyncio.wait(tasks, timeout=window)
+		for task in pending:
+			task.cancel()
+		await asyncio.gather(*pending, return_exceptions=True)
+	return completed, last_completion
+
+
+def run_mode(name, command, upstream, upstream_url, server_port, num_requests, window):
+	env = dict(os.environ, OPENAI_API_KEY="bench", OPENAI_BASE_URL=f"{upstream_url}/v1")
+	proc = subprocess.Popen(command, cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	try:
+		_wait_for_port(server_port)
+		upstream.reset()
+		completed, last_completion = asyncio.run(_fire(server_port, num_requests, window))
+		return {
+			"mode": name,
+			"peak_upstream_streams": upstream.peak_streams,
+			"completed": completed,
+			"last_completion_s": round(last_completion, 2),
+		}
+	finally:
+		proc.terminate()
+		proc.wait()
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--requests", type=int, default=200)
+	parser.add_argument("--window", type=float, default=10.0, help="seconds to wait for completions")
+	parser.add_argument("--ttft", type=float, default=0.3, help="upstream time to first token")
+	parser.add_argument("--tokens-per-second", type=float, default=250.0, help="upstream generation speed")
+	parser.add_argument("--server-port", type=int, default=18002)
+	args = parser.parse_args()
+
+	upstream = FakeOpenAI(ttft=args.ttft, tokens_per_second=args.tokens_per_second)
+	upstream_url = serve_in_thread(upstream, backlog=4096)
+
+	bind = f"127.0.0.1:{args.server_port}"
+	modes = [
+		("wsgi sync 1x2 threads", [sys.executable, "-m", "gunicorn", "--workers", "1", "--threads", "2", "--bind", bind, "app:app"]),
+		("asgi uvicorn worker", [sys.executable, "-m", "gunicorn", "-k", "uvicorn.workers.UvicornWorker", "--workers", "1", "--bind", bind, "asgi:app"]),
+	]
+	results = [run_mode(name, cmd, upstream, upstream_url, args.server_port, args.requests, args.window) for name, cmd in modes]
+
+	stream_seconds = args.ttft + len(tokenize(scene())) / args.tokens_per_second
+	print(f"{args.requests} concurrent streams of ~{stream_seconds:.1f}s each, {args.window:.0f}s window, one worker")
+	print(f"{'mode':<24}{'peak upstream streams':>24}{'completed':>12}{'last done s':>12}")
+	for r in results:
+		print(f"{r['mode']:<24}{r['peak_upstream_streams']:>24}{r['completed']:>12}{r['last_completion_s']:>12}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,126 @@
+"""
+Prompt tokens and generation latency of each WritingService prompt builder per context format
+(core/serializers.py): the compact and json formats, plus the two renderings the builders used
+before, Python repr (parameter suggestions) and json.dumps(indent=2) (chapter outlines).
+
+Context is built from sample_scene.json (the screenplay), chat_parameters.json (the story
+parameters), the stand-in's section summary and the prose in chat_history.json. Latency is
+measured against the fake_openai stand-in with a prompt processing rate
+(--prefill-tokens-per-second), or against a real provider with --base-url and OPENAI_API_KEY.
+"cold" is the first call of a prompt; "warm" the median of the repeats, with the provider's
+prefix cache holding the start of the prompt.
+
+Usage (from server/):
+    python -m benchmarks.bench_context_formats
+    python -m benchmarks.bench_context_formats --base-url https://api.openai.com/v1 --repeat 3
+"""
+import io
+import os
+import json
+import time
+import argparse
+import contextlib
+import statistics
+from core import serializers
+from core.llm_client import LLMClient
+from core.response_cache import ResponseCache
+from core.serializers import SERIALIZERS, register_serializer
+from core.tokens import count_tokens
+from fake_openai import FakeOpenAI, serve_in_thread
+from fake_openai.outputs import SERVER_DIR, SUMMARY, prose
+from services.writing_service import WritingService
+
+register_serializer("repr", str)
+register_serializer("json-indent", lambda value: json.dumps(value, indent=2))
+
+def build_context():
+	with open(os.path.join(SERVER_DIR, "sample_scene.json")) as f:
+		scene = json.load(f)
+	with open(os.path.join(SERVER_DIR, "chat_parameters.json")) as f:
+		parameters = json.load(f)["writing_assistant"]
+	paragraphs = prose().split("\n\n")[:8]
+	return {
+		"parameters": parameters,
+		"synopsis": "Emma pitches the hover-car to investors and Zoe has to save the demo.",
+		"overall_outline": "The pitch goes wrong before it goes right.",
+		"previous_summary": SUMMARY,
+		"previous_screenplay": scene,
+		"current_screenplay": scene,
+		"paragraphs": paragraphs,
+		"previous_paragraph": paragraphs[0],
+		"paragraph": paragraphs[1],
+		"next_paragraph": paragraphs[2],
+		"chapter_synopsis": "Emma pitches the hover-car to investors.",
+		"previous_outlines": ["Emma opens the pitch.", "Jack pushes back."],
+		"previous_summaries": [SUMMARY],
+	}
+
+def calls(context):
+	"""(name, call(service)) for every prompt builder, fed the same context."""
+	chapters = [{"title": f"Chapter {i}", "synopsis": f"Synopsis {i}.", "act": 1} for i in range(1, 6)]
+	return [
+		("parameter_suggestions", lambda s: s.generate_parameter_suggestions(context["parameters"], "character", {"name": "Emma Chen"})),
+		("chapter_suggestions", lambda s: s.generate_chapter_suggestions(chapters, context["parameters"], 3, 20)),
+		("chapter_outlines", lambda s: s.generate_chapter_outlines(context, "Zoe saves the demo.", 3)),
+		("section_summary", lambda s: s.generate_section_summary(context)),
+		("new_scene", lambda s: s.generate_new_scene(context, "Zoe saves the demo.", 10)),
+		("rewrite_scene", lambda s: s.rewrite_scene(context, "More tension.", 10)),
+		# the non-streamed text builders json.loads their prose, so these stream
+		("new_scene_paragraphs", lambda s: list(s.new_scene_paragraphs(context, "", 3, stream=True))),
+		("rewrite_scene_paragraphs", lambda s: s.rewrite_scene_paragraphs(context, "Tighten.", 1)),
+	]
+
+def record_prompts(llm_client, prompts):
+	create = llm_client.client.chat.completions.create
+	def recording(**kwargs):
+		prompts.append(kwargs["messages"][-1]["content"])
+		return create(**kwargs)
+	llm_client.client.chat.completions.create = recording
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--base-url", default=None, help="OpenAI-compatible provider; default: the stand-in")
+	parser.add_argument("--prefill-tokens-per-second", type=float, default=4000.0)
+	parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--formats", default=",".join(["repr", "json-indent", "json", "compact"]))
+	args = parser.parse_args()
+
+	base_url = args.base_url
+	if base_url is None:
+		os.environ.setdefault("OPENAI_API_KEY", "fake")
+		base_url = serve_in_thread(FakeOpenAI(ttft=0.05, tokens_per_second=args.tokens_per_second, prefill_tokens_per_second=args.prefill_tokens_per_second)) + "/v1"
+	llm_client = LLMClient(base_url=base_url)
+	prompts = []
+	record_prompts(llm_client, prompts)
+	service = WritingService(llm_client)
+	formats = args.formats.split(",")
+	context = build_context()
+
+	print(f"{'builder':<26}{'format':<13}{'prompt tokens':>14}{'cold ms':>10}{'warm ms':>10}")
+	totals = {name: 0 for name in formats}
+	for name, call in calls(context):
+		for format in formats:
+			if format not in SERIALIZERS:
+				raise SystemExit(f"unknown format {format}")
+			serializers.LLM_CONTEXT_FORMAT = format
+			times = []
+			for _ in range(1 + args.repeat):
+				# cached builders would otherwise answer the repeats without a call
+				llm_client.cache = ResponseCache(directory=None)
+				start = time.perf_counter()
+				# some builders print their prompt
+				with contextlib.redirect_stdout(io.StringIO()):
+					call(service)
+				times.append((time.perf_counter() - start) * 1000)
+			tokens = count_tokens(prompts[-1])
+			totals[format] += tokens
+			warm = statistics.median(times[1:]) if args.repeat else times[0]
+			print(f"{name:<26}{format:<13}{tokens:>14}{times[0]:>10.0f}{warm:>10.0f}")
+	print()
+	for format in formats:
+		print(f"{'all builders':<26}{format:<13}{totals[format]:>14}")
+
+
+if __name__ == "__main__":
+	main()
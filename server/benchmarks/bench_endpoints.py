@@ -0,0 +1,307 @@
+"""
+Per-endpoint load test of the /api/v1 blueprint under the production gunicorn configuration
+(GUNICORN_CMD_ARGS from Dockerfile.prod, plus gunicorn.conf.py, with only --bind overridden),
+against the fake_openai stand-in running in-process.
+
+Every route is driven in turn at each step of --concurrency by closed-loop clients that send
+back-to-back requests for --duration seconds. Streamed routes are requested with stream=true.
+For each (concurrency, endpoint) the bench reports throughput, p50/p95/p99 time to first byte
+(the first NDJSON line of a stream) and total latency, the error rate (non-2xx or an "error"
+line in the stream) and the peak RSS of the gunicorn master plus workers.
+
+Results go to a JSON file (--output) with the git revision and configuration, so runs from
+different releases can be diffed; --baseline prints the p95 and throughput change against an
+earlier results file.
+
+Usage (from server/):
+    python -m benchmarks.bench_endpoints --concurrency 1,8,32 --duration 10
+    python -m benchmarks.bench_endpoints --baseline benchmarks/results/<previous>.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import shlex
+import asyncio
+import argparse
+import platform
+import threading
+import subprocess
+import statistics
+from datetime import datetime, timezone
+import httpx
+from fake_openai import FakeOpenAI, serve_in_thread
+from fake_openai.outputs import SUMMARY, prose, scene
+from benchmarks.bench_concurrent_streams import SERVER_DIR, _wait_for_port
+
+def production_gunicorn_args() -> str:
+	"""GUNICORN_CMD_ARGS as baked into Dockerfile.prod, without its --bind."""
+	with open(os.path.join(SERVER_DIR, "Dockerfile.prod")) as f:
+		match = re.search(r'GUNICORN_CMD_ARGS="([^"]*)"', f.read())
+	if not match:
+		raise RuntimeError("GUNICORN_CMD_ARGS not found in Dockerfile.prod")
+	return " ".join(arg for arg in shlex.split(match.group(1)) if not arg.startswith("--bind"))
+
+def _story():
+	with open(os.path.join(SERVER_DIR, "chat_parameters.json")) as f:
+		parameters = json.load(f)
+	paragraphs = prose().split("\n\n")
+	return parameters, json.loads(scene())["elements"], paragraphs
+
+def endpoint_payloads():
+	"""(name, path, build(nonce) -> body) for every route; the nonce keeps the response cache and coalescing out of the numbers."""
+	parameters, elements, paragraphs = _story()
+	synopsis = "Alex wrestles with peer pressure and decides who he wants to be."
+	screenplay = json.dumps(elements[:10])
+
+	def scene_context(nonce):
+		return {
+			"parameters": parameters, "synopsis": synopsis, "previous_summary": json.dumps(SUMMARY),
+			"previous_screenplay": screenplay, "current_screenplay": screenplay, "overall_outline": nonce,
+		}
+
+	return [
+		("parameter_suggestions", "/parameters/suggestions", lambda nonce: {
+			"fieldType": "Title", "currentValue": nonce, "context": parameters,
+		}),
+		("chapter_suggestions", "/chapters/suggestions", lambda nonce: {
+			"chapters": [{"title": "Chapter 1", "synopsis": synopsis, "act": 1, "id": nonce}],
+			"parameters": parameters, "number_of_chapters": 3, "total_chapters": 10,
+		}),
+		("chapter_outlines", "/chapters/outlines", lambda nonce: {
+			"context": {"parameters": parameters, "synopsis": synopsis}, "instruction": nonce, "count": 3,
+		}),
+		("section_summary", "/chapters/summary", lambda nonce: {
+			"context": {"parameters": parameters, "synopsis": synopsis, "previous_summary": nonce, "paragraphs": paragraphs[:4]},
+		}),
+		("scene_new", "/chapters/scene/new", lambda nonce: {
+			"context": scene_context(nonce), "instruction": nonce, "count": 10, "stream": True,
+		}),
+		("scene_rewrite", "/chapters/scene/rewrite", lambda nonce: {
+			"context": scene_context(nonce), "instruction": nonce, "count": 10, "stream": True,
+		}),
+		("scene_continue", "/chapters/scene/continue", lambda nonce: {
+			"context": scene_context(nonce), "instruction": nonce, "count": 10, "stream": True,
+		}),
+		("scene_insert", "/chapters/scene/insert", lambda nonce: {
+			"context": scene_context(nonce), "instruction": nonce, "count": 10, "stream": True,
+		}),
+		("paragraph_new", "/chapters/scene/paragraph/new", lambda nonce: {
+			"context": {"parameters": parameters, "synopsis": synopsis, "current_screenplay": paragraphs[0]},
+			"instruction": nonce, "count": 3, "stream": True,
+		}),
+		("paragraph_rewrite", "/chapters/scene/paragraph/rewrite", lambda nonce: {
+			"context": {
+				"parameters": parameters, "synopsis": synopsis, "previous_paragraph": paragraphs[0],
+				"paragraph": paragraphs[1], "next_paragraph": paragraphs[2],
+			},
+			"instruction": nonce, "count": 1, "stream": True,
+		}),
+		("paragraph_insert", "/chapters/scene/paragraph/insert", lambda nonce: {
+			"context": {"parameters": parameters, "synopsis": synopsis, "summary": "", "prev": paragraphs[0], "next": paragraphs[1]},
+			"instruction": nonce, "count": 1, "stream": True,
+		}),
+	]
+
+def _rss_bytes(root_pid: int) -> int:
+	"""Resident set size of a process and its children, from /proc (0 where /proc is unavailable)."""
+	pids = {root_pid}
+	try:
+		for entry in os.listdir("/proc"):
+			if entry.isdigit():
+				with open(f"/proc/{entry}/stat") as f:
+					# the parent pid is the second field after the parenthesised command name
+					if int(f.read().rsplit(")", 1)[1].split()[1]) == root_pid:
+						pids.add(int(entry))
+		total = 0
+		for pid in pids:
+			with open(f"/proc/{pid}/status") as f:
+				total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) * 1024
+		return total
+	except (OSError, StopIteration):
+		return 0
+
+class RssSampler:
+	def __init__(self, pid: int, interval: float = 0.25):
+		self.pid = pid
+		self.interval = interval
+		self.peak = 0
+		self._stop = threading.Event()
+		self._thread = threading.Thread(target=self._run, daemon=True)
+
+	def _run(self):
+		while not self._stop.is_set():
+			self.peak = max(self.peak, _rss_bytes(self.pid))
+			self._stop.wait(self.interval)
+
+	def __enter__(self):
+		self.peak = _rss_bytes(self.pid)
+		self._thread.start()
+		return self
+
+	def __exit__(self, *exc):
+		self._stop.set()
+		self._thread.join()
+
+def _percentile(values, q):
+	if not values:
+		return None
+	ordered = sorted(values)
+	return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+async def _one(client, url, body, headers=None):
+	"""(time to first byte, total seconds, ok) for one request; streamed bodies are read line by line."""
+	start = time.perf_counter()
+	first = None
+	ok = True
+	async with client.stream("POST", url, json=body, headers=headers) as response:
+		ok = response.status_code < 400
+		async for line in response.aiter_lines():
+			if first is None:
+				first = time.perf_counter() - start
+			if body.get("stream") and line and '"error"' in line:
+				ok = False
+	total = time.perf_counter() - start
+	return (first if first is not None else total), total, ok
+
+async def _drive(base_url, path, build, concurrency, duration, request_timeout):
+	ttfts, totals = [], []
+	errors = 0
+	deadline = time.perf_counter() + duration
+
+	async def worker(client):
+		nonlocal errors
+		while time.perf_counter() < deadline:
+			try:
+				ttft, total, ok = await _one(client, base_url + path, build(uuid.uuid4().hex))
+			except httpx.HTTPError:
+				errors += 1
+				continue
+			if ok:
+				ttfts.append(ttft)
+				totals.append(total)
+			else:
+				errors += 1
+
+	limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+	async with httpx.AsyncClient(limits=limits, timeout=request_timeout) as client:
+		start = time.perf_counter()
+		await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+		elapsed = time.perf_counter() - start
+
+	requests = len(totals) + errors
+	ms = lambda v: round(v * 1000, 1) if v is not None else None
+	return {
+		"requests": requests,
+		"errors": errors,
+		"error_rate": round(errors / requests, 4) if requests else 0.0,
+		"throughput_rps": round(len(totals) / elapsed, 3),
+		**{f"ttft_p{q}_ms": ms(_percentile(ttfts, q)) for q in (50, 95, 99)},
+		**{f"latency_p{q}_ms": ms(_percentile(totals, q)) for q in (50, 95, 99)},
+		"latency_mean_ms": ms(statistics.mean(totals)) if totals else None,
+	}
+
+async def _warm_up(base_url, endpoints, workers):
+	"""One request per endpoint and worker, so the first measured step does not pay for worker boot and imports."""
+	async with httpx.AsyncClient(timeout=None) as client:
+		await asyncio.gather(*(
+			_one(client, base_url + path, build(uuid.uuid4().hex))
+			for _, path, build in endpoints
+			for _ in range(workers)
+		), return_exceptions=True)
+
+def _git_revision():
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return "unknown"
+
+def compare(results, baseline):
+	previous = {(r["concurrency"], r["endpoint"]): r for r in baseline["results"]}
+	print(f"\nagainst {baseline['revision']} ({baseline['started_at']})")
+	print(f"{'concurrency':>11} {'endpoint':<22}{'rps':>10}{'d rps':>9}{'p95 ms':>10}{'d p95':>9}")
+	for r in results["results"]:
+		before = previous.get((r["concurrency"], r["endpoint"]))
+		if not before:
+			continue
+		d_rps = (r["throughput_rps"] / before["throughput_rps"] - 1) * 100 if before["throughput_rps"] else 0.0
+		d_p95 = (r["latency_p95_ms"] / before["latency_p95_ms"] - 1) * 100 if before["latency_p95_ms"] and r["latency_p95_ms"] else 0.0
+		print(f"{r['concurrency']:>11} {r['endpoint']:<22}{r['throughput_rps']:>10}{d_rps:>+8.0f}%{r['latency_p95_ms'] or '-':>10}{d_p95:>+8.0f}%")
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency steps")
+	parser.add_argument("--duration", type=float, default=10.0, help="seconds per endpoint per step")
+	parser.add_argument("--endpoints", default="", help="comma-separated subset of endpoint names")
+	parser.add_argument("--ttft", type=float, default=0.3, help="upstream time to first token")
+	parser.add_argument("--tokens-per-second", type=float, default=250.0, help="upstream generation speed")
+	parser.add_argument("--error-rate", type=float, default=0.0, help="share of upstream calls failing with a 500")
+	parser.add_argument("--app", default="app:app", help="WSGI/ASGI app for gunicorn")
+	parser.add_argument("--gunicorn-args", default=None, help="override the production GUNICORN_CMD_ARGS")
+	parser.add_argument("--server-port", type=int, default=18021)
+	parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout")
+	parser.add_argument("--output", default=None, help="results file (default benchmarks/results/endpoints-<rev>-<time>.json)")
+	parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+	args = parser.parse_args()
+
+	steps = [int(step) for step in args.concurrency.split(",")]
+	endpoints = endpoint_payloads()
+	if args.endpoints:
+		wanted = set(args.endpoints.split(","))
+		endpoints = [e for e in endpoints if e[0] in wanted]
+
+	upstream = FakeOpenAI(ttft=args.ttft, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate, seed=0)
+	upstream_url = serve_in_thread(upstream, backlog=4096)
+
+	gunicorn_args = args.gunicorn_args if args.gunicorn_args is not None else production_gunicorn_args()
+	env = dict(os.environ, OPENAI_API_KEY="bench", OPENAI_BASE_URL=f"{upstream_url}/v1", GUNICORN_CMD_ARGS=gunicorn_args, FLASK_ENV="production")
+	command = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{args.server_port}", args.app]
+	results = {
+		"revision": _git_revision(),
+		"started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+		"python": platform.python_version(),
+		"app": args.app,
+		"gunicorn_args": gunicorn_args,
+		"upstream": {"ttft": args.ttft, "tokens_per_second": args.tokens_per_second, "error_rate": args.error_rate},
+		"duration_s": args.duration,
+		"results": [],
+	}
+
+	proc = subprocess.Popen(command, cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	try:
+		_wait_for_port(args.server_port)
+		base_url = f"http://127.0.0.1:{args.server_port}/api/v1"
+		workers = re.search(r"--workers[= ](\d+)", gunicorn_args)
+		asyncio.run(_warm_up(base_url, endpoints, int(workers.group(1)) if workers else 1))
+		print(f"{args.app} with gunicorn {gunicorn_args}; upstream ttft {args.ttft}s at {args.tokens_per_second} tok/s")
+		print(f"{'concurrency':>11} {'endpoint':<22}{'rps':>8}{'err %':>7}{'ttft p50':>10}{'p95':>8}{'p99':>8}{'total p50':>11}{'p95':>8}{'p99':>8}{'rss MB':>8}")
+		for concurrency in steps:
+			for name, path, build in endpoints:
+				with RssSampler(proc.pid) as rss:
+					row = asyncio.run(_drive(base_url, path, build, concurrency, args.duration, args.timeout))
+				row = {"concurrency": concurrency, "endpoint": name, **row, "peak_rss_mb": round(rss.peak / 2**20, 1)}
+				results["results"].append(row)
+				print(
+					f"{concurrency:>11} {name:<22}{row['throughput_rps']:>8.2f}{row['error_rate'] * 100:>7.1f}"
+					f"{row['ttft_p50_ms'] or '-':>10}{row['ttft_p95_ms'] or '-':>8}{row['ttft_p99_ms'] or '-':>8}"
+					f"{row['latency_p50_ms'] or '-':>11}{row['latency_p95_ms'] or '-':>8}{row['latency_p99_ms'] or '-':>8}{row['peak_rss_mb']:>8}"
+				)
+	finally:
+		proc.terminate()
+		proc.wait()
+
+	output = args.output or os.path.join(SERVER_DIR, "benchmarks", "results", f"endpoints-{results['revision']}-{int(time.time())}.json")
+	os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+	with open(output, "w") as f:
+		json.dump(results, f, indent=2)
+	print(f"results written to {output}")
+
+	if args.baseline:
+		with open(args.baseline) as f:
+			compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,90 @@
+"""
+Tail latency and token spend of upstream calls with no retries (the SDK's off as well), with
+the retry policy of core/resilience.py, and with retries plus hedging at a few percentiles.
+
+LLMClient streams --calls distinct prose generations, --concurrency at a time, from the
+fake_openai stand-in: a --slow-rate share of its requests wait --slow-ttft seconds for their
+first token instead of --ttft, and an --error-rate share fail with a 500. Hedging learns each
+percentile from --warmup calls first. Reported per mode: calls failed, median/p95/p99 seconds
+to the first sentence and to the whole text, upstream requests per call, and tokens served per
+call (prompt and completion, as the stand-in counts them) with the increase over no retries.
+
+Usage (from server/):
+    python -m benchmarks.bench_hedging --calls 1000 --slow-rate 0.02 --slow-ttft 3
+"""
+import os
+import time
+import logging
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from fake_openai import FakeOpenAI, serve_in_thread
+
+MODES = (("no retries", 1, 0), ("retries", 3, 0), ("hedge p99", 3, 99), ("hedge p95", 3, 95), ("hedge p90", 3, 90))
+
+def percentile(values, p):
+	values = sorted(values)
+	return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--calls", type=int, default=1000)
+	parser.add_argument("--concurrency", type=int, default=16)
+	parser.add_argument("--warmup", type=int, default=200, help="calls made first so hedging knows the times to first token")
+	parser.add_argument("--ttft", type=float, default=0.3, help="stand-in seconds before the first token")
+	parser.add_argument("--slow-rate", type=float, default=0.02, help="share of requests slow to their first token")
+	parser.add_argument("--slow-ttft", type=float, default=3.0, help="stand-in seconds before a slow request's first token")
+	parser.add_argument("--error-rate", type=float, default=0.01, help="share of requests failing with a 500")
+	parser.add_argument("--tokens-per-second", type=float, default=400.0)
+	args = parser.parse_args()
+
+	logging.disable(logging.CRITICAL)
+	os.environ.update(OPENAI_API_KEY="fake", LLM_CACHE_DIR="", LLM_RATE_LIMIT_PATH="")
+	from core import resilience
+	from core.llm_client import LLMClient
+	from core.resilience import Hedging
+
+	print(f"{'mode':<12}{'failed':>7}{'first p50':>10}{'p95':>7}{'p99':>7}{'total p50':>10}{'p95':>7}{'p99':>7}{'requests':>10}{'tokens':>8}{'extra':>8}")
+	baseline = None
+	run = 0
+	for mode, attempts, hedge_percentile in MODES:
+		fake = FakeOpenAI(
+			ttft=args.ttft, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+			slow_rate=args.slow_rate, slow_ttft=args.slow_ttft, seed=1,
+		)
+		llm_client = LLMClient(base_url=serve_in_thread(fake) + "/v1")
+		llm_client.hedging = Hedging(percentile=hedge_percentile, window=args.warmup, min_samples=args.warmup // 2)
+		resilience.LLM_RETRY_ATTEMPTS = attempts
+
+		def call(i):
+			start = time.perf_counter()
+			first = None
+			for chunk in llm_client.generate_streamed_text(f"Write the next paragraph ({run}-{i}).", "You write prose.", max_tokens=200, endpoint="bench_hedging"):
+				if "error" in chunk:
+					return None
+				if first is None:
+					first = time.perf_counter() - start
+			return first, time.perf_counter() - start
+
+		with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+			run += 1
+			list(pool.map(call, range(args.warmup)))
+			fake.reset()
+			run += 1
+			results = list(pool.map(call, range(args.calls)))
+		stats = fake.stats()
+		timings = [result for result in results if result is not None]
+		firsts = [first for first, _ in timings]
+		totals = [total for _, total in timings]
+		tokens = (stats["prompt_tokens"] + stats["completion_tokens"]) / args.calls
+		baseline = baseline or tokens
+		print(
+			f"{mode:<12}{args.calls - len(timings):>7}"
+			f"{statistics.median(firsts):>10.2f}{percentile(firsts, 95):>7.2f}{percentile(firsts, 99):>7.2f}"
+			f"{statistics.median(totals):>10.2f}{percentile(totals, 95):>7.2f}{percentile(totals, 99):>7.2f}"
+			f"{stats['requests'] / args.calls:>10.2f}{tokens:>8.0f}{tokens / baseline - 1:>8.1%}"
+		)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,98 @@
+"""
+CPU per stream of the JSON stream processing: the previous regex scanner versus
+core.stream_parsers.JsonStreamParser, on synthetic screenplay scenes split into
+~4-character deltas (roughly one delta per token).
+
+The regex scanner rescans the whole pending buffer on every delta, so its cost grows with
+the square of the longest still-open object: short elements hide it, long dialogue or
+internal monologue elements (and a stray "{" in the prose, after which the buffer is never
+trimmed again) expose it. The parser touches each character once regardless.
+
+Usage (from server/):
+    python -m benchmarks.bench_json_stream
+"""
+import re
+import json
+import time
+import argparse
+from core.stream_parsers import JsonStreamParser
+
+CHARS_PER_TOKEN = 4
+
+def legacy_process(deltas):
+	"""The pre-JsonStreamParser LLMClient._process_json_stream loop, minus the OpenAI plumbing."""
+	out = []
+	json_buffer = ""
+	for msg in deltas:
+		json_buffer += msg
+		while True:
+			match = re.search(r'\{[^{}]*\}', json_buffer)
+			if not match:
+				break
+			try:
+				out.append(json.dumps(json.loads(match.group())))
+				json_buffer = json_buffer[match.end():]
+			except json.JSONDecodeError:
+				break
+	return out
+
+def parser_process(deltas):
+	parser = JsonStreamParser()
+	out = []
+	for msg in deltas:
+		out.extend(parser.feed(msg))
+	out.extend(parser.close())
+	return out
+
+def make_scene(num_tokens: int, element_tokens: int, stray_brace: bool) -> str:
+	sentence = "Emma paces the length of the glass room, the city burning orange behind her. "
+	repeats = max(1, element_tokens * CHARS_PER_TOKEN // len(sentence))
+	elements = []
+	scene = {
+		"meta": {
+			"title": {"type": "title", "text": "The Big Pitch"},
+			"setting": {"location": "SLEEK CONFERENCE ROOM", "time": "DAY", "description": sentence * 3},
+			"characters": [{"type": "character", "name": n, "description": sentence} for n in ("EMMA", "JACK", "ZOE")],
+		},
+		"elements": elements,
+	}
+	i = 0
+	while len(json.dumps(scene, indent=2)) < num_tokens * CHARS_PER_TOKEN:
+		if i % 2:
+			elements.append({"type": "dialogue", "character": "JACK", "line": sentence * repeats, "parenthetical": "leaning back"})
+		else:
+			elements.append({"type": "internal_monologue", "character": "EMMA", "description": sentence * repeats})
+		i += 1
+	if stray_brace:
+		elements[0]["description"] = "She sketches a { on the whiteboard. " + elements[0]["description"]
+	return json.dumps(scene, indent=2)
+
+def cpu_seconds(fn, deltas, repeat: int) -> float:
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.process_time()
+		fn(deltas)
+		best = min(best, time.process_time() - start)
+	return best
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2500, 5000, 10000, 20000], help="scene sizes in tokens")
+	parser.add_argument("--element-tokens", type=int, nargs="+", default=[80, 800], help="approximate tokens per scene element")
+	parser.add_argument("--repeat", type=int, default=3)
+	args = parser.parse_args()
+
+	variants = [(f"{n}-token elements", n, False) for n in args.element_tokens]
+	variants.append(("stray brace", args.element_tokens[0], True))
+
+	print(f"{'scene':<22}{'tokens':>8}{'regex ms':>12}{'parser ms':>12}{'speedup':>10}")
+	for label, element_tokens, stray_brace in variants:
+		for size in args.sizes:
+			text = make_scene(size, element_tokens, stray_brace)
+			deltas = [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+			legacy = cpu_seconds(legacy_process, deltas, args.repeat) * 1000
+			incremental = cpu_seconds(parser_process, deltas, args.repeat) * 1000
+			print(f"{label:<22}{size:>8}{legacy:>12.1f}{incremental:>12.1f}{legacy / incremental:>9.1f}x")
+
+if __name__ == "__main__":
+	main()
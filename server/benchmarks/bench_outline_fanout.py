@@ -0,0 +1,89 @@
+"""
+Wall time of /chapters/outlines and /chapters/suggestions when one call generates every item
+("single") and when each item is its own concurrent call ("parallel", core/fanout.py).
+
+Each request goes through the Flask app in-process against the fake_openai stand-in, for
+--counts items, --repeat times with a different instruction each time (so no call is shared
+or cached). Reported per route, mode and count: median seconds for the whole response, median
+seconds to the first item of the same request with "stream": true, upstream requests made and
+completion tokens per request.
+
+Usage (from server/):
+    python -m benchmarks.bench_outline_fanout --counts 3 5 10
+"""
+import io
+import os
+import json
+import time
+import logging
+import argparse
+import contextlib
+import statistics
+from fake_openai import FakeOpenAI, serve_in_thread
+
+def body(route, count, i):
+	if route == "/chapters/outlines":
+		return {"context": {"synopsis": "Alex and Samuel argue under the bleachers."}, "instruction": f"Raise the stakes ({i}).", "count": count}
+	return {"chapters": [], "parameters": {"title": f"Bleachers ({i})"}, "number_of_chapters": count, "total_chapters": count + 2}
+
+def timed(client, route, plain, streamed):
+	"""Seconds to the whole response to `plain` and to the first item streamed for `streamed`."""
+	start = time.perf_counter()
+	response = client.post("/api/v1" + route, json=plain)
+	total = time.perf_counter() - start
+	assert response.status_code == 200, response.get_data(as_text=True)
+
+	start = time.perf_counter()
+	response = client.post("/api/v1" + route, json=dict(streamed, stream=True), buffered=False)
+	first = None
+	for line in response.response:
+		chunk = json.loads(line)
+		assert "error" not in chunk, chunk
+		if first is None and "index" in chunk:
+			first = time.perf_counter() - start
+	response.close()
+	return total, first
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--counts", type=int, nargs="+", default=[3, 5, 10])
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--ttft", type=float, default=0.4, help="stand-in seconds before the first token")
+	parser.add_argument("--tokens-per-second", type=float, default=60.0, help="stand-in output rate")
+	args = parser.parse_args()
+
+	logging.disable(logging.WARNING)
+	fake = FakeOpenAI(ttft=args.ttft, tokens_per_second=args.tokens_per_second)
+	base_url = serve_in_thread(fake)
+	# no disk cache: results from earlier runs would answer the cached suggestion calls
+	os.environ.update(OPENAI_API_KEY="fake", OPENAI_BASE_URL=base_url + "/v1", LLM_CACHE_DIR="")
+	import app as app_module
+	from core.usage import usage_stats
+	client = app_module.app.test_client()
+	endpoints = {"/chapters/outlines": "generate_chapter_outlines", "/chapters/suggestions": "generate_chapter_suggestions"}
+
+	print(f"{'route':<23}{'mode':<10}{'count':>6}{'total s':>9}{'first s':>9}{'requests':>10}{'tokens':>8}")
+	run = 0
+	for route, endpoint in endpoints.items():
+		for count in args.counts:
+			for mode in ("single", "parallel"):
+				totals, firsts = [], []
+				requests_before = fake.requests
+				tokens_before = usage_stats().get(endpoint, {}).get("completion_tokens", 0)
+				with contextlib.redirect_stdout(io.StringIO()):
+					for _ in range(args.repeat):
+						run += 2
+						total, first = timed(client, route, dict(body(route, count, run), mode=mode), dict(body(route, count, run + 1), mode=mode))
+						totals.append(total)
+						firsts.append(first)
+				# two requests per repeat: the plain one and the streamed one
+				requests = (fake.requests - requests_before) / (2 * args.repeat)
+				tokens = (usage_stats()[endpoint]["completion_tokens"] - tokens_before) / (2 * args.repeat)
+				print(
+					f"{route:<23}{mode:<10}{count:>6}{statistics.median(totals):>9.2f}{statistics.median(firsts):>9.2f}"
+					f"{requests:>10.0f}{tokens:>8.0f}"
+				)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,58 @@
+"""
+Time to first visible word per screenplay element, object-level streaming versus the
+opt-in field-level ("partial": true) mode of the scene routes.
+
+Replays a scene through JsonStreamParser as if it were generated at a fixed token rate and
+records, for each element, when its first word of dialogue/description/content reaches the
+browser: at the element's closing brace in object mode, or at the first partial event for
+one of those fields in partial mode. Lag is measured from when the previous element closed.
+
+Usage (from server/):
+    python -m benchmarks.bench_partial_streaming --scene sample_scene.json --tokens-per-second 60
+"""
+import json
+import argparse
+import statistics
+from core.stream_parsers import JsonStreamParser
+
+CHARS_PER_TOKEN = 4
+TEXT_FIELDS = ("line", "description", "content")
+
+def first_word_times(text: str, seconds_per_delta: float):
+	"""Per element: (time its closing brace arrives, time its first text-field word arrives)."""
+	parser = JsonStreamParser(partial_key="elements")
+	completed, first_word = {}, {}
+	for n, start in enumerate(range(0, len(text), CHARS_PER_TOKEN)):
+		now = (n + 1) * seconds_per_delta
+		for kind, value in parser.feed(text[start:start + CHARS_PER_TOKEN]):
+			if kind == "partial" and value["field"] in TEXT_FIELDS and value["text"].strip():
+				first_word.setdefault(value["index"], now)
+			elif kind == "complete":
+				completed[value["index"]] = now
+				first_word.setdefault(value["index"], now)
+	indexes = sorted(completed)
+	return [completed[i] for i in indexes], [first_word[i] for i in indexes]
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--scene", default="sample_scene.json")
+	parser.add_argument("--tokens-per-second", type=float, default=60.0)
+	args = parser.parse_args()
+
+	with open(args.scene) as f:
+		text = json.dumps(json.load(f), indent=2)
+	seconds_per_delta = 1.0 / args.tokens_per_second
+
+	whole, partial = first_word_times(text, seconds_per_delta)
+	# latency of each element relative to when its generation started (previous element done)
+	starts = [0.0] + whole[:-1]
+	object_lag = [w - s for w, s in zip(whole, starts)]
+	partial_lag = [p - s for p, s in zip(partial, starts)]
+
+	print(f"{len(whole)} elements at {args.tokens_per_second:.0f} tok/s")
+	print(f"{'mode':<10}{'first element s':>18}{'mean lag s':>14}{'p50 lag s':>12}{'max lag s':>12}")
+	for label, times, lag in (("object", whole, object_lag), ("partial", partial, partial_lag)):
+		print(f"{label:<10}{times[0]:>18.2f}{statistics.mean(lag):>14.2f}{statistics.median(lag):>12.2f}{max(lag):>12.2f}")
+
+if __name__ == "__main__":
+	main()
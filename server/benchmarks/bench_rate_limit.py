@@ -0,0 +1,94 @@
+"""
+What a burst across several workers does against a provider's requests-per-minute limit,
+without and with the shared rate limiter (core/rate_limit.py).
+
+--workers processes, each with its own Flask app like a gunicorn worker, send --burst
+/parameters/suggestions requests at once (one upstream call each) to the fake_openai
+stand-in limited to --rpm, then another burst --gap seconds after the first has been
+answered. The limiter runs off, on with no configured limit (it learns the provider's from
+its x-ratelimit-* headers and 429s, so only the second burst can be held back), and on with
+LLM_RATE_LIMIT_RPM set. Reported per burst: requests answered 200, failed with 500 (the
+provider's 429s surfacing once the OpenAI client's own retries run out), turned away with
+429 and a retry hint; the 429s the provider sent; and the median and slowest latency of the
+successful requests.
+
+Usage (from server/):
+    python -m benchmarks.bench_rate_limit --workers 4 --burst 40 --rpm 120 --gap 10
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from fake_openai import FakeOpenAI, serve_in_thread
+
+def worker(environment, worker_id, burst, start_at, gap, results):
+	os.environ.update(environment)
+	# the routes print and log every request
+	sys.stdout = open(os.devnull, "w")
+	logging.disable(logging.CRITICAL)
+	import app as app_module
+	client = app_module.app.test_client()
+
+	def request(i):
+		body = {"fieldType": "Title", "currentValue": "", "context": {"request": f"{worker_id}-{i}"}}
+		start = time.perf_counter()
+		response = client.post("/api/v1/parameters/suggestions", json=body)
+		return response.status_code, time.perf_counter() - start
+
+	time.sleep(max(0, start_at - time.time()))
+	with ThreadPoolExecutor(max_workers=burst) as pool:
+		results.put((0, list(pool.map(request, range(burst)))))
+		time.sleep(gap)
+		results.put((1, list(pool.map(request, range(burst, 2 * burst)))))
+
+def run(fake, base_url, args, limiter):
+	"""[(outcomes, provider 429s)] for each burst."""
+	environment = {"OPENAI_API_KEY": "fake", "OPENAI_BASE_URL": base_url + "/v1", "LLM_CACHE_DIR": "", "LLM_PREWARM_CONNECTIONS": "0"}
+	directory = tempfile.mkdtemp()
+	environment["LLM_RATE_LIMIT_PATH"] = os.path.join(directory, "rate-limit.db") if limiter != "off" else ""
+	environment["LLM_RATE_LIMIT_RPM"] = str(args.rpm) if limiter == "configured" else "0"
+	context = multiprocessing.get_context("spawn")
+	results = context.Queue()
+	start_at = time.time() + 3  # once every worker has imported the app
+	processes = [context.Process(target=worker, args=(environment, i, args.burst, start_at, args.gap, results)) for i in range(args.workers)]
+	for process in processes:
+		process.start()
+	bursts = [([], 0), ([], 0)]
+	for _ in range(2 * len(processes)):
+		burst, outcomes = results.get()
+		bursts[burst][0].extend(outcomes)
+		if burst == 0 and len(bursts[0][0]) == args.workers * args.burst:
+			bursts[0] = (bursts[0][0], fake.stats()["rate_limited"])
+	for process in processes:
+		process.join()
+	return [bursts[0], (bursts[1][0], fake.stats()["rate_limited"] - bursts[0][1])]
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--workers", type=int, default=4)
+	parser.add_argument("--burst", type=int, default=40, help="requests each worker sends at once")
+	parser.add_argument("--rpm", type=int, default=120, help="the stand-in's requests per minute")
+	parser.add_argument("--gap", type=float, default=10.0, help="seconds between a worker's two bursts")
+	parser.add_argument("--ttft", type=float, default=0.3, help="stand-in seconds before the first token")
+	args = parser.parse_args()
+
+	print(f"{'limiter':<12}{'burst':>6}{'200':>6}{'500':>6}{'429':>6}{'provider 429s':>15}{'p50 s':>8}{'max s':>8}")
+	for limiter in ("off", "learned", "configured"):
+		# a fresh stand-in each time, so every run starts with a full bucket
+		fake = FakeOpenAI(ttft=args.ttft, rpm=args.rpm)
+		for burst, (outcomes, provider_429s) in enumerate(run(fake, serve_in_thread(fake), args, limiter), 1):
+			latencies = [seconds for status, seconds in outcomes if status == 200]
+			count = lambda status: sum(1 for outcome in outcomes if outcome[0] == status)
+			print(
+				f"{limiter:<12}{burst:>6}{count(200):>6}{count(500):>6}{count(429):>6}{provider_429s:>15}"
+				f"{statistics.median(latencies) if latencies else 0:>8.2f}{max(latencies, default=0):>8.2f}"
+			)
+
+
+if __name__ == "__main__":
+	main()
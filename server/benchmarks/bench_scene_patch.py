@@ -0,0 +1,95 @@
+"""
+Output tokens and wall time of rewrite_scene regenerating a 40-element scene ("full") versus
+returning edit operations that the server applies ("patch"), for an instruction that touches
+two lines of dialogue.
+
+The scene repeats the elements of sample_scene.json up to --elements. Against the fake_openai
+stand-in (the default) the full rewrite replays that scene with the two lines changed and the
+patch replays fake_openai.outputs.scene_patch(), both at --tokens-per-second; with --base-url
+(and OPENAI_API_KEY) a real model writes both. Wall time is the median over --repeat calls,
+non-streamed and streamed to the last chunk; "first element" is when a streamed call delivers
+its first scene element, which a patch can only do once all its operations are in. Streamed
+calls stop at generate_streamed_json's max_tokens (1000), which a full rewrite of a long scene
+runs into.
+
+Usage (from server/):
+    python -m benchmarks.bench_scene_patch
+    python -m benchmarks.bench_scene_patch --base-url https://api.openai.com/v1 --repeat 3
+"""
+import io
+import os
+import json
+import time
+import argparse
+import contextlib
+import statistics
+from core.llm_client import LLMClient
+from core.scene_patch import apply_scene_patch
+from core.usage import usage_stats
+from fake_openai import FakeOpenAI, serve_in_thread
+from fake_openai.outputs import SERVER_DIR, scene_patch
+from services.writing_service import WritingService
+
+INSTRUCTION = "Make Emma's opening line steadier and Jack's first reply more hostile."
+
+def build_scene(num_elements: int):
+	with open(os.path.join(SERVER_DIR, "sample_scene.json")) as f:
+		scene = json.load(f)
+	elements = scene["elements"]
+	scene["elements"] = [dict(elements[i % len(elements)]) for i in range(num_elements)]
+	return scene
+
+def completion_tokens(endpoint: str) -> int:
+	return usage_stats().get(endpoint, {}).get("completion_tokens", 0)
+
+def measure(service, context, mode, endpoint, repeat):
+	"""(output tokens per non-streamed call, median non-streamed s, median streamed s, median s to the first element)."""
+	calls, streamed, first = [], [], []
+	tokens = 0
+	for i in range(repeat):
+		# distinct instructions, so identical calls are not coalesced or cached
+		instruction = f"{INSTRUCTION} ({i})"
+		with contextlib.redirect_stdout(io.StringIO()):
+			before = completion_tokens(endpoint)
+			start = time.perf_counter()
+			service.rewrite_scene(context, instruction, len(context["current_screenplay"]["elements"]), mode=mode)
+			calls.append(time.perf_counter() - start)
+			tokens += completion_tokens(endpoint) - before
+
+			start, first_at = time.perf_counter(), None
+			for chunk in service.rewrite_scene(context, instruction + " ", len(context["current_screenplay"]["elements"]), stream=True, mode=mode):
+				if first_at is None and "chunk" in chunk and chunk["chunk"] != "[DONE]":
+					first_at = time.perf_counter() - start
+			streamed.append(time.perf_counter() - start)
+			first.append(first_at or streamed[-1])
+	return tokens / repeat, statistics.median(calls), statistics.median(streamed), statistics.median(first)
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--elements", type=int, default=40)
+	parser.add_argument("--base-url", default=None, help="OpenAI-compatible provider; default: the stand-in")
+	parser.add_argument("--ttft", type=float, default=0.4, help="stand-in seconds before the first token")
+	parser.add_argument("--tokens-per-second", type=float, default=80.0, help="stand-in output rate")
+	parser.add_argument("--repeat", type=int, default=3)
+	args = parser.parse_args()
+
+	scene = build_scene(args.elements)
+	context = {"synopsis": "Emma pitches the hover-car to investors.", "current_screenplay": scene}
+	if args.base_url:
+		full_client = patch_client = LLMClient(base_url=args.base_url)
+	else:
+		os.environ.setdefault("OPENAI_API_KEY", "fake")
+		rewritten = apply_scene_patch(scene, json.loads(scene_patch()))
+		full_url = serve_in_thread(FakeOpenAI(ttft=args.ttft, tokens_per_second=args.tokens_per_second, output=json.dumps(rewritten, indent=2)))
+		patch_url = serve_in_thread(FakeOpenAI(ttft=args.ttft, tokens_per_second=args.tokens_per_second, output=scene_patch()))
+		full_client, patch_client = LLMClient(base_url=full_url + "/v1"), LLMClient(base_url=patch_url + "/v1")
+
+	print(f"{args.elements}-element scene, instruction touching two lines")
+	print(f"{'mode':<8}{'output tokens':>14}{'call s':>9}{'streamed s':>12}{'first element s':>17}")
+	for mode, client, endpoint in (("full", full_client, "rewrite_scene"), ("patch", patch_client, "rewrite_scene_patch")):
+		tokens, call, streamed, first = measure(WritingService(client), context, mode, endpoint, args.repeat)
+		print(f"{mode:<8}{tokens:>14.0f}{call:>9.2f}{streamed:>12.2f}{first:>17.2f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,107 @@
+"""
+Output tokens and latency of rewrite_scene_paragraphs for "make this funnier" style edits: the
+model echoing every sentence as an action ("full") versus returning edits to numbered
+sentences that the server expands into the same action list ("edits").
+
+Paragraphs come from the prose in chat_history.json; for each size (--paragraphs) the
+instruction changes --changed sentences per paragraph. Against the fake_openai stand-in (the
+default) both modes replay the model output that makes those changes, at --tokens-per-second;
+with --base-url (and OPENAI_API_KEY) a real model writes both. Times are medians over
+--repeat calls: non-streamed, streamed to the last chunk, and to the first streamed action
+(which edits sends once the first edit is parsed, along with the unchanged sentences before it).
+
+Usage (from server/):
+    python -m benchmarks.bench_sentence_edits
+    python -m benchmarks.bench_sentence_edits --base-url https://api.openai.com/v1 --repeat 3
+"""
+import io
+import os
+import json
+import time
+import argparse
+import contextlib
+import statistics
+from core.llm_client import LLMClient
+from core.sentence_edits import edits_to_actions, sentence_ids, split_sentences
+from core.usage import usage_stats
+from fake_openai import FakeOpenAI, serve_in_thread
+from fake_openai.outputs import prose
+from services.writing_service import WritingService
+
+INSTRUCTION = "Make this funnier."
+PUNCHLINES = [
+	", which, in hindsight, was the least of anyone's problems.",
+	", and somewhere a pigeon judged them silently.",
+	", mostly out of spite.",
+]
+
+def funnier(sentence: str, number: int) -> str:
+	return sentence.rstrip(".!?") + PUNCHLINES[number % len(PUNCHLINES)]
+
+def make_outputs(paragraphs, changed):
+	"""The model output for the same edits in both protocols: (full action list, sentence edits)."""
+	edits, start = [], 0
+	for paragraph in paragraphs:
+		for offset in range(0, len(paragraph), max(1, len(paragraph) // changed))[:changed]:
+			edits.append({"op": "edit", "id": f"S{start + offset + 1}", "text": funnier(paragraph[offset], len(edits))})
+		start += len(paragraph)
+	actions = edits_to_actions(paragraphs, edits)
+	return json.dumps(actions, indent=2), json.dumps(edits, indent=2)
+
+def completion_tokens(endpoint: str) -> int:
+	return usage_stats().get(endpoint, {}).get("completion_tokens", 0)
+
+def measure(service, context, mode, endpoint, repeat):
+	tokens, calls, streamed, first = 0, [], [], []
+	for i in range(repeat):
+		# distinct instructions, so identical calls are not coalesced
+		instruction = f"{INSTRUCTION} ({i})"
+		with contextlib.redirect_stdout(io.StringIO()):
+			before = completion_tokens(endpoint)
+			start = time.perf_counter()
+			service.rewrite_scene_paragraphs(context, instruction, 1, mode=mode)
+			calls.append(time.perf_counter() - start)
+			tokens += completion_tokens(endpoint) - before
+
+			start, first_at = time.perf_counter(), None
+			for chunk in service.rewrite_scene_paragraphs(context, instruction + " ", 1, stream=True, mode=mode):
+				if first_at is None and "chunk" in chunk and chunk["chunk"] != "[DONE]":
+					first_at = time.perf_counter() - start
+			streamed.append(time.perf_counter() - start)
+			first.append(first_at or streamed[-1])
+	return tokens / repeat, statistics.median(calls), statistics.median(streamed), statistics.median(first)
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--paragraphs", default="1,3")
+	parser.add_argument("--changed", type=int, default=2, help="sentences changed per paragraph")
+	parser.add_argument("--base-url", default=None, help="OpenAI-compatible provider; default: the stand-in")
+	parser.add_argument("--ttft", type=float, default=0.4, help="stand-in seconds before the first token")
+	parser.add_argument("--tokens-per-second", type=float, default=80.0, help="stand-in output rate")
+	parser.add_argument("--repeat", type=int, default=3)
+	args = parser.parse_args()
+
+	source = [p for p in prose().split("\n\n") if sum(map(len, split_sentences(p))) >= 4]
+	if args.base_url is None:
+		os.environ.setdefault("OPENAI_API_KEY", "fake")
+
+	print(f"{'paragraphs':<12}{'sentences':>10}{'mode':>7}{'output tokens':>15}{'call s':>9}{'streamed s':>12}{'first action s':>16}")
+	for count in (int(n) for n in args.paragraphs.split(",")):
+		text = "\n\n".join(source[:count])
+		paragraphs = split_sentences(text)
+		context = {"previous_paragraph": source[count], "paragraph": text, "next_paragraph": source[count + 1]}
+		if args.base_url:
+			clients = {"full": LLMClient(base_url=args.base_url), "edits": LLMClient(base_url=args.base_url)}
+		else:
+			full_output, edits_output = make_outputs(paragraphs, args.changed)
+			clients = {
+				mode: LLMClient(base_url=serve_in_thread(FakeOpenAI(ttft=args.ttft, tokens_per_second=args.tokens_per_second, output=output)) + "/v1")
+				for mode, output in (("full", full_output), ("edits", edits_output))
+			}
+		for mode, endpoint in (("full", "rewrite_scene_paragraphs"), ("edits", "rewrite_scene_sentences")):
+			tokens, call, streamed, first = measure(WritingService(clients[mode]), context, mode, endpoint, args.repeat)
+			print(f"{count:<12}{len(sentence_ids(paragraphs)):>10}{mode:>7}{tokens:>15.0f}{call:>9.2f}{streamed:>12.2f}{first:>16.2f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,85 @@
+"""
+Latency of the requests that follow a scene, with and without speculative prefetch
+(core/speculation.py, services/prefetch.py), and what the speculation costs.
+
+An author works through --rounds rounds on a stored story (the Bleachers story from the tests)
+through the Flask app in-process, against the fake_openai stand-in: generate a new scene
+(which saves a new paragraph through its delta), read it for --think seconds, then ask for
+the section summary and for outlines, with an instruction of their own in --custom-outlines of
+the rounds (which speculation cannot predict). Reported: median latency of the scene, summary
+and outline requests, the speculator's hit rate, and the tokens it spent and wasted.
+
+Usage (from server/):
+    python -m benchmarks.bench_speculation --rounds 6 --think 4
+"""
+import io
+import os
+import time
+import logging
+import argparse
+import tempfile
+import contextlib
+import statistics
+from fake_openai import FakeOpenAI, serve_in_thread
+
+def session(client, rounds, think, custom_outlines):
+	"""Median seconds per route over one author session."""
+	times = {"scene": [], "summary": [], "outlines": []}
+	for i in range(rounds):
+		target = {"chapter_id": "c1", "section": 1, "scene": 1}
+		delta = {"paragraphs": [{"chapter_id": "c1", "section": 1, "scene": 1, "index": 2 + i, "text": f"Round {i}: Alex paced the bleachers."}]}
+
+		start = time.perf_counter()
+		client.post("/api/v1/stories/s1/chapters/scene/new", json={"target": target, "delta": delta, "instruction": f"Storm off ({i})."})
+		times["scene"].append(time.perf_counter() - start)
+		time.sleep(think)
+
+		start = time.perf_counter()
+		client.post("/api/v1/stories/s1/chapters/summary", json={"target": target})
+		times["summary"].append(time.perf_counter() - start)
+
+		instruction = f"Raise the stakes ({i})." if i < round(rounds * custom_outlines) else ""
+		start = time.perf_counter()
+		client.post("/api/v1/stories/s1/chapters/outlines", json={"target": target, "instruction": instruction})
+		times["outlines"].append(time.perf_counter() - start)
+	return {route: statistics.median(values) for route, values in times.items()}
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--rounds", type=int, default=6)
+	parser.add_argument("--think", type=float, default=4.0, help="seconds the author reads the scene before asking for more")
+	parser.add_argument("--custom-outlines", type=float, default=0.5, help="share of rounds asking for outlines with their own instruction")
+	parser.add_argument("--ttft", type=float, default=0.4, help="stand-in seconds before the first token")
+	parser.add_argument("--tokens-per-second", type=float, default=80.0, help="stand-in output rate")
+	args = parser.parse_args()
+
+	logging.disable(logging.WARNING)
+	base_url = serve_in_thread(FakeOpenAI(ttft=args.ttft, tokens_per_second=args.tokens_per_second))
+	os.environ.update(OPENAI_API_KEY="fake", OPENAI_BASE_URL=base_url + "/v1")
+	import app as app_module
+	from core import story_store
+	from core.speculation import Speculator
+	from core.story_store import StoryStore
+	from tests.test_story_store import STORY
+
+	print(f"{'speculation':<13}{'scene s':>9}{'summary s':>11}{'outlines s':>12}{'hit rate':>10}{'spent tokens':>14}{'wasted tokens':>15}")
+	with tempfile.TemporaryDirectory() as directory:
+		for enabled in (False, True):
+			story_store._store = StoryStore(os.path.join(directory, f"stories-{enabled}.db"))
+			speculator = app_module.llm_client.speculator = Speculator(enabled=enabled, ttl=args.think * 3)
+			client = app_module.app.test_client()
+			client.put("/api/v1/stories/s1", json=STORY)
+			with contextlib.redirect_stdout(io.StringIO()):
+				medians = session(client, args.rounds, args.think, args.custom_outlines)
+			# let the last round's unused results expire
+			speculator.join()
+			time.sleep(speculator.ttl)
+			stats = speculator.stats()
+			print(
+				f"{'on' if enabled else 'off':<13}{medians['scene']:>9.2f}{medians['summary']:>11.2f}{medians['outlines']:>12.2f}"
+				f"{stats['hit_rate']:>10.2f}{stats['tokens']:>14}{stats['wasted_tokens']:>15}"
+			)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,97 @@
+"""
+Cost of the passage index behind retrieval of earlier passages (core/story_index.py): building
+it for a whole book, keeping it up to date on a one-paragraph write, and answering queries.
+
+The book is --words words of paragraphs made of shuffled sentences from the prose in
+chat_history.json, in chapters of 4 sections of 3 scenes (sample_scene.json) with a summary
+per section, stored in a temporary StoryStore. "Build" indexes every summary, scene and
+paragraph from SQLite; "write" is StoryStore.apply of one paragraph with and without an index
+to keep current; "query" is related_passages for the last chapter with an instruction-like
+query of --query-words words, median over --repeat queries.
+
+Usage (from server/):
+    python -m benchmarks.bench_story_index --words 200000
+"""
+import os
+import re
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from core.story_store import StoryStore
+from core.story_index import tokenize
+from fake_openai.outputs import prose, scene
+
+PARAGRAPHS_PER_SCENE = 10
+
+def build_book(words: int, seed: int = 0):
+	rng = random.Random(seed)
+	sentences = [s for s in re.split(r"(?<=[.!?])\s+", prose().replace("\n\n", " ")) if len(s.split()) > 3]
+	base = json.loads(scene())
+	chapters, total = [], 0
+	while total < words:
+		sections = []
+		for s in range(4):
+			scenes = []
+			for _ in range(3):
+				paragraphs = [" ".join(rng.sample(sentences, 5)) for _ in range(PARAGRAPHS_PER_SCENE)]
+				total += sum(len(p.split()) for p in paragraphs)
+				scenes.append(dict(base, paragraphs=paragraphs))
+			summary = " ".join(rng.sample(sentences, 4))
+			sections.append({"outline": f"Outline {len(chapters)}.{s}", "summary": summary, "scenes": scenes})
+		chapters.append({"id": f"c{len(chapters)}", "title": f"Chapter {len(chapters)}", "synopsis": rng.choice(sentences), "sections": sections})
+	return {"parameters": {"title": "Benchmark"}, "chapters": chapters}, total, sentences
+
+def _median_ms(fn, repeat):
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		fn()
+		times.append(time.perf_counter() - start)
+	return statistics.median(times) * 1e3
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--words", type=int, default=200000)
+	parser.add_argument("--query-words", type=int, default=20)
+	parser.add_argument("--passages", type=int, default=5)
+	parser.add_argument("--repeat", type=int, default=200)
+	args = parser.parse_args()
+
+	book, words, sentences = build_book(args.words)
+	vocabulary = sorted({word for sentence in sentences for word in tokenize(sentence)})
+	rng = random.Random(1)
+	queries = [" ".join(rng.sample(vocabulary, args.query_words)) for _ in range(args.repeat)]
+	last = book["chapters"][-1]["id"]
+	target = {"chapter_id": last, "section": 3}
+
+	with tempfile.TemporaryDirectory() as directory:
+		store = StoryStore(os.path.join(directory, "stories.db"))
+		store.replace_story("book", book)
+		index = store.index("book")
+		print(f"{len(book['chapters'])} chapters, {words} words of paragraphs, {len(index)} passages, {len(index.postings)} terms")
+
+		builds = []
+		for _ in range(3):
+			store._indexes.clear()
+			start = time.perf_counter()
+			store.index("book")
+			builds.append(time.perf_counter() - start)
+		print(f"build from SQLite: {statistics.median(builds) * 1e3:.0f} ms")
+
+		paragraph = lambda: {"paragraphs": [{"chapter_id": last, "section": 3, "scene": 2, "index": 4, "text": " ".join(rng.sample(sentences, 5))}]}
+		store._indexes.clear()
+		unindexed = _median_ms(lambda: store.apply("book", paragraph()), 50)
+		store.index("book")
+		indexed = _median_ms(lambda: store.apply("book", paragraph()), 50)
+		print(f"one-paragraph write: {unindexed:.2f} ms without an index, {indexed:.2f} ms keeping it current")
+
+		queries_left = iter(queries)
+		query = _median_ms(lambda: store.related_passages("book", next(queries_left), target, args.passages), args.repeat)
+		print(f"query ({args.query_words} words, top {args.passages}): {query:.2f} ms median")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,92 @@
+"""
+Request body size and server-side parse time: the full-context body each /api/v1 route takes
+today versus its /stories/<id>/ variant, which sends a target, the instruction and a one
+paragraph delta and has core/story_store.py assemble the same context from SQLite.
+
+The book is built from sample_scene.json and the prose in chat_history.json: --chapters
+chapters of --sections sections with --scenes scenes each. "Parse" is json.loads of the body
+for the plain route, and json.loads plus StoryStore.resolve (delta write and context reads)
+for the story variant.
+
+Usage (from server/):
+    python -m benchmarks.bench_story_store --chapters 20
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from core.story_store import StoryStore
+from fake_openai.outputs import prose, scene
+
+ROUTES = [
+	("/chapters/suggestions", {"number_of_chapters": 3, "total_chapters": 30}),
+	("/chapters/outlines", {"instruction": "Raise the stakes.", "count": 3}),
+	("/chapters/summary", {}),
+	("/chapters/scene/new", {"instruction": "Samuel leaves.", "count": 10, "stream": True}),
+	("/chapters/scene/rewrite", {"instruction": "More tension.", "count": 10, "stream": True}),
+	("/chapters/scene/paragraph/new", {"instruction": "Continue.", "count": 3, "stream": True}),
+	("/chapters/scene/paragraph/rewrite", {"instruction": "Tighten.", "count": 1, "stream": True}),
+	("/chapters/scene/paragraph/insert", {"instruction": "Bridge.", "count": 1, "stream": True}),
+]
+
+def build_book(chapters: int, sections: int, scenes: int):
+	base = json.loads(scene())
+	paragraphs = prose().split("\n\n")
+	with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chat_parameters.json")) as f:
+		parameters = json.load(f)
+	return {
+		"parameters": parameters,
+		"chapters": [
+			{
+				"id": f"c{c}", "title": f"Chapter {c}", "synopsis": f"Synopsis of chapter {c}.", "act": 1 + c * 3 // chapters,
+				"sections": [
+					{
+						"outline": f"Outline {c}.{s}", "summary": f"Summary of section {c}.{s}. " * 10,
+						"scenes": [dict(base, paragraphs=paragraphs[:6]) for _ in range(scenes)],
+					}
+					for s in range(sections)
+				],
+			}
+			for c in range(chapters)
+		],
+	}
+
+def _median_us(fn, repeat):
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		fn()
+		times.append(time.perf_counter() - start)
+	return statistics.median(times) * 1e6
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--chapters", type=int, default=20)
+	parser.add_argument("--sections", type=int, default=4)
+	parser.add_argument("--scenes", type=int, default=3)
+	parser.add_argument("--repeat", type=int, default=200)
+	args = parser.parse_args()
+
+	book = build_book(args.chapters, args.sections, args.scenes)
+	with tempfile.TemporaryDirectory() as directory:
+		store = StoryStore(os.path.join(directory, "stories.db"))
+		store.replace_story("book", book)
+		chapter = f"c{args.chapters - 1}"
+		section = args.sections - 1
+		target = {"chapter_id": chapter, "section": section, "scene": args.scenes - 1, "paragraph": 2}
+		delta = {"paragraphs": [{"chapter_id": chapter, "section": section, "scene": 0, "index": 1, "text": prose().split("\n\n")[1]}]}
+
+		print(f"book of {args.chapters} chapters x {args.sections} sections x {args.scenes} scenes ({len(json.dumps(book)) / 1024:.0f} KB)")
+		print(f"{'route':<36}{'full body KB':>13}{'story body KB':>14}{'full parse us':>15}{'story parse us':>16}")
+		for route, extra in ROUTES:
+			story_body = json.dumps(dict(extra, target=target, delta=delta))
+			full_body = json.dumps(store.resolve("book", route, json.loads(story_body)))
+			full_us = _median_us(lambda: json.loads(full_body), args.repeat)
+			story_us = _median_us(lambda: store.resolve("book", route, json.loads(story_body)), args.repeat)
+			print(f"{route:<36}{len(full_body) / 1024:>13.1f}{len(story_body) / 1024:>14.2f}{full_us:>15.0f}{story_us:>16.0f}")
+
+
+if __name__ == "__main__":
+	main()
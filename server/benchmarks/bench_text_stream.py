@@ -0,0 +1,87 @@
+"""
+CPU per stream of the prose stream processing: the previous replace + re.split loop versus
+core.stream_parsers.SentenceSegmenter, on long new_scene_paragraphs/insert_scene_paragraphs
+style outputs built from the prose in chat_history.json, at several delta sizes.
+
+The old loop re-ran str.replace and re.split over the whole pending buffer on every delta.
+That buffer only shrank at a sentence end followed by whitespace, and a paragraph break
+(rewritten to a literal "\\n\\n" marker, so no whitespace follows the full stop) carried the
+last sentence of each paragraph into the next one.
+
+Usage (from server/):
+    python -m benchmarks.bench_text_stream
+"""
+import re
+import json
+import time
+import argparse
+from core.stream_parsers import SentenceSegmenter
+
+CHARS_PER_TOKEN = 4
+
+def legacy_process(deltas):
+	"""The pre-SentenceSegmenter LLMClient._process_text_stream loop, minus the OpenAI plumbing."""
+	out = []
+	current_sentence = ""
+	for msg in deltas:
+		current_sentence += msg
+		current_sentence = current_sentence.replace("\n\n", "\\n\\n")
+		sentences = re.split(r'(?<=[.!?])\s+', current_sentence)
+		if len(sentences) > 1:
+			for sentence in sentences[:-1]:
+				out.append(sentence.strip())
+			current_sentence = sentences[-1]
+	if current_sentence.strip():
+		out.append(current_sentence.strip())
+	return out
+
+def segmenter_process(deltas):
+	segmenter = SentenceSegmenter()
+	out = []
+	for msg in deltas:
+		out.extend(segmenter.feed(msg))
+	out.extend(segmenter.close())
+	return out
+
+def make_prose(num_tokens: int) -> str:
+	with open("chat_history.json") as f:
+		sessions = json.load(f)
+	paragraphs = [
+		p.strip()
+		for session in sessions
+		for message in session["messages"]
+		for p in message["content"].split("\n\n")
+		if p.strip()
+	]
+	out, i = [], 0
+	while sum(len(p) + 2 for p in out) < num_tokens * CHARS_PER_TOKEN:
+		out.append(paragraphs[i % len(paragraphs)])
+		i += 1
+	return "\n\n".join(out)
+
+def cpu_ms(fn, deltas, repeat: int) -> float:
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.process_time()
+		fn(deltas)
+		best = min(best, time.process_time() - start)
+	return best * 1000
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--sizes", type=int, nargs="+", default=[2000, 5000, 10000], help="output sizes in tokens")
+	parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[1, 4, 16, 64], help="characters per delta")
+	parser.add_argument("--repeat", type=int, default=3)
+	args = parser.parse_args()
+
+	print(f"{'tokens':>8}{'chunk chars':>13}{'split ms':>11}{'segmenter ms':>14}{'speedup':>10}")
+	for size in args.sizes:
+		text = make_prose(size)
+		for chunk_size in args.chunk_sizes:
+			deltas = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+			legacy = cpu_ms(legacy_process, deltas, args.repeat)
+			segmented = cpu_ms(segmenter_process, deltas, args.repeat)
+			print(f"{size:>8}{chunk_size:>13}{legacy:>11.1f}{segmented:>14.1f}{legacy / segmented:>9.1f}x")
+
+if __name__ == "__main__":
+	main()
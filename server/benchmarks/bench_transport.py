@@ -0,0 +1,98 @@
+"""
+Handshakes and time to first token: a fresh OpenAI client per call (as app_old did) versus
+the shared pooled transport in core/transport.py, pre-warmed as at worker boot.
+
+The fake_openai stand-in sits behind a TCP proxy that delays every new connection by
+--handshake-ms before relaying bytes, standing in for the TCP + TLS round trips to a remote
+provider. The proxy counts accepted connections.
+
+Usage (from server/):
+    python -m benchmarks.bench_transport --calls 20 --handshake-ms 150
+"""
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+from openai import OpenAI
+from core import transport
+from fake_openai import FakeOpenAI, serve_in_thread
+from benchmarks.bench_concurrent_streams import _wait_for_port
+
+class DelayedAcceptProxy:
+	def __init__(self, upstream_port: int, handshake_delay: float):
+		self.upstream_port = upstream_port
+		self.handshake_delay = handshake_delay
+		self.accepted = 0
+
+	async def _pipe(self, reader, writer):
+		try:
+			while data := await reader.read(65536):
+				writer.write(data)
+				await writer.drain()
+		except ConnectionError:
+			pass
+		finally:
+			writer.close()
+
+	async def handle(self, client_reader, client_writer):
+		self.accepted += 1
+		await asyncio.sleep(self.handshake_delay)
+		upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", self.upstream_port)
+		await asyncio.gather(self._pipe(client_reader, upstream_writer), self._pipe(upstream_reader, client_writer))
+
+	def serve(self, port: int):
+		async def main():
+			server = await asyncio.start_server(self.handle, "127.0.0.1", port)
+			async with server:
+				await server.serve_forever()
+		asyncio.run(main())
+
+def time_to_first_token(client: OpenAI) -> float:
+	start = time.perf_counter()
+	stream = client.chat.completions.create(
+		model="bench",
+		messages=[{"role": "user", "content": "bench"}],
+		stream=True,
+	)
+	ttft = None
+	for chunk in stream:
+		if ttft is None and chunk.choices and chunk.choices[0].delta.content:
+			ttft = time.perf_counter() - start
+	return ttft
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--calls", type=int, default=20)
+	parser.add_argument("--handshake-ms", type=float, default=150.0)
+	parser.add_argument("--proxy-port", type=int, default=18012)
+	args = parser.parse_args()
+
+	upstream_url = serve_in_thread(FakeOpenAI(ttft=0.02, tokens_per_second=200, output="A short streamed reply."))
+	proxy = DelayedAcceptProxy(int(upstream_url.rsplit(":", 1)[1]), args.handshake_ms / 1000)
+	threading.Thread(target=proxy.serve, args=(args.proxy_port,), daemon=True).start()
+	_wait_for_port(args.proxy_port)
+	time.sleep(args.handshake_ms / 1000 + 0.1)
+	proxy.accepted = 0
+	base_url = f"http://127.0.0.1:{args.proxy_port}/v1"
+
+	results = []
+
+	ttfts = [time_to_first_token(OpenAI(api_key="bench", base_url=base_url)) for _ in range(args.calls)]
+	results.append(("client per call", proxy.accepted, ttfts))
+
+	proxy.accepted = 0
+	transport.prewarm(base_url=base_url, connections=2)
+	warm_connections = proxy.accepted
+	client = transport.create_openai_client(api_key="bench", base_url=base_url)
+	ttfts = [time_to_first_token(client) for _ in range(args.calls)]
+	results.append(("shared pool", proxy.accepted - warm_connections, ttfts))
+
+	print(f"{args.calls} sequential streamed calls, {args.handshake_ms:.0f} ms simulated handshake per new connection")
+	print(f"{'transport':<18}{'handshakes':>12}{'first ttft ms':>15}{'p50 ttft ms':>13}{'mean ttft ms':>14}")
+	for label, handshakes, ttfts in results:
+		print(f"{label:<18}{handshakes:>12}{ttfts[0] * 1000:>15.0f}{statistics.median(ttfts) * 1000:>13.0f}{statistics.mean(ttfts) * 1000:>14.0f}")
+	print(f"pre-warm opened {warm_connections} connection(s) before the first shared-pool call; pool stats {transport.transport_stats()}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,197 @@
+"""
+Trace-driven replay of whole book-writing sessions: N simulated authors each replay a recorded
+session (parameters, chapter suggestions, outlines, scene, paragraphs, summary, rewrites...)
+against the server, keeping the session's request order and think times.
+
+Record a trace by running the server with WORKLOAD_RECORD_PATH=/path/to/trace.jsonl (see
+core/workload.py); story text is reduced to string lengths and clients to salted hashes.
+Without --trace the bench replays a built-in session: three parameter suggestions and one
+round of chapter suggestions, then outlines, a new scene, two paragraph batches, a paragraph
+rewrite, a summary and a scene rewrite for each of --chapters chapters.
+
+Authors start spread over --ramp seconds. Each request is sent at its recorded offset divided
+by --speed, or as soon as the author's previous request finishes if the server is behind.
+The bench reports per-step (route) latency, per-session wall time, and the slowdown of each
+session against its ideal replay time, under the production gunicorn configuration against
+the fake_openai stand-in (or against --url).
+
+Usage (from server/):
+    python -m benchmarks.bench_workload --authors 20 --speed 20
+    python -m benchmarks.bench_workload --trace trace.jsonl --authors 50 --url http://127.0.0.1:5000
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timezone
+import httpx
+from core.workload import SESSION_HEADER, anonymize, load_trace, synthesize
+from fake_openai import FakeOpenAI, serve_in_thread
+from benchmarks.bench_concurrent_streams import SERVER_DIR, _wait_for_port
+from benchmarks.bench_endpoints import RssSampler, _git_revision, _one, _percentile, endpoint_payloads, production_gunicorn_args
+
+def builtin_session(chapters: int):
+	"""A session in trace form, built from the bench_endpoints payloads, with think times of a plausible author."""
+	payloads = {name: (path, build) for name, path, build in endpoint_payloads()}
+	steps = [("parameter_suggestions", 0, {"fieldType": field}) for field in ("Title", "Genre", "Premise")]
+	steps.append(("chapter_suggestions", 40, {}))
+	for _ in range(chapters):
+		steps += [
+			("chapter_outlines", 60, {}),
+			("scene_new", 30, {}),
+			("paragraph_new", 90, {}),
+			("paragraph_new", 120, {}),
+			("paragraph_rewrite", 60, {}),
+			("section_summary", 45, {}),
+			("scene_rewrite", 90, {}),
+		]
+	session = []
+	at = 0.0
+	for name, think, overrides in steps:
+		path, build = payloads[name]
+		at += think if session else 0
+		session.append({"at": at, "route": path, "body": anonymize(dict(build("x" * 32), **overrides))})
+		at += 20
+	return session
+
+async def _author(client, base_url, index, session, speed, start_delay, timeout):
+	await asyncio.sleep(start_delay)
+	seed = f"author-{index}"
+	start = time.perf_counter()
+	steps = []
+	for request in session:
+		delay = start + request["at"] / speed - time.perf_counter()
+		if delay > 0:
+			await asyncio.sleep(delay)
+		body = synthesize(request["body"], seed)
+		try:
+			ttft, total, ok = await asyncio.wait_for(
+				_one(client, base_url + request["route"], body, headers={SESSION_HEADER: seed}), timeout,
+			)
+		except (httpx.HTTPError, asyncio.TimeoutError):
+			ttft, total, ok = None, None, False
+		steps.append({"route": request["route"], "ttft": ttft, "total": total, "ok": ok})
+	ideal = session[-1]["at"] / speed if session else 0.0
+	return {"author": index, "wall": time.perf_counter() - start, "ideal": ideal, "steps": steps}
+
+async def replay(base_url, sessions, authors, speed, ramp, timeout):
+	limits = httpx.Limits(max_connections=authors, max_keepalive_connections=authors)
+	async with httpx.AsyncClient(limits=limits, timeout=None) as client:
+		rng = random.Random(0)
+		return await asyncio.gather(*(
+			_author(client, base_url, i, sessions[i % len(sessions)], speed, rng.uniform(0, ramp), timeout)
+			for i in range(authors)
+		))
+
+def summarize(runs):
+	ms = lambda v: round(v * 1000, 1) if v is not None else None
+	by_route = {}
+	for run in runs:
+		for step in run["steps"]:
+			by_route.setdefault(step["route"], []).append(step)
+	steps = []
+	for route, entries in sorted(by_route.items()):
+		ok = [e for e in entries if e["ok"]]
+		ttfts = [e["ttft"] for e in ok]
+		totals = [e["total"] for e in ok]
+		steps.append({
+			"route": route,
+			"requests": len(entries),
+			"error_rate": round(1 - len(ok) / len(entries), 4),
+			**{f"ttft_p{q}_ms": ms(_percentile(ttfts, q)) for q in (50, 95, 99)},
+			**{f"latency_p{q}_ms": ms(_percentile(totals, q)) for q in (50, 95, 99)},
+		})
+	walls = [run["wall"] for run in runs]
+	busy = [sum(s["total"] for s in run["steps"] if s["total"] is not None) for run in runs]
+	slowdowns = [run["wall"] / run["ideal"] for run in runs if run["ideal"]]
+	sessions = {
+		"sessions": len(runs),
+		"failed_steps": sum(not s["ok"] for run in runs for s in run["steps"]),
+		**{f"wall_p{q}_s": round(_percentile(walls, q), 2) for q in (50, 95, 99)},
+		**{f"waiting_p{q}_s": round(_percentile(busy, q), 2) for q in (50, 95, 99)},
+		**{f"slowdown_p{q}": round(_percentile(slowdowns, q), 3) for q in (50, 95, 99) if slowdowns},
+	}
+	return steps, sessions
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--trace", default=None, help="recorded trace (JSON lines); default is the built-in session")
+	parser.add_argument("--chapters", type=int, default=3, help="chapters in the built-in session")
+	parser.add_argument("--authors", type=int, default=20, help="concurrent simulated authors")
+	parser.add_argument("--speed", type=float, default=20.0, help="think-time compression factor")
+	parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which authors start")
+	parser.add_argument("--url", default=None, help="server to replay against instead of starting gunicorn")
+	parser.add_argument("--ttft", type=float, default=0.3, help="upstream time to first token")
+	parser.add_argument("--tokens-per-second", type=float, default=250.0, help="upstream generation speed")
+	parser.add_argument("--app", default="app:app", help="WSGI/ASGI app for gunicorn")
+	parser.add_argument("--gunicorn-args", default=None, help="override the production GUNICORN_CMD_ARGS")
+	parser.add_argument("--server-port", type=int, default=18031)
+	parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout")
+	parser.add_argument("--output", default=None, help="results file (default benchmarks/results/workload-<rev>-<time>.json)")
+	args = parser.parse_args()
+
+	sessions = load_trace(args.trace) if args.trace else [builtin_session(args.chapters)]
+	results = {
+		"revision": _git_revision(),
+		"started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+		"python": platform.python_version(),
+		"trace": args.trace or f"builtin ({args.chapters} chapters)",
+		"authors": args.authors,
+		"speed": args.speed,
+	}
+
+	proc = None
+	if args.url:
+		base_url = args.url.rstrip("/") + "/api/v1"
+	else:
+		upstream_url = serve_in_thread(FakeOpenAI(ttft=args.ttft, tokens_per_second=args.tokens_per_second, seed=0), backlog=4096)
+		gunicorn_args = args.gunicorn_args if args.gunicorn_args is not None else production_gunicorn_args()
+		env = dict(os.environ, OPENAI_API_KEY="bench", OPENAI_BASE_URL=f"{upstream_url}/v1", GUNICORN_CMD_ARGS=gunicorn_args, FLASK_ENV="production")
+		proc = subprocess.Popen(
+			[sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{args.server_port}", args.app],
+			cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+		)
+		base_url = f"http://127.0.0.1:{args.server_port}/api/v1"
+		results.update(app=args.app, gunicorn_args=gunicorn_args, upstream={"ttft": args.ttft, "tokens_per_second": args.tokens_per_second})
+	try:
+		if proc:
+			_wait_for_port(args.server_port)
+			with RssSampler(proc.pid) as rss:
+				runs = asyncio.run(replay(base_url, sessions, args.authors, args.speed, args.ramp, args.timeout))
+			results["peak_rss_mb"] = round(rss.peak / 2**20, 1)
+		else:
+			runs = asyncio.run(replay(base_url, sessions, args.authors, args.speed, args.ramp, args.timeout))
+	finally:
+		if proc:
+			proc.terminate()
+			proc.wait()
+
+	steps, session_stats = summarize(runs)
+	results.update(steps=steps, sessions=session_stats)
+
+	print(f"{args.authors} authors replaying {len(sessions)} session(s) from {results['trace']} at {args.speed:g}x speed")
+	print(f"{'route':<36}{'requests':>9}{'err %':>7}{'ttft p50':>10}{'p95':>8}{'p99':>8}{'total p50':>11}{'p95':>8}{'p99':>8}")
+	for row in steps:
+		print(
+			f"{row['route']:<36}{row['requests']:>9}{row['error_rate'] * 100:>7.1f}"
+			f"{row['ttft_p50_ms'] or '-':>10}{row['ttft_p95_ms'] or '-':>8}{row['ttft_p99_ms'] or '-':>8}"
+			f"{row['latency_p50_ms'] or '-':>11}{row['latency_p95_ms'] or '-':>8}{row['latency_p99_ms'] or '-':>8}"
+		)
+	print("sessions: " + ", ".join(f"{key} {value}" for key, value in session_stats.items()))
+	if "peak_rss_mb" in results:
+		print(f"peak server RSS {results['peak_rss_mb']} MB")
+
+	output = args.output or os.path.join(SERVER_DIR, "benchmarks", "results", f"workload-{results['revision']}-{int(time.time())}.json")
+	os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+	with open(output, "w") as f:
+		json.dump(results, f, indent=2)
+	print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+	main()
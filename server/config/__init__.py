@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Shared HTTP transport used by every LLM provider client (core/transport.py)
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '200'))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '50'))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv('LLM_KEEPALIVE_EXPIRY', '120'))
+LLM_HTTP2 = os.getenv('LLM_HTTP2', '1') == '1'
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '600'))
+# Connections opened to the provider when a worker boots (0 disables pre-warming)
+LLM_PREWARM_CONNECTIONS = int(os.getenv('LLM_PREWARM_CONNECTIONS', '2'))
+# Response cache for opted-in LLM calls (core/response_cache.py); an empty LLM_CACHE_DIR disables the disk tier
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1024'))
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '3600'))
+LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'writing-llm-cache'))
+LLM_CACHE_MAX_DISK_BYTES = int(os.getenv('LLM_CACHE_MAX_DISK_BYTES', str(256 * 1024 * 1024)))
+# Append an anonymised trace of API requests to this file for benchmarks/bench_workload.py (empty disables recording)
+WORKLOAD_RECORD_PATH = os.getenv('WORKLOAD_RECORD_PATH', '')
+# Token budget for assembled user prompts (core/prompt_layout.py); off by default, since trimming
+# drops story context from prompts (each trim is logged as a warning). 8000 suits most models
+LLM_PROMPT_TOKEN_BUDGET = int(os.getenv('LLM_PROMPT_TOKEN_BUDGET', '0'))
+# Per-segment caps as kind=tokens pairs, applied only while a prompt budget is set; segment kinds are listed in core/prompt_layout.py
+LLM_SEGMENT_TOKEN_BUDGETS = {
+	kind: int(tokens)
+	for kind, tokens in (
+		pair.split('=') for pair in os.getenv(
+			'LLM_SEGMENT_TOKEN_BUDGETS',
+			'parameters=1500,synopsis=500,outline=1500,summary=1500,screenplay=4000,paragraphs=3000,passages=1500',
+		).split(',') if pair
+	)
+}
+# tiktoken encoding used to count prompt tokens when tiktoken is installed
+LLM_TOKENIZER_ENCODING = os.getenv('LLM_TOKENIZER_ENCODING', 'o200k_base')
+# Concurrent calls made for one request generating items one per call (core/fanout.py), and
+# how many times each item is attempted before the request fails
+LLM_FANOUT_WORKERS = int(os.getenv('LLM_FANOUT_WORKERS', '8'))
+LLM_FANOUT_ATTEMPTS = int(os.getenv('LLM_FANOUT_ATTEMPTS', '2'))
+# Upstream rate limit shared by the workers on a host through a SQLite file (core/rate_limit.py). It is on
+# by default, in a file in the system temp directory named after this deployment's directory, so its
+# workers adapt to the provider's rate-limit headers and 429s together while other deployments on the host
+# keep their own; point it at a file on local disk shared by the workers, or set it empty to turn the
+# limiter off. Then requests and tokens per minute (0: none until the provider's headers report one), the
+# longest a call waits for capacity, and how many may wait before requests get a 429
+_DEPLOYMENT = hashlib.sha1(os.path.dirname(os.path.dirname(os.path.abspath(__file__))).encode()).hexdigest()[:12]
+LLM_RATE_LIMIT_PATH = os.getenv('LLM_RATE_LIMIT_PATH', os.path.join(tempfile.gettempdir(), f'writing-llm-rate-limit-{_DEPLOYMENT}.db'))
+LLM_RATE_LIMIT_RPM = int(os.getenv('LLM_RATE_LIMIT_RPM', '0'))
+LLM_RATE_LIMIT_TPM = int(os.getenv('LLM_RATE_LIMIT_TPM', '0'))
+LLM_RATE_LIMIT_MAX_WAIT = float(os.getenv('LLM_RATE_LIMIT_MAX_WAIT', '30'))
+LLM_RATE_LIMIT_MAX_QUEUE = int(os.getenv('LLM_RATE_LIMIT_MAX_QUEUE', '64'))
+# Completion tokens a call is charged on admission before its usage is known
+LLM_RATE_LIMIT_COMPLETION_ESTIMATE = int(os.getenv('LLM_RATE_LIMIT_COMPLETION_ESTIMATE', '1000'))
+# Upstream calls failing with a 429, 5xx, timeout, dropped connection or malformed JSON are made again
+# (core/resilience.py): attempts in all, and the base and cap in seconds of the jittered exponential backoff
+LLM_RETRY_ATTEMPTS = int(os.getenv('LLM_RETRY_ATTEMPTS', '3'))
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '0.5'))
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '8'))
+# Hedged calls: a second, identical request goes out when the first has no token by this percentile of
+# the endpoint's last LLM_HEDGE_WINDOW times to first token (0 disables), once LLM_HEDGE_MIN_SAMPLES are
+# known, and never sooner than LLM_HEDGE_MIN_DELAY seconds; the slower of the two is cancelled
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '0'))
+LLM_HEDGE_WINDOW = int(os.getenv('LLM_HEDGE_WINDOW', '200'))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', '0.2'))
+# OpenAI-compatible providers (core/providers.py) as a JSON list of {"name", "base_url", "api_key_env", "models",
+# "cost", "rpm", "tpm"}; "models" maps the model names the service asks for to the provider's ("*": any other;
+# omitted: the same names), "cost" ranks providers for the cheapest policy, and "rpm"/"tpm" are the rate limits
+# of providers after the first (the first's are LLM_RATE_LIMIT_RPM/TPM). Unset, the one provider is
+# OPENAI_BASE_URL (or OpenAI) with OPENAI_API_KEY. For example:
+# [{"name": "openai", "api_key_env": "OPENAI_API_KEY"},
+#  {"name": "hermes", "base_url": "https://api.lambdalabs.com/v1", "api_key_env": "LAMBDA_API_KEY",
+#   "models": {"*": "hermes-3-llama-3.1-405b-fp8"}, "cost": 0.2}]
+LLM_PROVIDERS = json.loads(os.getenv('LLM_PROVIDERS', '[]'))
+# Routing policy per WritingService method as method=policy pairs, "default" for the rest: fastest (lowest
+# recent latency), cheapest (lowest cost) or fixed:<name> (that provider; the first without a name), each
+# falling back to the other providers in order, healthy ones first
+LLM_ROUTING_POLICIES = dict(
+	pair.split('=', 1) for pair in os.getenv('LLM_ROUTING_POLICIES', 'default=fixed').split(',') if pair
+)
+# Share of calls under the fastest policy sent to another healthy provider first, so its latency stays known
+LLM_ROUTING_EXPLORE = float(os.getenv('LLM_ROUTING_EXPLORE', '0.05'))
+# Weight of the newest call in each provider's moving averages of latency and errors
+LLM_PROVIDER_SMOOTHING = float(os.getenv('LLM_PROVIDER_SMOOTHING', '0.2'))
+# Consecutive failures (5xx, timeouts, dropped connections) that open a provider's circuit breaker, and
+# seconds before a trial call may close it again
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', '30'))
+# SQLite file holding stories for the /api/v1/stories routes (core/story_store.py)
+STORY_STORE_PATH = os.getenv('STORY_STORE_PATH', 'stories.db')
+# Earlier passages of a stored story retrieved into scene and paragraph prompts (core/story_index.py); 0 disables
+STORY_RETRIEVAL_PASSAGES = int(os.getenv('STORY_RETRIEVAL_PASSAGES', '5'))
+# How structured context is written into prompts (core/serializers.py): compact or json
+LLM_CONTEXT_FORMAT = os.getenv('LLM_CONTEXT_FORMAT', 'compact')
+# Threads on which each ASGI worker (asgi.py) runs the requests it hands to the Flask app
+ASGI_FLASK_THREADS = int(os.getenv('ASGI_FLASK_THREADS', '32'))
+# Speculative follow-up generations for stored stories (core/speculation.py, services/prefetch.py); off unless set to 1
+SPECULATION_ENABLED = os.getenv('SPECULATION_ENABLED', '0') == '1'
+# Tokens of speculative work one author (core/workload.py's client_key) may spend per window of seconds
+SPECULATION_TOKEN_BUDGET = int(os.getenv('SPECULATION_TOKEN_BUDGET', '20000'))
+SPECULATION_BUDGET_WINDOW = float(os.getenv('SPECULATION_BUDGET_WINDOW', '3600'))
+# Seconds a speculative result is kept for its request before it is discarded as wasted
+SPECULATION_TTL = float(os.getenv('SPECULATION_TTL', '600'))
+SPECULATION_WORKERS = int(os.getenv('SPECULATION_WORKERS', '2'))
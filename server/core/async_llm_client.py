@@ -0,0 +1,282 @@
+import json
+import time
+import logging
+from typing import Dict, Any, AsyncGenerator, AsyncIterator, List, Optional
+from core.utils import clean_json_string
+from core.stream_parsers import JsonStreamParser, SentenceSegmenter, to_stream_chunk
+from core.transport import create_async_openai_client
+from core.response_cache import cache_key, get_response_cache
+from core.usage import CallMetrics
+from core.rate_limit import RateLimited, estimate_tokens
+from core.resilience import awith_retries
+from core.providers import Provider, Route, Router, configured_providers
+from core.single_flight import AsyncSingleFlight
+from core.llm_client import MODEL
+
+class AsyncLLMClient:
+	"""
+	Asyncio counterpart of LLMClient. Streams are awaited on the event loop instead of
+	pinning a worker thread, so a single ASGI worker can hold many of them open at once.
+	Failed calls are retried and routed across providers as LLMClient's are; hedging is
+	LLMClient's alone.
+	"""
+	def __init__(self, base_url: Optional[str] = None, providers: Optional[List[Provider]] = None, policies: Optional[Dict[str, str]] = None):
+		"""See LLMClient."""
+		self.router = Router(providers or configured_providers(base_url), policies)
+		first, *others = self.router.providers
+		self.openai_api_key = first.api_key
+		self.base_url = first.base_url
+		# self.client talks to the first provider, self.clients to the others
+		self.client = create_async_openai_client(api_key=first.api_key, base_url=first.base_url, max_retries=0)
+		self.clients = {provider.name: create_async_openai_client(api_key=provider.api_key, base_url=provider.base_url, max_retries=0) for provider in others}
+		self.cache = get_response_cache()
+		self.limiter = self.router.limiter(first)
+		self.flights = AsyncSingleFlight()
+		self.logger = logging.getLogger(__name__)
+
+	async def generate_json(
+		self,
+		prompt: str,
+		system_prompt: str,
+		model: str = MODEL,
+		temperature: float = 0.7,
+		max_tokens: int = 10000,
+		cache: bool = False,
+		endpoint: Optional[str] = None,
+	) -> str:
+		"""
+		Generate a JSON response from the language model based on the given prompt and system instructions.
+		With `cache`, identical calls are answered from the response cache. Identical calls
+		made while one is in flight always share its upstream request.
+		"""
+		key = cache_key("json", model, system_prompt, prompt, temperature, max_tokens)
+		if cache:
+			content = self.cache.get(key)
+			if content is not None:
+				return content
+		content = await self.flights.do(key, lambda: self._generate_json(prompt, system_prompt, model, temperature, max_tokens, endpoint))
+		if cache:
+			self.cache.set(key, content)
+		return content
+
+	async def _generate_json(self, prompt: str, system_prompt: str, model: str, temperature: float, max_tokens: int, endpoint: Optional[str]) -> str:
+		route = self.router.route(endpoint, model, streamed=False)
+
+		async def attempt() -> str:
+			content = clean_json_string(await self._complete(route, prompt, system_prompt, temperature, max_tokens, endpoint))
+			# malformed output is made again like a failed call
+			json.loads(content)
+			return content
+
+		return await awith_retries(attempt, endpoint)
+
+	def _client(self, provider: Provider):
+		return self.clients.get(provider.name, self.client)
+
+	async def _complete(self, route: Route, prompt: str, system_prompt: str, temperature: float, max_tokens: int, endpoint: Optional[str]) -> str:
+		provider, model = route.next()
+		admission = await self.router.limiter(provider).aadmit(estimate_tokens(system_prompt, prompt, max_tokens))
+		call = CallMetrics(endpoint, model, admission)
+		try:
+			response = await self._client(provider).chat.completions.create(
+				model=model,
+				messages=[
+					{"role": "system", "content": system_prompt},
+					{"role": "user", "content": prompt}
+				],
+				temperature=temperature,
+				max_tokens=max_tokens
+			)
+		except Exception as e:
+			call.finish(outcome="error")
+			self.router.failed(provider, e)
+			raise
+		call.finish(response.usage)
+		self.router.succeeded(provider, time.perf_counter() - call.start, streamed=False)
+		return response.choices[0].message.content
+
+	async def _open_stream(self, route: Route, prompt: str, system_prompt: str, temperature: float, max_tokens: int, endpoint: Optional[str]):
+		"""An admitted streamed call to the next provider of `route`: its response, once the provider has accepted it, its metrics and the provider."""
+		provider, model = route.next()
+		admission = await self.router.limiter(provider).aadmit(estimate_tokens(system_prompt, prompt, max_tokens))
+		call = CallMetrics(endpoint, model, admission, max_tokens)
+		try:
+			response = await self._client(provider).chat.completions.create(
+				model=model,
+				messages=[
+					{"role": "system", "content": system_prompt},
+					{"role": "user", "content": prompt}
+				],
+				temperature=temperature,
+				max_tokens=max_tokens,
+				stream=True,
+				stream_options={"include_usage": True},
+			)
+		except Exception as e:
+			call.finish(outcome="error")
+			self.router.failed(provider, e)
+			raise
+		return response, call, provider
+
+	async def generate_text(self, prompt: str, system_prompt: str, temperature: float = 0.7, max_tokens: int = 1000, cache: bool = False, endpoint: Optional[str] = None) -> str:
+		key = cache_key("text", MODEL, system_prompt, prompt, temperature, max_tokens)
+		if cache:
+			content = self.cache.get(key)
+			if content is not None:
+				return content
+		content = await self.flights.do(key, lambda: self._generate_text(prompt, system_prompt, temperature, max_tokens, endpoint))
+		if cache:
+			self.cache.set(key, content)
+		return content
+
+	async def _generate_text(self, prompt: str, system_prompt: str, temperature: float, max_tokens: int, endpoint: Optional[str]) -> str:
+		route = self.router.route(endpoint, MODEL, streamed=False)
+		return await awith_retries(lambda: self._complete(route, prompt, system_prompt, temperature, max_tokens, endpoint), endpoint)
+
+	def generate_streamed_json(
+		self,
+		prompt: str,
+		system_prompt: str,
+		model: str = MODEL,
+		temperature: float = 0.7,
+		max_tokens: int = 1000,
+		partial: bool = False,
+		cache: bool = False,
+		endpoint: Optional[str] = None,
+	) -> AsyncIterator[Dict[str, Any]]:
+		key = cache_key("partial_json" if partial else "streamed_json", model, system_prompt, prompt, temperature, max_tokens)
+		stream = self.flights.stream(key, lambda: self._stream_json(prompt, system_prompt, model, temperature, max_tokens, partial, endpoint))
+		return self._cached_stream(key, stream) if cache else stream
+
+	async def _stream_json(self, prompt: str, system_prompt: str, model: str, temperature: float, max_tokens: int, partial: bool, endpoint: Optional[str]) -> AsyncGenerator[Dict[str, Any], None]:
+		try:
+			route = self.router.route(endpoint, model, streamed=True)
+			response, call, provider = await awith_retries(lambda: self._open_stream(route, prompt, system_prompt, temperature, max_tokens, endpoint), endpoint)
+		except RateLimited as e:
+			yield {"error": str(e), "retry_after": e.retry_after}
+			return
+		except Exception as e:
+			self.logger.error(f"Error in generate_streamed_json: {str(e)}")
+			yield {"error": f"An error occurred: {str(e)}"}
+			return
+		try:
+			async for item in self._process_json_stream(response, call, provider, partial_key="elements" if partial else None):
+				yield item
+		except Exception as e:
+			call.finish(outcome="error")
+			self.router.failed(provider, e)
+			self.logger.error(f"Error in generate_streamed_json: {str(e)}")
+			yield {"error": f"An error occurred: {str(e)}"}
+		finally:
+			# drops the connection, and so the generation upstream, when the stream did not end
+			if hasattr(response, "close"):
+				await response.close()
+			# a no-op unless the client went away before the stream ended
+			call.finish(outcome="cancelled")
+
+	def generate_streamed_text(
+		self,
+		prompt: str,
+		system_prompt: str,
+		model: str = MODEL,
+		temperature: float = 0.7,
+		max_tokens: int = 10000,
+		cache: bool = False,
+		endpoint: Optional[str] = None,
+	) -> AsyncIterator[Dict[str, Any]]:
+		key = cache_key("streamed_text", model, system_prompt, prompt, temperature, max_tokens)
+		stream = self.flights.stream(key, lambda: self._stream_text(prompt, system_prompt, model, temperature, max_tokens, endpoint))
+		return self._cached_stream(key, stream) if cache else stream
+
+	async def _stream_text(self, prompt: str, system_prompt: str, model: str, temperature: float, max_tokens: int, endpoint: Optional[str]) -> AsyncGenerator[Dict[str, Any], None]:
+		try:
+			route = self.router.route(endpoint, model, streamed=True)
+			response, call, provider = await awith_retries(lambda: self._open_stream(route, prompt, system_prompt, temperature, max_tokens, endpoint), endpoint)
+		except RateLimited as e:
+			yield {"error": str(e), "retry_after": e.retry_after}
+			return
+		except Exception as e:
+			self.logger.error(f"Error in generate_streamed_text: {str(e)}")
+			yield {"error": f"An error occurred: {str(e)}"}
+			return
+		try:
+			async for item in self._process_text_stream(response, call, provider):
+				yield item
+		except Exception as e:
+			call.finish(outcome="error")
+			self.router.failed(provider, e)
+			self.logger.error(f"Error in generate_streamed_text: {str(e)}")
+			yield {"error": f"An error occurred: {str(e)}"}
+		finally:
+			# drops the connection, and so the generation upstream, when the stream did not end
+			if hasattr(response, "close"):
+				await response.close()
+			# a no-op unless the client went away before the stream ended
+			call.finish(outcome="cancelled")
+
+	async def _cached_stream(self, key: str, stream: AsyncIterator[Dict[str, Any]]) -> AsyncGenerator[Dict[str, Any], None]:
+		chunks = self.cache.get(key)
+		if chunks is not None:
+			for item in chunks:
+				yield item
+			return
+		chunks = []
+		async for item in stream:
+			chunks.append(item)
+			yield item
+		if chunks and chunks[-1] == {"chunk": "[DONE]"}:
+			self.cache.set(key, chunks)
+
+	def _first_token(self, call: CallMetrics, provider: Provider) -> None:
+		call.first_token()
+		if call.deltas == 1:
+			self.router.succeeded(provider, call.first_token_at - call.start, streamed=True)
+
+	async def _process_json_stream(self, response, call: CallMetrics, provider: Provider, partial_key=None):
+		parser = JsonStreamParser(partial_key=partial_key)
+		head = ""
+		async for chunk in response:
+			if chunk.usage:
+				call.usage = chunk.usage
+			if chunk.choices and chunk.choices[0].delta.content:
+				msg = chunk.choices[0].delta.content
+				self._first_token(call, provider)
+
+				if len(head) < len("I'm sorry"):
+					head += msg
+					if head.startswith("I'm sorry"):
+						raise ValueError("I'm sorry phrase detected")
+
+				for event in parser.feed(msg):
+					yield to_stream_chunk(event)
+
+		for event in parser.close():
+			yield to_stream_chunk(event)
+
+		call.finish()
+		yield {"chunk": "[DONE]"}
+
+	async def _process_text_stream(self, response, call: CallMetrics, provider: Provider):
+		segmenter = SentenceSegmenter()
+		head = ""
+		async for chunk in response:
+			if chunk.usage:
+				call.usage = chunk.usage
+			if chunk.choices and chunk.choices[0].delta.content:
+				msg = chunk.choices[0].delta.content
+				self._first_token(call, provider)
+
+				# Check for "I'm sorry" at the beginning of the response
+				if len(head.lstrip()) < len("I'm sorry"):
+					head += msg
+					if head.lstrip().startswith("I'm sorry"):
+						raise ValueError("I'm sorry phrase detected")
+
+				for event in segmenter.feed(msg):
+					yield to_stream_chunk(event)
+
+		for event in segmenter.close():
+			yield to_stream_chunk(event)
+
+		call.finish()
+		yield {"chunk": "[DONE]"}
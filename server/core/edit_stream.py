@@ -0,0 +1,69 @@
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Union
+
+# Streams of edit operations (scene patches, sentence edits) rewritten on their way to the
+# client: each object of the streamed JSON array goes through `feed` as soon as it is parsed,
+# and `close` adds the chunks that end the stream, in place of the model stream's own [DONE].
+
+Chunks = Union[Iterator[Dict[str, Any]], AsyncIterator[Dict[str, Any]]]
+Feed = Callable[[Any], Iterable[Dict[str, Any]]]
+Close = Callable[[], Iterable[Dict[str, Any]]]
+Finish = Callable[[List[Any]], Iterator[Dict[str, Any]]]
+
+def _step(chunk: Dict[str, Any], feed: Feed) -> List[Dict[str, Any]]:
+	"""The chunks sent for one model stream chunk; an error chunk, passed through, ends the stream."""
+	if "error" in chunk:
+		return [chunk]
+	text = chunk.get("chunk")
+	if text and text != "[DONE]" and "index" not in chunk:
+		return list(feed(json.loads(text)))
+	return []
+
+def _error(e: ValueError) -> Dict[str, Any]:
+	return {"error": f"Invalid output from LLM: {e}"}
+
+def _transform(stream: Iterator[Dict[str, Any]], feed: Feed, close: Close) -> Iterator[Dict[str, Any]]:
+	try:
+		for chunk in stream:
+			chunks = _step(chunk, feed)
+			yield from chunks
+			if chunks and "error" in chunks[-1]:
+				return
+		chunks = list(close())
+	except ValueError as e:
+		yield _error(e)
+		return
+	yield from chunks
+
+async def _atransform(stream: AsyncIterator[Dict[str, Any]], feed: Feed, close: Close) -> AsyncIterator[Dict[str, Any]]:
+	try:
+		async for chunk in stream:
+			chunks = _step(chunk, feed)
+			for out in chunks:
+				yield out
+			if chunks and "error" in chunks[-1]:
+				return
+		chunks = list(close())
+	except ValueError as e:
+		yield _error(e)
+		return
+	for chunk in chunks:
+		yield chunk
+
+def transform_stream(stream: Chunks, feed: Feed, close: Close) -> Chunks:
+	"""
+	Stream what `feed` makes of each object of a streamed JSON array (LLMClient or
+	AsyncLLMClient chunks) as it arrives, then what `close` adds. An error chunk from the model
+	stream, or a ValueError from `feed`/`close`, becomes the stream's last chunk.
+	"""
+	if hasattr(stream, "__aiter__"):
+		return _atransform(stream, feed, close)
+	return _transform(stream, feed, close)
+
+def stream_after(stream: Chunks, finish: Finish) -> Chunks:
+	"""Collect all the objects of a streamed JSON array, then stream what `finish` makes of them."""
+	objects: List[Any] = []
+	def feed(obj: Any) -> List[Dict[str, Any]]:
+		objects.append(obj)
+		return []
+	return transform_stream(stream, feed, lambda: finish(objects))
@@ -0,0 +1,38 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, Tuple, TypeVar
+from config import LLM_FANOUT_ATTEMPTS, LLM_FANOUT_WORKERS
+
+T = TypeVar("T")
+
+def fan_out(
+	call: Callable[[int], T],
+	count: int,
+	workers: int = LLM_FANOUT_WORKERS,
+	attempts: int = LLM_FANOUT_ATTEMPTS,
+) -> Iterator[Tuple[int, T]]:
+	"""
+	Make `call(0)` … `call(count - 1)` concurrently on up to `workers` threads and yield
+	(index, result) as each one finishes. A call that raises ValueError (output that did not
+	validate) is made again for its index alone, up to `attempts` times in all; after that, or
+	on any other exception, the error is raised and the calls not yet started are cancelled.
+	Closing the iterator early cancels them as well.
+	"""
+	executor = ThreadPoolExecutor(max_workers=max(1, min(count, workers)), thread_name_prefix="fanout")
+	pending: Dict[Future, Tuple[int, int]] = {}
+	try:
+		for index in range(count):
+			pending[executor.submit(call, index)] = (index, 1)
+		while pending:
+			done, _ = wait(pending, return_when=FIRST_COMPLETED)
+			for future in done:
+				index, attempt = pending.pop(future)
+				try:
+					result = future.result()
+				except ValueError:
+					if attempt >= attempts:
+						raise
+					pending[executor.submit(call, index)] = (index, attempt + 1)
+					continue
+				yield index, result
+	finally:
+		executor.shutdown(wait=False, cancel_futures=True)
@@ -1,18 +1,39 @@
-import os
-import re
 import json
 import logging
-from typing import Dict, Any, Generator
-from openai import OpenAI
-from flask import jsonify
+import time
+from typing import Dict, Any, Generator, Iterator, List, Optional
 from core.utils import clean_json_string
+from core.stream_parsers import JsonStreamParser, SentenceSegmenter, to_stream_chunk
+from core.transport import create_openai_client
+from core.response_cache import cache_key, get_response_cache
+from core.usage import CallMetrics
+from core.rate_limit import RateLimited, estimate_tokens
+from core.resilience import get_hedging, hedged, with_retries
+from core.providers import Provider, Route, Router, configured_providers
+from core.single_flight import SingleFlight
+from core.speculation import get_speculator
 
 MODEL = "gpt-4o-2024-08-06"
 # MODEL = "gpt-4o-mini"
 class LLMClient:
-	def __init__(self):
-		self.openai_api_key = os.getenv('OPENAI_API_KEY')
-		self.client = OpenAI(api_key=self.openai_api_key)
+	def __init__(self, base_url: Optional[str] = None, providers: Optional[List[Provider]] = None, policies: Optional[Dict[str, str]] = None):
+		"""
+		`base_url` (or OPENAI_BASE_URL) points the client at any OpenAI-compatible server, e.g. the
+		fake_openai stand-in. With `providers` (by default LLM_PROVIDERS, when set) each call goes
+		to the provider its endpoint's routing policy picks (core/providers.py).
+		"""
+		self.router = Router(providers or configured_providers(base_url), policies)
+		first, *others = self.router.providers
+		self.openai_api_key = first.api_key
+		self.base_url = first.base_url
+		# self.client talks to the first provider, self.clients to the others
+		self.client = create_openai_client(api_key=first.api_key, base_url=first.base_url, max_retries=0)
+		self.clients = {provider.name: create_openai_client(api_key=provider.api_key, base_url=provider.base_url, max_retries=0) for provider in others}
+		self.cache = get_response_cache()
+		self.limiter = self.router.limiter(first)
+		self.hedging = get_hedging()
+		self.flights = SingleFlight()
+		self.speculator = get_speculator()
 		self.logger = logging.getLogger(__name__)
 
 	def generate_json(
@@ -22,12 +43,71 @@ class LLMClient:
 		model: str = MODEL,
 		temperature: float = 0.7,
 		max_tokens: int = 10000,
+		cache: bool = False,
+		endpoint: Optional[str] = None,
 	) -> Dict[str, Any]:
 		"""
 		Generate a JSON response from the language model based on the given prompt and system instructions.
+		With `cache`, identical calls are answered from the response cache. Identical calls
+		made while one is in flight always share its upstream request, and a call the
+		speculator has already made (core/speculation.py) is answered with its result.
 		"""
+		key = cache_key("json", model, system_prompt, prompt, temperature, max_tokens)
+		content = self.speculator.take(key)
+		if content is not None:
+			return content
+		if cache:
+			content = self.cache.get(key)
+			if content is not None:
+				return content
+		call = lambda: self.flights.do(key, lambda: self._generate_json(prompt, system_prompt, model, temperature, max_tokens, endpoint))
+		content = self.speculator.run(key, prompt, call) if self.speculator.speculating() else call()
+		if cache and isinstance(content, str):
+			self.cache.set(key, content)
+		return content
+
+	def _generate_json(self, prompt: str, system_prompt: str, model: str, temperature: float, max_tokens: int, endpoint: Optional[str]) -> Dict[str, Any]:
+		route = self.router.route(endpoint, model, streamed=self.hedging.enabled)
+
+		def attempt() -> str:
+			content = clean_json_string(self._complete(route, prompt, system_prompt, temperature, max_tokens, endpoint))
+			# malformed output is made again like a failed call
+			json.loads(content)
+			return content
+
+		# errors are raised for the route to answer: this may run on a fan-out or speculation
+		# thread, outside any Flask app context
 		try:
-			response = self.client.chat.completions.create(
+			return with_retries(attempt, endpoint)
+
+		except RateLimited:
+			raise
+
+		except json.JSONDecodeError as e:
+			self.logger.error(f"Failed to parse response as JSON: {e}")
+			raise
+
+		except Exception as e:
+			self.logger.error(f"Error in generate_json: {str(e)}")
+			raise
+
+	def _client(self, provider: Provider):
+		return self.clients.get(provider.name, self.client)
+
+	def _complete(self, route: Route, prompt: str, system_prompt: str, temperature: float, max_tokens: int, endpoint: Optional[str]) -> str:
+		"""
+		The text of one upstream call to the next provider of `route`. With hedging on it is made
+		as a stream, so its time to first token is known and a slow one can be hedged
+		(core/resilience.py), by the provider after it.
+		"""
+		if self.hedging.enabled:
+			chunks = hedged(lambda: self._chunks(route, prompt, system_prompt, temperature, max_tokens, endpoint), endpoint, self.hedging.delay(endpoint))
+			return "".join(chunk.choices[0].delta.content for chunk in chunks if chunk.choices)
+		provider, model = route.next()
+		admission = self.router.limiter(provider).admit(estimate_tokens(system_prompt, prompt, max_tokens))
+		call = CallMetrics(endpoint, model, admission)
+		try:
+			response = self._client(provider).chat.completions.create(
 				model=model,
 				messages=[
 					{"role": "system", "content": system_prompt},
@@ -36,25 +116,63 @@ class LLMClient:
 				temperature=temperature,
 				max_tokens=max_tokens
 			)
-			
-			content = response.choices[0].message.content
-			content = clean_json_string(content)
-			# print(content)
-			
-			# self.logger.info(f"Generated JSON content: {content[:100]}...")
-			
-			# Parse and validate the JSON response
-			# json_response = json.loads(content)
-			
-			return content
-
-		except json.JSONDecodeError as e:
-			self.logger.error(f"Failed to parse response as JSON: {e}")
-			return jsonify({'error': "Failed to generate valid JSON response"}), 500
+		except Exception as e:
+			call.finish(outcome="error")
+			self.router.failed(provider, e)
+			raise
+		call.finish(response.usage)
+		self.router.succeeded(provider, time.perf_counter() - call.start, streamed=False)
+		return response.choices[0].message.content
 
+	def _chunks(self, route: Route, prompt: str, system_prompt: str, temperature: float, max_tokens: int, endpoint: Optional[str]) -> Generator[Any, None, None]:
+		"""
+		The chunks of one streamed upstream call to the next provider of `route` that carry
+		content or usage, so the first one is the first token. Closing the generator closes the
+		response and so the connection.
+		"""
+		provider, model = route.next()
+		admission = self.router.limiter(provider).admit(estimate_tokens(system_prompt, prompt, max_tokens))
+		call = CallMetrics(endpoint, model, admission, max_tokens)
+		response = None
+		try:
+			response = self._client(provider).chat.completions.create(
+				model=model,
+				messages=[
+					{"role": "system", "content": system_prompt},
+					{"role": "user", "content": prompt}
+				],
+				temperature=temperature,
+				max_tokens=max_tokens,
+				stream=True,
+				stream_options={"include_usage": True},
+			)
+			for chunk in response:
+				if chunk.usage:
+					call.usage = chunk.usage
+				elif not (chunk.choices and chunk.choices[0].delta.content):
+					continue
+				else:
+					call.first_token()
+					if call.deltas == 1:
+						self.hedging.observe(endpoint, call.first_token_at - call.start)
+						self.router.succeeded(provider, call.first_token_at - call.start, streamed=True)
+				yield chunk
+			call.finish()
 		except Exception as e:
-			self.logger.error(f"Error in generate_json: {str(e)}")
-			return jsonify({'error': "An error occurred while processing the request"}), 500
+			call.finish(outcome="error")
+			self.router.failed(provider, e)
+			raise
+		finally:
+			if response is not None and hasattr(response, "close"):
+				response.close()
+			# a no-op unless the stream was abandoned: the client went away, or a hedge won
+			call.finish(outcome="cancelled")
+
+	def _upstream(self, prompt: str, system_prompt: str, model: str, temperature: float, max_tokens: int, endpoint: Optional[str]) -> Iterator[Any]:
+		"""Chunks of a streamed call, retried until its first token arrives and hedged when that is slow."""
+		route = self.router.route(endpoint, model, streamed=True)
+		start = lambda: self._chunks(route, prompt, system_prompt, temperature, max_tokens, endpoint)
+		return with_retries(lambda: hedged(start, endpoint, self.hedging.delay(endpoint)), endpoint)
 
 	def _validate_json_schema(self, data: Dict[str, Any], schema: Dict[str, Any]) -> None:
 		"""
@@ -76,17 +194,20 @@ class LLMClient:
 		validate_object(data, schema)
 
 	# You can add other methods from the original app.py here, such as:
-	def generate_text(self, prompt: str, system_prompt: str, temperature: float = 0.7, max_tokens: int = 1000):
-		response = self.client.chat.completions.create(
-			model="gpt-4o-2024-08-06",
-			messages=[
-				{"role": "system", "content": system_prompt},
-				{"role": "user", "content": prompt}
-			],
-			temperature=temperature,
-			max_tokens=max_tokens
-		)
-		return response.choices[0].message.content
+	def generate_text(self, prompt: str, system_prompt: str, temperature: float = 0.7, max_tokens: int = 1000, cache: bool = False, endpoint: Optional[str] = None):
+		key = cache_key("text", MODEL, system_prompt, prompt, temperature, max_tokens)
+		if cache:
+			content = self.cache.get(key)
+			if content is not None:
+				return content
+		content = self.flights.do(key, lambda: self._generate_text(prompt, system_prompt, temperature, max_tokens, endpoint))
+		if cache:
+			self.cache.set(key, content)
+		return content
+
+	def _generate_text(self, prompt: str, system_prompt: str, temperature: float, max_tokens: int, endpoint: Optional[str]) -> str:
+		route = self.router.route(endpoint, MODEL, streamed=self.hedging.enabled)
+		return with_retries(lambda: self._complete(route, prompt, system_prompt, temperature, max_tokens, endpoint), endpoint)
 
 	def generate_streamed_json(
 		self,
@@ -95,19 +216,20 @@ class LLMClient:
 		model: str = MODEL,
 		temperature: float = 0.7,
 		max_tokens: int = 1000,
-	) -> Generator[Dict[str, Any], None, None]:
+		partial: bool = False,
+		cache: bool = False,
+		endpoint: Optional[str] = None,
+	) -> Iterator[Dict[str, Any]]:
+		key = cache_key("partial_json" if partial else "streamed_json", model, system_prompt, prompt, temperature, max_tokens)
+		stream = self.flights.stream(key, lambda: self._stream_json(prompt, system_prompt, model, temperature, max_tokens, partial, endpoint))
+		return self._cached_stream(key, stream) if cache else stream
+
+	def _stream_json(self, prompt: str, system_prompt: str, model: str, temperature: float, max_tokens: int, partial: bool, endpoint: Optional[str]) -> Generator[Dict[str, Any], None, None]:
 		try:
-			response = self.client.chat.completions.create(
-				model=model,
-				messages=[
-					{"role": "system", "content": system_prompt},
-					{"role": "user", "content": prompt}
-				],
-				temperature=temperature,
-				max_tokens=max_tokens,
-				stream=True
-			)
-			yield from self._process_json_stream(response)
+			chunks = self._upstream(prompt, system_prompt, model, temperature, max_tokens, endpoint)
+			yield from self._process_json_stream(chunks, partial_key="elements" if partial else None)
+		except RateLimited as e:
+			yield {"error": str(e), "retry_after": e.retry_after}
 		except Exception as e:
 			self.logger.error(f"Error in generate_streamed_json: {str(e)}")
 			yield {"error": f"An error occurred: {str(e)}"}
@@ -119,82 +241,73 @@ class LLMClient:
 		model: str = MODEL,
 		temperature: float = 0.7,
 		max_tokens: int = 10000,
-	) -> Generator[Dict[str, Any], None, None]:
+		cache: bool = False,
+		endpoint: Optional[str] = None,
+	) -> Iterator[Dict[str, Any]]:
+		key = cache_key("streamed_text", model, system_prompt, prompt, temperature, max_tokens)
+		stream = self.flights.stream(key, lambda: self._stream_text(prompt, system_prompt, model, temperature, max_tokens, endpoint))
+		return self._cached_stream(key, stream) if cache else stream
+
+	def _stream_text(self, prompt: str, system_prompt: str, model: str, temperature: float, max_tokens: int, endpoint: Optional[str]) -> Generator[Dict[str, Any], None, None]:
 		try:
-			response = self.client.chat.completions.create(
-				model=model,
-				messages=[
-					{"role": "system", "content": system_prompt},
-					{"role": "user", "content": prompt}
-				],
-				temperature=temperature,
-				max_tokens=max_tokens,
-				stream=True
-			)
-			yield from self._process_text_stream(response)
+			chunks = self._upstream(prompt, system_prompt, model, temperature, max_tokens, endpoint)
+			yield from self._process_text_stream(chunks)
+		except RateLimited as e:
+			yield {"error": str(e), "retry_after": e.retry_after}
 		except Exception as e:
 			self.logger.error(f"Error in generate_streamed_text: {str(e)}")
 			yield {"error": f"An error occurred: {str(e)}"}
 	
-	def _process_json_stream(self, response):
-		json_buffer = ""
-		for chunk in response:
-			if chunk.choices[0].delta.content:
+	def _cached_stream(self, key: str, stream: Iterator[Dict[str, Any]]) -> Generator[Dict[str, Any], None, None]:
+		"""Replay a cached chunk sequence, or pass `stream` through and store it if it runs to [DONE]."""
+		chunks = self.cache.get(key)
+		if chunks is not None:
+			yield from chunks
+			return
+		chunks = []
+		for item in stream:
+			chunks.append(item)
+			yield item
+		if chunks and chunks[-1] == {"chunk": "[DONE]"}:
+			self.cache.set(key, chunks)
+
+	def _process_json_stream(self, chunks, partial_key=None):
+		parser = JsonStreamParser(partial_key=partial_key)
+		head = ""
+		for chunk in chunks:
+			if chunk.choices and chunk.choices[0].delta.content:
 				msg = chunk.choices[0].delta.content
-				json_buffer += msg
-
-				if json_buffer.startswith("I'm sorry"):
-					raise ValueError("I'm sorry phrase detected")
-				
-				while True:
-					match = re.search(r'\{[^{}]*\}', json_buffer)
-					if not match:
-						break
-					
-					json_str = match.group()
-					try:
-						json_obj = json.loads(json_str)
-						yield {"chunk": json.dumps(json_obj)}
-						json_buffer = json_buffer[match.end():]
-					except json.JSONDecodeError:
-						break
-		
-		if json_buffer.strip():
-			try:
-				json_obj = json.loads(json_buffer)
-				yield {"chunk": json.dumps(json_obj)}
-			except json.JSONDecodeError:
-				pass
+
+				if len(head) < len("I'm sorry"):
+					head += msg
+					if head.startswith("I'm sorry"):
+						raise ValueError("I'm sorry phrase detected")
+
+				for event in parser.feed(msg):
+					yield to_stream_chunk(event)
+
+		for event in parser.close():
+			yield to_stream_chunk(event)
 
 		yield {"chunk": "[DONE]"}
 	
-	def _process_text_stream(self, response):
-		current_sentence = ""
-		final_response = ""
-		for chunk in response:
-			if chunk.choices[0].delta.content:
-				msg = chunk.choices[0].delta.content or ""
-				
+	def _process_text_stream(self, chunks):
+		segmenter = SentenceSegmenter()
+		head = ""
+		for chunk in chunks:
+			if chunk.choices and chunk.choices[0].delta.content:
+				msg = chunk.choices[0].delta.content
+
 				# Check for "I'm sorry" at the beginning of the response
-				if not current_sentence and msg.lstrip().startswith("I'm sorry"):
-					raise ValueError("I'm sorry phrase detected")
-				
-				current_sentence += msg
-				current_sentence = current_sentence.replace("\n\n", "\\n\\n")
-				
-				sentences = re.split(r'(?<=[.!?])\s+', current_sentence)
-				
-				if len(sentences) > 1:
-					complete_sentences = sentences[:-1]
-					for sentence in complete_sentences:
-						yield {"chunk": sentence.strip()}
-						final_response += sentence + " "
-					
-					current_sentence = sentences[-1]
-		
-		# Yield any remaining content in current_sentence
-		if current_sentence.strip():
-			yield {"chunk": current_sentence.strip()}
-			final_response += current_sentence
-
-		yield {"chunk": "[DONE]"}
\ No newline at end of file
+				if len(head.lstrip()) < len("I'm sorry"):
+					head += msg
+					if head.lstrip().startswith("I'm sorry"):
+						raise ValueError("I'm sorry phrase detected")
+
+				for event in segmenter.feed(msg):
+					yield to_stream_chunk(event)
+
+		for event in segmenter.close():
+			yield to_stream_chunk(event)
+
+		yield {"chunk": "[DONE]"}
@@ -0,0 +1,100 @@
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Minimal Prometheus primitives: fixed buckets, one lock per metric, and nothing
+# allocated on the hot path once a label set has been seen. Values are per process.
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+
+def _escape(value: str) -> str:
+	return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+	pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+	if extra:
+		pairs.append(extra)
+	return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+	if value == float("inf"):
+		return "+Inf"
+	return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Counter:
+	def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+		self.name = name
+		self.documentation = documentation
+		self.labelnames = labelnames
+		self._values: Dict[LabelValues, float] = {}
+		self._lock = threading.Lock()
+		REGISTRY.append(self)
+
+	def inc(self, labels: LabelValues = (), amount: float = 1) -> None:
+		with self._lock:
+			self._values[labels] = self._values.get(labels, 0) + amount
+
+	def values(self) -> Dict[LabelValues, float]:
+		with self._lock:
+			return dict(self._values)
+
+	def render(self) -> List[str]:
+		lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+		for labels, value in sorted(self.values().items()):
+			lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+		return lines
+
+class Histogram:
+	def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], buckets: Tuple[float, ...]):
+		self.name = name
+		self.documentation = documentation
+		self.labelnames = labelnames
+		self.buckets = tuple(sorted(buckets))
+		# per label set: [count per bucket (last one is +Inf, not cumulative), sum]
+		self._values: Dict[LabelValues, List] = {}
+		self._lock = threading.Lock()
+		REGISTRY.append(self)
+
+	def observe(self, value: float, labels: LabelValues = ()) -> None:
+		index = bisect_left(self.buckets, value)
+		with self._lock:
+			entry = self._values.get(labels)
+			if entry is None:
+				entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+			entry[0][index] += 1
+			entry[1] += value
+
+	def render(self) -> List[str]:
+		with self._lock:
+			snapshot = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+		lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+		for labels, (counts, total) in sorted(snapshot.items()):
+			cumulative = 0
+			for bound, count in zip(self.buckets + (float("inf"),), counts):
+				cumulative += count
+				le = f'le="{_format_value(bound)}"'
+				lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+			lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+			lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+		return lines
+
+REGISTRY: List = []
+_collectors: List[Callable[[], List[Tuple[str, str, str, List[Sample]]]]] = []
+
+def register_collector(collect: Callable[[], List[Tuple[str, str, str, List[Sample]]]]) -> None:
+	"""Add a callable returning (name, type, help, samples) for values owned elsewhere, read at scrape time."""
+	_collectors.append(collect)
+
+def render_prometheus() -> str:
+	"""Every registered metric in the Prometheus text exposition format (version 0.0.4)."""
+	lines: List[str] = []
+	for metric in REGISTRY:
+		lines.extend(metric.render())
+	for collect in _collectors:
+		for name, kind, documentation, samples in collect():
+			lines.append(f"# HELP {name} {documentation}")
+			lines.append(f"# TYPE {name} {kind}")
+			for labels, value in samples:
+				lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+	return "\n".join(lines) + "\n"
@@ -0,0 +1,168 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from config import LLM_PROMPT_TOKEN_BUDGET, LLM_SEGMENT_TOKEN_BUDGETS
+from core.serializers import serialize
+from core.tokens import count_tokens
+from core.usage import PROMPT_TOKENS_SAVED
+
+logger = logging.getLogger(__name__)
+
+# Segment kinds from most to least stable across the calls made for one story. Providers
+# reuse the longest prompt prefix they have already seen, so whatever changes per call goes last.
+SEGMENT_ORDER = (
+	"parameters",
+	"synopsis",
+	"outline",
+	"summary",
+	"screenplay",
+	"paragraphs",
+	"passages",
+	"task",
+	"instruction",
+)
+
+# Which context to give up first when a prompt is over budget, most important first; this is
+# the "in priority order" the scene prompts describe. Task and instruction are never trimmed.
+SEGMENT_PRIORITY = (
+	"screenplay",
+	"paragraphs",
+	"outline",
+	"summary",
+	"synopsis",
+	"parameters",
+	"passages",
+)
+UNTRIMMED = ("task", "instruction")
+# For these kinds the end matters most (where the story continues); the rest keep their beginning
+KEEP_TAIL = ("screenplay", "paragraphs", "summary")
+# Segments that would shrink below this are dropped instead
+MIN_SEGMENT_TOKENS = 32
+OMITTED = "[...]"
+
+# (kind, label, value) or (kind, label, value, fallback), the fallback being a shorter stand-in
+# (a summary) used before the value itself is cut
+Segment = Tuple
+
+def render_value(value: Any) -> str:
+	"""Strings as they are; anything else in the configured context format (core/serializers.py)."""
+	return serialize(value)
+
+def _render_segment(label: Optional[str], value: Any) -> str:
+	text = render_value(value)
+	return f"{label}: `{text}`" if label else text
+
+def _trim_list(items: List[Any], max_tokens: int, keep_tail: bool) -> List[Any]:
+	kept: List[Any] = []
+	used = count_tokens(OMITTED) + 2
+	for item in (reversed(items) if keep_tail else items):
+		cost = count_tokens(render_value(item)) + 1
+		if used + cost > max_tokens:
+			break
+		kept.append(item)
+		used += cost
+	if len(kept) == len(items):
+		return items
+	omitted = f"[{len(items) - len(kept)} {'earlier' if keep_tail else 'later'} items omitted]"
+	return [omitted] + kept[::-1] if keep_tail else kept + [omitted]
+
+def trim_value(value: Any, max_tokens: int, keep_tail: bool) -> Any:
+	"""
+	Shrink a context value to about `max_tokens`: lists (and a scene's "elements") lose whole
+	items, anything else is cut as text, marking what was left out either way.
+	"""
+	if isinstance(value, list):
+		return _trim_list(value, max_tokens, keep_tail)
+	if isinstance(value, dict) and isinstance(value.get("elements"), list):
+		rest = count_tokens(render_value(dict(value, elements=[])))
+		return dict(value, elements=_trim_list(value["elements"], max(0, max_tokens - rest), keep_tail))
+	text = render_value(value)
+	tokens = count_tokens(text)
+	if tokens <= max_tokens:
+		return value
+	length = int(len(text) * max_tokens / tokens)
+	while length > 0:
+		trimmed = OMITTED + text[-length:] if keep_tail else text[:length] + OMITTED
+		if count_tokens(trimmed) <= max_tokens:
+			return trimmed
+		length = int(length * 0.9)
+	return ""
+
+def fit_segments(
+	segments: List[Segment],
+	budget: Optional[int] = None,
+	segment_budgets: Optional[Dict[str, int]] = None,
+) -> Tuple[List[Segment], int]:
+	"""
+	Cap each segment at its kind's budget, then, while the prompt is over `budget`, give up
+	context from the least important kind (SEGMENT_PRIORITY; the largest segment first within
+	a kind): swap in its fallback if that is shorter, else cut it, or drop it when little
+	would remain. Returns the fitted (kind, label, value) segments and the tokens saved; a
+	budget of 0 (LLM_PROMPT_TOKEN_BUDGET's default) leaves every segment as it is.
+	"""
+	budget = LLM_PROMPT_TOKEN_BUDGET if budget is None else budget
+	segment_budgets = LLM_SEGMENT_TOKEN_BUDGETS if segment_budgets is None else segment_budgets
+	if not budget:
+		return [tuple(segment[:3]) for segment in segments], 0
+	entries = []
+	for kind, label, value, *fallback in segments:
+		entries.append([kind, label, value, fallback[0] if fallback else None, count_tokens(_render_segment(label, value))])
+	before = sum(entry[4] for entry in entries)
+
+	def shrink(entry, max_tokens):
+		kind, label = entry[0], entry[1]
+		overhead = count_tokens(_render_segment(label, ""))
+		if max_tokens - overhead < MIN_SEGMENT_TOKENS:
+			entry[2] = ""
+		else:
+			entry[2] = trim_value(entry[2], max_tokens - overhead, kind in KEEP_TAIL)
+		entry[4] = count_tokens(_render_segment(label, entry[2]))
+
+	def substitute(entry) -> bool:
+		if entry[3] is None:
+			return False
+		fallback_tokens = count_tokens(_render_segment(entry[1], entry[3]))
+		if fallback_tokens >= entry[4]:
+			return False
+		entry[2], entry[3], entry[4] = entry[3], None, fallback_tokens
+		return True
+
+	for entry in entries:
+		cap = segment_budgets.get(entry[0])
+		if cap is not None and entry[0] not in UNTRIMMED and entry[4] > cap:
+			if not substitute(entry) or entry[4] > cap:
+				shrink(entry, cap)
+
+	candidates = sorted(
+		(entry for entry in entries if entry[0] not in UNTRIMMED),
+		key=lambda entry: (-SEGMENT_PRIORITY.index(entry[0]) if entry[0] in SEGMENT_PRIORITY else 0, -entry[4]),
+	)
+	for entry in candidates:
+		excess = sum(e[4] for e in entries) - budget
+		if excess <= 0:
+			break
+		if substitute(entry):
+			excess = sum(e[4] for e in entries) - budget
+			if excess <= 0:
+				break
+		shrink(entry, entry[4] - excess)
+
+	fitted = [(kind, label, value) for kind, label, value, _, _ in entries]
+	return fitted, before - sum(entry[4] for entry in entries)
+
+def layout_prompt(
+	segments: List[Segment],
+	endpoint: Optional[str] = None,
+	budget: Optional[int] = None,
+) -> str:
+	"""
+	Assemble a user prompt from (kind, label, value[, fallback]) segments, ordered by
+	SEGMENT_ORDER whatever order they are given in and fitted to the token budget (see
+	fit_segments; tokens saved are counted per endpoint). Labelled segments render as
+	"Label: `value`", unlabelled ones (the task description) verbatim.
+	"""
+	fitted, saved = fit_segments(segments, budget)
+	if saved:
+		logger.warning(f"Trimmed {saved} tokens of context from the {endpoint or 'unknown'} prompt to fit the token budget")
+		PROMPT_TOKENS_SAVED.inc((endpoint or "unknown",), saved)
+	ordered = sorted(fitted, key=lambda segment: SEGMENT_ORDER.index(segment[0]))
+	return "\n\n".join(_render_segment(label, value) for _, label, value in ordered)
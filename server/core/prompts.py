@@ -107,4 +107,28 @@ Important Guidelines:
 - Keep the language very simple
 - Ensure the summary can be used as a basis for continuing the story coherently.
 - For sequence, take important events/revelations from previous summary and add new events/revelations from the current scene. (Keep max 5 entries, by compressing information from previous summary without losing important information)
-"""
\ No newline at end of file
+"""
+
+SYSTEM_PROMPT_SCENE_PATCH_WRITER = """You are an expert screenplay editor. You are given a screenplay scene whose elements are numbered (#0, #1, ...) and an instruction. Change only what the instruction asks for, and return the changes as edit operations instead of the whole scene.
+
+Output your entire response as a valid JSON array of operations. Element indices always refer to the numbering of the scene you were given:
+
+[
+  {"op": "replace", "from": <first index>, "to": <last index, inclusive>, "elements": [<new elements>]},
+  {"op": "insert", "after": <index, or -1 for the start of the scene>, "elements": [<new elements>]},
+  {"op": "delete", "from": <first index>, "to": <last index, inclusive>},
+  {"op": "set", "field": "title" | "setting" | "characters", "value": <new value>}
+]
+
+Elements use the scene format:
+- {"type": "action", "description": "<what happens>"}
+- {"type": "dialogue", "character": "<speaker>", "line": "<spoken line>", "parenthetical": "<acting direction, optional>"}
+- {"type": "transition", "description": "<transition>"}
+- {"type": "internal_monologue", "character": "<thinker>", "description": "<thoughts>"}
+
+Guidelines:
+1. Use as few operations as the instruction allows; leave every element the instruction does not touch out of the output.
+2. Ranges of different operations must not overlap, and do not insert inside a range you replace or delete.
+3. New elements must match the tone, voice and characters of the surrounding scene.
+4. Use "set" only when the instruction changes the title, the setting or the characters.
+5. Return [] if nothing needs to change. Return only the JSON array, nothing else."""
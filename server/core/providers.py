@@ -0,0 +1,237 @@
+import os
+import time
+import random
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from config import (
+	LLM_PROVIDERS,
+	LLM_ROUTING_POLICIES,
+	LLM_ROUTING_EXPLORE,
+	LLM_PROVIDER_SMOOTHING,
+	LLM_BREAKER_FAILURES,
+	LLM_BREAKER_COOLDOWN,
+)
+from core.metrics import Counter
+from core.rate_limit import RateLimiter, get_provider_limiter, get_rate_limiter
+from core.resilience import retry_reason
+
+PROVIDER_CALLS = Counter("llm_provider_calls_total", "Upstream calls by provider and outcome (ok, failed).", ("provider", "outcome"))
+CIRCUIT_CHANGES = Counter("llm_circuit_transitions_total", "Provider circuit breaker changes by state entered (open, half_open, closed).", ("provider", "state"))
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+# what counts against a provider's health: a 429 is the rate limiter's business, a 4xx or malformed output the caller's
+PROVIDER_FAILURES = ("server_error", "timeout", "connection")
+
+class Provider:
+	"""One OpenAI-compatible endpoint, the names it knows the service's models by, and its cost rank."""
+	def __init__(
+		self,
+		name: str,
+		base_url: Optional[str] = None,
+		api_key: Optional[str] = None,
+		models: Optional[Dict[str, str]] = None,
+		cost: float = 1.0,
+		rpm: int = 0,
+		tpm: int = 0,
+	):
+		self.name = name
+		self.base_url = base_url
+		self.api_key = api_key
+		self.models = models or {}
+		self.cost = cost
+		self.rpm = rpm
+		self.tpm = tpm
+
+	def model_for(self, model: str) -> Optional[str]:
+		"""This provider's name for `model`, or None when it does not serve it."""
+		if not self.models:
+			return model
+		return self.models.get(model) or self.models.get("*")
+
+def configured_providers(base_url: Optional[str] = None) -> List[Provider]:
+	"""The providers of LLM_PROVIDERS, or the one at `base_url` (or OPENAI_BASE_URL) when given or unset."""
+	if base_url or not LLM_PROVIDERS:
+		return [Provider("openai", base_url or os.getenv('OPENAI_BASE_URL'), os.getenv('OPENAI_API_KEY'))]
+	return [
+		Provider(
+			entry["name"],
+			entry.get("base_url"),
+			os.getenv(entry.get("api_key_env", "OPENAI_API_KEY")),
+			entry.get("models"),
+			entry.get("cost", 1.0),
+			entry.get("rpm", 0),
+			entry.get("tpm", 0),
+		)
+		for entry in LLM_PROVIDERS
+	]
+
+class ProviderHealth:
+	"""
+	Live latency and error tracking and the circuit breaker of one provider. Latency is an
+	exponential moving average kept apart for streamed calls (time to first token) and whole
+	ones (time to the response). `failures` consecutive failures open the circuit; after
+	`cooldown` seconds one trial call may go, and closes it by succeeding or reopens it by failing.
+	"""
+	def __init__(self, name: str, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN, smoothing: float = LLM_PROVIDER_SMOOTHING):
+		self.name = name
+		self.failures = failures
+		self.cooldown = cooldown
+		self.smoothing = smoothing
+		self.latency: Dict[bool, Optional[float]] = {True: None, False: None}
+		self.error_rate = 0.0
+		self.consecutive_failures = 0
+		self.state = "closed"
+		self.opened_at = 0.0
+		self.trial_at = 0.0
+		self._lock = threading.Lock()
+
+	def _enter(self, state: str) -> None:
+		if state != self.state:
+			self.state = state
+			CIRCUIT_CHANGES.inc((self.name, state))
+
+	def healthy(self, now: float) -> bool:
+		"""Whether calls may go to this provider now: its circuit is closed or a trial is due."""
+		if self.state == "closed":
+			return True
+		if self.state == "open":
+			return now - self.opened_at >= self.cooldown
+		return now - self.trial_at >= self.cooldown
+
+	def claim(self, now: float) -> bool:
+		"""Like healthy(), but takes the trial call of an open circuit whose cooldown is over."""
+		with self._lock:
+			if not self.healthy(now):
+				return False
+			if self.state != "closed":
+				self._enter("half_open")
+				self.trial_at = now
+			return True
+
+	def succeeded(self, latency: float, streamed: bool) -> None:
+		with self._lock:
+			previous = self.latency[streamed]
+			self.latency[streamed] = latency if previous is None else previous + self.smoothing * (latency - previous)
+			self.error_rate -= self.smoothing * self.error_rate
+			self.consecutive_failures = 0
+			self._enter("closed")
+
+	def failed(self) -> None:
+		with self._lock:
+			self.error_rate += self.smoothing * (1 - self.error_rate)
+			self.consecutive_failures += 1
+			if self.state == "half_open" or self.consecutive_failures >= self.failures:
+				self.opened_at = time.monotonic()
+				self._enter("open")
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			"state": self.state,
+			"latency": self.latency[True],
+			"whole_latency": self.latency[False],
+			"error_rate": self.error_rate,
+			"consecutive_failures": self.consecutive_failures,
+		}
+
+# health is kept per provider name for the process, so every client routes on what all of them saw
+_health: Dict[str, ProviderHealth] = {}
+_health_lock = threading.Lock()
+
+def provider_health(name: str) -> ProviderHealth:
+	with _health_lock:
+		if name not in _health:
+			_health[name] = ProviderHealth(name)
+		return _health[name]
+
+class Route:
+	"""
+	The providers one call may use, best first. Each attempt (a retry, or a hedge) takes the
+	next one whose circuit allows it, going round again when every one has been tried.
+	"""
+	def __init__(self, router: "Router", candidates: List[Tuple[Provider, str]]):
+		self.router = router
+		self.candidates = candidates
+		self.taken = 0
+		self._lock = threading.Lock()
+
+	def next(self) -> Tuple[Provider, str]:
+		"""(provider, its model name) for the next attempt."""
+		with self._lock:
+			now = time.monotonic()
+			count = len(self.candidates)
+			for offset in range(count):
+				index = (self.taken + offset) % count
+				if self.router.health(self.candidates[index][0]).claim(now):
+					break
+			else:
+				# every circuit is open: try them in order anyway rather than fail without asking
+				index = self.taken % count
+			self.taken = index + 1
+			return self.candidates[index]
+
+class Router:
+	"""
+	Picks the provider for each upstream call by the routing policy of its endpoint (the
+	WritingService method): "fastest", "cheapest" or "fixed:<name>". Every policy puts healthy
+	providers first and falls back to the others in their configured order. Callers report
+	each call's outcome with succeeded() or failed().
+	"""
+	def __init__(self, providers: List[Provider], policies: Optional[Dict[str, str]] = None, explore: float = LLM_ROUTING_EXPLORE):
+		if not providers:
+			raise ValueError("At least one LLM provider is needed")
+		self.providers = providers
+		self.policies = LLM_ROUTING_POLICIES if policies is None else policies
+		self.explore = explore
+		self.limiters = {
+			provider.name: get_rate_limiter() if i == 0 else get_provider_limiter(provider.name, provider.base_url or DEFAULT_BASE_URL, provider.rpm, provider.tpm)
+			for i, provider in enumerate(providers)
+		}
+		self.random = random.Random()
+
+	def health(self, provider: Provider) -> ProviderHealth:
+		return provider_health(provider.name)
+
+	def limiter(self, provider: Provider) -> RateLimiter:
+		return self.limiters[provider.name]
+
+	def policy(self, endpoint: Optional[str]) -> str:
+		return self.policies.get(endpoint or "", self.policies.get("default", "fixed"))
+
+	def route(self, endpoint: Optional[str], model: str, streamed: bool) -> Route:
+		"""The providers serving `model` in the order `endpoint`'s policy prefers for a call of this kind."""
+		candidates = [(provider, provider.model_for(model)) for provider in self.providers]
+		candidates = [(provider, name) for provider, name in candidates if name]
+		if not candidates:
+			raise LookupError(f"No LLM provider serves the model {model}")
+		policy, _, fixed = self.policy(endpoint).partition(":")
+
+		def latency(provider: Provider) -> float:
+			# a provider not yet measured goes first, so it gets measured
+			value = self.health(provider).latency[streamed]
+			return 0.0 if value is None else value
+
+		if policy == "fastest":
+			candidates.sort(key=lambda candidate: latency(candidate[0]))
+			if len(candidates) > 1 and self.random.random() < self.explore:
+				candidates.insert(0, candidates.pop(self.random.randrange(1, len(candidates))))
+		elif policy == "cheapest":
+			candidates.sort(key=lambda candidate: (candidate[0].cost, latency(candidate[0])))
+		else:
+			fixed = fixed or self.providers[0].name
+			candidates.sort(key=lambda candidate: candidate[0].name != fixed)
+		now = time.monotonic()
+		candidates.sort(key=lambda candidate: not self.health(candidate[0]).healthy(now))
+		return Route(self, candidates)
+
+	def succeeded(self, provider: Provider, latency: float, streamed: bool) -> None:
+		PROVIDER_CALLS.inc((provider.name, "ok"))
+		self.health(provider).succeeded(latency, streamed)
+
+	def failed(self, provider: Provider, error: BaseException) -> None:
+		"""Count a failed call against the provider when the provider is to blame (see PROVIDER_FAILURES)."""
+		if retry_reason(error) in PROVIDER_FAILURES:
+			PROVIDER_CALLS.inc((provider.name, "failed"))
+			self.health(provider).failed()
+
+	def stats(self) -> Dict[str, Dict[str, Any]]:
+		return {provider.name: dict(self.health(provider).stats(), cost=provider.cost) for provider in self.providers}
@@ -0,0 +1,369 @@
+import os
+import math
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Generator, Mapping, Optional, Tuple
+from config import (
+	LLM_RATE_LIMIT_PATH,
+	LLM_RATE_LIMIT_RPM,
+	LLM_RATE_LIMIT_TPM,
+	LLM_RATE_LIMIT_MAX_WAIT,
+	LLM_RATE_LIMIT_MAX_QUEUE,
+	LLM_RATE_LIMIT_COMPLETION_ESTIMATE,
+)
+from core.metrics import Counter, Histogram
+from core.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_WAIT = Histogram(
+	"llm_admission_wait_seconds", "Time upstream calls waited for the shared rate limit, by outcome (admitted, rejected).", ("outcome",),
+	(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+ADMISSION_REJECTED = Counter("llm_admission_rejected_total", "Upstream calls turned away by the shared rate limit, by reason (queue, wait).", ("reason",))
+
+# Seconds between attempts of a waiting call; another worker may free the head of the queue at any time
+POLL_INTERVAL = 0.05
+# Waiters older than this past the longest wait belong to a worker that died while waiting
+STALE_WAITER = 60.0
+BUCKETS = ("requests", "tokens")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, reported REAL NOT NULL DEFAULT 0, level REAL, updated REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS waiters (id INTEGER PRIMARY KEY AUTOINCREMENT, pid INTEGER NOT NULL, tokens INTEGER NOT NULL, since REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS blocks (name TEXT PRIMARY KEY, until REAL NOT NULL);
+"""
+
+class RateLimited(Exception):
+	"""An upstream call that was not admitted; `retry_after` is the suggested wait in seconds."""
+	def __init__(self, retry_after: float, reason: str):
+		self.retry_after = max(1, math.ceil(retry_after))
+		self.reason = reason
+		super().__init__(f"LLM provider rate limit: {reason}; retry after {self.retry_after} s")
+
+def _header_float(headers: Mapping[str, str], name: str) -> Optional[float]:
+	value = headers.get(name)
+	try:
+		return float(value) if value is not None else None
+	except ValueError:
+		return None
+
+def header_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+	"""Seconds a provider response asks callers to wait (retry-after-ms or retry-after), if it says."""
+	milliseconds = _header_float(headers, "retry-after-ms")
+	if milliseconds is not None:
+		return milliseconds / 1000
+	return _header_float(headers, "retry-after")
+
+def estimate_tokens(system_prompt: str, prompt: str, max_tokens: int) -> int:
+	"""What a call is charged on admission: its prompt and an expected completion, settled once its usage is known."""
+	return count_tokens(system_prompt) + count_tokens(prompt) + min(max_tokens, LLM_RATE_LIMIT_COMPLETION_ESTIMATE)
+
+class Admission:
+	"""The tokens one admitted call was charged; `settle` swaps the estimate for what it used."""
+	__slots__ = ("limiter", "tokens")
+
+	def __init__(self, limiter: "RateLimiter", tokens: int):
+		self.limiter = limiter
+		self.tokens = tokens
+
+	def settle(self, used: int) -> None:
+		try:
+			loop = asyncio.get_running_loop()
+		except RuntimeError:
+			self.limiter.refund(self.tokens - used)
+			return
+		# on the event loop the SQLite transaction, which may wait for other workers, goes to a thread
+		loop.run_in_executor(None, self.limiter.refund, self.tokens - used)
+
+class RateLimiter:
+	"""
+	Token buckets for upstream requests and tokens per minute, kept in a SQLite file so every
+	worker on the host draws from one budget. `admit` charges a call its estimated tokens,
+	waiting in a first-come queue for up to `max_wait` seconds when the buckets are short, and
+	raises RateLimited when it would wait longer or `max_queue` calls are already waiting. A
+	call that finds room is charged in a single transaction.
+
+	Limits start at `rpm`/`tpm` (0: none until the provider reports one) and adapt to the
+	provider's x-ratelimit-* headers through `observe`: a reported limit below the configured
+	one replaces it, the buckets never hold more than the provider says remains, and a 429
+	stops admissions for its retry-after.
+	"""
+	def __init__(
+		self,
+		path: str = LLM_RATE_LIMIT_PATH,
+		rpm: int = LLM_RATE_LIMIT_RPM,
+		tpm: int = LLM_RATE_LIMIT_TPM,
+		max_wait: float = LLM_RATE_LIMIT_MAX_WAIT,
+		max_queue: int = LLM_RATE_LIMIT_MAX_QUEUE,
+	):
+		self.path = path
+		self.enabled = bool(path)
+		self.configured = {"requests": rpm, "tokens": tpm}
+		self.max_wait = max_wait
+		self.max_queue = max_queue
+		self._local = threading.local()
+		if self.enabled:
+			with self._connect() as db:
+				db.executescript(SCHEMA)
+
+	def _connect(self) -> sqlite3.Connection:
+		db = getattr(self._local, "db", None)
+		if db is None:
+			db = sqlite3.connect(self.path, timeout=30)
+			db.execute("PRAGMA journal_mode=WAL")
+			db.execute("PRAGMA synchronous=NORMAL")
+			self._local.db = db
+		return db
+
+	def _capacity(self, reported: float, name: str) -> float:
+		limits = [limit for limit in (self.configured[name], reported) if limit]
+		return min(limits) if limits else 0
+
+	def _buckets(self, db: sqlite3.Connection, now: float) -> Dict[str, Dict[str, float]]:
+		"""Each bucket refilled up to now (capacity 0: unlimited); call inside a write transaction."""
+		rows = {name: (reported, level, updated) for name, reported, level, updated in db.execute("SELECT name, reported, level, updated FROM buckets")}
+		buckets = {}
+		for name in BUCKETS:
+			reported, level, updated = rows.get(name, (0, None, now))
+			capacity = self._capacity(reported, name)
+			level = capacity if level is None else min(capacity, level + (now - updated) * capacity / 60)
+			buckets[name] = {"reported": reported, "capacity": capacity, "level": level}
+		return buckets
+
+	def _store(self, db: sqlite3.Connection, buckets: Dict[str, Dict[str, float]], now: float) -> None:
+		db.executemany(
+			"INSERT INTO buckets (name, reported, level, updated) VALUES (?, ?, ?, ?) "
+			"ON CONFLICT(name) DO UPDATE SET reported = excluded.reported, level = excluded.level, updated = excluded.updated",
+			[(name, bucket["reported"], bucket["level"], now) for name, bucket in buckets.items()],
+		)
+
+	def _blocked_for(self, db: sqlite3.Connection, now: float) -> float:
+		row = db.execute("SELECT until FROM blocks WHERE name = 'provider'").fetchone()
+		return max(0.0, row[0] - now) if row else 0.0
+
+	def _queue_depth(self, db: sqlite3.Connection, now: float) -> int:
+		return db.execute("SELECT COUNT(*) FROM waiters WHERE since > ?", (now - self.max_wait - STALE_WAITER,)).fetchone()[0]
+
+	def _queue_retry_after(self, db: sqlite3.Connection, depth: int, now: float) -> float:
+		"""Roughly how long the calls already waiting will take to be admitted."""
+		rpm = self._buckets(db, now)["requests"]["capacity"]
+		return max(self._blocked_for(db, now), depth * 60 / rpm if rpm else POLL_INTERVAL * depth)
+
+	def retry_after(self) -> Optional[float]:
+		"""
+		Seconds a new request should wait before trying again if the queue is full or the
+		provider has asked for a pause longer than any call may wait; None when it may proceed.
+		"""
+		if not self.enabled:
+			return None
+		now = time.time()
+		db = self._connect()
+		depth = self._queue_depth(db, now)
+		blocked = self._blocked_for(db, now)
+		if depth >= self.max_queue:
+			return max(1, math.ceil(self._queue_retry_after(db, depth, now)))
+		if blocked > self.max_wait:
+			return max(1, math.ceil(blocked))
+		return None
+
+	def _attempt(self, waiter: Optional[int], tokens: int) -> Tuple[float, Optional[int]]:
+		"""
+		One try at charging a call: (0, None) once charged, else (seconds until it might be,
+		its place in the queue). The call goes when the buckets also cover everything the
+		calls queued before it need, so nobody jumps the queue and nobody waits behind room.
+		"""
+		now = time.time()
+		with self._connect() as db:
+			db.execute("BEGIN IMMEDIATE")
+			blocked = self._blocked_for(db, now)
+			ahead_requests, ahead_tokens = db.execute(
+				"SELECT COUNT(*), COALESCE(SUM(tokens), 0) FROM waiters WHERE since > ? AND (? IS NULL OR id < ?)",
+				(now - self.max_wait - STALE_WAITER, waiter, waiter),
+			).fetchone()
+			buckets = self._buckets(db, now)
+			wait = blocked
+			for name, own, ahead in (("requests", 1, ahead_requests), ("tokens", tokens, ahead_tokens)):
+				bucket = buckets[name]
+				if not bucket["capacity"]:
+					continue
+				# a call larger than a whole minute's budget goes once the bucket is full
+				need = min(own + ahead, bucket["capacity"])
+				if bucket["level"] < need:
+					wait = max(wait, (need - bucket["level"]) * 60 / bucket["capacity"])
+			if not wait:
+				for name, own in (("requests", 1), ("tokens", tokens)):
+					if buckets[name]["capacity"]:
+						buckets[name]["level"] -= own
+				self._store(db, buckets, now)
+				if waiter is not None:
+					db.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+				return 0.0, None
+			if waiter is None:
+				db.execute("DELETE FROM waiters WHERE since <= ?", (now - self.max_wait - STALE_WAITER,))
+				depth = self._queue_depth(db, now)
+				if depth >= self.max_queue:
+					ADMISSION_REJECTED.inc(("queue",))
+					raise RateLimited(max(wait, self._queue_retry_after(db, depth, now)), f"{depth} calls already waiting")
+				waiter = db.execute("INSERT INTO waiters (pid, tokens, since) VALUES (?, ?, ?)", (os.getpid(), tokens, now)).lastrowid
+			return wait, waiter
+
+	def _dequeue(self, waiter: int) -> None:
+		with self._connect() as db:
+			db.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+
+	def _admission(self, tokens: int) -> Generator[float, None, None]:
+		"""The delays to sleep between attempts; ends once the call is charged, or raises RateLimited."""
+		start = time.monotonic()
+		waiter = None
+		try:
+			while True:
+				wait, waiter = self._attempt(waiter, tokens)
+				waited = time.monotonic() - start
+				if not wait:
+					ADMISSION_WAIT.observe(waited, ("admitted",))
+					return
+				if waited + wait > self.max_wait:
+					ADMISSION_WAIT.observe(waited, ("rejected",))
+					ADMISSION_REJECTED.inc(("wait",))
+					raise RateLimited(wait, f"no capacity within {self.max_wait:g} s")
+				yield min(wait, POLL_INTERVAL)
+		finally:
+			if waiter is not None:
+				self._dequeue(waiter)
+
+	def admit(self, tokens: int) -> Optional[Admission]:
+		"""Wait until a call estimated at `tokens` may be sent (see estimate_tokens)."""
+		if not self.enabled:
+			return None
+		for delay in self._admission(tokens):
+			time.sleep(delay)
+		return Admission(self, tokens)
+
+	async def aadmit(self, tokens: int) -> Optional[Admission]:
+		"""
+		`admit` for the event loop: each attempt's SQLite transaction, which may wait for the
+		lock other workers hold, runs on a thread, and the waits between them on the loop.
+		"""
+		if not self.enabled:
+			return None
+		admission = self._admission(tokens)
+		step = None
+		try:
+			while True:
+				step = asyncio.ensure_future(asyncio.to_thread(next, admission, None))
+				delay = await asyncio.shield(step)
+				step = None
+				if delay is None:
+					return Admission(self, tokens)
+				await asyncio.sleep(delay)
+		except asyncio.CancelledError:
+			# leave the queue, once the attempt under way (if any) is over
+			if step is not None:
+				await asyncio.wait({step})
+			await asyncio.to_thread(admission.close)
+			raise
+
+	def refund(self, tokens: int) -> None:
+		"""Return tokens charged beyond what a call used (a negative amount charges the shortfall)."""
+		if not self.enabled or not tokens:
+			return
+		now = time.time()
+		with self._connect() as db:
+			db.execute("BEGIN IMMEDIATE")
+			buckets = self._buckets(db, now)
+			bucket = buckets["tokens"]
+			if not bucket["capacity"]:
+				return
+			bucket["level"] = min(bucket["capacity"], bucket["level"] + tokens)
+			self._store(db, buckets, now)
+
+	def observe(self, status: int, headers: Mapping[str, str]) -> None:
+		"""Adapt to a provider response: its x-ratelimit-* limits and remaining counts, and a 429's retry-after."""
+		if not self.enabled:
+			return
+		reported = {name: _header_float(headers, f"x-ratelimit-limit-{name}") for name in BUCKETS}
+		remaining = {name: _header_float(headers, f"x-ratelimit-remaining-{name}") for name in BUCKETS}
+		if status != 429 and not any(reported.values()) and all(value is None for value in remaining.values()):
+			return
+		now = time.time()
+		with self._connect() as db:
+			db.execute("BEGIN IMMEDIATE")
+			buckets = self._buckets(db, now)
+			for name, bucket in buckets.items():
+				if reported[name]:
+					previous = bucket["capacity"]
+					bucket["reported"] = reported[name]
+					bucket["capacity"] = self._capacity(reported[name], name)
+					# a limit learned just now starts full, as far as the provider's remaining count allows
+					bucket["level"] = min(bucket["level"], bucket["capacity"]) if previous else bucket["capacity"]
+				if remaining[name] is not None:
+					bucket["level"] = min(bucket["level"], remaining[name])
+			self._store(db, buckets, now)
+			if status == 429:
+				pause = header_retry_after(headers) or 1.0
+				logger.warning(f"Provider rate limit hit; pausing upstream calls for {pause:g} s")
+				db.execute(
+					"INSERT INTO blocks (name, until) VALUES ('provider', ?) ON CONFLICT(name) DO UPDATE SET until = MAX(until, excluded.until)",
+					(now + pause,),
+				)
+
+	def stats(self) -> Dict[str, Any]:
+		"""Host-wide queue depth, pause left and bucket levels (capacity 0: unlimited)."""
+		if not self.enabled:
+			return {"enabled": False, "queue_depth": 0, "blocked_for": 0.0, "buckets": {}}
+		now = time.time()
+		db = self._connect()
+		buckets = self._buckets(db, now)
+		return {
+			"enabled": True,
+			"queue_depth": self._queue_depth(db, now),
+			"blocked_for": self._blocked_for(db, now),
+			"buckets": {name: {"capacity": bucket["capacity"], "level": bucket["level"]} for name, bucket in buckets.items()},
+		}
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+# the limiters of providers after the first (core/providers.py), and their base URLs
+_provider_limiters: Dict[str, RateLimiter] = {}
+_provider_urls: Dict[str, str] = {}
+
+def get_rate_limiter() -> RateLimiter:
+	"""The process-wide limiter at LLM_RATE_LIMIT_PATH, shared with the other workers on the host (the first provider's)."""
+	global _limiter
+	with _limiter_lock:
+		if _limiter is None:
+			_limiter = RateLimiter(LLM_RATE_LIMIT_PATH)
+		return _limiter
+
+def get_provider_limiter(name: str, base_url: str, rpm: int = 0, tpm: int = 0) -> RateLimiter:
+	"""The limiter of another provider, in its own file next to LLM_RATE_LIMIT_PATH (none when that is empty)."""
+	with _limiter_lock:
+		if name not in _provider_limiters:
+			root, extension = os.path.splitext(LLM_RATE_LIMIT_PATH)
+			_provider_limiters[name] = RateLimiter(f"{root}-{name}{extension}" if LLM_RATE_LIMIT_PATH else "", rpm, tpm)
+			_provider_urls[base_url.rstrip("/")] = name
+		return _provider_limiters[name]
+
+def limiter_for_url(url: str) -> RateLimiter:
+	"""The limiter of the provider a request to `url` went to, for adapting to its response."""
+	for base_url, name in list(_provider_urls.items()):
+		if url.startswith(base_url):
+			return _provider_limiters[name]
+	return get_rate_limiter()
+
+def admission_retry_after() -> Optional[float]:
+	"""
+	Seconds a new request should wait before trying again when no provider's limiter could
+	take a call now (see RateLimiter.retry_after); None when at least one could.
+	"""
+	hints = []
+	for limiter in [get_rate_limiter()] + list(_provider_limiters.values()):
+		hint = limiter.retry_after()
+		if hint is None:
+			return None
+		hints.append(hint)
+	return min(hints)
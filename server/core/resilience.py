@@ -0,0 +1,208 @@
+import json
+import time
+import queue
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Generator, Iterator, Optional, TypeVar
+import httpx
+import openai
+from config import (
+	LLM_RETRY_ATTEMPTS,
+	LLM_RETRY_BASE_DELAY,
+	LLM_RETRY_MAX_DELAY,
+	LLM_HEDGE_PERCENTILE,
+	LLM_HEDGE_WINDOW,
+	LLM_HEDGE_MIN_SAMPLES,
+	LLM_HEDGE_MIN_DELAY,
+)
+from core.metrics import Counter
+from core.rate_limit import header_retry_after
+
+logger = logging.getLogger(__name__)
+
+LLM_RETRIES = Counter(
+	"llm_retries_total", "Upstream calls made again after a failure, by reason (rate_limited, server_error, timeout, connection, invalid_json).",
+	("endpoint", "reason"),
+)
+LLM_HEDGES = Counter("llm_hedged_requests_total", "Second requests sent for calls slow to their first token, by outcome (won, lost).", ("endpoint", "outcome"))
+
+T = TypeVar("T")
+_EMPTY = object()
+
+def retry_reason(error: BaseException) -> Optional[str]:
+	"""Why a failed upstream call is worth making again, or None when it is not (e.g. a 400, or RateLimited, which has already waited)."""
+	if isinstance(error, json.JSONDecodeError):
+		return "invalid_json"
+	if isinstance(error, (openai.APITimeoutError, httpx.TimeoutException)):
+		return "timeout"
+	if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+		return "connection"
+	if isinstance(error, openai.APIStatusError):
+		if error.status_code == 429:
+			return "rate_limited"
+		if error.status_code in (408, 409) or error.status_code >= 500:
+			return "server_error"
+	return None
+
+def backoff(attempt: int, error: BaseException) -> float:
+	"""
+	Seconds to wait after failed attempt number `attempt` (from 0): "full jitter" over an
+	exponential ceiling, so callers that failed together do not come back together, but no
+	less than a retry-after the provider sent, within LLM_RETRY_MAX_DELAY.
+	"""
+	delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+	response = getattr(error, "response", None)
+	if isinstance(response, httpx.Response):
+		delay = max(delay, min(LLM_RETRY_MAX_DELAY, header_retry_after(response.headers) or 0))
+	return delay
+
+def _retrying(error: Exception, attempt: int, attempts: int, endpoint: Optional[str]) -> Optional[float]:
+	"""The backoff before trying again after `error`, or None when it should be raised."""
+	reason = retry_reason(error)
+	if reason is None or attempt >= attempts - 1:
+		return None
+	delay = backoff(attempt, error)
+	LLM_RETRIES.inc((endpoint or "unknown", reason))
+	logger.warning(f"Upstream call for {endpoint or 'unknown'} failed ({reason}: {error}); retrying in {delay:.2f} s")
+	return delay
+
+def with_retries(attempt: Callable[[], T], endpoint: Optional[str], attempts: Optional[int] = None) -> T:
+	"""
+	`attempt()`, made up to `attempts` (LLM_RETRY_ATTEMPTS) times in all while it fails in a way
+	retry_reason classifies as transient, with a jittered backoff between tries. Other
+	failures, and the last one, are raised.
+	"""
+	attempts = attempts or LLM_RETRY_ATTEMPTS
+	for number in range(max(1, attempts)):
+		try:
+			return attempt()
+		except Exception as e:
+			delay = _retrying(e, number, attempts, endpoint)
+			if delay is None:
+				raise
+		time.sleep(delay)
+
+async def awith_retries(attempt: Callable[[], Awaitable[T]], endpoint: Optional[str], attempts: Optional[int] = None) -> T:
+	"""`with_retries` for the event loop."""
+	attempts = attempts or LLM_RETRY_ATTEMPTS
+	for number in range(max(1, attempts)):
+		try:
+			return await attempt()
+		except Exception as e:
+			delay = _retrying(e, number, attempts, endpoint)
+			if delay is None:
+				raise
+		await asyncio.sleep(delay)
+
+class Hedging:
+	"""
+	When to hedge an upstream call. Once `min_samples` of an endpoint's last `window` times to
+	first token are known, a call with nothing to show by their `percentile` (and at least
+	`min_delay` seconds) gets a second, identical request; a `percentile` of 0 turns hedging off.
+	"""
+	def __init__(
+		self,
+		percentile: float = LLM_HEDGE_PERCENTILE,
+		window: int = LLM_HEDGE_WINDOW,
+		min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+		min_delay: float = LLM_HEDGE_MIN_DELAY,
+	):
+		self.enabled = percentile > 0
+		self.percentile = percentile
+		self.window = window
+		self.min_samples = min_samples
+		self.min_delay = min_delay
+		self._samples: Dict[str, Deque[float]] = {}
+		self._lock = threading.Lock()
+
+	def observe(self, endpoint: Optional[str], seconds: float) -> None:
+		"""Record a call's time to first token (from sending it, after admission)."""
+		if not self.enabled:
+			return
+		with self._lock:
+			self._samples.setdefault(endpoint or "unknown", deque(maxlen=self.window)).append(seconds)
+
+	def delay(self, endpoint: Optional[str]) -> Optional[float]:
+		"""Seconds without a first token after which a call to `endpoint` is hedged, or None."""
+		if not self.enabled:
+			return None
+		with self._lock:
+			samples = sorted(self._samples.get(endpoint or "unknown", ()))
+		if len(samples) < self.min_samples:
+			return None
+		return max(self.min_delay, samples[min(len(samples) - 1, int(len(samples) * self.percentile / 100))])
+
+def _resumed(first: Any, stream: Iterator[T]) -> Generator[T, None, None]:
+	try:
+		if first is not _EMPTY:
+			yield first
+		yield from stream
+	finally:
+		stream.close()
+
+def hedged(start: Callable[[], Iterator[T]], endpoint: Optional[str], delay: Optional[float]) -> Iterator[T]:
+	"""
+	The items of `start()`, a generator that makes one upstream request, with the first one
+	already fetched so that a failure before it is raised here, where it can be retried.
+
+	With a `delay`, the first request runs on its own thread and a second one is started if
+	nothing has arrived by then. The first of the two to produce an item is returned and the
+	other is closed by its thread as soon as it produces or fails, which drops its connection
+	and so cancels the generation upstream. Only when both fail is the first failure raised.
+	"""
+	if delay is None:
+		stream = start()
+		return _resumed(next(stream, _EMPTY), stream)
+
+	results: "queue.Queue" = queue.Queue()
+	claim = threading.Lock()
+	winner = []
+
+	def race(hedge: bool) -> None:
+		stream = start()
+		try:
+			first = next(stream, _EMPTY)
+		except Exception as e:
+			results.put((hedge, None, None, e))
+			return
+		with claim:
+			lost = bool(winner)
+			if not lost:
+				winner.append(hedge)
+		if lost:
+			stream.close()
+			return
+		results.put((hedge, stream, first, None))
+
+	threading.Thread(target=race, args=(False,), name="hedge", daemon=True).start()
+	started = 1
+	try:
+		result = results.get(timeout=delay)
+	except queue.Empty:
+		threading.Thread(target=race, args=(True,), name="hedge", daemon=True).start()
+		started = 2
+		result = results.get()
+	failures = []
+	while result[3] is not None:
+		failures.append(result[3])
+		if len(failures) == started:
+			raise failures[0]
+		result = results.get()
+	hedge, stream, first, _ = result
+	if started == 2:
+		LLM_HEDGES.inc((endpoint or "unknown", "won" if hedge else "lost"))
+	return _resumed(first, stream)
+
+_hedging: Optional[Hedging] = None
+_hedging_lock = threading.Lock()
+
+def get_hedging() -> Hedging:
+	"""The process-wide hedging policy, so every client learns from the same times to first token."""
+	global _hedging
+	with _hedging_lock:
+		if _hedging is None:
+			_hedging = Hedging()
+		return _hedging
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from config import (
+	LLM_CACHE_MAX_ENTRIES,
+	LLM_CACHE_TTL,
+	LLM_CACHE_DIR,
+	LLM_CACHE_MAX_DISK_BYTES,
+)
+
+logger = logging.getLogger(__name__)
+
+def cache_key(kind: str, model: str, system_prompt: str, prompt: str, temperature: float, max_tokens: int) -> str:
+	"""
+	Key for one LLM call. `kind` separates plain responses from streamed chunk sequences
+	(and the partial variant of the latter), which are stored in different shapes.
+	"""
+	payload = json.dumps([kind, model, system_prompt, prompt, temperature, max_tokens], ensure_ascii=False)
+	return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+	"""
+	Two-tier cache for LLM responses: an in-memory LRU in front of a size-bounded directory
+	shared by every worker on the host. Entries expire `ttl` seconds after they were stored
+	in either tier. Values must be JSON-serialisable.
+	"""
+	def __init__(
+		self,
+		max_entries: int = LLM_CACHE_MAX_ENTRIES,
+		ttl: float = LLM_CACHE_TTL,
+		directory: Optional[str] = LLM_CACHE_DIR,
+		max_disk_bytes: int = LLM_CACHE_MAX_DISK_BYTES,
+	):
+		self.max_entries = max_entries
+		self.ttl = ttl
+		self.directory = directory if directory and max_disk_bytes > 0 else None
+		self.max_disk_bytes = max_disk_bytes
+		self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+		self._lock = threading.Lock()
+		self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+		self._disk_bytes = 0
+		if self.directory:
+			os.makedirs(self.directory, exist_ok=True)
+			self._disk_bytes = sum(size for _, _, size in self._disk_entries())
+
+	def get(self, key: str, default: Any = None) -> Any:
+		now = time.time()
+		with self._lock:
+			entry = self._memory.get(key)
+			if entry is not None:
+				if entry[0] > now:
+					self._memory.move_to_end(key)
+					self._stats["hits"] += 1
+					self._stats["memory_hits"] += 1
+					return entry[1]
+				del self._memory[key]
+
+		entry = self._read_disk(key, now)
+		with self._lock:
+			if entry is None:
+				self._stats["misses"] += 1
+				return default
+			self._stats["hits"] += 1
+			self._stats["disk_hits"] += 1
+			self._remember(key, entry)
+		return entry[1]
+
+	def set(self, key: str, value: Any) -> None:
+		entry = (time.time() + self.ttl, value)
+		with self._lock:
+			self._remember(key, entry)
+			self._stats["stores"] += 1
+		self._write_disk(key, entry)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._memory.clear()
+		for path, _, _ in self._disk_entries():
+			self._remove(path)
+		self._disk_bytes = 0
+
+	def stats(self) -> Dict[str, int]:
+		with self._lock:
+			return dict(self._stats, entries=len(self._memory), disk_bytes=self._disk_bytes)
+
+	def _remember(self, key: str, entry: Tuple[float, Any]) -> None:
+		self._memory[key] = entry
+		self._memory.move_to_end(key)
+		while len(self._memory) > self.max_entries:
+			self._memory.popitem(last=False)
+			self._stats["evictions"] += 1
+
+	def _path(self, key: str) -> str:
+		return os.path.join(self.directory, key + ".json")
+
+	def _read_disk(self, key: str, now: float) -> Optional[Tuple[float, Any]]:
+		if not self.directory:
+			return None
+		path = self._path(key)
+		try:
+			with open(path, encoding="utf-8") as f:
+				expires, value = json.load(f)
+		except FileNotFoundError:
+			return None
+		except (OSError, ValueError) as e:
+			logger.warning(f"Discarding unreadable cache entry {path}: {e}")
+			self._remove(path)
+			return None
+		if expires <= now:
+			self._remove(path)
+			return None
+		return expires, value
+
+	def _write_disk(self, key: str, entry: Tuple[float, Any]) -> None:
+		if not self.directory:
+			return
+		data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+		if len(data) > self.max_disk_bytes:
+			return
+		path = self._path(key)
+		try:
+			replaced = os.path.getsize(path)
+		except OSError:
+			replaced = 0
+		try:
+			fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+			with os.fdopen(fd, "wb") as f:
+				f.write(data)
+			os.replace(tmp_path, path)
+		except OSError as e:
+			logger.warning(f"Failed to write cache entry {key}: {e}")
+			return
+		# an entry written again for the same key replaces its old file
+		self._disk_bytes += len(data) - replaced
+		if self._disk_bytes > self.max_disk_bytes:
+			self._shrink_disk()
+
+	def _disk_entries(self):
+		"""(path, mtime, size) of every entry file; other workers write to the same directory."""
+		entries = []
+		try:
+			with os.scandir(self.directory) as it:
+				for item in it:
+					if item.name.endswith(".json"):
+						try:
+							stat = item.stat()
+						except FileNotFoundError:
+							continue
+						entries.append((item.path, stat.st_mtime, stat.st_size))
+		except FileNotFoundError:
+			pass
+		return entries
+
+	def _shrink_disk(self) -> None:
+		# drop the oldest files until the directory is back under 90% of its budget
+		entries = sorted(self._disk_entries(), key=lambda entry: entry[1])
+		total = sum(size for _, _, size in entries)
+		target = self.max_disk_bytes * 0.9
+		for path, _, size in entries:
+			if total <= target:
+				break
+			self._remove(path)
+			total -= size
+			with self._lock:
+				self._stats["evictions"] += 1
+		self._disk_bytes = total
+
+	@staticmethod
+	def _remove(path: str) -> None:
+		try:
+			os.remove(path)
+		except FileNotFoundError:
+			pass
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+	"""The process-wide response cache used by LLMClient and AsyncLLMClient."""
+	global _response_cache
+	with _response_cache_lock:
+		if _response_cache is None:
+			_response_cache = ResponseCache()
+		return _response_cache
@@ -0,0 +1,127 @@
+import copy
+import json
+from typing import Any, Dict, Iterator, List
+
+# Element types the scene writer produces (core/prompts.py) and the text field each needs
+ELEMENT_TYPES = ("action", "dialogue", "transition", "internal_monologue")
+# Scene fields a "set" operation may change; they live at the top of the client's scenes and
+# under "meta" in the scene writer's output
+META_FIELDS = ("title", "setting", "characters")
+
+class ScenePatchError(ValueError):
+	"""A patch that does not fit the scene it is applied to."""
+
+def is_patchable(scene: Any) -> bool:
+	return isinstance(scene, dict) and isinstance(scene.get("elements"), list)
+
+def _check_elements(elements: Any, where: str) -> None:
+	if not isinstance(elements, list) or not elements:
+		raise ScenePatchError(f"{where}: \"elements\" must be a non-empty list")
+	for element in elements:
+		if not isinstance(element, dict) or element.get("type") not in ELEMENT_TYPES:
+			raise ScenePatchError(f"{where}: elements must be objects with a type in {', '.join(ELEMENT_TYPES)}")
+		if element["type"] == "dialogue":
+			if not element.get("character") or not isinstance(element.get("line"), str):
+				raise ScenePatchError(f"{where}: dialogue needs a character and a line")
+		elif not isinstance(element.get("description", element.get("content")), str):
+			raise ScenePatchError(f"{where}: {element['type']} needs a description")
+
+def _index(operation: Dict[str, Any], key: str, low: int, high: int, where: str) -> int:
+	value = operation.get(key)
+	if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+		raise ScenePatchError(f"{where}: \"{key}\" must be an element index from {low} to {high}")
+	return value
+
+def validate_patch(scene: Dict[str, Any], operations: Any) -> None:
+	"""
+	Check a patch against `scene` before anything is applied. Indices refer to the scene as
+	sent (not as earlier operations leave it), ranges ("from"/"to", inclusive) may not
+	overlap, and an insert may not land inside a replaced or deleted range.
+	"""
+	if not isinstance(operations, list):
+		raise ScenePatchError("A patch must be a list of operations")
+	last = len(scene["elements"]) - 1
+	ranges, inserts = [], []
+	for number, operation in enumerate(operations):
+		where = f"operation {number}"
+		op = operation.get("op") if isinstance(operation, dict) else None
+		if op in ("replace", "delete"):
+			start = _index(operation, "from", 0, last, where)
+			end = _index(operation, "to", start, last, where)
+			if op == "replace":
+				_check_elements(operation.get("elements"), where)
+			ranges.append((start, end, where))
+		elif op == "insert":
+			inserts.append((_index(operation, "after", -1, last, where), where))
+			_check_elements(operation.get("elements"), where)
+		elif op == "set":
+			if operation.get("field") not in META_FIELDS:
+				raise ScenePatchError(f"{where}: \"field\" must be one of {', '.join(META_FIELDS)}")
+			if "value" not in operation:
+				raise ScenePatchError(f"{where}: \"set\" needs a value")
+		else:
+			raise ScenePatchError(f"{where}: unknown op {op!r}, expected replace, insert, delete or set")
+	ranges.sort()
+	for (_, end, first), (start, _, second) in zip(ranges, ranges[1:]):
+		if start <= end:
+			raise ScenePatchError(f"{first} and {second} change overlapping elements")
+	for after, where in inserts:
+		for start, end, other in ranges:
+			if start <= after < end:
+				raise ScenePatchError(f"{where} inserts inside the range {other} changes")
+
+def apply_scene_patch(scene: Dict[str, Any], operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+	"""
+	The scene with a validated patch applied: "replace" and "delete" an inclusive element
+	range, "insert" elements after an index (-1 for the start), "set" a meta field. Returns a
+	new scene; `scene` is left as it was.
+	"""
+	validate_patch(scene, operations)
+	elements = scene["elements"]
+	replaced = {op["from"]: op for op in operations if op["op"] in ("replace", "delete")}
+	inserted: Dict[int, List[Dict[str, Any]]] = {}
+	for op in operations:
+		if op["op"] == "insert":
+			inserted.setdefault(op["after"], []).extend(op["elements"])
+
+	result = copy.deepcopy(scene)
+	patched = list(inserted.get(-1, []))
+	index = 0
+	while index < len(elements):
+		op = replaced.get(index)
+		if op is None:
+			patched.append(copy.deepcopy(elements[index]))
+			patched.extend(inserted.get(index, []))
+			index += 1
+			continue
+		if op["op"] == "replace":
+			patched.extend(op["elements"])
+		patched.extend(inserted.get(op["to"], []))
+		index = op["to"] + 1
+	result["elements"] = patched
+
+	for op in operations:
+		if op["op"] == "set":
+			meta = result.get("meta")
+			target = meta if isinstance(meta, dict) and op["field"] in meta and op["field"] not in result else result
+			target[op["field"]] = op["value"]
+	return result
+
+def _scene_chunks(scene: Dict[str, Any], partial: bool) -> Iterator[Dict[str, Any]]:
+	"""A finished scene in the chunk protocol of a streamed scene (see core/stream_parsers.to_stream_chunk)."""
+	meta = dict(scene.get("meta") or {})
+	meta.update((key, value) for key, value in scene.items() if key not in ("meta", "elements"))
+	if meta:
+		yield {"meta": meta}
+	for index, element in enumerate(scene["elements"]):
+		yield {"chunk": json.dumps(element), "index": index, "complete": True} if partial else {"chunk": json.dumps(element)}
+	yield {"chunk": "[DONE]"}
+
+def patched_scene_chunks(scene: Dict[str, Any], operations: List[Any], partial: bool = False) -> Iterator[Dict[str, Any]]:
+	"""The scene with `operations` applied, as streamed scene chunks, or an error chunk for a bad patch."""
+	try:
+		patched = apply_scene_patch(scene, operations)
+	except ScenePatchError as e:
+		yield {"error": f"Invalid patch from LLM: {e}"}
+		return
+	yield from _scene_chunks(patched, partial)
@@ -0,0 +1,204 @@
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+from core.edit_stream import Chunks, transform_stream
+from core.stream_parsers import SentenceSegmenter
+
+# Paragraph rewrites as edits to numbered sentences: the server numbers the sentences of the
+# paragraph(s) (S1, S2, ...), the model returns only the sentences it changes, and the edits
+# are expanded back into the action list clients consume (edit / add / remove / no_change /
+# paragraph_break, one entry per sentence). Streamed, each edit's actions go out as soon as the
+# edit is parsed, numbered with "seq", and a summary event with the counts ends the stream.
+
+EDIT_OPS = ("edit", "remove", "add", "break", "join")
+ACTIONS = ("edit", "add", "remove", "no_change", "paragraph_break")
+# where an edit goes among the actions of the sentence it names: its own action, then adds after it, then the break
+_SLOT = {"edit": 0, "remove": 0, "add": 1, "break": 2, "join": 2}
+
+class SentenceEditError(ValueError):
+	"""Edits that do not fit the numbered sentences they were made against."""
+
+def split_sentences(text: str) -> List[List[str]]:
+	"""Paragraphs (split on blank lines, or the client's literal "\\n\\n" marker) as lists of sentences."""
+	segmenter = SentenceSegmenter()
+	events = segmenter.feed(text.replace("\\n\\n", "\n\n")) + segmenter.close()
+	paragraphs: List[List[str]] = [[]]
+	for kind, value in events:
+		if kind == "sentence":
+			paragraphs[-1].append(value)
+		elif paragraphs[-1]:
+			paragraphs.append([])
+	return [paragraph for paragraph in paragraphs if paragraph]
+
+def sentence_ids(paragraphs: List[List[str]]) -> List[str]:
+	return [f"S{number}" for number in range(1, sum(len(paragraph) for paragraph in paragraphs) + 1)]
+
+def numbered_sentences(paragraphs: List[List[str]]) -> str:
+	"""One "S<n>: sentence" line per sentence, paragraphs separated by a blank line."""
+	blocks, number = [], 0
+	for paragraph in paragraphs:
+		lines = []
+		for sentence in paragraph:
+			number += 1
+			lines.append(f"S{number}: {sentence}")
+		blocks.append("\n".join(lines))
+	return "\n\n".join(blocks)
+
+def _number(sentence_id: Any) -> int:
+	"""The n of "S<n>", or -1 for anything else."""
+	if isinstance(sentence_id, str) and sentence_id[:1] == "S" and sentence_id[1:].isdigit():
+		return int(sentence_id[1:])
+	return -1
+
+def _check_edit(edit: Any, count: int, where: str) -> int:
+	"""Check one edit's shape; returns the number of the sentence it names (0 for "add" after S0)."""
+	op = edit.get("op") if isinstance(edit, dict) else None
+	if op not in EDIT_OPS:
+		raise SentenceEditError(f"{where}: unknown op {op!r}, expected edit, remove, add, break or join")
+	sentence_id = edit.get("id") if op in ("edit", "remove") else edit.get("after")
+	number = _number(sentence_id)
+	if not (1 <= number <= count or (op == "add" and number == 0)):
+		raise SentenceEditError(f"{where}: unknown sentence {sentence_id!r}")
+	if op in ("edit", "add") and not (isinstance(edit.get("text"), str) and edit["text"].strip()):
+		raise SentenceEditError(f"{where}: {op} needs a text")
+	return number
+
+class SentenceEditExpander:
+	"""
+	Expands edits to numbered sentences into actions as they arrive, so a streamed rewrite can
+	be applied progressively: `feed` returns the actions an edit settles (the no_change
+	sentences before it, then its own), `close` the rest. Edits must come in sentence order:
+	"edit"/"remove" name an existing sentence at most once between them, "add" goes after a
+	sentence (S0 for the start), "break" splits a paragraph after a sentence and "join" removes
+	the paragraph break after one. An edit whose text is the original sentence is no_change.
+	"""
+
+	def __init__(self, paragraphs: List[List[str]]):
+		self.sentences = [sentence for paragraph in paragraphs for sentence in paragraph]
+		self.breaks = {_number(sentence_id) for sentence_id in _paragraph_ends(paragraphs)}
+		self.edits = 0
+		self._next = 1  # the first sentence without an action yet
+		self._open: Optional[int] = None  # the last one with an action, whose adds and break may still come
+		self._position = (0, 0)
+
+	def feed(self, edit: Any) -> List[Dict[str, Any]]:
+		where = f"edit {self.edits}"
+		number = _check_edit(edit, len(self.sentences), where)
+		op = edit["op"]
+		position = (number, _SLOT[op])
+		if position == self._position and _SLOT[op] == 0:
+			raise SentenceEditError(f"{where}: S{number} is changed twice")
+		if position < self._position:
+			raise SentenceEditError(f"{where}: {op} on S{number} is out of sentence order")
+		if op == "break" and (number in self.breaks or number == len(self.sentences)):
+			raise SentenceEditError(f"{where}: S{number} already ends a paragraph")
+		if op == "join" and number not in self.breaks:
+			raise SentenceEditError(f"{where}: no paragraph break after S{number}")
+		self._position = position
+		self.edits += 1
+
+		actions = self._through(number - 1 if _SLOT[op] == 0 else number)
+		if op in ("edit", "remove"):
+			actions.extend(self._close_open())
+			sentence = self.sentences[number - 1]
+			if op == "remove":
+				actions.append({"action": "remove", "original_sentence": sentence})
+			elif edit["text"].strip() == sentence:
+				actions.append({"action": "no_change", "original_sentence": sentence})
+			else:
+				actions.append({"action": "edit", "original_sentence": sentence, "rewritten_sentence": edit["text"].strip()})
+			self._open, self._next = number, number + 1
+		elif op == "add":
+			actions.append({"action": "add", "rewritten_sentence": edit["text"].strip()})
+		elif op == "break":
+			self.breaks.add(number)
+		else:
+			self.breaks.discard(number)
+		return actions
+
+	def close(self) -> List[Dict[str, Any]]:
+		"""The actions left once the edits are in, ending with the final paragraph_break."""
+		return self._through(len(self.sentences)) + self._close_open() + [{"action": "paragraph_break"}]
+
+	def _through(self, number: int) -> List[Dict[str, Any]]:
+		"""no_change actions for the sentences up to `number` that have none yet."""
+		actions = []
+		for n in range(self._next, number + 1):
+			actions.extend(self._close_open())
+			actions.append({"action": "no_change", "original_sentence": self.sentences[n - 1]})
+			self._open = n
+		self._next = max(self._next, number + 1)
+		return actions
+
+	def _close_open(self) -> List[Dict[str, Any]]:
+		"""The paragraph_break after the open sentence, if it ends a paragraph; no more edits can follow it."""
+		number, self._open = self._open, None
+		if number is not None and number in self.breaks:
+			return [{"action": "paragraph_break"}]
+		return []
+
+def _paragraph_ends(paragraphs: List[List[str]]) -> Set[str]:
+	"""Ids of the sentences followed by a paragraph break (every paragraph's last but the final one's)."""
+	ends, number = set(), 0
+	for paragraph in paragraphs[:-1]:
+		number += len(paragraph)
+		ends.add(f"S{number}")
+	return ends
+
+def _order(edit: Any) -> Tuple[int, int]:
+	if not isinstance(edit, dict) or edit.get("op") not in EDIT_OPS:
+		return (-1, 0)
+	return (_number(edit.get("id") if edit["op"] in ("edit", "remove") else edit.get("after")), _SLOT[edit["op"]])
+
+def edits_to_actions(paragraphs: List[List[str]], edits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+	"""Expand a complete list of edits, in any order, into the full action list in sentence order."""
+	if not isinstance(edits, list):
+		raise SentenceEditError("Edits must be a list")
+	expander = SentenceEditExpander(paragraphs)
+	actions: List[Dict[str, Any]] = []
+	# a stable sort keeps adds after the same sentence in the order they were given
+	for edit in sorted(edits, key=_order):
+		actions.extend(expander.feed(edit))
+	return actions + expander.close()
+
+class ActionSequence:
+	"""Numbers the actions of a streamed paragraph rewrite and counts them for its summary event."""
+
+	def __init__(self):
+		self.seq = 0
+		self.counts: Dict[str, int] = {action: 0 for action in ACTIONS}
+
+	def chunk(self, action: Dict[str, Any]) -> Dict[str, Any]:
+		self.seq += 1
+		kind = action.get("action") if isinstance(action, dict) else None
+		kind = kind if kind in ACTIONS else "other"
+		self.counts[kind] = self.counts.get(kind, 0) + 1
+		return {"chunk": json.dumps(action), "seq": self.seq}
+
+	def chunks(self, actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+		return [self.chunk(action) for action in actions]
+
+	def summary(self) -> List[Dict[str, Any]]:
+		"""The chunks that end the stream: the summary event, then [DONE]."""
+		return [{"summary": dict(self.counts, actions=self.seq)}, {"chunk": "[DONE]"}]
+
+def action_chunks(stream: Chunks) -> Chunks:
+	"""A full-mode rewrite's streamed actions, numbered, with the summary event at the end."""
+	sequence = ActionSequence()
+	return transform_stream(stream, lambda action: [sequence.chunk(action)], sequence.summary)
+
+def sentence_edit_chunks(paragraphs: List[List[str]], stream: Chunks) -> Chunks:
+	"""
+	The actions for a stream of sentence edits, numbered and sent as soon as each edit settles
+	them, with the summary event at the end. Bad or out-of-order edits end the stream with an
+	error chunk.
+	"""
+	expander, sequence = SentenceEditExpander(paragraphs), ActionSequence()
+
+	def feed(edit: Any) -> List[Dict[str, Any]]:
+		# models sometimes wrap the list in an object ({"edits": [...]})
+		if isinstance(edit, dict) and "op" not in edit:
+			edits = next((value for value in edit.values() if isinstance(value, list)), [edit])
+			return [chunk for inner in edits for chunk in feed(inner)]
+		return sequence.chunks(expander.feed(edit))
+
+	return transform_stream(stream, feed, lambda: sequence.chunks(expander.close()) + sequence.summary())
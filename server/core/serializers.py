@@ -0,0 +1,134 @@
+import json
+from typing import Any, Callable, Dict, Optional
+from config import LLM_CONTEXT_FORMAT
+
+# How context values (scenes, characters, summaries, parameters) are written into prompts.
+# Strings always pass through as they are; the format only decides how structured values read.
+
+Serializer = Callable[[Any], str]
+
+def json_format(value: Any) -> str:
+	"""JSON with sorted keys, so equal context renders byte-identically."""
+	return json.dumps(value, sort_keys=True, ensure_ascii=False)
+
+def _scalar(value: Any) -> str:
+	if isinstance(value, str):
+		return value
+	return json.dumps(value, ensure_ascii=False)
+
+def _text(value: Any) -> str:
+	"""A scene field that may be a plain string or the scene writer's {"type", "text"} object."""
+	if isinstance(value, dict):
+		return _scalar(value.get("text", ""))
+	return _scalar(value) if value is not None else ""
+
+def is_scene(value: Any) -> bool:
+	return isinstance(value, dict) and isinstance(value.get("elements"), list)
+
+def _scene_element(element: Any) -> str:
+	if not isinstance(element, dict):
+		# an "[N earlier items omitted]" marker left by prompt_layout's trimming
+		return _scalar(element)
+	kind = element.get("type", "")
+	text = _text(element.get("line", element.get("description", element.get("content", ""))))
+	character = element.get("character")
+	if kind == "dialogue":
+		parenthetical = f" ({element['parenthetical']})" if element.get("parenthetical") else ""
+		return f"{character or '?'}{parenthetical}: {text}"
+	if kind == "internal_monologue":
+		return f"[thinks] {character}: {text}" if character else f"[thinks] {text}"
+	return f"[{kind}] {text}" if kind else text
+
+def _character(character: Any) -> str:
+	if not isinstance(character, dict):
+		return _scalar(character)
+	name = _scalar(character.get("name", "?"))
+	return f"{name} ({_scalar(character['description'])})" if character.get("description") else name
+
+def compact_scene(scene: Dict[str, Any], numbered: bool = False) -> str:
+	"""
+	A scene as one line per element: "NAME (parenthetical): line" for dialogue, "[thinks] NAME:"
+	for internal monologue and "[action]"/"[transition]" for the rest, under its title, setting
+	and cast. Reads the client's scenes and the scene writer's meta/title/setting layout alike.
+	`numbered` prefixes each element with its index ("#3 "), for prompts that address elements.
+	"""
+	meta = scene.get("meta") or {}
+	lines = []
+	title = _text(scene.get("title", meta.get("title")))
+	if title:
+		lines.append(f"TITLE: {title}")
+	setting = scene.get("setting") or meta.get("setting") or {}
+	if setting:
+		where = ", ".join(_scalar(setting[key]) for key in ("location", "time") if setting.get(key))
+		description = _scalar(setting.get("description", ""))
+		lines.append(f"SETTING: {where}" + (f". {description}" if description else ""))
+	characters = scene.get("characters", meta.get("characters")) or []
+	if characters:
+		lines.append("CHARACTERS: " + "; ".join(_character(character) for character in characters))
+	rest = {key: value for key, value in scene.items() if key not in ("meta", "title", "setting", "characters", "elements", "paragraphs")}
+	if rest:
+		lines.append(_compact(rest, 0))
+	if lines:
+		lines.append("")
+	for index, element in enumerate(scene["elements"]):
+		lines.append(f"#{index} {_scene_element(element)}" if numbered else _scene_element(element))
+	return "\n".join(lines)
+
+def _indent(text: str, depth: int) -> str:
+	return text.replace("\n", "\n" + "  " * depth)
+
+def _compact(value: Any, depth: int) -> str:
+	pad = "  " * depth
+	if is_scene(value):
+		return pad + _indent(compact_scene(value), depth)
+	if isinstance(value, dict):
+		if not value:
+			return pad + "{}"
+		lines = []
+		for key in sorted(value):
+			item = value[key]
+			if isinstance(item, (dict, list)) and item:
+				lines.append(f"{pad}{key}:\n{_compact(item, depth + 1)}")
+			else:
+				lines.append(f"{pad}{key}: {_indent(_scalar(item), depth + 1)}")
+		return "\n".join(lines)
+	if isinstance(value, list):
+		if not value:
+			return pad + "[]"
+		lines = []
+		for item in value:
+			if isinstance(item, (dict, list)) and item:
+				nested = _compact(item, depth + 1)
+				# the first line of a nested record goes on the "- " line itself
+				lines.append(f"{pad}- {nested[len(pad) + 2:]}")
+			else:
+				lines.append(f"{pad}- {_indent(_scalar(item), depth + 1)}")
+		return "\n".join(lines)
+	return pad + _indent(_scalar(value), depth)
+
+def compact_format(value: Any) -> str:
+	"""
+	Indented "key: value" lines and "- item" lists (keys sorted, so equal context renders
+	byte-identically), scenes as screenplay lines: no quotes, braces or escapes to pay for.
+	"""
+	return _compact(value, 0)
+
+SERIALIZERS: Dict[str, Serializer] = {
+	"json": json_format,
+	"compact": compact_format,
+}
+
+def register_serializer(name: str, serializer: Serializer) -> None:
+	SERIALIZERS[name] = serializer
+
+def serialize(value: Any, format: Optional[str] = None) -> str:
+	"""
+	`value` as prompt text in `format` (LLM_CONTEXT_FORMAT by default, one of SERIALIZERS).
+	Strings are returned as they are.
+	"""
+	if isinstance(value, str):
+		return value
+	name = format or LLM_CONTEXT_FORMAT
+	if name not in SERIALIZERS:
+		raise ValueError(f"Unknown context format {name!r}, expected one of {', '.join(SERIALIZERS)}")
+	return SERIALIZERS[name](value)
@@ -0,0 +1,260 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+_END = object()
+
+class _Broadcast:
+	"""
+	One upstream chunk sequence shared by every subscriber. There is no pump thread:
+	whichever subscriber runs out of buffered chunks first pulls the next one from the
+	source while the others wait, so the stream keeps going as long as anyone is reading.
+	"""
+	def __init__(self, source: Iterator[Any]):
+		self._source = source
+		self._chunks: List[Any] = []
+		self._done = False
+		self._error = None
+		self._pulling = False
+		self._cond = threading.Condition()
+		self.subscribers = 0
+
+	def subscribe(self) -> Iterator[Any]:
+		i = 0
+		while True:
+			with self._cond:
+				while i >= len(self._chunks) and not self._done and self._pulling:
+					self._cond.wait()
+				pull = i >= len(self._chunks)
+				if pull and self._done:
+					if self._error is not None:
+						raise self._error
+					return
+				if pull:
+					self._pulling = True
+				else:
+					item = self._chunks[i]
+
+			if pull:
+				try:
+					item = next(self._source)
+				except StopIteration:
+					self._finish()
+					return
+				except Exception as e:
+					self._finish(e)
+					raise
+				with self._cond:
+					self._chunks.append(item)
+					self._pulling = False
+					self._cond.notify_all()
+			i += 1
+			yield item
+
+	def abandon(self) -> None:
+		"""Called once the last subscriber has gone: let the upstream request go."""
+		with self._cond:
+			if self._done:
+				return
+			self._done = True
+		self._source.close()
+
+	def _finish(self, error: Exception = None) -> None:
+		with self._cond:
+			self._done = True
+			self._error = error
+			self._pulling = False
+			self._cond.notify_all()
+
+class _Call:
+	__slots__ = ("event", "result", "error")
+
+	def __init__(self):
+		self.event = threading.Event()
+		self.result = None
+		self.error = None
+
+class SingleFlight:
+	"""
+	Coalesces identical concurrent calls within a process: while a call for a key is in
+	flight, callers with the same key wait for its result instead of starting their own.
+	Streams are fanned out chunk by chunk, and a late subscriber gets the sequence from
+	the first chunk. Nothing is kept once the call finishes; that is ResponseCache's job.
+	"""
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._calls: Dict[str, _Call] = {}
+		self._streams: Dict[str, _Broadcast] = {}
+		self._stats = {"calls": 0, "coalesced": 0}
+
+	def do(self, key: str, fn: Callable[[], Any]) -> Any:
+		with self._lock:
+			self._stats["calls"] += 1
+			call = self._calls.get(key)
+			if call is not None:
+				self._stats["coalesced"] += 1
+				leader = False
+			else:
+				call = self._calls[key] = _Call()
+				leader = True
+
+		if not leader:
+			call.event.wait()
+			if call.error is not None:
+				raise call.error
+			return call.result
+
+		try:
+			call.result = fn()
+			return call.result
+		except Exception as e:
+			call.error = e
+			raise
+		finally:
+			with self._lock:
+				del self._calls[key]
+			call.event.set()
+
+	def stream(self, key: str, fn: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+		with self._lock:
+			self._stats["calls"] += 1
+			broadcast = self._streams.get(key)
+			if broadcast is not None:
+				self._stats["coalesced"] += 1
+			else:
+				broadcast = self._streams[key] = _Broadcast(iter(fn()))
+			broadcast.subscribers += 1
+		try:
+			yield from broadcast.subscribe()
+		finally:
+			with self._lock:
+				broadcast.subscribers -= 1
+				last = broadcast.subscribers == 0
+				if last and self._streams.get(key) is broadcast:
+					del self._streams[key]
+			if last:
+				broadcast.abandon()
+
+	def stats(self) -> Dict[str, int]:
+		with self._lock:
+			return dict(self._stats, in_flight=len(self._calls) + len(self._streams))
+
+class _AsyncBroadcast:
+	"""
+	asyncio counterpart of _Broadcast. Each chunk is read from the source by a task of its
+	own, so a subscriber cancelled while waiting for one (its client went away) leaves the
+	read running for another subscriber to take over; only abandon() stops it.
+	"""
+	def __init__(self, source: AsyncIterator[Any]):
+		self._source = source
+		self._chunks: List[Any] = []
+		self._done = False
+		self._error = None
+		self._pulling = False
+		self._next: Optional[asyncio.Future] = None
+		self._cond = asyncio.Condition()
+		self.subscribers = 0
+
+	async def _read(self) -> Any:
+		try:
+			return await self._source.__anext__()
+		except StopAsyncIteration:
+			return _END
+
+	async def subscribe(self) -> AsyncIterator[Any]:
+		i = 0
+		while True:
+			async with self._cond:
+				while i >= len(self._chunks) and not self._done and self._pulling:
+					await self._cond.wait()
+				pull = i >= len(self._chunks)
+				if pull and self._done:
+					if self._error is not None:
+						raise self._error
+					return
+				if pull:
+					self._pulling = True
+				else:
+					item = self._chunks[i]
+
+			if pull:
+				if self._next is None:
+					self._next = asyncio.ensure_future(self._read())
+				try:
+					item = await asyncio.shield(self._next)
+				except asyncio.CancelledError:
+					# this subscriber went away; the read goes on for the next one to pick up
+					async with self._cond:
+						self._pulling = False
+						self._cond.notify_all()
+					raise
+				except Exception as e:
+					self._next = None
+					await self._finish(e)
+					raise
+				self._next = None
+				if item is _END:
+					await self._finish()
+					return
+				async with self._cond:
+					self._chunks.append(item)
+					self._pulling = False
+					self._cond.notify_all()
+			i += 1
+			yield item
+
+	async def abandon(self) -> None:
+		if self._done:
+			return
+		self._done = True
+		if self._next is not None:
+			# cancels the generation the read is waiting on
+			self._next.cancel()
+			await asyncio.wait({self._next})
+		await self._source.aclose()
+
+	async def _finish(self, error: Exception = None) -> None:
+		async with self._cond:
+			self._done = True
+			self._error = error
+			self._pulling = False
+			self._cond.notify_all()
+
+class AsyncSingleFlight:
+	"""asyncio counterpart of SingleFlight, for AsyncLLMClient."""
+	def __init__(self):
+		self._calls: Dict[str, asyncio.Future] = {}
+		self._streams: Dict[str, _AsyncBroadcast] = {}
+		self._stats = {"calls": 0, "coalesced": 0}
+
+	async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+		self._stats["calls"] += 1
+		task = self._calls.get(key)
+		if task is not None:
+			self._stats["coalesced"] += 1
+		else:
+			task = self._calls[key] = asyncio.ensure_future(fn())
+			task.add_done_callback(lambda _: self._calls.pop(key, None))
+		# a cancelled waiter must not cancel the call the others are waiting on
+		return await asyncio.shield(task)
+
+	async def stream(self, key: str, fn: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+		self._stats["calls"] += 1
+		broadcast = self._streams.get(key)
+		if broadcast is not None:
+			self._stats["coalesced"] += 1
+		else:
+			broadcast = self._streams[key] = _AsyncBroadcast(fn())
+		broadcast.subscribers += 1
+		try:
+			async for item in broadcast.subscribe():
+				yield item
+		finally:
+			broadcast.subscribers -= 1
+			if broadcast.subscribers == 0:
+				if self._streams.get(key) is broadcast:
+					del self._streams[key]
+				await broadcast.abandon()
+
+	def stats(self) -> Dict[str, int]:
+		return dict(self._stats, in_flight=len(self._calls) + len(self._streams))
@@ -0,0 +1,180 @@
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
+from config import (
+	SPECULATION_ENABLED,
+	SPECULATION_TOKEN_BUDGET,
+	SPECULATION_BUDGET_WINDOW,
+	SPECULATION_TTL,
+	SPECULATION_WORKERS,
+)
+from core.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+class _Entry:
+	__slots__ = ("user", "event", "content", "tokens", "expires")
+
+	def __init__(self, user: str):
+		self.user = user
+		self.event = threading.Event()
+		self.content: Any = None
+		self.tokens = 0
+		self.expires: Optional[float] = None  # None while the call is running
+
+class Speculator:
+	"""
+	Results of LLM calls made before anyone asked for them. `submit` runs a callable in the
+	background on behalf of a user; each call it makes through LLMClient.generate_json is
+	kept under that call's cache key until the identical call arrives and takes it (waiting
+	for it if it is still running) or `ttl` seconds pass and it is discarded. Users get
+	`budget` tokens (prompt and completion, counted with core/tokens.py) of speculative work
+	per `window` seconds; submits over budget are skipped.
+	"""
+	def __init__(
+		self,
+		enabled: bool = SPECULATION_ENABLED,
+		budget: int = SPECULATION_TOKEN_BUDGET,
+		window: float = SPECULATION_BUDGET_WINDOW,
+		ttl: float = SPECULATION_TTL,
+		workers: int = SPECULATION_WORKERS,
+	):
+		self.enabled = enabled
+		self.budget = budget
+		self.window = window
+		self.ttl = ttl
+		self.workers = workers
+		self._executor: Optional[ThreadPoolExecutor] = None
+		self._futures: Set[Future] = set()
+		self._local = threading.local()
+		self._lock = threading.Lock()
+		self._entries: Dict[str, _Entry] = {}
+		self._spent: Dict[str, Deque[Tuple[float, int]]] = {}
+		self._stats = {"submitted": 0, "skipped": 0, "calls": 0, "hits": 0, "discarded": 0, "failed": 0, "tokens": 0, "wasted_tokens": 0}
+
+	def submit(self, user: str, fn: Callable[[], Any]) -> bool:
+		"""Run `fn` in the background as `user`, unless speculation is off or the user is over budget."""
+		if not self.enabled:
+			return False
+		now = time.time()
+		with self._lock:
+			self._expire(now)
+			if self._spent_by(user, now) >= self.budget:
+				self._stats["skipped"] += 1
+				return False
+			self._stats["submitted"] += 1
+			if self._executor is None:
+				self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="speculation")
+			future = self._executor.submit(self._run, user, fn)
+			self._futures.add(future)
+		future.add_done_callback(self._done)
+		return True
+
+	def _run(self, user: str, fn: Callable[[], Any]) -> None:
+		self._local.user = user
+		try:
+			fn()
+		except Exception as e:
+			logger.warning(f"Speculative call failed: {e}")
+			with self._lock:
+				self._stats["failed"] += 1
+		finally:
+			self._local.user = None
+
+	def _done(self, future: Future) -> None:
+		with self._lock:
+			self._futures.discard(future)
+
+	def speculating(self) -> bool:
+		"""Whether the current thread is running a submitted callable."""
+		return getattr(self._local, "user", None) is not None
+
+	def run(self, key: str, prompt: str, fn: Callable[[], Any]) -> Any:
+		"""Make the call `fn` for `key` on a speculating thread, keeping its result for `take`."""
+		entry = _Entry(self._local.user)
+		with self._lock:
+			held = self._entries.get(key)
+			if held is None:
+				self._entries[key] = entry
+				self._stats["calls"] += 1
+		if held is not None:
+			# already speculated on: share that call rather than pay for it twice
+			held.event.wait()
+			return held.content
+		content = None
+		try:
+			content = fn()
+		finally:
+			now = time.time()
+			with self._lock:
+				if content is not None:
+					entry.content, entry.expires = content, now + self.ttl
+					entry.tokens = count_tokens(prompt) + count_tokens(content)
+				else:
+					# a failed call raised out of fn, leaving content None: nothing is kept
+					entry.tokens = count_tokens(prompt)
+					if self._entries.get(key) is entry:
+						del self._entries[key]
+				self._spent.setdefault(entry.user, deque()).append((now, entry.tokens))
+				self._stats["tokens"] += entry.tokens
+			entry.event.set()
+		return content
+
+	def take(self, key: str) -> Optional[Any]:
+		"""The speculative result for `key`, if there is one (waiting for it while it is being made)."""
+		with self._lock:
+			entry = self._entries.pop(key, None)
+		if entry is None:
+			return None
+		entry.event.wait()
+		if entry.content is None:
+			return None
+		with self._lock:
+			self._stats["hits"] += 1
+		return entry.content
+
+	def _expire(self, now: float) -> None:
+		for key, entry in list(self._entries.items()):
+			if entry.expires is not None and entry.expires <= now:
+				del self._entries[key]
+				self._stats["discarded"] += 1
+				self._stats["wasted_tokens"] += entry.tokens
+
+	def _spent_by(self, user: str, now: float) -> int:
+		spent = self._spent.get(user)
+		if not spent:
+			return 0
+		while spent and spent[0][0] <= now - self.window:
+			spent.popleft()
+		return sum(tokens for _, tokens in spent)
+
+	def join(self, timeout: Optional[float] = None) -> None:
+		"""Wait for the submitted callables to finish."""
+		with self._lock:
+			futures = set(self._futures)
+		wait(futures, timeout=timeout)
+
+	def stats(self) -> Dict[str, Any]:
+		"""Counters so far: hit_rate is the share of kept results that were taken rather than discarded."""
+		with self._lock:
+			self._expire(time.time())
+			settled = self._stats["hits"] + self._stats["discarded"]
+			return dict(
+				self._stats,
+				held=sum(entry.expires is not None for entry in self._entries.values()),
+				hit_rate=self._stats["hits"] / settled if settled else 0.0,
+			)
+
+_speculator: Optional[Speculator] = None
+_speculator_lock = threading.Lock()
+
+def get_speculator() -> Speculator:
+	"""The process-wide speculator used by LLMClient."""
+	global _speculator
+	with _speculator_lock:
+		if _speculator is None:
+			_speculator = Speculator()
+		return _speculator
@@ -0,0 +1,90 @@
+import re
+import math
+import heapq
+from collections import Counter
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# BM25 over a story's passages (section summaries, scenes, paragraphs), so prompts late in a
+# long book can carry the few earlier passages that matter to the instruction instead of all
+# of them. Kept in memory and updated passage by passage as the story is written.
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be been before but by can could did do does
+for from had has have he her hers him his how i if in into is it its me more my no not of
+on one or our out over she so some than that the their them then there these they this to
+up us was we were what when where which who will with would you your
+""".split())
+
+def tokenize(text: str) -> List[str]:
+	"""Lowercased words, without stopwords."""
+	return [word for word in WORD.findall(text.lower()) if word not in STOPWORDS]
+
+class StoryIndex:
+	"""
+	An inverted index of passages addressed by hashable keys. `add` replaces a passage,
+	`remove`/`remove_prefix` drop passages (by key, or every tuple key starting with a prefix),
+	and `search` ranks passages against a query by BM25. `version` is left to the owner to
+	tell whether the index still matches its source.
+	"""
+
+	def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+		self.k1, self.b = k1, b
+		self.postings: Dict[str, Dict[Hashable, int]] = {}
+		self.texts: Dict[Hashable, str] = {}
+		self.lengths: Dict[Hashable, int] = {}
+		self.total_length = 0
+		self.version = None
+
+	def __len__(self) -> int:
+		return len(self.texts)
+
+	def add(self, key: Hashable, text: str) -> None:
+		self.remove(key)
+		words = tokenize(text)
+		if not words:
+			return
+		for word, count in Counter(words).items():
+			self.postings.setdefault(word, {})[key] = count
+		self.texts[key] = text
+		self.lengths[key] = len(words)
+		self.total_length += len(words)
+
+	def add_all(self, passages: Iterable[Tuple[Hashable, str]]) -> None:
+		for key, text in passages:
+			self.add(key, text)
+
+	def remove(self, key: Hashable) -> None:
+		text = self.texts.pop(key, None)
+		if text is None:
+			return
+		self.total_length -= self.lengths.pop(key)
+		for word in set(tokenize(text)):
+			postings = self.postings[word]
+			del postings[key]
+			if not postings:
+				del self.postings[word]
+
+	def remove_prefix(self, prefix: Tuple) -> None:
+		for key in [key for key in self.texts if key[:len(prefix)] == prefix]:
+			self.remove(key)
+
+	def search(self, query: str, k: int = 5, keep: Optional[Callable[[Hashable], bool]] = None) -> List[Tuple[Hashable, float]]:
+		"""The `k` best (key, score) matches for `query`, best first, among the keys `keep` accepts."""
+		if not self.texts:
+			return []
+		count, average = len(self.texts), self.total_length / len(self.texts)
+		scores: Dict[Hashable, float] = {}
+		for word in set(tokenize(query)):
+			postings = self.postings.get(word)
+			if not postings:
+				continue
+			idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+			for key, frequency in postings.items():
+				norm = self.k1 * (1 - self.b + self.b * self.lengths[key] / average)
+				scores[key] = scores.get(key, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+		matches = scores.items() if keep is None else ((key, score) for key, score in scores.items() if keep(key))
+		return heapq.nlargest(k, matches, key=lambda match: match[1])
@@ -0,0 +1,520 @@
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from config import STORY_STORE_PATH
+from core.story_index import StoryIndex
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stories (
+	id TEXT PRIMARY KEY,
+	parameters TEXT NOT NULL DEFAULT '{}',
+	updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chapters (
+	story_id TEXT NOT NULL,
+	id TEXT NOT NULL,
+	position INTEGER NOT NULL,
+	title TEXT,
+	synopsis TEXT,
+	act,
+	PRIMARY KEY (story_id, id)
+);
+CREATE TABLE IF NOT EXISTS sections (
+	story_id TEXT NOT NULL,
+	chapter_id TEXT NOT NULL,
+	position INTEGER NOT NULL,
+	outline TEXT,
+	summary TEXT,
+	PRIMARY KEY (story_id, chapter_id, position)
+);
+CREATE TABLE IF NOT EXISTS scenes (
+	story_id TEXT NOT NULL,
+	chapter_id TEXT NOT NULL,
+	section INTEGER NOT NULL,
+	position INTEGER NOT NULL,
+	scene TEXT NOT NULL,
+	PRIMARY KEY (story_id, chapter_id, section, position)
+);
+CREATE TABLE IF NOT EXISTS paragraphs (
+	story_id TEXT NOT NULL,
+	chapter_id TEXT NOT NULL,
+	section INTEGER NOT NULL,
+	scene INTEGER NOT NULL,
+	position INTEGER NOT NULL,
+	text TEXT NOT NULL,
+	PRIMARY KEY (story_id, chapter_id, section, scene, position)
+);
+"""
+
+CHAPTER_FIELDS = ("title", "synopsis", "act")
+SECTION_FIELDS = ("outline", "summary")
+
+class StoryNotFound(KeyError):
+	pass
+
+def screenplay_text(scene: Optional[Dict[str, Any]]) -> str:
+	"""A scene as screenplay text, as the client's convertSceneToScreenplayText renders it for prompts."""
+	if not scene:
+		return ""
+	setting = scene.get("setting") or {}
+	lines = [
+		f"TITLE: {scene.get('title', '')}",
+		f"INT. {str(setting.get('location', '')).upper()} - {str(setting.get('time', '')).upper()}",
+		"",
+		setting.get("description", ""),
+		"",
+	]
+	for element in scene.get("elements", []):
+		kind = element.get("type")
+		if kind == "dialogue":
+			if element.get("character"):
+				lines.append(element["character"].upper())
+			if element.get("parenthetical"):
+				lines.append(f"({element['parenthetical']})")
+			lines.append(element.get("line", ""))
+		elif kind == "transition":
+			lines.append(str(element.get("description", "")).upper())
+		elif kind in ("action", "internal_monologue"):
+			lines.append(element.get("description", element.get("content", "")))
+		else:
+			continue
+		lines.append("")
+	return "\n".join(lines)
+
+class StoryStore:
+	"""
+	SQLite store of stories (parameters), chapters, sections (outline, summary), scenes and
+	paragraphs, so clients can send the pieces that changed plus a target instead of the
+	whole context on every call. One connection per thread; WAL lets workers read while
+	another writes.
+
+	Each story read for retrieval also gets an in-memory StoryIndex of its passages, tagged
+	with the story's updated_at: this process's writes update it in place, and a write from
+	another process (a different updated_at) has it rebuilt on the next search.
+	"""
+	def __init__(self, path: str = STORY_STORE_PATH):
+		self.path = path
+		self._local = threading.local()
+		self._indexes: Dict[str, StoryIndex] = {}
+		self._index_lock = threading.Lock()
+		with self._connect() as db:
+			db.executescript(SCHEMA)
+
+	def _connect(self) -> sqlite3.Connection:
+		db = getattr(self._local, "db", None)
+		if db is None:
+			db = sqlite3.connect(self.path, timeout=30)
+			db.row_factory = sqlite3.Row
+			db.execute("PRAGMA journal_mode=WAL")
+			db.execute("PRAGMA synchronous=NORMAL")
+			self._local.db = db
+		return db
+
+	def _touch(self, db: sqlite3.Connection, story_id: str, parameters: Optional[Dict[str, Any]] = None) -> float:
+		"""Mark a story updated (creating it when given its parameters); returns its new updated_at."""
+		now = time.time()
+		if parameters is not None:
+			db.execute(
+				"INSERT INTO stories (id, parameters, updated_at) VALUES (?, ?, ?) "
+				"ON CONFLICT(id) DO UPDATE SET parameters = excluded.parameters, updated_at = excluded.updated_at",
+				(story_id, json.dumps(parameters), now),
+			)
+		elif db.execute("UPDATE stories SET updated_at = ? WHERE id = ?", (now, story_id)).rowcount == 0:
+			raise StoryNotFound(story_id)
+		return now
+
+	def _updated_at(self, db: sqlite3.Connection, story_id: str) -> Optional[float]:
+		row = db.execute("SELECT updated_at FROM stories WHERE id = ?", (story_id,)).fetchone()
+		return row["updated_at"] if row else None
+
+	def replace_story(self, story_id: str, story: Dict[str, Any]) -> None:
+		"""
+		Store a whole story in the client's shape: {"parameters", "chapters": [{"id", "title",
+		"synopsis", "act", "sections": [{"outline", "summary", "scenes": [{..., "paragraphs"}]}]}]}.
+		Raises ValueError for anything of another shape.
+		"""
+		if not isinstance(story, dict):
+			raise ValueError("A story must be an object")
+		for chapter in _records(story, "chapters"):
+			for section in _records(chapter, "sections"):
+				_records(section, "scenes")
+		with self._connect() as db:
+			for table in ("chapters", "sections", "scenes", "paragraphs"):
+				db.execute(f"DELETE FROM {table} WHERE story_id = ?", (story_id,))
+			self._touch(db, story_id, story.get("parameters") or {})
+			for position, chapter in enumerate(story.get("chapters") or []):
+				chapter_id = str(chapter["id"])
+				self._put_chapter(db, story_id, dict(chapter, id=chapter_id, position=position))
+				for index, section in enumerate(chapter.get("sections") or []):
+					self._put_section(db, story_id, dict(section, chapter_id=chapter_id, index=index))
+					for scene_index, scene in enumerate(section.get("scenes") or []):
+						self._put_scene(db, story_id, {"chapter_id": chapter_id, "section": index, "index": scene_index, "scene": scene})
+		with self._index_lock:
+			self._indexes.pop(story_id, None)
+
+	def apply(self, story_id: str, delta: Dict[str, Any]) -> None:
+		"""
+		Apply the changed pieces of a story: "parameters" replaces the story parameters, and
+		"chapters", "sections", "scenes" and "paragraphs" are lists of records addressed by
+		chapter id and positions. Records only update the fields they carry; {"deleted": true}
+		removes a record and everything under it. Raises ValueError for a delta of another shape.
+		"""
+		if not isinstance(delta, dict):
+			raise ValueError("A delta must be an object")
+		for key in ("chapters", "sections", "scenes", "paragraphs"):
+			_records(delta, key)
+		changed: List[Tuple] = []
+		with self._connect() as db:
+			# take the write lock first, so the updated_at read here is the one this write replaces
+			db.execute("BEGIN IMMEDIATE")
+			previous = self._updated_at(db, story_id)
+			updated = self._touch(db, story_id, delta.get("parameters"))
+			for chapter in delta.get("chapters") or []:
+				self._put_chapter(db, story_id, dict(chapter, id=str(chapter["id"])))
+				if chapter.get("deleted"):
+					changed.append((str(chapter["id"]),))
+			for section in delta.get("sections") or []:
+				self._put_section(db, story_id, dict(section, chapter_id=str(section["chapter_id"])))
+				changed.append((str(section["chapter_id"]), section["index"]))
+			for scene in delta.get("scenes") or []:
+				self._put_scene(db, story_id, dict(scene, chapter_id=str(scene["chapter_id"])))
+				changed.append((str(scene["chapter_id"]), scene["section"], scene["index"]))
+			for paragraph in delta.get("paragraphs") or []:
+				self._put_paragraph(db, story_id, dict(paragraph, chapter_id=str(paragraph["chapter_id"])))
+				changed.append((str(paragraph["chapter_id"]), paragraph["section"], paragraph["scene"], paragraph["index"]))
+		self._reindex(story_id, previous, updated, changed)
+
+	def _put_chapter(self, db, story_id: str, chapter: Dict[str, Any]) -> None:
+		key = (story_id, chapter["id"])
+		if chapter.get("deleted"):
+			for table in ("sections", "scenes", "paragraphs"):
+				db.execute(f"DELETE FROM {table} WHERE story_id = ? AND chapter_id = ?", key)
+			db.execute("DELETE FROM chapters WHERE story_id = ? AND id = ?", key)
+			return
+		row = db.execute("SELECT * FROM chapters WHERE story_id = ? AND id = ?", key).fetchone()
+		position = chapter.get("position")
+		if position is None:
+			position = row["position"] if row else db.execute("SELECT COUNT(*) FROM chapters WHERE story_id = ?", (story_id,)).fetchone()[0]
+		fields = [chapter.get(field, row[field] if row else None) for field in CHAPTER_FIELDS]
+		db.execute("INSERT OR REPLACE INTO chapters VALUES (?, ?, ?, ?, ?, ?)", key + (position, *fields))
+
+	def _put_section(self, db, story_id: str, section: Dict[str, Any]) -> None:
+		key = (story_id, section["chapter_id"], section["index"])
+		if section.get("deleted"):
+			for table in ("scenes", "paragraphs"):
+				db.execute(f"DELETE FROM {table} WHERE story_id = ? AND chapter_id = ? AND section = ?", key)
+			db.execute("DELETE FROM sections WHERE story_id = ? AND chapter_id = ? AND position = ?", key)
+			return
+		row = db.execute("SELECT * FROM sections WHERE story_id = ? AND chapter_id = ? AND position = ?", key).fetchone()
+		fields = [section.get(field, row[field] if row else None) for field in SECTION_FIELDS]
+		db.execute("INSERT OR REPLACE INTO sections VALUES (?, ?, ?, ?, ?)", key + tuple(fields))
+
+	def _put_scene(self, db, story_id: str, scene: Dict[str, Any]) -> None:
+		key = (story_id, scene["chapter_id"], scene["section"], scene["index"])
+		db.execute("DELETE FROM paragraphs WHERE story_id = ? AND chapter_id = ? AND section = ? AND scene = ?", key)
+		if scene.get("deleted"):
+			db.execute("DELETE FROM scenes WHERE story_id = ? AND chapter_id = ? AND section = ? AND position = ?", key)
+			return
+		body = dict(scene["scene"])
+		paragraphs = body.pop("paragraphs", None) or []
+		db.execute("INSERT OR REPLACE INTO scenes VALUES (?, ?, ?, ?, ?)", key + (json.dumps(body),))
+		db.executemany(
+			"INSERT INTO paragraphs VALUES (?, ?, ?, ?, ?, ?)",
+			[key + (position, text) for position, text in enumerate(paragraphs)],
+		)
+
+	def _put_paragraph(self, db, story_id: str, paragraph: Dict[str, Any]) -> None:
+		key = (story_id, paragraph["chapter_id"], paragraph["section"], paragraph["scene"], paragraph["index"])
+		if paragraph.get("deleted"):
+			db.execute("DELETE FROM paragraphs WHERE story_id = ? AND chapter_id = ? AND section = ? AND scene = ? AND position = ?", key)
+		else:
+			db.execute("INSERT OR REPLACE INTO paragraphs VALUES (?, ?, ?, ?, ?, ?)", key + (paragraph["text"],))
+
+	def _reindex(self, story_id: str, previous: Optional[float], updated: float, changed: List[Tuple]) -> None:
+		"""Bring a story's index up to date with a write that replaced updated_at `previous` with `updated`."""
+		with self._index_lock:
+			index = self._indexes.get(story_id)
+			if index is None:
+				return
+			if index.version != previous:
+				# the index had already missed another process's write
+				del self._indexes[story_id]
+				return
+			db = self._connect()
+			for prefix in changed:
+				index.remove_prefix(prefix)
+				index.add_all(_passages(db, story_id, prefix))
+			index.version = updated
+
+	def index(self, story_id: str) -> StoryIndex:
+		"""The story's passage index, built or rebuilt if the story changed since it was last brought up to date."""
+		db = self._connect()
+		updated = self._updated_at(db, story_id)
+		if updated is None:
+			raise StoryNotFound(story_id)
+		with self._index_lock:
+			index = self._indexes.get(story_id)
+			if index is None or index.version != updated:
+				index = StoryIndex()
+				index.add_all(_passages(db, story_id))
+				index.version = updated
+				self._indexes[story_id] = index
+			return index
+
+	def related_passages(self, story_id: str, query: str, target: Dict[str, Any], k: int = 5) -> List[str]:
+		"""
+		The `k` passages written before `target` ({"chapter_id", "section"}: earlier chapters and
+		the chapter's earlier sections) that best match `query`, best first, each labelled with
+		where it comes from.
+		"""
+		chapters = {chapter["id"]: (position, chapter) for position, chapter in enumerate(self.chapters(story_id))}
+		chapter_id, section = str(target["chapter_id"]), target.get("section", 0)
+		if chapter_id not in chapters:
+			return []
+		position = chapters[chapter_id][0]
+
+		def earlier(key) -> bool:
+			if key[0] == chapter_id:
+				return key[1] < section
+			return key[0] in chapters and chapters[key[0]][0] < position
+
+		index, passages = self.index(story_id), []
+		for key, _ in index.search(query, k, keep=earlier):
+			title = chapters[key[0]][1].get("title") or key[0]
+			where = f"Chapter {title!r}, section {key[1] + 1}"
+			if key[2] is None:
+				where += " summary"
+			elif key[3] is None:
+				where += f", scene {key[2] + 1}"
+			passages.append(f"[{where}] {index.texts[key]}")
+		return passages
+
+	def parameters(self, story_id: str) -> Dict[str, Any]:
+		row = self._connect().execute("SELECT parameters FROM stories WHERE id = ?", (story_id,)).fetchone()
+		if row is None:
+			raise StoryNotFound(story_id)
+		return json.loads(row["parameters"])
+
+	def chapters(self, story_id: str) -> List[Dict[str, Any]]:
+		"""Chapter records (id, title, synopsis, act) in story order, without their sections."""
+		rows = self._connect().execute("SELECT * FROM chapters WHERE story_id = ? ORDER BY position", (story_id,))
+		return [{"id": row["id"], **{field: row[field] for field in CHAPTER_FIELDS}} for row in rows]
+
+	def chapter_record(self, story_id: str, chapter_id: str) -> Dict[str, Any]:
+		"""A chapter's id, title, synopsis and act."""
+		row = self._connect().execute("SELECT * FROM chapters WHERE story_id = ? AND id = ?", (story_id, str(chapter_id))).fetchone()
+		if row is None:
+			raise StoryNotFound(f"{story_id}/{chapter_id}")
+		return {"id": row["id"], **{field: row[field] for field in CHAPTER_FIELDS}}
+
+	def sections(
+		self,
+		story_id: str,
+		chapter_id: str,
+		positions: Optional[List[int]] = None,
+		scenes: bool = True,
+	) -> Dict[int, Dict[str, Any]]:
+		"""
+		A chapter's sections by position, limited to `positions` when given, with their scenes
+		and paragraphs unless `scenes` is false. Context builders only read the sections they need.
+		"""
+		db = self._connect()
+		key = (story_id, str(chapter_id))
+		where = "story_id = ? AND chapter_id = ?"
+		if positions is not None:
+			positions = [position for position in positions if position >= 0]
+			if not positions:
+				return {}
+			where += " AND {column} IN (" + ", ".join("?" * len(positions)) + ")"
+			key += tuple(positions)
+		sections = {
+			r["position"]: {"outline": r["outline"], "summary": r["summary"], "scenes": []}
+			for r in db.execute(f"SELECT * FROM sections WHERE {where.format(column='position')} ORDER BY position", key)
+		}
+		if not scenes:
+			return sections
+		loaded = {}
+		for r in db.execute(f"SELECT * FROM scenes WHERE {where.format(column='section')} ORDER BY section, position", key):
+			scene = dict(json.loads(r["scene"]), paragraphs=[])
+			sections.setdefault(r["section"], {"outline": None, "summary": None, "scenes": []})["scenes"].append(scene)
+			loaded[(r["section"], r["position"])] = scene
+		for r in db.execute(f"SELECT * FROM paragraphs WHERE {where.format(column='section')} ORDER BY section, scene, position", key):
+			if (r["section"], r["scene"]) in loaded:
+				loaded[(r["section"], r["scene"])]["paragraphs"].append(r["text"])
+		return sections
+
+	def chapter(self, story_id: str, chapter_id: str) -> Dict[str, Any]:
+		"""One chapter with its sections, scenes and paragraphs, in the client's shape."""
+		chapter = self.chapter_record(story_id, chapter_id)
+		sections = self.sections(story_id, chapter_id)
+		return dict(chapter, sections=[sections[position] for position in sorted(sections)])
+
+	def story(self, story_id: str) -> Dict[str, Any]:
+		return {
+			"id": story_id,
+			"parameters": self.parameters(story_id),
+			"chapters": [self.chapter(story_id, chapter["id"]) for chapter in self.chapters(story_id)],
+		}
+
+	def resolve(self, story_id: str, route: str, body: Dict[str, Any]) -> Dict[str, Any]:
+		"""
+		Turn a story request ({"delta", "target", ...rest}) for an /api/v1 route into the body
+		that route takes: apply the delta, then assemble the context the client would have sent
+		for `target` ({"chapter_id", "section", "scene", "paragraph"}).
+		"""
+		build = CONTEXT_BUILDERS.get(route)
+		if build is None:
+			raise ValueError(f"No story variant of {route}")
+		if body.get("delta"):
+			self.apply(story_id, body["delta"])
+		request = {key: value for key, value in body.items() if key not in ("delta", "target")}
+		return build(self, story_id, body.get("target") or {}, request)
+
+def _records(container: Dict[str, Any], key: str) -> List[Dict[str, Any]]:
+	"""The list of records under `key`, or a ValueError when it is not a list of objects."""
+	records = container.get(key) or []
+	if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+		raise ValueError(f'"{key}" must be a list of objects')
+	return records
+
+def _passages(db: sqlite3.Connection, story_id: str, prefix: Tuple = ()) -> Iterator[Tuple[Tuple, str]]:
+	"""
+	The story's passages under `prefix`, keyed (chapter_id, section, scene, paragraph) with None
+	for the levels a passage is above: section summaries, scenes as screenplay text, paragraphs.
+	"""
+	def query(table: str, columns: Tuple[str, ...]) -> List[sqlite3.Row]:
+		where = " AND ".join(f"{column} = ?" for column in ("story_id",) + columns[:len(prefix)])
+		return db.execute(f"SELECT * FROM {table} WHERE {where}", (story_id,) + tuple(prefix)).fetchall()
+
+	if len(prefix) <= 2:
+		for row in query("sections", ("chapter_id", "position")):
+			if row["summary"]:
+				yield (row["chapter_id"], row["position"], None, None), row["summary"]
+	if len(prefix) <= 3:
+		for row in query("scenes", ("chapter_id", "section", "position")):
+			yield (row["chapter_id"], row["section"], row["position"], None), screenplay_text(json.loads(row["scene"]))
+	for row in query("paragraphs", ("chapter_id", "section", "scene", "position")):
+		yield (row["chapter_id"], row["section"], row["scene"], row["position"]), row["text"]
+
+def _section_paragraphs(section: Dict[str, Any]) -> List[str]:
+	return [paragraph for scene in section["scenes"] for paragraph in scene.get("paragraphs", [])]
+
+EMPTY_SECTION = {"outline": "", "summary": "", "scenes": []}
+
+def _chapter_context(store: StoryStore, story_id: str, target: Dict[str, Any], previous_scenes: bool = False):
+	"""The chapter record, the base context, the target section and the previous section (scenes only if asked for)."""
+	parameters = store.parameters(story_id)
+	chapter = store.chapter_record(story_id, target["chapter_id"])
+	index = target.get("section", 0)
+	# "story" lets WritingService retrieve earlier passages for the target
+	base = {"parameters": parameters, "synopsis": chapter.get("synopsis") or "", "story": {"id": story_id, "chapter_id": chapter["id"], "section": index}}
+	section = store.sections(story_id, chapter["id"], [index]).get(index, EMPTY_SECTION)
+	previous = store.sections(story_id, chapter["id"], [index - 1], scenes=previous_scenes).get(index - 1, EMPTY_SECTION)
+	return chapter, base, section, previous
+
+def _target_scene(section: Dict[str, Any], target: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+	scenes = section["scenes"]
+	index = target.get("scene")
+	return scenes[index] if index is not None and index < len(scenes) else None
+
+def _new_scene(store, story_id, target, request):
+	_, base, section, previous_section = _chapter_context(store, story_id, target)
+	previous = section["scenes"][-1] if section["scenes"] else None
+	context = dict(base, overall_outline=section.get("outline") or "", previous_summary=previous_section.get("summary") or "", previous_screenplay=screenplay_text(previous))
+	return dict(request, context=dict(context, **request.get("context", {})))
+
+def _current_scene(store, story_id, target, request):
+	_, base, section, previous_section = _chapter_context(store, story_id, target)
+	scene = _target_scene(section, target)
+	if request.get("mode") == "patch" and scene:
+		# patch rewrites address the scene's elements, so they get the scene itself
+		current = {key: value for key, value in scene.items() if key != "paragraphs"}
+	else:
+		current = screenplay_text(scene)
+	context = dict(base, current_screenplay=current, previous_summary=previous_section.get("summary") or "")
+	return dict(request, context=dict(context, **request.get("context", {})))
+
+def _inserted_scene(store, story_id, target, request):
+	_, base, _, _ = _chapter_context(store, story_id, target)
+	return dict(request, context=dict(base, **request.get("context", {})))
+
+def _new_paragraphs(store, story_id, target, request):
+	_, base, section, _ = _chapter_context(store, story_id, target)
+	context = dict(base, current_screenplay=screenplay_text(_target_scene(section, target)))
+	return dict(request, context=dict(context, **request.get("context", {})))
+
+def _paragraph_neighbours(store, story_id, target):
+	index = target.get("paragraph", 0)
+	_, base, section, previous_section = _chapter_context(store, story_id, target, previous_scenes=index == 0)
+	paragraphs = _section_paragraphs(section)
+	if index > 0:
+		previous = paragraphs[index - 1] if index - 1 < len(paragraphs) else None
+	else:
+		earlier = _section_paragraphs(previous_section)
+		previous = earlier[-1] if earlier else None
+	current = paragraphs[index] if index < len(paragraphs) else None
+	following = paragraphs[index + 1] if index + 1 < len(paragraphs) else None
+	return base, previous, current, following
+
+def _rewrite_paragraphs(store, story_id, target, request):
+	base, previous, current, following = _paragraph_neighbours(store, story_id, target)
+	context = dict(base, previous_paragraph=previous, next_paragraph=following, paragraph=current)
+	return dict(request, context=dict(context, **request.get("context", {})))
+
+def _insert_paragraphs(store, story_id, target, request):
+	base, _, current, following = _paragraph_neighbours(store, story_id, target)
+	context = dict(base, prev=current, next=following)
+	return dict(request, context=dict(context, **request.get("context", {})))
+
+def _outlines(store, story_id, target, request):
+	parameters = store.parameters(story_id)
+	chapter = store.chapter_record(story_id, target["chapter_id"])
+	base = {"parameters": parameters, "synopsis": chapter.get("synopsis") or ""}
+	sections = store.sections(story_id, chapter["id"], scenes=False)
+	sections = [sections[position] for position in sorted(sections)]
+	context = dict(
+		base,
+		chapter_synopsis=chapter.get("synopsis") or "",
+		previous_outlines=[section.get("outline") for section in sections],
+		previous_summaries=[section["summary"] for section in sections if section.get("summary") is not None],
+	)
+	return dict(request, context=dict(context, **request.get("context", {})))
+
+def _summary(store, story_id, target, request):
+	_, base, section, previous_section = _chapter_context(store, story_id, target)
+	context = dict(base, paragraphs=_section_paragraphs(section), previous_summary=previous_section.get("summary") or None)
+	return dict(request, context=dict(context, **request.get("context", {})))
+
+def _chapter_suggestions(store, story_id, target, request):
+	return dict(request, chapters=store.chapters(story_id), parameters=store.parameters(story_id))
+
+def _parameter_suggestions(store, story_id, target, request):
+	return dict(request, context=dict(store.parameters(story_id), **request.get("context", {})))
+
+# /api/v1 route -> builder of that route's request body from the stored story
+CONTEXT_BUILDERS: Dict[str, Callable[[StoryStore, str, Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = {
+	"/parameters/suggestions": _parameter_suggestions,
+	"/chapters/suggestions": _chapter_suggestions,
+	"/chapters/outlines": _outlines,
+	"/chapters/summary": _summary,
+	"/chapters/scene/new": _new_scene,
+	"/chapters/scene/rewrite": _current_scene,
+	"/chapters/scene/continue": _current_scene,
+	"/chapters/scene/insert": _inserted_scene,
+	"/chapters/scene/paragraph/new": _new_paragraphs,
+	"/chapters/scene/paragraph/rewrite": _rewrite_paragraphs,
+	"/chapters/scene/paragraph/insert": _insert_paragraphs,
+}
+
+_store: Optional[StoryStore] = None
+_store_lock = threading.Lock()
+
+def get_story_store() -> StoryStore:
+	"""The process-wide story store at STORY_STORE_PATH."""
+	global _store
+	with _store_lock:
+		if _store is None:
+			_store = StoryStore()
+		return _store
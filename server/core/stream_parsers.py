@@ -0,0 +1,335 @@
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from core.utils import clean_json_string
+
+# Characters that can change the tokenizer state; everything else is skipped in C via finditer.
+_STRUCTURAL = re.compile(r'[{}\[\]":,\\]')
+
+Event = Tuple[str, Any]
+
+class _Frame:
+	__slots__ = ("kind", "start", "key", "is_item", "in_item", "has_child", "expect_key", "pending_key", "is_meta", "index", "array_key", "count")
+
+	def __init__(self, kind: str, start: int, parent: Optional["_Frame"], is_root_child: bool):
+		self.kind = kind
+		self.start = start
+		self.key = parent.pending_key if parent is not None and parent.kind == "{" else None
+		self.is_item = parent is not None and parent.kind == "["
+		self.in_item = parent is not None and (parent.is_item or parent.in_item)
+		self.has_child = False
+		self.expect_key = kind == "{"
+		self.pending_key = None
+		self.is_meta = kind == "{" and is_root_child and self.key == "meta"
+		self.count = 0
+		if self.is_item:
+			self.index = parent.count
+			self.array_key = parent.key
+			parent.count += 1
+		else:
+			self.index = None
+			self.array_key = None
+
+	def is_candidate(self) -> bool:
+		"""Whether this frame may still be emitted when it closes, so its text has to be kept."""
+		if self.kind != "{" or self.in_item:
+			return False
+		return self.is_item or self.is_meta or not self.has_child
+
+class JsonStreamParser:
+	"""
+	Incremental tokenizer for streamed JSON model output.
+
+	Each delta is scanned once, tracking nesting depth and string/escape state, and only the
+	text of objects that may still be emitted is buffered. Emits ("object", value) for every
+	outermost array item (scene `elements`, `characters`, rewrite actions) and for every
+	object without nested containers outside of one (the `meta` title/setting/notes), plus
+	("meta", value) once the top-level `meta` object closes.
+
+	With `partial_key` set (e.g. "elements"), string values of that array's items are also
+	surfaced while they are being generated as ("partial", {"index", "field", "text"}), and
+	the items themselves close as ("complete", {"index", "value"}).
+	"""
+	def __init__(self, partial_key: Optional[str] = None):
+		self.partial_key = partial_key
+		self._stack: List[_Frame] = []
+		self._buffer = ""
+		self._buffer_start = 0
+		self._offset = 0
+		self._in_string = False
+		self._escape_at = -1
+		self._key_start: Optional[int] = None
+		self._partial: Optional[List[Any]] = None
+		self._emitted = False
+		self._raw: List[str] = []
+
+	def feed(self, text: str) -> List[Event]:
+		events: List[Event] = []
+		base = self._offset
+		self._buffer += text
+		self._offset += len(text)
+		if not self._emitted:
+			self._raw.append(text)
+
+		stack = self._stack
+		for match in _STRUCTURAL.finditer(text):
+			pos = base + match.start()
+			c = match.group()
+			if pos == self._escape_at:
+				continue
+
+			if self._in_string:
+				if c == "\\":
+					self._escape_at = pos + 1
+				elif c == '"':
+					self._in_string = False
+					if self._key_start is not None:
+						stack[-1].pending_key = self._slice(self._key_start + 1, pos)
+						self._key_start = None
+					elif self._partial is not None:
+						self._flush_partial(pos, events)
+						self._partial = None
+				continue
+
+			if not stack:
+				if c == "{" or c == "[":
+					stack.append(_Frame(c, pos, None, False))
+				continue
+
+			top = stack[-1]
+			if c == '"':
+				self._in_string = True
+				if top.expect_key:
+					self._key_start = pos
+				elif self.partial_key is not None and top.is_item and not top.in_item and top.array_key == self.partial_key:
+					# [index, field, absolute position of the first character not yet surfaced]
+					self._partial = [top.index, top.pending_key, pos + 1]
+			elif c == "{" or c == "[":
+				top.has_child = True
+				stack.append(_Frame(c, pos, top, len(stack) == 1 and top.kind == "{"))
+			elif c == "}" or c == "]":
+				stack.pop()
+				if c == "}":
+					self._close_object(top, pos, events)
+			elif c == ":":
+				top.expect_key = False
+			elif c == ",":
+				if top.kind == "{":
+					top.expect_key = True
+					top.pending_key = None
+
+		if self._partial is not None:
+			self._flush_partial(self._offset, events)
+		self._trim()
+		return events
+
+	def close(self) -> List[Event]:
+		"""
+		Finish the stream. If nothing was emitted (e.g. a top-level array of strings),
+		fall back to parsing the whole output in one go.
+		"""
+		events: List[Event] = []
+		if not self._emitted and self._raw:
+			try:
+				events.append(("object", json.loads(clean_json_string("".join(self._raw)))))
+			except json.JSONDecodeError:
+				pass
+		self._raw = []
+		self._buffer = ""
+		return events
+
+	def _close_object(self, frame: _Frame, end: int, events: List[Event]) -> None:
+		if not frame.is_candidate():
+			return
+		try:
+			value = json.loads(self._slice(frame.start, end + 1))
+		except json.JSONDecodeError:
+			return
+		if frame.is_item and self.partial_key is not None and frame.array_key == self.partial_key:
+			events.append(("complete", {"index": frame.index, "value": value}))
+		elif frame.is_item or not frame.has_child:
+			events.append(("object", value))
+		if frame.is_meta:
+			events.append(("meta", value))
+		if not self._emitted:
+			self._emitted = True
+			self._raw = []
+
+	def _flush_partial(self, end: int, events: List[Event]) -> None:
+		index, field, start = self._partial
+		raw = self._slice(start, end)
+		if end == self._offset:
+			raw = raw[:_complete_escapes_length(raw)]
+		if not raw:
+			return
+		try:
+			text = json.loads('"' + raw + '"', strict=False)
+		except json.JSONDecodeError:
+			return
+		self._partial[2] = start + len(raw)
+		events.append(("partial", {"index": index, "field": field, "text": text}))
+
+	def _slice(self, start: int, end: int) -> str:
+		return self._buffer[start - self._buffer_start:end - self._buffer_start]
+
+	def _trim(self) -> None:
+		keep = self._offset
+		for frame in self._stack:
+			if frame.is_candidate():
+				keep = frame.start
+				break
+		if self._key_start is not None:
+			keep = min(keep, self._key_start)
+		if keep > self._buffer_start:
+			self._buffer = self._buffer[keep - self._buffer_start:]
+			self._buffer_start = keep
+
+def _complete_escapes_length(raw: str) -> int:
+	"""Length of the prefix of a raw JSON string body that does not end inside an escape sequence."""
+	backslash = raw.rfind("\\", max(0, len(raw) - 6))
+	if backslash == -1:
+		return len(raw)
+	run_start = backslash
+	while run_start > 0 and raw[run_start - 1] == "\\":
+		run_start -= 1
+	if (backslash - run_start) % 2:
+		# the last backslash is itself escaped
+		return len(raw)
+	escape_length = 6 if raw[backslash + 1:backslash + 2] == "u" else 2
+	return backslash if len(raw) - backslash < escape_length else len(raw)
+
+_TERMINATORS = ".!?"
+_CLOSERS = "\"'\u201d\u2019)]"
+_ABBREVIATIONS = frozenset((
+	"mr", "mrs", "ms", "dr", "st", "jr", "sr", "prof", "rev", "gen", "col", "lt", "capt", "sgt",
+	"mt", "vs", "etc", "e.g", "i.e", "fig", "ave", "approx",
+))
+# abbreviations only before a number ("No. 5"), since they are also words ("She said no.")
+_NUMBER_ABBREVIATIONS = frozenset(("no",))
+
+_SENTENCE_END = re.compile(r'[.!?\n]')
+
+# SentenceSegmenter states
+_IN_TEXT, _AFTER_TERMINATOR, _AFTER_SPACE = range(3)
+
+class SentenceSegmenter:
+	"""
+	Streaming sentence and paragraph segmenter for prose output.
+
+	Each character is looked at once, and runs of plain text are skipped with a regex. A
+	sentence ends at `.`, `!` or `?` (plus any closing quotes or brackets) followed by
+	whitespace and a character that is not lowercase, so `"Stop!" she said.` and `Mr. Hale`
+	stay whole (as does `No. 5`, but not `She said no. Then`); a blank line ends the paragraph. Emits ("sentence", text) and
+	("paragraph_break", None).
+	"""
+	def __init__(self):
+		self._text = ""
+		self._state = _IN_TEXT
+		self._boundary = 0
+		self._newlines = 0
+		self._paragraph_has_text = False
+
+	def feed(self, chunk: str) -> List[Event]:
+		events: List[Event] = []
+		# keep the only reference local so `text += c` can grow in place
+		text, self._text = self._text, ""
+		state = self._state
+
+		i, n = 0, len(chunk)
+		while i < n:
+			if state == _IN_TEXT:
+				# jump straight to the next character that can end a sentence or a paragraph
+				match = _SENTENCE_END.search(chunk, i)
+				end = match.start() if match else n
+				if end > i:
+					run = chunk[i:end]
+					if self._newlines and not run.isspace():
+						self._newlines = 0
+					text += run
+					i = end
+					if i == n:
+						break
+			c = chunk[i]
+			i += 1
+
+			if c == "\n":
+				self._newlines += 1
+				if self._newlines == 2:
+					sentence = text.strip()
+					if sentence:
+						events.append(("sentence", sentence))
+						self._paragraph_has_text = True
+					if self._paragraph_has_text:
+						events.append(("paragraph_break", None))
+						self._paragraph_has_text = False
+					text = ""
+					state = _IN_TEXT
+				elif state == _AFTER_TERMINATOR:
+					state = _AFTER_SPACE
+					self._boundary = len(text)
+				text += c
+				continue
+
+			if c.isspace():
+				if state == _AFTER_TERMINATOR:
+					state = _AFTER_SPACE
+					self._boundary = len(text)
+				text += c
+				continue
+
+			self._newlines = 0
+			if state == _AFTER_SPACE:
+				if not c.islower() and not (c.isdigit() and _abbreviated_word(text[:self._boundary]).lower() in _NUMBER_ABBREVIATIONS):
+					sentence = text[:self._boundary].strip()
+					if sentence:
+						events.append(("sentence", sentence))
+						self._paragraph_has_text = True
+					text = ""
+				state = _IN_TEXT
+			elif state == _AFTER_TERMINATOR and c not in _CLOSERS and c not in _TERMINATORS:
+				state = _IN_TEXT
+
+			text += c
+			if c in _TERMINATORS and (c != "." or not _ends_with_abbreviation(text)):
+				state = _AFTER_TERMINATOR
+
+		self._text = text
+		self._state = state
+		return events
+
+	def close(self) -> List[Event]:
+		sentence = self._text.strip()
+		self._text = ""
+		self._state = _IN_TEXT
+		return [("sentence", sentence)] if sentence else []
+
+def _abbreviated_word(text: str) -> str:
+	"""The word (dots included) before the `.` that ends `text`."""
+	start = len(text) - 1
+	while start > 0 and len(text) - start < 8 and (text[start - 1].isalpha() or text[start - 1] == "."):
+		start -= 1
+	return text[start:-1]
+
+def _ends_with_abbreviation(text: str) -> bool:
+	"""Whether the `.` that ends `text` closes an abbreviation or an initial rather than a sentence."""
+	word = _abbreviated_word(text)
+	# "I" is a word far more often than an initial
+	if len(word) == 1 and word.isupper() and word != "I":
+		return True
+	return word.lower() in _ABBREVIATIONS
+
+def to_stream_chunk(event: Event) -> Dict[str, Any]:
+	"""Map a parser event onto the NDJSON payload the client consumes."""
+	kind, value = event
+	if kind == "sentence":
+		return {"chunk": value}
+	if kind == "paragraph_break":
+		# the literal marker keeps clients that still split chunks on "\\n\\n" working
+		return {"chunk": "\\n\\n", "paragraph_break": True}
+	if kind == "meta":
+		return {"meta": value}
+	if kind == "partial":
+		return {"partial": value}
+	if kind == "complete":
+		return {"chunk": json.dumps(value["value"]), "index": value["index"], "complete": True}
+	return {"chunk": json.dumps(value)}
@@ -0,0 +1,33 @@
+import math
+import logging
+from functools import lru_cache
+from config import LLM_TOKENIZER_ENCODING
+
+try:
+	import tiktoken
+	TIKTOKEN_AVAILABLE = True
+except ImportError:
+	TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Without tiktoken, English prose and JSON average about four characters per token
+CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=None)
+def _encoding():
+	if not TIKTOKEN_AVAILABLE:
+		return None
+	try:
+		return tiktoken.get_encoding(LLM_TOKENIZER_ENCODING)
+	except Exception as e:
+		# unknown encoding, or the BPE file could not be downloaded
+		logger.warning(f"tiktoken encoding {LLM_TOKENIZER_ENCODING} unavailable, estimating tokens from length: {e}")
+		return None
+
+def count_tokens(text: str) -> int:
+	"""Tokens in `text` for the configured encoding, or an estimate from its length when tiktoken is not installed."""
+	encoding = _encoding()
+	if encoding is not None:
+		return len(encoding.encode(text, disallowed_special=()))
+	return math.ceil(len(text) / CHARS_PER_TOKEN)
@@ -0,0 +1,139 @@
+import os
+import asyncio
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+import httpx
+from openai import DEFAULT_MAX_RETRIES, OpenAI, AsyncOpenAI
+from config import (
+	LLM_MAX_CONNECTIONS,
+	LLM_MAX_KEEPALIVE_CONNECTIONS,
+	LLM_KEEPALIVE_EXPIRY,
+	LLM_HTTP2,
+	LLM_CONNECT_TIMEOUT,
+	LLM_TIMEOUT,
+	LLM_PREWARM_CONNECTIONS,
+)
+from core.rate_limit import limiter_for_url
+
+try:
+	import h2  # noqa: F401
+	HTTP2_AVAILABLE = True
+except ImportError:
+	HTTP2_AVAILABLE = False
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+logger = logging.getLogger(__name__)
+
+# One pool per process, shared by every provider client; httpx keys connections by origin.
+_lock = threading.Lock()
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+_stats = {"connections_opened": 0, "tls_handshakes": 0}
+
+def _count_connection(event_name: str, info: Dict[str, Any]) -> None:
+	if event_name == "connection.connect_tcp.complete":
+		_stats["connections_opened"] += 1
+	elif event_name == "connection.start_tls.complete":
+		_stats["tls_handshakes"] += 1
+
+async def _acount_connection(event_name: str, info: Dict[str, Any]) -> None:
+	_count_connection(event_name, info)
+
+def _trace_request(request: httpx.Request) -> None:
+	request.extensions["trace"] = _count_connection
+
+async def _atrace_request(request: httpx.Request) -> None:
+	request.extensions["trace"] = _acount_connection
+
+def _observe_response(response: httpx.Response) -> None:
+	# provider rate-limit headers and 429s adapt the limit shared by the host's workers
+	try:
+		limiter_for_url(str(response.request.url)).observe(response.status_code, response.headers)
+	except sqlite3.Error as e:
+		logger.warning(f"Could not record rate-limit headers: {e}")
+
+async def _aobserve_response(response: httpx.Response) -> None:
+	# off the event loop: the write may wait for the lock another worker holds
+	await asyncio.to_thread(_observe_response, response)
+
+def _client_options() -> Dict[str, Any]:
+	return {
+		"limits": httpx.Limits(
+			max_connections=LLM_MAX_CONNECTIONS,
+			max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+			keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+		),
+		"timeout": httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+		"http2": LLM_HTTP2 and HTTP2_AVAILABLE,
+	}
+
+def get_http_client() -> httpx.Client:
+	"""The process-wide pooled client for synchronous provider calls."""
+	global _http_client
+	with _lock:
+		if _http_client is None or _http_client.is_closed:
+			_http_client = httpx.Client(event_hooks={"request": [_trace_request], "response": [_observe_response]}, **_client_options())
+		return _http_client
+
+def get_async_http_client() -> httpx.AsyncClient:
+	"""The process-wide pooled client for asyncio provider calls (used from the worker's event loop)."""
+	global _async_http_client
+	with _lock:
+		if _async_http_client is None or _async_http_client.is_closed:
+			_async_http_client = httpx.AsyncClient(event_hooks={"request": [_atrace_request], "response": [_aobserve_response]}, **_client_options())
+		return _async_http_client
+
+def create_openai_client(api_key: Optional[str] = None, base_url: Optional[str] = None, max_retries: int = DEFAULT_MAX_RETRIES) -> OpenAI:
+	"""
+	OpenAI-compatible client for any provider, backed by the shared connection pool. LLMClient
+	passes max_retries=0, as core/resilience.py retries its calls, each admitted by the rate
+	limiter again; other callers keep the SDK's own retries.
+	"""
+	return OpenAI(api_key=api_key, base_url=base_url, http_client=get_http_client(), max_retries=max_retries)
+
+def create_async_openai_client(api_key: Optional[str] = None, base_url: Optional[str] = None, max_retries: int = DEFAULT_MAX_RETRIES) -> AsyncOpenAI:
+	return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=get_async_http_client(), max_retries=max_retries)
+
+def _prewarm_url(base_url: Optional[str]) -> str:
+	return base_url or os.getenv('OPENAI_BASE_URL') or DEFAULT_BASE_URL
+
+def prewarm(base_url: Optional[str] = None, connections: int = LLM_PREWARM_CONNECTIONS) -> None:
+	"""
+	Open `connections` keep-alive connections to the provider so the first requests a
+	worker serves skip the TCP/TLS handshake. Failures are logged and ignored.
+	"""
+	if connections <= 0:
+		return
+	url = _prewarm_url(base_url)
+	client = get_http_client()
+
+	def touch(_):
+		try:
+			client.head(url)
+		except httpx.HTTPError as e:
+			logger.warning(f"Connection pre-warm to {url} failed: {e}")
+
+	with ThreadPoolExecutor(max_workers=connections) as pool:
+		list(pool.map(touch, range(connections)))
+
+async def aprewarm(base_url: Optional[str] = None, connections: int = LLM_PREWARM_CONNECTIONS) -> None:
+	if connections <= 0:
+		return
+	url = _prewarm_url(base_url)
+	client = get_async_http_client()
+
+	async def touch():
+		try:
+			await client.head(url)
+		except httpx.HTTPError as e:
+			logger.warning(f"Connection pre-warm to {url} failed: {e}")
+
+	await asyncio.gather(*(touch() for _ in range(connections)))
+
+def transport_stats() -> Dict[str, int]:
+	"""Connections and TLS handshakes opened by the shared pools since the process started."""
+	return dict(_stats)
@@ -0,0 +1,102 @@
+import time
+from typing import Any, Dict, Optional
+from core.metrics import Counter, Histogram
+
+LABELS = ("endpoint", "model")
+
+LLM_REQUESTS = Counter("llm_requests_total", "Upstream LLM calls by outcome (ok, error, cancelled).", LABELS + ("outcome",))
+LLM_PROMPT_TOKENS = Counter("llm_prompt_tokens_total", "Prompt tokens sent upstream.", LABELS)
+LLM_CACHED_TOKENS = Counter("llm_cached_prompt_tokens_total", "Prompt tokens served from the provider's prompt cache.", LABELS)
+LLM_COMPLETION_TOKENS = Counter("llm_completion_tokens_total", "Completion tokens generated upstream.", LABELS)
+LLM_CANCELLED_TOKENS = Counter(
+	"llm_cancelled_completion_tokens_total",
+	"Completion tokens streams were still allowed to generate (max_tokens less those received) when they were cancelled: what cancelling saved, at most.",
+	LABELS,
+)
+PROMPT_TOKENS_SAVED = Counter("llm_prompt_tokens_saved_total", "Context tokens left out of prompts to keep them within the token budget.", ("endpoint",))
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+	"llm_time_to_first_token_seconds", "Time from sending a streamed call to its first content delta.", LABELS,
+	(0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10),
+)
+LLM_DURATION = Histogram(
+	"llm_request_duration_seconds", "Total time of an upstream call, including the whole stream.", LABELS,
+	(0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300),
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+	"llm_output_tokens_per_second", "Completion tokens per second after the first token (whole call when not streamed).", LABELS,
+	(5, 10, 20, 30, 40, 60, 80, 100, 150, 200),
+)
+
+class CallMetrics:
+	"""
+	Timing and token accounting for one upstream call. first_token() is cheap enough to
+	call on every delta, and counts them; finish() records once, so later calls (e.g. the
+	"cancelled" fallback in a finally block) are no-ops. Given the call's rate-limit
+	admission, finish() also settles the tokens it was charged against the usage reported,
+	and given its `max_tokens`, a cancelled call counts the completion tokens it left ungenerated.
+	"""
+	__slots__ = ("labels", "admission", "max_tokens", "start", "first_token_at", "deltas", "usage", "finished")
+
+	def __init__(self, endpoint: Optional[str], model: str, admission: Any = None, max_tokens: Optional[int] = None):
+		self.labels = (endpoint or "unknown", model)
+		self.admission = admission
+		self.max_tokens = max_tokens
+		self.start = time.perf_counter()
+		self.first_token_at: Optional[float] = None
+		self.deltas = 0
+		self.usage: Any = None
+		self.finished = False
+
+	def first_token(self) -> None:
+		# a content delta is about one token
+		self.deltas += 1
+		if self.first_token_at is None:
+			self.first_token_at = time.perf_counter()
+			LLM_TIME_TO_FIRST_TOKEN.observe(self.first_token_at - self.start, self.labels)
+
+	def finish(self, usage: Any = None, outcome: str = "ok") -> None:
+		if self.finished:
+			return
+		self.finished = True
+		end = time.perf_counter()
+		LLM_REQUESTS.inc(self.labels + (outcome,))
+		LLM_DURATION.observe(end - self.start, self.labels)
+		if outcome == "cancelled" and self.max_tokens:
+			LLM_CANCELLED_TOKENS.inc(self.labels, max(0, self.max_tokens - self.deltas))
+		usage = usage if usage is not None else self.usage
+		if usage is None:
+			return
+		if self.admission is not None:
+			self.admission.settle((usage.prompt_tokens or 0) + (usage.completion_tokens or 0))
+		details = getattr(usage, "prompt_tokens_details", None)
+		LLM_PROMPT_TOKENS.inc(self.labels, usage.prompt_tokens or 0)
+		LLM_CACHED_TOKENS.inc(self.labels, getattr(details, "cached_tokens", None) or 0)
+		LLM_COMPLETION_TOKENS.inc(self.labels, usage.completion_tokens or 0)
+		generating = end - (self.first_token_at if self.first_token_at is not None else self.start)
+		if usage.completion_tokens and generating > 0:
+			LLM_TOKENS_PER_SECOND.observe(usage.completion_tokens / generating, self.labels)
+
+def usage_stats() -> Dict[str, Dict[str, Any]]:
+	"""
+	Token totals per endpoint (all models), with the share of prompt tokens the provider served
+	from its prompt cache, the context tokens the prompt budget kept out of the prompts and the
+	completion tokens cancelled streams did not generate.
+	"""
+	totals: Dict[str, Dict[str, Any]] = {}
+
+	def entry(endpoint: str) -> Dict[str, Any]:
+		return totals.setdefault(endpoint, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "tokens_saved": 0, "tokens_cancelled": 0})
+
+	for name, counter in (("prompt_tokens", LLM_PROMPT_TOKENS), ("cached_tokens", LLM_CACHED_TOKENS), ("completion_tokens", LLM_COMPLETION_TOKENS)):
+		for (endpoint, _), value in counter.values().items():
+			entry(endpoint)[name] += int(value)
+	for (endpoint, _, _), value in LLM_REQUESTS.values().items():
+		if endpoint in totals:
+			totals[endpoint]["calls"] += int(value)
+	for (endpoint,), value in PROMPT_TOKENS_SAVED.values().items():
+		entry(endpoint)["tokens_saved"] += int(value)
+	for (endpoint, _), value in LLM_CANCELLED_TOKENS.values().items():
+		entry(endpoint)["tokens_cancelled"] += int(value)
+	for stats in totals.values():
+		stats["cache_hit_rate"] = stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+	return totals
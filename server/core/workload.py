@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import secrets
+import threading
+from typing import Any, Dict, List, Optional
+from config import WORKLOAD_RECORD_PATH
+
+logger = logging.getLogger(__name__)
+
+# Request fields that select a prompt rather than carry story text; kept verbatim in traces
+VERBATIM_KEYS = frozenset({"fieldType"})
+SESSION_HEADER = "X-Session-Id"
+# A client idle for longer than this starts a new session
+SESSION_IDLE_SECONDS = 30 * 60
+
+WORDS = (
+	"the a and of to in he she they was said her his it that with as at on for but not had "
+	"from by one all were would there their out up into back down just over could like again "
+	"light night field voice hand eyes door room window road house morning silence friend"
+).split()
+
+def anonymize(value: Any, key: Optional[str] = None) -> Any:
+	"""
+	Shape of a request body with every string replaced by {"$str": length}; numbers, booleans,
+	structure and VERBATIM_KEYS survive, so a replay sends requests of the same size and kind.
+	"""
+	if isinstance(value, str):
+		return value if key in VERBATIM_KEYS else {"$str": len(value)}
+	if isinstance(value, dict):
+		return {k: anonymize(v, k) for k, v in value.items()}
+	if isinstance(value, list):
+		return [anonymize(v) for v in value]
+	return value
+
+def synthesize(shape: Any, seed: str, path: str = "") -> Any:
+	"""
+	Inverse of anonymize(): filler text of the recorded lengths. The same seed and field path
+	always give the same text, so fields a session resends unchanged (parameters, synopsis)
+	stay identical across its requests, as they would for a real author.
+	"""
+	if isinstance(shape, dict):
+		if set(shape) == {"$str"}:
+			rng = random.Random(f"{seed}:{path}:{shape['$str']}")
+			text = ""
+			while len(text) < shape["$str"]:
+				text += rng.choice(WORDS) + " "
+			return text[:shape["$str"]]
+		return {k: synthesize(v, seed, f"{path}.{k}") for k, v in shape.items()}
+	if isinstance(shape, list):
+		return [synthesize(v, seed, f"{path}[{i}]") for i, v in enumerate(shape)]
+	return shape
+
+def client_key(headers, remote_addr: Optional[str]) -> str:
+	"""What identifies an author: the X-Session-Id header when the client sends one, else address and user agent."""
+	session = headers.get(SESSION_HEADER)
+	if session:
+		return "session:" + session
+	address = (headers.get("X-Forwarded-For") or remote_addr or "").split(",")[0].strip()
+	return f"{address}|{headers.get('User-Agent', '')}"
+
+def _shared_salt(path: str) -> bytes:
+	"""Salt kept next to the trace, so every worker on the host hashes a client to the same id."""
+	salt_path = path + ".salt"
+	try:
+		fd = os.open(salt_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+	except FileExistsError:
+		with open(salt_path, "rb") as f:
+			return f.read()
+	salt = secrets.token_bytes(16)
+	with os.fdopen(fd, "wb") as f:
+		f.write(salt)
+	return salt
+
+class WorkloadRecorder:
+	"""
+	Appends one JSON line per API request: a salted hash of the client, the time, the route
+	and the anonymised body. The salt lives in `<path>.salt`; delete it before sharing a
+	trace and client ids can no longer be matched to addresses. Lines are written with a
+	single O_APPEND write, so several workers can share one file.
+	"""
+	def __init__(self, path: str):
+		self.path = path
+		self._salt = _shared_salt(path)
+
+	def record(self, client_key: str, route: str, body: Any) -> None:
+		entry = {
+			"client": hashlib.sha256(self._salt + client_key.encode()).hexdigest()[:16],
+			"ts": round(time.time(), 3),
+			"route": route,
+			"body": anonymize(body),
+		}
+		line = (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+		try:
+			fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+			try:
+				os.write(fd, line)
+			finally:
+				os.close(fd)
+		except OSError as e:
+			logger.warning(f"Could not record workload to {self.path}: {e}")
+
+def load_trace(path: str) -> List[List[Dict[str, Any]]]:
+	"""
+	Recorded requests grouped into sessions in request order, each request with `at`, its
+	offset in seconds from the start of the session. A client idle for SESSION_IDLE_SECONDS
+	starts a new session.
+	"""
+	clients: Dict[str, List[Dict[str, Any]]] = {}
+	with open(path) as f:
+		for line in f:
+			if line.strip():
+				entry = json.loads(line)
+				clients.setdefault(entry["client"], []).append(entry)
+	sessions = []
+	for requests in clients.values():
+		requests.sort(key=lambda r: r["ts"])
+		session = []
+		for request in requests:
+			if session and request["ts"] - session[-1]["ts"] > SESSION_IDLE_SECONDS:
+				sessions.append(session)
+				session = []
+			session.append(request)
+		sessions.append(session)
+	return [[dict(r, at=round(r["ts"] - s[0]["ts"], 3)) for r in s] for s in sessions]
+
+_recorder: Optional[WorkloadRecorder] = None
+_recorder_lock = threading.Lock()
+
+def get_workload_recorder() -> Optional[WorkloadRecorder]:
+	"""The process-wide recorder, or None when WORKLOAD_RECORD_PATH is unset."""
+	global _recorder
+	if not WORKLOAD_RECORD_PATH:
+		return None
+	with _recorder_lock:
+		if _recorder is None:
+			_recorder = WorkloadRecorder(WORKLOAD_RECORD_PATH)
+		return _recorder
@@ -0,0 +1,7 @@
+"""
+Local OpenAI-compatible stand-in for offline load and latency testing.
+
+    python -m fake_openai --port 8100 --ttft 0.4 --tokens-per-second 60
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=fake gunicorn app:app
+"""
+from fake_openai.server import FakeOpenAI, serve_in_thread, tokenize
@@ -0,0 +1,35 @@
+import argparse
+import uvicorn
+from fake_openai import FakeOpenAI
+
+def main():
+	parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in server replaying canned outputs.")
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=8100)
+	parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first token")
+	parser.add_argument("--tokens-per-second", type=float, default=60.0)
+	parser.add_argument("--prefill-tokens-per-second", type=float, default=0.0, help="prompt processing rate added to the ttft (0: none)")
+	parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+	parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with a 429")
+	parser.add_argument("--rpm", type=int, default=0, help="requests per minute before answering with 429s (0: unlimited)")
+	parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests slow to their first token")
+	parser.add_argument("--slow-ttft", type=float, default=0.0, help="seconds before the first token of a slow request")
+	parser.add_argument("--seed", type=int, default=None)
+	args = parser.parse_args()
+
+	app = FakeOpenAI(
+		ttft=args.ttft,
+		tokens_per_second=args.tokens_per_second,
+		error_rate=args.error_rate,
+		rate_limit_rate=args.rate_limit_rate,
+		seed=args.seed,
+		prefill_tokens_per_second=args.prefill_tokens_per_second,
+		rpm=args.rpm,
+		slow_rate=args.slow_rate,
+		slow_ttft=args.slow_ttft,
+	)
+	print(f"Serving the stand-in at http://{args.host}:{args.port}/v1")
+	uvicorn.run(app, host=args.host, port=args.port, log_level="warning", backlog=4096)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,101 @@
+import os
+import re
+import json
+from functools import lru_cache
+from core.prompts import SYSTEM_PROMPT_SCENE_WRITER, SYSTEM_PROMPT_SCENE_PARAGRAPH_WRITER, SYSTEM_PROMPT_SCENE_SUMMARY_WRITER, SYSTEM_PROMPT_SCENE_PATCH_WRITER
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SUMMARY = {
+	"currentScene": {
+		"location": "United States, High school, Football field bleachers",
+		"previous_location": "N/A",
+		"characters": [
+			{"name": "Alex", "clothes": "N/A", "appearance": "Teenage boy"},
+			{"name": "Samuel", "clothes": "N/A", "appearance": "Teenage boy, Alex's friend"},
+		],
+		"ongoing_action": "Alex and Samuel talk on the empty bleachers about the pressure to fit in.",
+	},
+	"sequence": [
+		"Alex feels pressure from his peers to change who he is.",
+		"Samuel tells Alex that real friends accept him as he is.",
+		"Alex decides to stay true to himself.",
+	],
+}
+
+@lru_cache(maxsize=None)
+def scene() -> str:
+	with open(os.path.join(SERVER_DIR, "sample_scene.json")) as f:
+		return json.dumps(json.load(f), indent=2)
+
+@lru_cache(maxsize=None)
+def prose() -> str:
+	with open(os.path.join(SERVER_DIR, "chat_history.json")) as f:
+		sessions = json.load(f)
+	return "\n\n".join(
+		message["content"].strip()
+		for session in sessions
+		for message in session["messages"]
+		if message["role"] == "ai"
+	)
+
+def rewrite_actions() -> str:
+	paragraph = prose().split("\n\n")[0]
+	sentences = re.split(r'(?<=[.!?])\s+', paragraph)
+	actions = [{"action": "no_change", "original_sentence": sentence} for sentence in sentences]
+	actions[0] = {"action": "edit", "original_sentence": sentences[0], "rewritten_sentence": sentences[0].upper()}
+	actions.append({"action": "paragraph_break"})
+	return json.dumps(actions, indent=2)
+
+def sentence_edits() -> str:
+	"""A one-sentence edit plus an added sentence, valid for any paragraph."""
+	return json.dumps([
+		{"op": "edit", "id": "S1", "text": "It was, by any reasonable measure, a terrible idea, which is exactly why everyone agreed to it."},
+		{"op": "add", "after": "S1", "text": "Nobody asked the goat."},
+	], indent=2)
+
+def scene_patch() -> str:
+	"""A two-line dialogue edit, valid for any scene of four or more elements."""
+	return json.dumps([
+		{"op": "replace", "from": 1, "to": 1, "elements": [
+			{"type": "dialogue", "character": "EMMA", "parenthetical": "steady", "line": "Thank you for coming. Let me show you what changes everything."},
+		]},
+		{"op": "replace", "from": 3, "to": 3, "elements": [
+			{"type": "dialogue", "character": "JACK", "parenthetical": "arms crossed", "line": "Everyone says that. Convince me in one sentence."},
+		]},
+	], indent=2)
+
+def _requested_count(prompt: str, pattern: str, default: int = 3) -> int:
+	match = re.search(pattern, prompt)
+	return int(match.group(1)) if match else default
+
+def canned_output(system_prompt: str, prompt: str) -> str:
+	"""Pick a realistic response for a WritingService prompt, recognised by its system prompt and wording."""
+	if system_prompt == SYSTEM_PROMPT_SCENE_WRITER:
+		return scene()
+	if system_prompt == SYSTEM_PROMPT_SCENE_PATCH_WRITER:
+		return scene_patch()
+	if system_prompt == SYSTEM_PROMPT_SCENE_SUMMARY_WRITER:
+		return json.dumps(SUMMARY, indent=2)
+	if system_prompt == SYSTEM_PROMPT_SCENE_PARAGRAPH_WRITER:
+		if '"op": "edit"' in prompt:
+			return sentence_edits()
+		return rewrite_actions() if "rewritten_sentence" in prompt else prose()
+	if "one-line outline for paragraph" in prompt:
+		index = _requested_count(prompt, r"for paragraph (\d+) of", 1)
+		return json.dumps([{"outline": f"Outline {index} of the next paragraphs."}])
+	if "outline of new chapter" in prompt:
+		index = _requested_count(prompt, r"outline of new chapter (\d+) of", 1)
+		return json.dumps([{"title": f"Chapter {index}", "synopsis": f"Synopsis of chapter {index}.", "act": 1}])
+	if "one-line outlines" in prompt:
+		count = _requested_count(prompt, r"Generate (\d+) one-line outlines")
+		return json.dumps([{"outline": f"Outline {i + 1} of the next paragraphs."} for i in range(count)])
+	if "new chapter outlines" in prompt:
+		count = _requested_count(prompt, r"Generate (\d+) new chapter outlines")
+		return json.dumps([
+			{"title": f"Chapter {i + 1}", "synopsis": f"Synopsis of chapter {i + 1}.", "act": 1}
+			for i in range(count)
+		])
+	if "'text'" in system_prompt:
+		return json.dumps({"text": "Echoes of the Forgotten Realm"})
+	return prose()
@@ -0,0 +1,265 @@
+import re
+import json
+import time
+import socket
+import random
+import asyncio
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+import uvicorn
+from fake_openai.outputs import canned_output
+
+CHARS_PER_TOKEN = 4
+# Provider prompt caching works on prefixes of at least 1024 tokens, in 128-token steps
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_STEP_TOKENS = 128
+
+_TOKEN = re.compile(r"\s*\S{1,4}|\s+")
+
+def tokenize(text: str) -> List[str]:
+	"""Split text into roughly token-sized deltas (about four characters each)."""
+	return _TOKEN.findall(text)
+
+class FakeOpenAI:
+	"""
+	OpenAI-compatible stand-in for POST /v1/chat/completions, streamed and not, as a plain
+	ASGI app. It replays canned scene, paragraph, summary and suggestion outputs (or a
+	fixed `output`) after `ttft` seconds (plus the uncached prompt tokens at
+	`prefill_tokens_per_second`, when set) at `tokens_per_second`, honours max_tokens and
+	stream_options.include_usage, simulates the provider's prompt-prefix cache in the
+	usage block, and fails a share of requests with 500s or 429s. With `rpm`, requests also draw
+	on a bucket of that many per minute, refilled continuously as the provider's is: responses
+	carry its x-ratelimit-* headers, and requests finding it empty get a 429 with a retry-after.
+	A `slow_rate` share of requests wait `slow_ttft` seconds for their first token instead, the
+	long tail a provider has under load. A stream stops generating when its client disconnects;
+	stats() counts the prompt and completion tokens actually served.
+	"""
+	def __init__(
+		self,
+		ttft: float = 0.3,
+		tokens_per_second: float = 60.0,
+		error_rate: float = 0.0,
+		rate_limit_rate: float = 0.0,
+		output: Optional[str] = None,
+		seed: Optional[int] = None,
+		prefill_tokens_per_second: float = 0.0,
+		rpm: int = 0,
+		slow_rate: float = 0.0,
+		slow_ttft: float = 0.0,
+	):
+		self.ttft = ttft
+		self.slow_rate = slow_rate
+		self.slow_ttft = slow_ttft
+		self.prefill_tokens_per_second = prefill_tokens_per_second
+		self.tokens_per_second = tokens_per_second
+		self.error_rate = error_rate
+		self.rate_limit_rate = rate_limit_rate
+		self.rpm = rpm
+		self._bucket = (float(rpm), time.monotonic())
+		self.output = output
+		self.random = random.Random(seed)
+		self.lock = threading.Lock()
+		self._prefixes = set()
+		self.reset()
+
+	def reset(self) -> None:
+		with self.lock:
+			self.requests = 0
+			self.errors = 0
+			self.rate_limited = 0
+			self.open_streams = 0
+			self.peak_streams = 0
+			self.disconnected_streams = 0
+			self.prompt_tokens = 0
+			self.completion_tokens = 0
+
+	def stats(self) -> Dict[str, int]:
+		with self.lock:
+			return {
+				"requests": self.requests,
+				"errors": self.errors,
+				"rate_limited": self.rate_limited,
+				"open_streams": self.open_streams,
+				"peak_streams": self.peak_streams,
+				"disconnected_streams": self.disconnected_streams,
+				"prompt_tokens": self.prompt_tokens,
+				"completion_tokens": self.completion_tokens,
+			}
+
+	async def __call__(self, scope, receive, send):
+		if scope["type"] == "lifespan":
+			while True:
+				message = await receive()
+				if message["type"] == "lifespan.startup":
+					await send({"type": "lifespan.startup.complete"})
+				elif message["type"] == "lifespan.shutdown":
+					await send({"type": "lifespan.shutdown.complete"})
+					return
+		if scope["type"] != "http":
+			return
+
+		body = b""
+		while True:
+			message = await receive()
+			body += message.get("body", b"")
+			if not message.get("more_body"):
+				break
+
+		path = scope["path"].rstrip("/")
+		if scope["method"] == "GET" and path.endswith("/models"):
+			return await self._json(send, 200, {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "fake"}]})
+		if scope["method"] != "POST" or not path.endswith("/chat/completions"):
+			return await self._json(send, 404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+		request = json.loads(body or b"{}")
+		with self.lock:
+			self.requests += 1
+			roll = self.random.random()
+			slow = bool(self.slow_rate) and self.random.random() < self.slow_rate
+			headers, wait = self._take_request()
+		if roll < self.rate_limit_rate or wait:
+			with self.lock:
+				self.rate_limited += 1
+			retry_after = f"{max(wait, 1.0):.3f}".encode()
+			return await self._json(send, 429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}}, [(b"retry-after", retry_after)] + headers)
+		if roll < self.rate_limit_rate + self.error_rate:
+			with self.lock:
+				self.errors += 1
+			return await self._json(send, 500, {"error": {"message": "The server had an error", "type": "server_error"}})
+
+		messages = request.get("messages", [])
+		system_prompt = next((m["content"] for m in messages if m["role"] == "system"), "")
+		prompt = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+		tokens = tokenize(self.output if self.output is not None else canned_output(system_prompt, prompt))
+		finish_reason = "stop"
+		max_tokens = request.get("max_tokens") or request.get("max_completion_tokens")
+		if max_tokens and len(tokens) > max_tokens:
+			tokens = tokens[:max_tokens]
+			finish_reason = "length"
+		usage = self._usage("".join(m["content"] for m in messages), len(tokens))
+		model = request.get("model", "fake")
+		ttft = self.slow_ttft if slow else self.ttft
+		with self.lock:
+			self.prompt_tokens += usage["prompt_tokens"]
+		if self.prefill_tokens_per_second:
+			ttft += (usage["prompt_tokens"] - usage["prompt_tokens_details"]["cached_tokens"]) / self.prefill_tokens_per_second
+
+		if request.get("stream"):
+			include_usage = (request.get("stream_options") or {}).get("include_usage", False)
+			await self._stream(receive, send, model, tokens, finish_reason, usage if include_usage else None, ttft, headers)
+		else:
+			await asyncio.sleep(ttft + len(tokens) / self.tokens_per_second)
+			with self.lock:
+				self.completion_tokens += len(tokens)
+			await self._json(send, 200, {
+				"id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+				"choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": finish_reason}],
+				"usage": usage,
+			}, headers)
+
+	def _take_request(self):
+		"""Rate-limit headers and, when the `rpm` bucket is empty, seconds until it holds a request (call under the lock)."""
+		if not self.rpm:
+			return [], 0.0
+		level, updated = self._bucket
+		now = time.monotonic()
+		level = min(self.rpm, level + (now - updated) * self.rpm / 60)
+		wait = 0.0
+		if level >= 1:
+			level -= 1
+		else:
+			wait = (1 - level) * 60 / self.rpm
+		self._bucket = (level, now)
+		headers = [
+			(b"x-ratelimit-limit-requests", str(self.rpm).encode()),
+			(b"x-ratelimit-remaining-requests", str(int(level)).encode()),
+			(b"x-ratelimit-reset-requests", f"{(self.rpm - level) * 60 / self.rpm:.3f}s".encode()),
+		]
+		return headers, wait
+
+	def _usage(self, prompt_text: str, completion_tokens: int) -> Dict[str, Any]:
+		prompt_tokens = max(1, len(prompt_text) // CHARS_PER_TOKEN)
+		cached_tokens = 0
+		with self.lock:
+			for length in range(PROMPT_CACHE_MIN_TOKENS, prompt_tokens + 1, PROMPT_CACHE_STEP_TOKENS):
+				digest = hashlib.sha1(prompt_text[:length * CHARS_PER_TOKEN].encode()).digest()
+				if digest in self._prefixes:
+					cached_tokens = length
+				else:
+					self._prefixes.add(digest)
+		return {
+			"prompt_tokens": prompt_tokens,
+			"completion_tokens": completion_tokens,
+			"total_tokens": prompt_tokens + completion_tokens,
+			"prompt_tokens_details": {"cached_tokens": cached_tokens},
+		}
+
+	async def _stream(self, receive, send, model: str, tokens: List[str], finish_reason: str, usage: Optional[Dict[str, Any]], ttft: float, headers=None) -> None:
+		await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")] + (headers or [])})
+		with self.lock:
+			self.open_streams += 1
+			self.peak_streams = max(self.peak_streams, self.open_streams)
+		disconnected = asyncio.ensure_future(self._disconnect(receive))
+		try:
+			start = time.perf_counter() + ttft
+			for i, token in enumerate(tokens):
+				# schedule against the clock so per-token sleeps do not accumulate drift
+				delay = start + i / self.tokens_per_second - time.perf_counter()
+				if delay > 0:
+					await asyncio.wait([disconnected], timeout=delay)
+				if disconnected.done():
+					with self.lock:
+						self.disconnected_streams += 1
+					return
+				await self._event(send, self._chunk(model, {"content": token}, None))
+				with self.lock:
+					self.completion_tokens += 1
+			await self._event(send, self._chunk(model, {}, finish_reason))
+			if usage is not None:
+				await self._event(send, dict(self._chunk(model, {}, None), choices=[], usage=usage))
+			await send({"type": "http.response.body", "body": b"data: [DONE]\n\n", "more_body": False})
+		finally:
+			disconnected.cancel()
+			with self.lock:
+				self.open_streams -= 1
+
+	@staticmethod
+	async def _disconnect(receive) -> None:
+		"""Returns once the client has gone away (the request body has already been read)."""
+		while (await receive())["type"] != "http.disconnect":
+			pass
+
+	@staticmethod
+	def _chunk(model: str, delta: Dict[str, Any], finish_reason: Optional[str]) -> Dict[str, Any]:
+		return {
+			"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+			"choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+		}
+
+	@staticmethod
+	async def _event(send, payload: Dict[str, Any]) -> None:
+		await send({"type": "http.response.body", "body": f"data: {json.dumps(payload)}\n\n".encode(), "more_body": True})
+
+	@staticmethod
+	async def _json(send, status: int, payload: Dict[str, Any], headers=None) -> None:
+		await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json")] + (headers or [])})
+		await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+
+def serve_in_thread(app, host: str = "127.0.0.1", port: int = 0, **config) -> str:
+	"""
+	Run an ASGI app under uvicorn on a daemon thread and return its base URL once it is
+	accepting connections. Port 0 picks a free port.
+	"""
+	sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	sock.bind((host, port))
+	port = sock.getsockname()[1]
+	server = uvicorn.Server(uvicorn.Config(app, log_level="error", **config))
+	threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+	deadline = time.time() + 20
+	while not server.started:
+		if time.time() > deadline:
+			raise RuntimeError(f"stand-in server did not start on {host}:{port}")
+		time.sleep(0.01)
+	return f"http://{host}:{port}"
@@ -0,0 +1,7 @@
+# Loaded automatically by gunicorn from the working directory; command-line flags still take precedence.
+
+
+def post_worker_init(worker):
+    # Open provider connections before the worker takes traffic (see LLM_PREWARM_CONNECTIONS).
+    from core.transport import prewarm
+    prewarm()
@@ -0,0 +1,97 @@
+import json
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from core.story_store import get_story_store
+from services.writing_service import WritingService
+
+# Speculative follow-ups for stored stories: once a generation completes, start the calls the
+# author usually makes next, with the context the story variant of that route will assemble,
+# so the request finds its result waiting in the speculator (core/speculation.py).
+
+logger = logging.getLogger(__name__)
+
+# story route -> the routes that usually follow it
+FOLLOW_UPS = {
+	"/chapters/scene/new": ("/chapters/summary", "/chapters/outlines"),
+	"/chapters/scene/continue": ("/chapters/summary", "/chapters/outlines"),
+	"/chapters/scene/paragraph/new": ("/chapters/summary", "/chapters/outlines"),
+}
+# the body of a follow-up as the client sends it when the author adds nothing
+FOLLOW_UP_DEFAULTS = {
+	"/chapters/summary": {},
+	"/chapters/outlines": {"instruction": "", "count": 3},
+}
+
+class FollowUps:
+	"""
+	Watches one generation for a stored story (`feed` its chunks, then `done`) and, if it ran
+	to the end, submits its follow-ups to the writing service's speculator as `user`. New
+	paragraphs are assumed to be saved as generated, at the end of their scene, so the
+	predicted summary covers them.
+	"""
+	def __init__(self, writing_service: WritingService, story_id: str, route: str, target: Dict[str, Any], user: str):
+		self.writing_service = writing_service
+		self.story_id = story_id
+		self.route = route
+		self.target = target
+		self.user = user
+		self.paragraphs: List[str] = [""]
+		self.complete = False
+
+	@classmethod
+	def start(cls, writing_service: WritingService, story_id: str, route: str, body: Dict[str, Any], user: str) -> Optional["FollowUps"]:
+		"""A watcher for a story request, or None when speculation is off or nothing follows the route."""
+		target = body.get("target") or {}
+		if not writing_service.llm_client.speculator.enabled or route not in FOLLOW_UPS or "chapter_id" not in target:
+			return None
+		return cls(writing_service, story_id, route, target, user)
+
+	def feed(self, chunk: Dict[str, Any]) -> None:
+		text = chunk.get("chunk")
+		if text == "[DONE]":
+			self.complete = True
+		elif chunk.get("paragraph_break"):
+			self.paragraphs.append("")
+		elif isinstance(text, str) and self.route == "/chapters/scene/paragraph/new":
+			self.paragraphs[-1] = f"{self.paragraphs[-1]} {text}".strip()
+
+	def done(self) -> None:
+		if not self.complete:
+			return
+		for route in FOLLOW_UPS[self.route]:
+			self.writing_service.llm_client.speculator.submit(self.user, lambda route=route: self._speculate(route))
+
+	def _speculate(self, route: str) -> None:
+		store = get_story_store()
+		body = store.resolve(self.story_id, route, dict(FOLLOW_UP_DEFAULTS[route], target=self.target))
+		context = body["context"]
+		if route == "/chapters/summary":
+			added = [paragraph for paragraph in self.paragraphs if paragraph]
+			if added:
+				section = self.target.get("section", 0)
+				scenes = store.sections(self.story_id, self.target["chapter_id"], [section]).get(section, {"scenes": []})["scenes"]
+				end = sum(len(scene.get("paragraphs", [])) for scene in scenes[:self.target.get("scene", len(scenes) - 1) + 1])
+				context = dict(context, paragraphs=context["paragraphs"][:end] + added + context["paragraphs"][end:])
+			self.writing_service.generate_section_summary(context=context)
+		elif route == "/chapters/outlines":
+			self.writing_service.generate_chapter_outlines(context=context, instruction=body["instruction"], num_outlines=body["count"])
+
+	def watch(self, response: Any) -> Any:
+		"""Watch a Flask response: a streamed one's NDJSON lines as they are sent, a plain one at once."""
+		if isinstance(response, tuple):
+			return response
+		if response.is_streamed:
+			response.response = self._watch_lines(response.response)
+		elif response.status_code == 200:
+			self.complete = True
+			self.done()
+		return response
+
+	def _watch_lines(self, lines: Iterable[Any]) -> Iterator[Any]:
+		for line in lines:
+			try:
+				self.feed(json.loads(line))
+			except ValueError:
+				pass
+			yield line
+		self.done()
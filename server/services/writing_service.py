@@ -1,13 +1,20 @@
 import json
 import logging
-from typing import Dict, List, Any
-from tenacity import retry, stop_after_attempt, wait_exponential
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
 from core.llm_client import LLMClient
+from config import STORY_RETRIEVAL_PASSAGES
+from core.prompt_layout import Segment, layout_prompt
+from core.edit_stream import stream_after
+from core.fanout import fan_out
+from core.scene_patch import apply_scene_patch, is_patchable, patched_scene_chunks
+from core.sentence_edits import action_chunks, edits_to_actions, numbered_sentences, sentence_edit_chunks, split_sentences
+from core.serializers import compact_scene, serialize
+from core.story_store import get_story_store
 
-from core.prompts import SYSTEM_PROMPT_SCENE_WRITER, SYSTEM_PROMPT_SCENE_PARAGRAPH_WRITER, SYSTEM_PROMPT_SCENE_SUMMARY_WRITER
+from core.prompts import SYSTEM_PROMPT_SCENE_WRITER, SYSTEM_PROMPT_SCENE_PARAGRAPH_WRITER, SYSTEM_PROMPT_SCENE_SUMMARY_WRITER, SYSTEM_PROMPT_SCENE_PATCH_WRITER
 
 def get_user_prompt(field_type, current_value, context):
-	base_prompt = f"Based on the current value '{current_value}' and the following context: {context}, "
+	base_prompt = f"Based on the current value '{serialize(current_value)}' and the following context: {serialize(context)}, "
 	print("get_user_prompt: " + field_type)
 	if field_type == 'Title':
 		return base_prompt + "suggest a creative and engaging title for the story."
@@ -38,12 +45,26 @@ def get_user_prompt(field_type, current_value, context):
 	else:
 		return base_prompt + f"provide a suggestion for the {field_type} of the story."
 
+# how generate_chapter_outlines and generate_chapter_suggestions split their items across calls
+FANOUT_MODES = ("single", "parallel")
+
 class WritingService:
 	def __init__(self, llm_client: LLMClient):
 		self.llm_client = llm_client
 		self.logger = logging.getLogger(__name__)
 
-	@retry(stop=stop_after_attempt(1), wait=wait_exponential(multiplier=1, min=4, max=10))
+	def _earlier_passages(self, context: Dict[str, Any], instruction: str) -> List[Segment]:
+		"""
+		A prompt segment with the passages from earlier in a stored story (the story variants
+		set context["story"]) that best match the instruction and chapter synopsis, or none.
+		"""
+		story = context.get('story')
+		if not story or not STORY_RETRIEVAL_PASSAGES:
+			return []
+		query = f"{instruction} {serialize(context.get('synopsis') or '')}"
+		passages = get_story_store().related_passages(story['id'], query, story, STORY_RETRIEVAL_PASSAGES)
+		return [("passages", "Relevant Earlier Passages (for continuity only; do not repeat them)", passages)] if passages else []
+
 	def generate_parameter_suggestions(
 		self,
 		context: Dict[str, Any],
@@ -76,6 +97,8 @@ class WritingService:
 			response = self.llm_client.generate_json(
 				prompt=user_prompt,
 				system_prompt=system_prompt,
+				endpoint="generate_parameter_suggestions",
+				cache=True,
 			)
 
 			parameters = json.loads(response)
@@ -91,13 +114,97 @@ class WritingService:
 			self.logger.error(f"Unexpected error in generate_chapter_suggestions: {e}")
 			raise
 
-	@retry(stop=stop_after_attempt(1), wait=wait_exponential(multiplier=1, min=4, max=10))
+	def _ask_items(self, prompt: str, system_prompt: str, endpoint: str, valid: Callable[[Any], bool], cache: bool = False) -> List[Dict[str, Any]]:
+		"""The valid items of the JSON array one call returns (a lone object counts as one item)."""
+		response = self.llm_client.generate_json(
+			prompt=prompt,
+			system_prompt=system_prompt,
+			endpoint=endpoint,
+			cache=cache,
+		)
+		try:
+			items = json.loads(response)
+		except json.JSONDecodeError as e:
+			self.logger.error(f"Failed to parse LLM response as JSON: {e}")
+			raise ValueError("Invalid response format from LLM") from e
+		if isinstance(items, dict):
+			items = [items]
+		if not isinstance(items, list):
+			return []
+		return [item for item in items if valid(item)]
+
+	def _streamed_items(self, prompt: str, system_prompt: str, endpoint: str, valid: Callable[[Any], bool]) -> Iterator[Dict[str, Any]]:
+		"""The valid items of a streamed JSON array, each as soon as it is parsed."""
+		for chunk in self.llm_client.generate_streamed_json(prompt=prompt, system_prompt=system_prompt, endpoint=endpoint):
+			if "error" in chunk:
+				raise ValueError(chunk["error"])
+			text = chunk.get("chunk")
+			if text and text != "[DONE]":
+				item = json.loads(text)
+				if valid(item):
+					yield item
+
+	def _topped_up(self, first: Iterable[Dict[str, Any]], count: int, top_up: Callable[[int, List[Dict[str, Any]]], List[Dict[str, Any]]], name: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+		"""
+		(index, item) for the items of one call asking for all `count`, extras dropped; if it
+		comes back short, one more call (`top_up(missing, items so far)`) asks for the rest. A
+		reply with no valid item at all is an error.
+		"""
+		items: List[Dict[str, Any]] = []
+		for item in first:
+			items.append(item)
+			yield len(items) - 1, item
+			if len(items) == count:
+				return
+		if not items:
+			raise ValueError(f"No valid {name} in LLM response")
+		missing = count - len(items)
+		self.logger.warning(f"LLM returned {len(items)} {name} instead of the requested {count}; asking for the other {missing}")
+		for item in top_up(missing, list(items))[:missing]:
+			items.append(item)
+			yield len(items) - 1, item
+		if len(items) < count:
+			raise ValueError(f"Expected {count} {name}, but received {len(items)}")
+
+	def _fanned_out(self, count: int, ask_one: Callable[[int], List[Dict[str, Any]]], name: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+		"""(index, item) as each of `count` concurrent calls, one per item, finishes; a call without one is made again."""
+		def call(index: int) -> Dict[str, Any]:
+			items = ask_one(index)
+			if not items:
+				raise ValueError(f"No valid {name} in LLM response")
+			return items[0]
+		return fan_out(call, count)
+
+	def _item_results(self, results: Iterator[Tuple[int, Dict[str, Any]]], count: int, stream: bool):
+		"""
+		All the items in order or, with `stream`, a chunk per item as it arrives:
+		{"chunk": <item JSON>, "index": position, "complete": True}, then {"chunk": "[DONE]"}.
+		A ValueError while streaming becomes a last {"error"} chunk.
+		"""
+		if stream:
+			return self._item_chunks(results)
+		items: List[Any] = [None] * count
+		for index, item in results:
+			items[index] = item
+		return items
+
+	def _item_chunks(self, results: Iterator[Tuple[int, Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+		try:
+			for index, item in results:
+				yield {"chunk": json.dumps(item), "index": index, "complete": True}
+		except ValueError as e:
+			yield {"error": f"Invalid output from LLM: {e}"}
+			return
+		yield {"chunk": "[DONE]"}
+
 	def generate_chapter_suggestions(
 		self,
 		chapters: List[Dict[str, Any]],
 		parameters: Dict[str, Any],
 		number_of_chapters: int,
-		total_chapters: int
+		total_chapters: int,
+		mode: str = "single",
+		stream: bool = False
 	) -> List[Dict[str, Any]]:
 		"""
 		Generate suggestions for new chapters based on the current story context.
@@ -107,11 +214,14 @@ class WritingService:
 			parameters (Dict[str, Any]): Story parameters
 			number_of_chapters (int): Number of new chapters to generate
 			total_chapters (int): Total number of chapters in the story
+			mode (str): "single" asks one call for every chapter (topping up with one more call
+				when it comes back short); "parallel" makes one concurrent call per chapter
+			stream (bool): Stream each chapter as it is ready (see _item_results)
 
 		Returns:
 			List[Dict[str, Any]]: List of suggested chapters
 		"""
-		self.logger.info(f"Generating {number_of_chapters} chapter suggestions")
+		self.logger.info(f"Generating {number_of_chapters} chapter suggestions ({mode})")
 
 		if number_of_chapters <= 0:
 			raise ValueError("Number of chapters to generate must be positive")
@@ -119,6 +229,9 @@ class WritingService:
 		if total_chapters < len(chapters) + number_of_chapters:
 			raise ValueError("Total chapters cannot be less than existing chapters plus new chapters")
 
+		if mode not in FANOUT_MODES:
+			raise ValueError(f"Unknown mode: {mode}")
+
 		system_prompt = """You are an AI assistant specialized in creative writing and story structure. Your task is to generate chapter outlines for novels based on a given premise. You should create engaging chapter titles, concise synopses, and determine which act each chapter belongs to in a structure defined in the "parameters". Your output should be well-structured, consistent, and suitable for further development into a full novel. Follow these guidelines:
 		1. Create chapter titles that are intriguing and relevant to the chapter's content.
 		2. Write synopses that capture the key events, character developments, and themes of each chapter.
@@ -136,48 +249,70 @@ class WritingService:
 
 		Your output should be a valid JSON array where each element is an object containing 'title', 'synopsis', and 'act' keys."""
 
-		user_prompt = f"""Generate {number_of_chapters} new chapter outlines based on the following:
+		# over budget, existing chapters fall back to their title, synopsis and act
+		chapter_outlines = [
+			{key: chapter[key] for key in ("title", "synopsis", "act") if key in chapter}
+			for chapter in chapters
+		]
+		valid = lambda item: isinstance(item, dict) and 'title' in item and 'synopsis' in item
 
-		Story Parameters:
-		{json.dumps(parameters, indent=2)}
+		def prompt(task: str, suggested: List[Dict[str, Any]] = ()) -> str:
+			segments = [
+				("parameters", "Story Parameters", parameters),
+				("outline", "Existing Chapters", chapters, chapter_outlines),
+			]
+			if suggested:
+				segments.append(("outline", "New Chapters Already Suggested", list(suggested)))
+			return layout_prompt(segments + [("task", None, task)], endpoint="generate_chapter_suggestions")
 
-		Existing Chapters:
-		{json.dumps(chapters, indent=2)}
+		def top_up(missing: int, suggested: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+			task = f"""Generate {missing} new chapter outlines based on the Story Parameters and Existing Chapters above, continuing after the New Chapters Already Suggested.
 
-		Total Chapters in Story: {total_chapters}
+Total Chapters in Story: {total_chapters}
 
-		Please provide an array of {number_of_chapters} new chapter outlines, each containing a title, synopsis, and the act it belongs to. Ensure that these new chapters logically follow the existing ones and lead towards a satisfying conclusion of the story, considering the total number of chapters for the field "suggestions".
-		"""
+Please provide an array of {missing} new chapter outlines, each containing a title, synopsis, and the act it belongs to. Ensure that these new chapters logically follow the ones above and lead towards a satisfying conclusion of the story, considering the total number of chapters."""
+			return self._ask_items(prompt(task, suggested), system_prompt, "generate_chapter_suggestions", valid)
 
-		try:
-			self.logger.debug(f"Sending prompt to LLM: {user_prompt[:100]}...")
-			response = self.llm_client.generate_json(
-				prompt=user_prompt,
-				system_prompt=system_prompt,
-			)
+		def ask_one(index: int) -> List[Dict[str, Any]]:
+			task = f"""Generate the outline of new chapter {index + 1} of {number_of_chapters} (chapter {len(chapters) + index + 1} of the story) based on the Story Parameters and Existing Chapters above.
 
-			suggested_chapters = json.loads(response)
+Total Chapters in Story: {total_chapters}
 
-			if len(suggested_chapters) != number_of_chapters:
-				self.logger.warning(f"LLM returned {len(suggested_chapters)} chapters instead of the requested {number_of_chapters}")
+The other new chapters are outlined separately, so cover only the part of the story that falls to this one: it follows {index} new chapter(s) after the existing ones and precedes {number_of_chapters - index - 1}. Please provide an array with this single chapter outline, containing a title, synopsis, and the act it belongs to."""
+			return self._ask_items(prompt(task), system_prompt, "generate_chapter_suggestions", valid, cache=True)
 
-			self.logger.info(f"Successfully generated {len(suggested_chapters)} chapter suggestions")
-			return suggested_chapters
+		if mode == "parallel":
+			results = self._fanned_out(number_of_chapters, ask_one, "chapters")
+		else:
+			task = f"""Generate {number_of_chapters} new chapter outlines based on the Story Parameters and Existing Chapters above.
 
-		except json.JSONDecodeError as e:
-			self.logger.error(f"Failed to parse LLM response as JSON: {e}")
-			raise ValueError("Invalid response format from LLM") from e
+Total Chapters in Story: {total_chapters}
 
+Please provide an array of {number_of_chapters} new chapter outlines, each containing a title, synopsis, and the act it belongs to. Ensure that these new chapters logically follow the existing ones and lead towards a satisfying conclusion of the story, considering the total number of chapters for the field "suggestions"."""
+			user_prompt = prompt(task)
+			self.logger.debug(f"Sending prompt to LLM: {user_prompt[:100]}...")
+			if stream:
+				first = self._streamed_items(user_prompt, system_prompt, "generate_chapter_suggestions", valid)
+			else:
+				first = self._ask_items(user_prompt, system_prompt, "generate_chapter_suggestions", valid, cache=True)
+			results = self._topped_up(first, number_of_chapters, top_up, "chapters")
+
+		try:
+			suggested_chapters = self._item_results(results, number_of_chapters, stream)
 		except Exception as e:
 			self.logger.error(f"Unexpected error in generate_chapter_suggestions: {e}")
 			raise
+		if not stream:
+			self.logger.info(f"Successfully generated {len(suggested_chapters)} chapter suggestions")
+		return suggested_chapters
 
-	@retry(stop=stop_after_attempt(1), wait=wait_exponential(multiplier=1, min=4, max=10))
 	def generate_chapter_outlines(
 		self,
 		context: Dict[str, Any],
 		instruction: str,
-		num_outlines: int
+		num_outlines: int,
+		mode: str = "single",
+		stream: bool = False
 	) -> List[Dict[str, str]]:
 		"""
 		Generate outlines for continuing a chapter.
@@ -186,15 +321,21 @@ class WritingService:
 			context (Dict[str, Any]): Context information for the chapter
 			instruction (str): Specific instruction for generating outlines
 			num_outlines (int): Number of outlines to generate
+			mode (str): "single" asks one call for every outline (topping up with one more call
+				when it comes back short); "parallel" makes one concurrent call per outline
+			stream (bool): Stream each outline as it is ready (see _item_results)
 
 		Returns:
 			List[Dict[str, str]]: List of generated outlines
 		"""
-		self.logger.info(f"Generating {num_outlines} chapter outlines")
+		self.logger.info(f"Generating {num_outlines} chapter outlines ({mode})")
 
 		if num_outlines <= 0:
 			raise ValueError("Number of outlines to generate must be positive")
 
+		if mode not in FANOUT_MODES:
+			raise ValueError(f"Unknown mode: {mode}")
+
 		system_prompt = f"""You are an AI assistant specialized in creative writing and story structure. As a masterful and seasoned novelist known for captivating storytelling, you excel in crafting intriguing one-line outlines for story chapters. You are comfortable with mature themes and explicit content when appropriate to the story.
 
 Your task is to generate concise, one-line outlines for the next few paragraphs of a chapter. These outlines should:
@@ -217,41 +358,53 @@ If the instruction or context is unclear or contradictory:
 
 Your output must be a valid JSON array where each element is an object containing an 'outline' key. Return only the JSON output, nothing else."""
 
-		user_prompt = f"""Generate {num_outlines} one-line outlines for the next paragraphs based on the following:
+		valid = lambda item: isinstance(item, dict) and 'outline' in item
 
-		Context: {json.dumps(context, indent=2)}
+		def top_up(missing: int, outlines: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+			user_prompt = f"""Generate {missing} one-line outlines for the next paragraphs, continuing after the outlines already written, based on the following:
+
+		Context: {serialize(context)}
 		Instruction (content to cover in the outlines): {instruction}
+		Outlines already written: {serialize(outlines)}
 
-		Please provide an array of {num_outlines} outlines, each containing an 'outline' key."""
+		Please provide an array of {missing} outlines, each containing an 'outline' key."""
+			return self._ask_items(user_prompt, system_prompt, "generate_chapter_outlines", valid)
 
-		try:
-			# self.logger.debug(f"Sending prompt to LLM: {user_prompt[:100]}...")
-			response = self.llm_client.generate_json(
-				prompt=user_prompt,
-				system_prompt=system_prompt,
-			)
+		def ask_one(index: int) -> List[Dict[str, Any]]:
+			user_prompt = f"""Generate the one-line outline for paragraph {index + 1} of the next {num_outlines} paragraphs based on the following:
 
-			outlines = json.loads(response)
+		Context: {serialize(context)}
+		Instruction (content to cover in the outlines): {instruction}
 
-			if not isinstance(outlines, list) or len(outlines) != num_outlines:
-				raise ValueError(f"Expected {num_outlines} outlines, but received {len(outlines) if isinstance(outlines, list) else 'non-list data'}")
+		The other paragraphs are outlined separately, so cover only the part of the instruction that falls to paragraph {index + 1} of {num_outlines}. Please provide an array with this single outline, containing an 'outline' key."""
+			# uncached like the sequential path: only the suggestion endpoints opt into the response
+			# cache, and asking for outlines again is how an author gets different ones
+			return self._ask_items(user_prompt, system_prompt, "generate_chapter_outlines", valid)
 
-			for outline in outlines:
-				if not isinstance(outline, dict) or 'outline' not in outline:
-					raise ValueError("Invalid outline format in LLM response")
+		if mode == "parallel":
+			results = self._fanned_out(num_outlines, ask_one, "outlines")
+		else:
+			user_prompt = f"""Generate {num_outlines} one-line outlines for the next paragraphs based on the following:
 
-			self.logger.info(f"Successfully generated {len(outlines)} chapter outlines")
-			return outlines
+		Context: {serialize(context)}
+		Instruction (content to cover in the outlines): {instruction}
 
-		except json.JSONDecodeError as e:
-			self.logger.error(f"Failed to parse LLM response as JSON: {e}")
-			raise ValueError("Invalid response format from LLM") from e
+		Please provide an array of {num_outlines} outlines, each containing an 'outline' key."""
+			if stream:
+				first = self._streamed_items(user_prompt, system_prompt, "generate_chapter_outlines", valid)
+			else:
+				first = self._ask_items(user_prompt, system_prompt, "generate_chapter_outlines", valid)
+			results = self._topped_up(first, num_outlines, top_up, "outlines")
 
+		try:
+			outlines = self._item_results(results, num_outlines, stream)
 		except Exception as e:
 			self.logger.error(f"Unexpected error in generate_chapter_outlines: {e}")
 			raise
+		if not stream:
+			self.logger.info(f"Successfully generated {len(outlines)} chapter outlines")
+		return outlines
 
-	@retry(stop=stop_after_attempt(1), wait=wait_exponential(multiplier=1, min=4, max=10))
 	def generate_section_summary(
 		self,
 		context: Dict[str, Any],
@@ -269,33 +422,33 @@ Your output must be a valid JSON array where each element is an object containin
 
 		system_prompt = SYSTEM_PROMPT_SCENE_SUMMARY_WRITER
 
-		user_prompt = f"""
-Summarize the following paragraphs in JSON format as specified in the system message: `{context.get('paragraphs', "")}`
-
-Here's the relevant context:
-
-Novel Parameters: `{context.get('parameters', "")}`
-
-Current Chapter Synopsis: `{context.get('synopsis', "")}`
-
-Previous Section Summary: `{context.get('previous_summary', "")}`
+		task = f"""Summarize the Paragraphs to summarize above in JSON format as specified in the system message, using the Novel Parameters, Current Chapter Synopsis and Previous Section Summary as context.
 
 Ensure your summary captures all key elements without introducing any new information or speculation about future events.
 
 CRITICAL INSTRUCTIONS:
 1. For "sequence" list, make sure the new events/revelations are added after all the events/revelations are already compressed and give a proper sequence of the story so far. Keep the list to maximum 5 entries.
 """
+		user_prompt = layout_prompt([
+			("parameters", "Novel Parameters", context.get('parameters', "")),
+			("synopsis", "Current Chapter Synopsis", context.get('synopsis', "")),
+			("summary", "Previous Section Summary", context.get('previous_summary', "")),
+			("paragraphs", "Paragraphs to summarize", context.get('paragraphs', "")),
+			("task", None, task),
+		], endpoint="generate_section_summary")
 		# print(user_prompt)
 		try:
 			if stream:
 				return self.llm_client.generate_streamed_json(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
+					endpoint="generate_section_summary",
 				)
 			else:
 				response = self.llm_client.generate_json(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
+					endpoint="generate_section_summary",
 				)
 				return json.loads(response)
 
@@ -307,13 +460,13 @@ CRITICAL INSTRUCTIONS:
 			self.logger.error(f"Unexpected error in generate_new_scene: {e}")
 			raise
 
-	@retry(stop=stop_after_attempt(1), wait=wait_exponential(multiplier=1, min=4, max=10))
 	def generate_new_scene(
 		self,
 		context: Dict[str, Any],
 		instruction: str,
 		num_elements: int,
-		stream: bool = False
+		stream: bool = False,
+		partial: bool = False
 	) -> Dict[str, Any]:
 		"""
 		Generate a new scene based on the given context and instruction.
@@ -322,6 +475,7 @@ CRITICAL INSTRUCTIONS:
 			context (Dict[str, Any]): Context information for the scene
 			instruction (str): Specific instruction for generating the scene
 			num_elements (int): Minimum number of elements to generate in the scene
+			partial (bool): When streaming, also emit element field text while it is being generated
 
 		Returns:
 			Dict[str, Any]: Generated scene as a JSON object
@@ -331,19 +485,14 @@ CRITICAL INSTRUCTIONS:
 		if num_elements <= 0:
 			raise ValueError("Number of elements must be positive")
 
-		user_prompt = f"""Create a new scene in JSON format based on the instruction `{instruction}` and additional context (in priority order):
-1. Previous Screenplay: `{context.get('previous_screenplay', "")}`
-2. Overall Section Outline: `{context.get('overall_outline', "")}`
-3. Previous Section Summary: `{context.get('previous_summary', "")}`
-4. Synopsis for the entire chapter: `{context.get('synopsis', '')}`
-5. Overall story parameters: `{context.get('parameters', '')}`
+		task = f"""Create a new scene in JSON format based on the Instruction at the end of this message and the context above, in priority order: Previous Screenplay, Overall Section Outline, Previous Section Summary, Synopsis for the entire chapter, Overall story parameters.
 
 CRITICAL Instructions:
-- Analyze the Previous Screenplay (Point 1 above). Make a note of where the previous screenplay ends. The new scene should start after the events of previous screenplay only. Add a field "previous_end_note" with a single line noting the previous end if available.
+- Analyze the Previous Screenplay. Make a note of where the previous screenplay ends. The new scene should start after the events of previous screenplay only. Add a field "previous_end_note" with a single line noting the previous end if available.
 - Generate an extensive, richly detailed screenplay scene that follow the instructions exactly.
 - If specific instructions are unavailable, then take guidance from the current section outline.
-- Do not repeat any content from the Previous Section Summary (Point 3 above), those things have already happened, use them as guidance for the new scene.
-- Ensure the new scene especially the "sequence" part, does not repeat anything that has already happened in the "sequence" part of Previous Section Summary (Point 3 above).
+- Do not repeat any content from the Previous Section Summary, those things have already happened, use them as guidance for the new scene.
+- Ensure the new scene especially the "sequence" part, does not repeat anything that has already happened in the "sequence" part of Previous Section Summary.
 - Maintain consistency with the overall theme and character development described in the Chapter Synopsis and Parameters.
 - The scene should include:
   1. A vividly described setting with sensory details
@@ -358,17 +507,29 @@ CRITICAL Instructions:
 - If the instruction asks to make changes to characters, time or location modify those fields as well.
 
 Remember to structure your output as a JSON object according to the format specified in the system prompt, including title, setting, characters, and scene elements."""
+		user_prompt = layout_prompt([
+			("parameters", "Overall story parameters", context.get('parameters', '')),
+			("synopsis", "Synopsis for the entire chapter", context.get('synopsis', '')),
+			("outline", "Overall Section Outline", context.get('overall_outline', "")),
+			("summary", "Previous Section Summary", context.get('previous_summary', "")),
+			("screenplay", "Previous Screenplay", context.get('previous_screenplay', "")),
+			("task", None, task),
+			("instruction", "Instruction", instruction),
+		] + self._earlier_passages(context, instruction), endpoint="generate_new_scene")
 		print(user_prompt)
 		try:
 			if stream:
 				return self.llm_client.generate_streamed_json(
 					prompt=user_prompt,
 					system_prompt=SYSTEM_PROMPT_SCENE_WRITER,
+					endpoint="generate_new_scene",
+					partial=partial,
 				)
 			else:
 				response = self.llm_client.generate_json(
 					prompt=user_prompt,
 					system_prompt=SYSTEM_PROMPT_SCENE_WRITER,
+					endpoint="generate_new_scene",
 				)
 				return json.loads(response)
 
@@ -380,13 +541,13 @@ Remember to structure your output as a JSON object according to the format speci
 			self.logger.error(f"Unexpected error in generate_new_scene: {e}")
 			raise
 	
-	@retry(stop=stop_after_attempt(1), wait=wait_exponential(multiplier=1, min=4, max=10))
 	def continue_scene(
 		self,
 		context: Dict[str, Any],
 		instruction: str,
 		num_elements: int,
-		stream: bool = False
+		stream: bool = False,
+		partial: bool = False
 	) -> Dict[str, Any]:
 		"""
 		Generate a new scene based on the given context and instruction.
@@ -395,6 +556,7 @@ Remember to structure your output as a JSON object according to the format speci
 			context (Dict[str, Any]): Context information for the scene
 			instruction (str): Specific instruction for generating the scene
 			num_elements (int): Minimum number of elements to generate in the scene
+			partial (bool): When streaming, also emit element field text while it is being generated
 
 		Returns:
 			Dict[str, Any]: Generated scene as a JSON object
@@ -406,11 +568,7 @@ Remember to structure your output as a JSON object according to the format speci
 
 		system_prompt = SYSTEM_PROMPT_SCENE_WRITER
 
-		user_prompt = f"""Continue the screenplay scene in JSON format (only scene elements) based on the instruction `{instruction}` and additional context (in priority order), by adding more elements only:
-1. Current screenplay to continue: `{context.get('current_screenplay', "")}`
-2. Previous Section Summary: `{context.get('previous_summary', "")}`
-3. Synopsis for the entire chapter: `{context.get('synopsis', '')}`
-4. Overall story parameters: `{context.get('parameters', '')}`
+		task = f"""Continue the screenplay scene in JSON format (only scene elements) based on the Instruction at the end of this message and the context above, in priority order: Current screenplay to continue, Previous Section Summary, Synopsis for the entire chapter, Overall story parameters. Add more elements only.
 
 Instructions:
 - Continue the extensive, richly detailed screenplay scene that follows instructions precisely.
@@ -431,17 +589,28 @@ Instructions:
 
 Remember to structure your output as a JSON object according to the format specified in the system prompt and only generate scene elements.
 	"""
+		user_prompt = layout_prompt([
+			("parameters", "Overall story parameters", context.get('parameters', '')),
+			("synopsis", "Synopsis for the entire chapter", context.get('synopsis', '')),
+			("summary", "Previous Section Summary", context.get('previous_summary', "")),
+			("screenplay", "Current screenplay to continue", context.get('current_screenplay', "")),
+			("task", None, task),
+			("instruction", "Instruction", instruction),
+		] + self._earlier_passages(context, instruction), endpoint="continue_scene")
 		# print(user_prompt)
 		try:
 			if stream:
 				return self.llm_client.generate_streamed_json(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
+					endpoint="continue_scene",
+					partial=partial,
 				)
 			else:
 				response = self.llm_client.generate_json(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
+					endpoint="continue_scene",
 				)
 				return json.loads(response)
 
@@ -453,7 +622,6 @@ Remember to structure your output as a JSON object according to the format speci
 			self.logger.error(f"Unexpected error in generate_new_scene: {e}")
 			raise
 
-	@retry(stop=stop_after_attempt(1), wait=wait_exponential(multiplier=1, min=4, max=10))
 	def insert_scene(
 		self,
 		context: Dict[str, Any],
@@ -479,11 +647,7 @@ Remember to structure your output as a JSON object according to the format speci
 
 		system_prompt = SYSTEM_PROMPT_SCENE_WRITER
 
-		user_prompt = f"""Continue the screenplay scene in JSON format (only scene elements) based on the instruction `{instruction}` and additional context (in priority order), by adding more elements only:
-1. Current screenplay to continue: `{context.get('current_screenplay', "")}`
-2. Previous Section Summary: `{context.get('previous_summary', "")}`
-3. Synopsis for the entire chapter: `{context.get('synopsis', '')}`
-4. Overall story parameters: `{context.get('parameters', '')}`
+		task = f"""Continue the screenplay scene in JSON format (only scene elements) based on the Instruction at the end of this message and the context above, in priority order: Current screenplay to continue, Previous Section Summary, Synopsis for the entire chapter, Overall story parameters. Add more elements only.
 
 Instructions:
 - Continue the extensive, richly detailed screenplay scene that follows instructions precisely.
@@ -504,17 +668,27 @@ Instructions:
 
 Remember to structure your output as a JSON object according to the format specified in the system prompt and only generate scene elements.
 	"""
+		user_prompt = layout_prompt([
+			("parameters", "Overall story parameters", context.get('parameters', '')),
+			("synopsis", "Synopsis for the entire chapter", context.get('synopsis', '')),
+			("summary", "Previous Section Summary", context.get('previous_summary', "")),
+			("screenplay", "Current screenplay to continue", context.get('current_screenplay', "")),
+			("task", None, task),
+			("instruction", "Instruction", instruction),
+		] + self._earlier_passages(context, instruction), endpoint="insert_scene")
 		# print(user_prompt)
 		try:
 			if stream:
 				return self.llm_client.generate_streamed_json(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
+					endpoint="insert_scene",
 				)
 			else:
 				response = self.llm_client.generate_json(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
+					endpoint="insert_scene",
 				)
 				return json.loads(response)
 
@@ -526,13 +700,14 @@ Remember to structure your output as a JSON object according to the format speci
 			self.logger.error(f"Unexpected error in generate_new_scene: {e}")
 			raise
 
-	@retry(stop=stop_after_attempt(1), wait=wait_exponential(multiplier=1, min=4, max=10))
 	def rewrite_scene(
 		self,
 		context: Dict[str, Any],
 		instruction: str,
 		num_elements: int,
-		stream: bool = False
+		stream: bool = False,
+		partial: bool = False,
+		mode: str = "full"
 	) -> Dict[str, Any]:
 		"""
 		Generate a rewritten scene based on the given context and instruction.
@@ -541,6 +716,9 @@ Remember to structure your output as a JSON object according to the format speci
 			context (Dict[str, Any]): Context information for the scene
 			instruction (str): Specific instruction for generating the scene
 			num_elements (int): Number of elements to generate in the scene
+			partial (bool): When streaming, also emit element field text while it is being generated
+			mode (str): "full" regenerates the scene; "patch" has the model return edit operations
+				only, applied to the current screenplay (which must then be a scene object)
 
 		Returns:
 			Dict[str, Any]: Generated scene as a JSON object
@@ -550,13 +728,16 @@ Remember to structure your output as a JSON object according to the format speci
 		if num_elements <= 0:
 			raise ValueError("Number of elements must be positive")
 
+		if mode == "patch":
+			if is_patchable(context.get('current_screenplay')):
+				return self._patch_scene(context, instruction, stream, partial)
+			self.logger.info("Current screenplay is not a scene object, rewriting it in full")
+		elif mode != "full":
+			raise ValueError(f"Unknown rewrite mode {mode!r}, expected full or patch")
+
 		system_prompt = SYSTEM_PROMPT_SCENE_WRITER
 
-		user_prompt = f"""Rewrite the screenplay scene in JSON format based on the instruction `{instruction}` and additional context (in priority order):
-1. Current screenplay to rewrite: `{context.get('current_screenplay', "")}`
-2. Previous Section Summary: `{context.get('previous_summary', "")}`
-3. Synopsis for the entire chapter: `{context.get('synopsis', '')}`
-4. Overall story parameters: `{context.get('parameters', '')}`
+		task = f"""Rewrite the screenplay scene in JSON format based on the Instruction at the end of this message and the context above, in priority order: Current screenplay to rewrite, Previous Section Summary, Synopsis for the entire chapter, Overall story parameters.
 
 Instructions:
 - Generate an extensive, richly detailed screenplay scene that follows instructions precisely to alter the scene.
@@ -577,17 +758,28 @@ Instructions:
 
 Remember to structure your output as a JSON object according to the format specified in the system prompt, including title, setting, characters, and scene elements.
     """
+		user_prompt = layout_prompt([
+			("parameters", "Overall story parameters", context.get('parameters', '')),
+			("synopsis", "Synopsis for the entire chapter", context.get('synopsis', '')),
+			("summary", "Previous Section Summary", context.get('previous_summary', "")),
+			("screenplay", "Current screenplay to rewrite", context.get('current_screenplay', "")),
+			("task", None, task),
+			("instruction", "Instruction", instruction),
+		] + self._earlier_passages(context, instruction), endpoint="rewrite_scene")
 		# print(user_prompt)
 		try:
 			if stream:
 				return self.llm_client.generate_streamed_json(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
+					endpoint="rewrite_scene",
+					partial=partial,
 				)
 			else:
 				response = self.llm_client.generate_json(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
+					endpoint="rewrite_scene",
 				)
 				return json.loads(response)
 
@@ -599,7 +791,46 @@ Remember to structure your output as a JSON object according to the format speci
 			self.logger.error(f"Unexpected error in generate_new_scene: {e}")
 			raise
 
-	@retry(stop=stop_after_attempt(1), wait=wait_exponential(multiplier=1, min=4, max=10))
+	def _patch_scene(self, context: Dict[str, Any], instruction: str, stream: bool, partial: bool):
+		"""rewrite_scene in patch mode: the model edits elements by index and the server applies the edits."""
+		scene = context['current_screenplay']
+		task = """Rewrite the Current screenplay above according to the Instruction at the end of this message, using the Previous Section Summary, Synopsis for the entire chapter and Overall story parameters as context.
+
+Return only the edit operations (replace, insert, delete, set) described in the system message, addressing elements by their # number. Do not repeat elements that stay as they are."""
+		user_prompt = layout_prompt([
+			("parameters", "Overall story parameters", context.get('parameters', '')),
+			("synopsis", "Synopsis for the entire chapter", context.get('synopsis', '')),
+			("summary", "Previous Section Summary", context.get('previous_summary', "")),
+			("screenplay", "Current screenplay", compact_scene(scene, numbered=True)),
+			("task", None, task),
+			("instruction", "Instruction", instruction),
+		] + self._earlier_passages(context, instruction), endpoint="rewrite_scene_patch")
+		try:
+			if stream:
+				chunks = self.llm_client.generate_streamed_json(
+					prompt=user_prompt,
+					system_prompt=SYSTEM_PROMPT_SCENE_PATCH_WRITER,
+					endpoint="rewrite_scene_patch",
+				)
+				return stream_after(chunks, lambda operations: patched_scene_chunks(scene, operations, partial))
+			response = json.loads(self.llm_client.generate_json(
+				prompt=user_prompt,
+				system_prompt=SYSTEM_PROMPT_SCENE_PATCH_WRITER,
+				endpoint="rewrite_scene_patch",
+			))
+			# models sometimes wrap the list in an object ({"operations": [...]})
+			if isinstance(response, dict):
+				response = next((value for value in response.values() if isinstance(value, list)), response)
+			return apply_scene_patch(scene, response)
+
+		except json.JSONDecodeError as e:
+			self.logger.error(f"Failed to parse LLM response as JSON: {e}")
+			raise ValueError("Invalid response format from LLM") from e
+
+		except Exception as e:
+			self.logger.error(f"Unexpected error in rewrite_scene: {e}")
+			raise
+
 	def new_scene_paragraphs(
 		self,
 		context: Dict[str, Any],
@@ -623,11 +854,7 @@ Remember to structure your output as a JSON object according to the format speci
 
 		system_prompt = SYSTEM_PROMPT_SCENE_PARAGRAPH_WRITER
 
-		user_prompt = f"""Transform the following screenplay scene into novel-style paragraphs. Your task is to accurately represent all elements of the screenplay in prose form without altering or adding any major plot points or significant details. Use the following context:
-1. Current Screenplay: `{context.get('current_screenplay', "")}`
-2. Additional Instructions: `{instruction}`
-3. Synopsis for the entire chapter: `{context.get('synopsis', '')}`
-4. Overall story parameters: `{context.get('parameters', '')}`
+		task = f"""Transform the Current Screenplay above into novel-style paragraphs. Your task is to accurately represent all elements of the screenplay in prose form without altering or adding any major plot points or significant details. Use the Synopsis for the entire chapter, the Overall story parameters and the Additional Instructions at the end of this message as context.
 
 Instructions:
 1. Begin your prose with a paragraph that sets the scene, incorporating the details from the "setting" object in the JSON.
@@ -642,17 +869,26 @@ Instructions:
 7. Organize your writing into paragraphs that correspond to natural breaks or shifts in the scene.
 8. Do not write short paragraphs.
 	"""
+		user_prompt = layout_prompt([
+			("parameters", "Overall story parameters", context.get('parameters', '')),
+			("synopsis", "Synopsis for the entire chapter", context.get('synopsis', '')),
+			("screenplay", "Current Screenplay", context.get('current_screenplay', "")),
+			("task", None, task),
+			("instruction", "Additional Instructions", instruction),
+		] + self._earlier_passages(context, instruction), endpoint="new_scene_paragraphs")
 		# print(user_prompt)
 		try:
 			if stream:
 				return self.llm_client.generate_streamed_text(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
+					endpoint="new_scene_paragraphs",
 				)
 			else:
 				response = self.llm_client.generate_text(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
+					endpoint="new_scene_paragraphs",
 				)
 				return json.loads(response)
 
@@ -664,13 +900,13 @@ Instructions:
 			self.logger.error(f"Unexpected error in generate_new_scene: {e}")
 			raise
 
-	@retry(stop=stop_after_attempt(1), wait=wait_exponential(multiplier=1, min=4, max=10))
 	def rewrite_scene_paragraphs(
 		self,
 		context: Dict[str, Any],
 		instruction: str,
 		num_paragraphs: int,
-		stream: bool = False
+		stream: bool = False,
+		mode: str = "edits"
 	) -> Dict[str, Any]:
 		"""
 		Generate a rewritten paragraphs for scene based on the given context and instruction.
@@ -679,6 +915,12 @@ Instructions:
 			context (Dict[str, Any]): Context information for the scene
 			instruction (str): Specific instruction for generating the scene paragraphs
 			num_paragraphs (int): Number of paragraphs to generate for the scene
+			mode (str): "edits" numbers the sentences and has the model return only the ones it
+				changes, expanded here into the action list; "full" has the model write every
+				sentence's action itself
+
+		Streamed, each action is sent as soon as it is parsed as {"chunk": <action>, "seq": n},
+		followed by a {"summary": {<action>: count, ..., "actions": n}} event before [DONE].
 
 		Returns:
 			Dict[str, Any]: Generated paragraphs as a JSON object
@@ -686,19 +928,20 @@ Instructions:
 		if num_paragraphs <= 0:
 			raise ValueError("Number of paragraphs must be positive")
 
-		system_prompt = SYSTEM_PROMPT_SCENE_PARAGRAPH_WRITER
+		if mode == "edits":
+			paragraphs = split_sentences(serialize(context.get('paragraph') or ''))
+			if paragraphs:
+				return self._edit_sentences(context, instruction, num_paragraphs, stream, paragraphs)
+		elif mode != "full":
+			raise ValueError(f"Unknown rewrite mode {mode!r}, expected edits or full")
 
-		user_prompt = f"""
-	Rewrite the following paragraph(s) within the context of its section and the overall story:
+		system_prompt = SYSTEM_PROMPT_SCENE_PARAGRAPH_WRITER
 
-	1. Chapter Synopsis: {context.get('synopsis', '')}
-	2. Overall Story Parameters: {context.get('parameters', '')}
-	3. Previous Paragraph: {context.get('previous_paragraph', '')}
-	4. Paragraph(s) to Rewrite: {context.get('paragraph', '')}
-	5. Next Paragraph: {context.get('next_paragraph', '')}
+		task = f"""
+	Rewrite the Paragraph(s) to Rewrite above within the context of its section and the overall story.
 
 	CRITICAL INSTRUCTIONS:
-	1. Follow these specific instructions to rewrite the paragraph(s): `{instruction}`
+	1. Follow the Instruction at the end of this message to rewrite the paragraph(s).
 	2. Rewrite ONLY the given paragraph(s). Do not alter or address content from other paragraphs in the section.
 	3. Write exactly {num_paragraphs} paragraph(s) that fit perfectly between the previous and next paragraphs, maintaining a natural flow and seamless continuity.
 	4. Do not repeat any part of next paragraph in the newly generated paragraphs.
@@ -734,18 +977,29 @@ Instructions:
 
 	Return only the JSON list of dictionaries representing the rewritten paragraph(s). Do not include any explanatory text or metadata in your response.
 	"""
+		user_prompt = layout_prompt([
+			("parameters", "Overall Story Parameters", context.get('parameters', '')),
+			("synopsis", "Chapter Synopsis", context.get('synopsis', '')),
+			("paragraphs", "Previous Paragraph", context.get('previous_paragraph', '')),
+			("paragraphs", "Paragraph(s) to Rewrite", context.get('paragraph', '')),
+			("paragraphs", "Next Paragraph", context.get('next_paragraph', '')),
+			("task", None, task),
+			("instruction", "Instruction", instruction),
+		] + self._earlier_passages(context, instruction), endpoint="rewrite_scene_paragraphs")
 		print(user_prompt)
 
 		try:
 			if stream:
-				return self.llm_client.generate_streamed_json(
+				return action_chunks(self.llm_client.generate_streamed_json(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
-				)
+					endpoint="rewrite_scene_paragraphs",
+				))
 			else:
 				response = self.llm_client.generate_json(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
+					endpoint="rewrite_scene_paragraphs",
 				)
 				return json.loads(response)
 
@@ -757,7 +1011,62 @@ Instructions:
 			self.logger.error(f"Unexpected error in generate_new_scene: {e}")
 			raise
 
-	@retry(stop=stop_after_attempt(1), wait=wait_exponential(multiplier=1, min=4, max=10))
+	def _edit_sentences(self, context: Dict[str, Any], instruction: str, num_paragraphs: int, stream: bool, paragraphs: List[List[str]]):
+		"""rewrite_scene_paragraphs in edits mode: the model changes numbered sentences and the actions are rebuilt here."""
+		task = f"""
+	Rewrite the Paragraph(s) to Rewrite above within the context of its section and the overall story. Its sentences are numbered S1, S2, ...; blank lines separate paragraphs.
+
+	CRITICAL INSTRUCTIONS:
+	1. Follow the Instruction at the end of this message to rewrite the paragraph(s).
+	2. Rewrite ONLY the given paragraph(s), so they still fit between the previous and next paragraphs. Do not repeat any part of the next paragraph.
+	3. The result should have {num_paragraphs} paragraph(s).
+	4. Make changes ONLY where the instruction requires them. Do not rewrite sentences or make stylistic changes it does not ask for.
+	5. For general instructions (e.g., "make this paragraph funnier"), change only the sentences where it matters.
+
+	OUTPUT FORMAT:
+	Return a JSON list of the changes only, in sentence order. Sentences you do not list stay as they are; never list an unchanged sentence.
+	1. {{"op": "edit", "id": "S3", "text": "<rewritten sentence>"}}
+	2. {{"op": "add", "after": "S3", "text": "<new sentence>"}} (use "S0" to add before the first sentence)
+	3. {{"op": "remove", "id": "S4"}}
+	4. {{"op": "break", "after": "S5"}} to start a new paragraph after a sentence, {{"op": "join", "after": "S2"}} to merge the paragraphs on either side of a paragraph end
+
+	Return only the JSON list, or [] if nothing needs to change. Do not include any explanatory text.
+	"""
+		user_prompt = layout_prompt([
+			("parameters", "Overall Story Parameters", context.get('parameters', '')),
+			("synopsis", "Chapter Synopsis", context.get('synopsis', '')),
+			("paragraphs", "Previous Paragraph", context.get('previous_paragraph', '')),
+			("paragraphs", "Paragraph(s) to Rewrite", numbered_sentences(paragraphs)),
+			("paragraphs", "Next Paragraph", context.get('next_paragraph', '')),
+			("task", None, task),
+			("instruction", "Instruction", instruction),
+		] + self._earlier_passages(context, instruction), endpoint="rewrite_scene_sentences")
+		try:
+			if stream:
+				chunks = self.llm_client.generate_streamed_json(
+					prompt=user_prompt,
+					system_prompt=SYSTEM_PROMPT_SCENE_PARAGRAPH_WRITER,
+					endpoint="rewrite_scene_sentences",
+				)
+				return sentence_edit_chunks(paragraphs, chunks)
+			edits = json.loads(self.llm_client.generate_json(
+				prompt=user_prompt,
+				system_prompt=SYSTEM_PROMPT_SCENE_PARAGRAPH_WRITER,
+				endpoint="rewrite_scene_sentences",
+			))
+			# models sometimes wrap the list in an object ({"edits": [...]})
+			if isinstance(edits, dict):
+				edits = next((value for value in edits.values() if isinstance(value, list)), edits)
+			return edits_to_actions(paragraphs, edits)
+
+		except json.JSONDecodeError as e:
+			self.logger.error(f"Failed to parse LLM response as JSON: {e}")
+			raise ValueError("Invalid response format from LLM") from e
+
+		except Exception as e:
+			self.logger.error(f"Unexpected error in rewrite_scene_paragraphs: {e}")
+			raise
+
 	def insert_scene_paragraphs(
 		self,
 		context: Dict[str, Any],
@@ -781,18 +1090,11 @@ Instructions:
 
 		system_prompt = SYSTEM_PROMPT_SCENE_PARAGRAPH_WRITER
 
-		user_prompt = f"""
-Insert {num_paragraphs} paragraphs between previous paragraph and next paragraph:
-
-1. Specific instruction to follow (can be empty): {instruction}
-2. Previous paragraph (required): {context.get('prev', '')}
-3. Next paragraph (can be empty): {context.get('next', '')}
-4. Section summary (can be empty): {context.get('summary', '')}
-5. Chapter synopsis: {context.get('synopsis', '')}
-6. Overall Story Parameters: {context.get('parameters', '')}
+		task = f"""
+Insert {num_paragraphs} paragraphs between the Previous paragraph and the Next paragraph above.
 
 CRITICAL INSTRUCTIONS:
-1. Follow these specific instructions (Point 1) to insert new paragraphs
+1. Follow the Specific instruction at the end of this message to insert new paragraphs
 2. Ensure the inserted {num_paragraphs} new paragraph/s fits seamlessly within the section, maintaining continuity with preceding and following paragraphs.
 
 STYLE GUIDELINES:
@@ -815,16 +1117,27 @@ FINAL VERIFICATION:
 
 Return all the inserted paragraphs. Do not include any explanatory text or metadata in your response.
 """
+		user_prompt = layout_prompt([
+			("parameters", "Overall Story Parameters", context.get('parameters', '')),
+			("synopsis", "Chapter synopsis", context.get('synopsis', '')),
+			("summary", "Section summary (can be empty)", context.get('summary', '')),
+			("paragraphs", "Previous paragraph (required)", context.get('prev', '')),
+			("paragraphs", "Next paragraph (can be empty)", context.get('next', '')),
+			("task", None, task),
+			("instruction", "Specific instruction to follow (can be empty)", instruction),
+		] + self._earlier_passages(context, instruction), endpoint="insert_scene_paragraphs")
 		try:
 			if stream:
 				return self.llm_client.generate_streamed_text(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
+					endpoint="insert_scene_paragraphs",
 				)
 			else:
 				response = self.llm_client.generate_text(
 					prompt=user_prompt,
 					system_prompt=system_prompt,
+					endpoint="insert_scene_paragraphs",
 				)
 				return json.loads(response)
 
@@ -0,0 +1,10 @@
+import pytest
+from core import rate_limit
+
+@pytest.fixture(autouse=True)
+def isolated_rate_limits(monkeypatch, tmp_path):
+    """Give each test its own rate-limit files, so no test inherits (or leaves on the host) another's blocks."""
+    monkeypatch.setattr(rate_limit, "LLM_RATE_LIMIT_PATH", str(tmp_path / "rate-limit.db"))
+    monkeypatch.setattr(rate_limit, "_limiter", None)
+    monkeypatch.setattr(rate_limit, "_provider_limiters", {})
+    monkeypatch.setattr(rate_limit, "_provider_urls", {})
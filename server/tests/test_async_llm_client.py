@@ -0,0 +1,55 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from core.async_llm_client import AsyncLLMClient
+
+def make_chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], usage=None)
+
+class FakeStream:
+    def __init__(self, pieces):
+        self.pieces = pieces
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for piece in self.pieces:
+            yield make_chunk(piece)
+
+async def collect(agen):
+    return [item async for item in agen]
+
+@pytest.fixture
+def async_llm_client(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    return AsyncLLMClient()
+
+def test_generate_streamed_json(async_llm_client):
+    pieces = ['{"elements": [{"type": "act', 'ion", "description": "A"}, ', '{"type": "action", "description": "B"}]}']
+    async_llm_client.client.chat.completions.create = AsyncMock(return_value=FakeStream(pieces))
+
+    result = asyncio.run(collect(async_llm_client.generate_streamed_json("prompt", "system")))
+
+    assert [json.loads(r["chunk"]) for r in result[:-1]] == [
+        {"type": "action", "description": "A"},
+        {"type": "action", "description": "B"},
+    ]
+    assert result[-1] == {"chunk": "[DONE]"}
+
+def test_generate_streamed_text(async_llm_client):
+    pieces = ['First sentence. Sec', 'ond sentence! Third']
+    async_llm_client.client.chat.completions.create = AsyncMock(return_value=FakeStream(pieces))
+
+    result = asyncio.run(collect(async_llm_client.generate_streamed_text("prompt", "system")))
+
+    assert [r["chunk"] for r in result] == ["First sentence.", "Second sentence!", "Third", "[DONE]"]
+
+def test_generate_streamed_json_api_error(async_llm_client):
+    async_llm_client.client.chat.completions.create = AsyncMock(side_effect=Exception("API Error"))
+
+    result = asyncio.run(collect(async_llm_client.generate_streamed_json("prompt", "system")))
+
+    assert result == [{"error": "An error occurred: API Error"}]
@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+import asyncio
+import pytest
+from core.async_llm_client import AsyncLLMClient
+from core.llm_client import LLMClient
+from core.usage import LLM_CANCELLED_TOKENS
+from fake_openai import FakeOpenAI, serve_in_thread
+
+PATH = "/api/v1/chapters/scene/paragraph/new"
+
+async def stream_then_leave(asgi, body, leave=True, path=PATH):
+    """POST a streamed request, go away after its first chunk (if `leave`), and return the body lines received."""
+    data = json.dumps(body).encode()
+    messages = [{"type": "http.request", "body": data, "more_body": False}]
+    first_chunk = asyncio.Event()
+    finished = asyncio.Event()
+    lines = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await (first_chunk if leave else finished).wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            lines.extend(json.loads(line) for line in message.get("body", b"").decode().splitlines())
+            if message.get("body"):
+                first_chunk.set()
+            if not message.get("more_body", False):
+                finished.set()
+
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "POST", "scheme": "http", "path": path, "root_path": "",
+        "query_string": b"", "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())], "client": ("127.0.0.1", 1234),
+    }
+    await asgi.app(scope, receive, send)
+    return lines
+
+@pytest.mark.parametrize("served_by", ["asgi", "flask"])
+def test_upstream_stream_closes_soon_after_the_client_leaves(monkeypatch, served_by):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    import asgi
+    fake = FakeOpenAI(ttft=0.05, tokens_per_second=50, output=" ".join(["The rain kept falling on the roof."] * 200))
+    base_url = serve_in_thread(fake) + "/v1"
+    if served_by == "asgi":
+        monkeypatch.setattr(asgi.async_writing_service, "llm_client", AsyncLLMClient(base_url=base_url))
+    else:
+        monkeypatch.setattr(asgi, "STREAMING_ROUTES", {})
+        monkeypatch.setattr(asgi.writing_service, "llm_client", LLMClient(base_url=base_url))
+    cancelled_before = sum(LLM_CANCELLED_TOKENS.values().values())
+
+    start = time.monotonic()
+    asyncio.run(stream_then_leave(asgi, {"context": {}, "instruction": f"Leave early ({served_by})", "count": 1, "stream": True}))
+    while fake.stats()["disconnected_streams"] == 0 and time.monotonic() - start < 5:
+        time.sleep(0.02)
+
+    # the whole text would take over 30 s to stream
+    assert time.monotonic() - start < 2
+    assert fake.stats()["disconnected_streams"] == 1 and fake.stats()["open_streams"] == 0
+    assert sum(LLM_CANCELLED_TOKENS.values().values()) > cancelled_before
+
+def test_one_client_leaving_a_coalesced_stream_leaves_the_other_going(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    import asgi
+    fake = FakeOpenAI(ttft=0.05, tokens_per_second=400, output=" ".join(["The rain kept falling on the roof."] * 20))
+    monkeypatch.setattr(asgi.async_writing_service, "llm_client", AsyncLLMClient(base_url=serve_in_thread(fake) + "/v1"))
+    body = {"context": {}, "instruction": "Two readers", "count": 1, "stream": True}
+
+    async def main():
+        # the first client is the one reading from upstream when it leaves
+        leaving = asyncio.ensure_future(stream_then_leave(asgi, body))
+        await asyncio.sleep(0)
+        return await asyncio.gather(leaving, stream_then_leave(asgi, body, leave=False))
+
+    left, stayed = asyncio.run(main())
+
+    assert len(left) < 20
+    assert [line["chunk"] for line in stayed] == ["The rain kept falling on the roof."] * 20 + ["[DONE]"]
+    assert fake.stats()["requests"] == 1 and fake.stats()["disconnected_streams"] == 0
+
+def test_requests_for_the_flask_app_run_in_parallel(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    import asgi
+
+    def slow_summary(context):
+        time.sleep(0.5)
+        return threading.current_thread().name
+
+    monkeypatch.setattr(asgi.writing_service, "generate_section_summary", slow_summary)
+
+    async def main():
+        return await asyncio.gather(*(
+            stream_then_leave(asgi, {"context": {}}, leave=False, path="/api/v1/chapters/summary") for _ in range(4)
+        ))
+
+    start = time.monotonic()
+    responses = asyncio.run(main())
+
+    assert time.monotonic() - start < 1.5
+    assert len({lines[0]["summary"] for lines in responses}) == 4
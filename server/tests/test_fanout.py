@@ -0,0 +1,86 @@
+import json
+import re
+import threading
+import httpx
+import openai
+import pytest
+from unittest.mock import MagicMock
+from core.fanout import fan_out
+from core.llm_client import LLMClient
+from services.writing_service import WritingService
+
+def test_results_arrive_as_calls_finish_and_failures_are_made_again():
+    release = threading.Event()
+    attempts = []
+
+    def call(index):
+        attempts.append(index)
+        if index == 0:
+            release.wait(5)
+        if index == 2 and attempts.count(2) == 1:
+            raise ValueError("short")
+        return f"item {index}"
+
+    results = fan_out(call, 3, workers=3)
+    first = [next(results), next(results)]
+    release.set()
+    assert sorted(first) == [(1, "item 1"), (2, "item 2")]
+    assert list(results) == [(0, "item 0")]
+    assert sorted(attempts) == [0, 1, 2, 2]
+
+def test_items_failing_every_attempt_raise():
+    with pytest.raises(ValueError):
+        list(fan_out(lambda index: (_ for _ in ()).throw(ValueError("bad")), 2, attempts=2))
+
+def outline_service(reply):
+    """A WritingService whose model answers each prompt with reply(prompt)."""
+    llm_client = MagicMock()
+    llm_client.generate_json.side_effect = lambda prompt, **kwargs: json.dumps(reply(prompt))
+    return WritingService(llm_client), llm_client
+
+def test_short_replies_are_topped_up_rather_than_thrown_away():
+    service, llm_client = outline_service(
+        lambda prompt: [{"outline": "A"}, {"outline": "B"}, {"note": "not an outline"}] if "already written" not in prompt else [{"outline": "C"}, {"outline": "D"}]
+    )
+
+    assert service.generate_chapter_outlines({}, "", 3) == [{"outline": "A"}, {"outline": "B"}, {"outline": "C"}]
+    top_up = llm_client.generate_json.call_args.kwargs["prompt"]
+    assert top_up.startswith("Generate 1 one-line outlines")
+    assert "Outlines already written" in top_up and llm_client.generate_json.call_count == 2
+
+def test_parallel_mode_asks_once_per_outline_in_order():
+    service, llm_client = outline_service(
+        lambda prompt: [{"outline": "Outline " + re.search(r"paragraph (\d+) of", prompt).group(1)}]
+    )
+
+    outlines = service.generate_chapter_outlines({}, "Rain.", 4, mode="parallel")
+
+    assert outlines == [{"outline": f"Outline {i}"} for i in range(1, 5)]
+    assert llm_client.generate_json.call_count == 4
+
+def test_a_failing_branch_raises_its_upstream_error(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    llm_client = LLMClient()
+
+    def complete(route, prompt, *args):
+        if "paragraph 2 of" in prompt:
+            response = httpx.Response(400, request=httpx.Request("POST", "http://fake/v1/chat/completions"))
+            raise openai.BadRequestError("context too long", response=response, body=None)
+        return json.dumps([{"outline": "Outline"}])
+
+    monkeypatch.setattr(llm_client, "_complete", complete)
+
+    # the branches run on fan-out threads, outside any Flask app context
+    with pytest.raises(openai.BadRequestError, match="context too long"):
+        WritingService(llm_client).generate_chapter_outlines({}, "Rain.", 3, mode="parallel")
+
+def test_streamed_suggestions_are_indexed_chunks():
+    service, _ = outline_service(
+        lambda prompt: [{"title": "T" + re.search(r"new chapter (\d+) of", prompt).group(1), "synopsis": "S", "act": 1}]
+    )
+
+    chunks = list(service.generate_chapter_suggestions([], {}, 2, 10, mode="parallel", stream=True))
+
+    assert sorted((chunk["index"], json.loads(chunk["chunk"])["title"]) for chunk in chunks[:-1]) == [(0, "T1"), (1, "T2")]
+    assert all(chunk["complete"] for chunk in chunks[:-1])
+    assert chunks[-1] == {"chunk": "[DONE]"}
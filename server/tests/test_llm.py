@@ -1,86 +1,91 @@
 import pytest
 import json
-from unittest.mock import Mock, patch
+import openai
 from core.llm_client import LLMClient
-from openai import OpenAI
-
-@pytest.fixture
-def llm_client():
-    with patch('llm_client.OpenAI'):
-        yield LLMClient()
-
-@pytest.fixture
-def mock_openai_response():
-    mock_response = Mock()
-    mock_response.choices = [Mock(message=Mock(content='{"key": "value"}'))]
-    return mock_response
-
-def test_generate_json_success(llm_client, mock_openai_response):
-    with patch.object(llm_client.client.chat.completions, 'create', return_value=mock_openai_response):
-        result = llm_client.generate_json(
-            prompt="Test prompt",
-            system_prompt="Test system prompt",
-            json_schema={"type": "object", "properties": {"key": {"type": "string"}}}
-        )
-    
-    assert result == {"key": "value"}
-
-def test_generate_json_invalid_json(llm_client):
-    mock_response = Mock()
-    mock_response.choices = [Mock(message=Mock(content='Invalid JSON'))]
-    
-    with patch.object(llm_client.client.chat.completions, 'create', return_value=mock_response):
-        result = llm_client.generate_json(
-            prompt="Test prompt",
-            system_prompt="Test system prompt",
-            json_schema={"type": "object"}
-        )
-    
-    assert isinstance(result, tuple)
-    assert result[0].json['error'] == "Failed to generate valid JSON response"
-    assert result[1] == 500
-
-def test_generate_json_schema_validation_failure(llm_client, mock_openai_response):
-    with patch.object(llm_client.client.chat.completions, 'create', return_value=mock_openai_response):
-        with pytest.raises(ValueError, match="Missing required key: required_key"):
-            llm_client.generate_json(
-                prompt="Test prompt",
-                system_prompt="Test system prompt",
-                json_schema={
-                    "type": "object",
-                    "properties": {"required_key": {"type": "string"}},
-                    "required": ["required_key"]
-                }
-            )
-
-def test_generate_text_success(llm_client):
-    mock_response = Mock()
-    mock_response.choices = [Mock(message=Mock(content='Generated text'))]
-    
-    with patch.object(llm_client.client.chat.completions, 'create', return_value=mock_response):
-        result = llm_client.generate_text(
-            prompt="Test prompt",
-            system_prompt="Test system prompt"
-        )
-    
-    assert result == 'Generated text'
-
-def test_generate_json_api_error(llm_client):
-    with patch.object(llm_client.client.chat.completions, 'create', side_effect=Exception("API Error")):
-        result = llm_client.generate_json(
-            prompt="Test prompt",
-            system_prompt="Test system prompt",
-            json_schema={"type": "object"}
-        )
-    
-    assert isinstance(result, tuple)
-    assert result[0].json['error'] == "An error occurred while processing the request"
-    assert result[1] == 500
-
-def test_generate_text_api_error(llm_client):
-    with patch.object(llm_client.client.chat.completions, 'create', side_effect=Exception("API Error")):
-        with pytest.raises(Exception, match="API Error"):
-            llm_client.generate_text(
-                prompt="Test prompt",
-                system_prompt="Test system prompt"
-            )
\ No newline at end of file
+from core.prompts import SYSTEM_PROMPT_SCENE_WRITER, SYSTEM_PROMPT_SCENE_SUMMARY_WRITER
+from fake_openai import FakeOpenAI, serve_in_thread
+from fake_openai.outputs import SUMMARY, prose, scene
+
+@pytest.fixture(scope="module")
+def fake_base_url():
+    return serve_in_thread(FakeOpenAI(ttft=0, tokens_per_second=100000)) + "/v1"
+
+@pytest.fixture(scope="module")
+def failing_base_url():
+    return serve_in_thread(FakeOpenAI(ttft=0, error_rate=1.0)) + "/v1"
+
+@pytest.fixture(scope="module")
+def rate_limited_base_url():
+    return serve_in_thread(FakeOpenAI(ttft=0, rate_limit_rate=1.0)) + "/v1"
+
+def make_client(monkeypatch, base_url):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    llm_client = LLMClient(base_url=base_url)
+    return llm_client
+
+def test_generate_json_success(monkeypatch, fake_base_url):
+    llm_client = make_client(monkeypatch, fake_base_url)
+
+    result = llm_client.generate_json(prompt="Summarize", system_prompt=SYSTEM_PROMPT_SCENE_SUMMARY_WRITER)
+
+    assert json.loads(result) == SUMMARY
+
+def test_json_schema_validation_failure(monkeypatch, fake_base_url):
+    llm_client = make_client(monkeypatch, fake_base_url)
+    schema = {"type": "object", "properties": {"required_key": {"type": "string"}}, "required": ["required_key"]}
+
+    with pytest.raises(ValueError, match="Missing required key: required_key"):
+        llm_client._validate_json_schema({"key": "value"}, schema)
+
+def test_generate_text_success(monkeypatch, fake_base_url):
+    llm_client = make_client(monkeypatch, fake_base_url)
+
+    result = llm_client.generate_text(prompt="Write", system_prompt="Test system prompt", max_tokens=10000)
+
+    assert result == prose()
+
+def test_generate_text_honours_max_tokens(monkeypatch, fake_base_url):
+    llm_client = make_client(monkeypatch, fake_base_url)
+
+    result = llm_client.generate_text(prompt="Write", system_prompt="Test system prompt", max_tokens=5)
+
+    assert result == prose()[:len(result)]
+    assert 5 <= len(result) <= 20
+
+def test_generate_streamed_json(monkeypatch, fake_base_url):
+    llm_client = make_client(monkeypatch, fake_base_url)
+
+    result = list(llm_client.generate_streamed_json(prompt="Write a scene", system_prompt=SYSTEM_PROMPT_SCENE_WRITER, max_tokens=10000))
+
+    elements = [json.loads(r["chunk"]) for r in result[:-1] if "type" in json.loads(r["chunk"])]
+    assert [e["type"] for e in elements] == [e["type"] for e in json.loads(scene())["elements"]]
+    assert result[-1] == {"chunk": "[DONE]"}
+
+def test_generate_streamed_text(monkeypatch, fake_base_url):
+    llm_client = make_client(monkeypatch, fake_base_url)
+
+    result = list(llm_client.generate_streamed_text(prompt="Write", system_prompt="Test system prompt"))
+
+    assert result[0]["chunk"] == prose().split(". ")[0] + "."
+    assert {"chunk": "\\n\\n", "paragraph_break": True} in result
+    assert result[-1] == {"chunk": "[DONE]"}
+
+def test_generate_json_api_error(monkeypatch, failing_base_url):
+    llm_client = make_client(monkeypatch, failing_base_url)
+
+    with pytest.raises(openai.InternalServerError):
+        llm_client.generate_json(prompt="Test prompt", system_prompt="Test system prompt")
+
+def test_generate_text_api_error(monkeypatch, failing_base_url):
+    llm_client = make_client(monkeypatch, failing_base_url)
+
+    with pytest.raises(openai.InternalServerError):
+        llm_client.generate_text(prompt="Test prompt", system_prompt="Test system prompt")
+
+def test_generate_streamed_json_rate_limited(monkeypatch, rate_limited_base_url):
+    llm_client = make_client(monkeypatch, rate_limited_base_url)
+
+    result = list(llm_client.generate_streamed_json(prompt="Test prompt", system_prompt="Test system prompt"))
+
+    assert len(result) == 1
+    assert "Rate limit reached" in result[0]["error"]
@@ -0,0 +1,72 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from core.llm_client import LLMClient
+from core.metrics import Counter, Histogram, REGISTRY, render_prometheus
+
+def make_chunk(content=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_latency_seconds", "Test latency.", ("endpoint",), (0.1, 1))
+    REGISTRY.remove(histogram)
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value, ("scene",))
+
+    assert histogram.render()[2:] == [
+        'test_latency_seconds_bucket{endpoint="scene",le="0.1"} 1',
+        'test_latency_seconds_bucket{endpoint="scene",le="1"} 3',
+        'test_latency_seconds_bucket{endpoint="scene",le="+Inf"} 4',
+        'test_latency_seconds_sum{endpoint="scene"} 4.25',
+        'test_latency_seconds_count{endpoint="scene"} 4',
+    ]
+
+def test_counter_escapes_label_values():
+    counter = Counter("test_total", "Test counter.", ("endpoint",))
+    REGISTRY.remove(counter)
+    counter.inc(('say "hi"',), 2)
+
+    assert counter.render()[2] == 'test_total{endpoint="say \\"hi\\""} 2'
+
+def test_streamed_call_records_tokens_and_timings(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    llm_client = LLMClient()
+    usage = SimpleNamespace(prompt_tokens=1500, completion_tokens=40, prompt_tokens_details=SimpleNamespace(cached_tokens=1024))
+
+    def stream(**kwargs):
+        time.sleep(0.01)
+        yield make_chunk("One. ")
+        yield make_chunk("Two.")
+        yield make_chunk(usage=usage)
+
+    llm_client.client.chat.completions.create = MagicMock(side_effect=stream)
+    list(llm_client.generate_streamed_text("prompt", "system", endpoint="test_metrics_stream"))
+
+    text = render_prometheus()
+    labels = 'endpoint="test_metrics_stream",model="gpt-4o-2024-08-06"'
+    assert f'llm_requests_total{{{labels},outcome="ok"}} 1' in text
+    assert f"llm_prompt_tokens_total{{{labels}}} 1500" in text
+    assert f"llm_cached_prompt_tokens_total{{{labels}}} 1024" in text
+    assert f"llm_time_to_first_token_seconds_count{{{labels}}} 1" in text
+    assert f"llm_output_tokens_per_second_count{{{labels}}} 1" in text
+
+def test_failed_call_is_counted(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    llm_client = LLMClient()
+    llm_client.client.chat.completions.create = MagicMock(side_effect=Exception("API Error"))
+
+    list(llm_client.generate_streamed_json("prompt", "system", endpoint="test_metrics_error"))
+
+    assert 'llm_requests_total{endpoint="test_metrics_error",model="gpt-4o-2024-08-06",outcome="error"} 1' in render_prometheus()
+
+def test_metrics_route(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    from app import app
+
+    response = app.test_client().get("/api/v1/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    assert b"# TYPE llm_request_duration_seconds histogram" in response.data
+    assert b'llm_response_cache_events_total{event="hits"}' in response.data
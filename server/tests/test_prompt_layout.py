@@ -0,0 +1,133 @@
+import logging
+import os
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from core import prompt_layout
+from core.llm_client import LLMClient
+from core.prompt_layout import fit_segments, layout_prompt, render_value
+from core.response_cache import ResponseCache
+from core.tokens import count_tokens
+from core.usage import usage_stats
+from services.writing_service import WritingService
+
+CONTEXT = {
+    "parameters": {"title": "The Glass Orchard", "genre": "Gothic", "premise": "A widow inherits an orchard of glass trees."},
+    "synopsis": "Maren arrives at the estate and meets the groundskeeper.",
+    "previous_summary": "Maren left the city after the funeral.",
+    "previous_screenplay": "",
+    "overall_outline": "Arrival at the estate.",
+}
+
+def make_completion(content, prompt_tokens=0, cached_tokens=0):
+    usage = SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=10,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+    )
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+def test_segments_are_ordered_from_stable_to_volatile():
+    prompt = layout_prompt([
+        ("instruction", "Instruction", "Make it rain."),
+        ("screenplay", "Screenplay", "..."),
+        ("task", None, "Write the scene."),
+        ("parameters", "Parameters", {"b": 1, "a": 2}),
+    ])
+
+    assert prompt == 'Parameters: `a: 2\nb: 1`\n\nScreenplay: `...`\n\nWrite the scene.\n\nInstruction: `Make it rain.`'
+
+def test_scene_prompts_share_the_context_prefix(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    llm_client = LLMClient()
+    llm_client.client.chat.completions.create = MagicMock(return_value=make_completion('{"elements": []}'))
+    service = WritingService(llm_client)
+
+    service.generate_new_scene(CONTEXT, "Maren finds a key.", 10)
+    service.generate_new_scene(dict(CONTEXT, parameters=dict(reversed(list(CONTEXT["parameters"].items())))), "The groundskeeper lies.", 12)
+
+    first, second = [call.kwargs["messages"][1]["content"] for call in llm_client.client.chat.completions.create.call_args_list]
+    prefix = os.path.commonprefix([first, second])
+    assert first.startswith("Overall story parameters:")
+    assert first.endswith("Instruction: `Maren finds a key.`")
+    assert "Previous Section Summary: `Maren left the city after the funeral.`" in prefix
+    assert "Maren finds a key." not in prefix
+
+def test_cached_tokens_are_recorded_per_endpoint(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    llm_client = LLMClient()
+    llm_client.client.chat.completions.create = MagicMock(return_value=make_completion('{}', prompt_tokens=2000, cached_tokens=1536))
+
+    llm_client.generate_json("prompt", "system", endpoint="test_cached_tokens")
+    llm_client.generate_json("other prompt", "system", endpoint="test_cached_tokens")
+
+    stats = usage_stats()["test_cached_tokens"]
+    assert stats["calls"] == 2
+    assert stats["cached_tokens"] == 3072
+    assert stats["cache_hit_rate"] == 0.768
+
+def test_streams_request_and_record_usage(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    llm_client = LLMClient()
+    usage = make_completion("", prompt_tokens=1200, cached_tokens=1024).usage
+    chunks = [
+        SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="Done."))], usage=None),
+        SimpleNamespace(choices=[], usage=usage),
+    ]
+    llm_client.client.chat.completions.create = MagicMock(return_value=iter(chunks))
+
+    result = list(llm_client.generate_streamed_text("prompt", "system", endpoint="test_stream_usage"))
+
+    assert [r["chunk"] for r in result] == ["Done.", "[DONE]"]
+    assert llm_client.client.chat.completions.create.call_args.kwargs["stream_options"] == {"include_usage": True}
+    assert usage_stats()["test_stream_usage"]["cached_tokens"] == 1024
+
+def test_segments_over_their_cap_keep_the_end_of_the_screenplay():
+    elements = [{"type": "dialogue", "content": f"Line {i} " + "word " * 40} for i in range(50)]
+
+    [(_, _, screenplay)], saved = fit_segments([("screenplay", "Previous Screenplay", {"elements": elements})], budget=100000, segment_budgets={"screenplay": 500})
+
+    assert screenplay["elements"][0] == f"[{50 - len(screenplay['elements']) + 1} earlier items omitted]"
+    assert screenplay["elements"][-1] == elements[-1]
+    assert count_tokens("Previous Screenplay: `%s`" % render_value(screenplay)) <= 500
+    assert saved > 0
+
+def test_over_budget_prompts_give_up_low_priority_context_first():
+    segments = [
+        ("parameters", "Parameters", "p" * 4000),
+        ("screenplay", "Screenplay", "s" * 4000),
+        ("task", None, "t" * 400),
+        ("instruction", "Instruction", "Make it rain."),
+    ]
+
+    fitted, saved = fit_segments(segments, budget=1300, segment_budgets={})
+
+    values = {kind: value for kind, _, value in fitted}
+    assert values["screenplay"] == "s" * 4000
+    assert values["parameters"].startswith("ppp") and values["parameters"].endswith("[...]")
+    assert values["task"] == "t" * 400 and values["instruction"] == "Make it rain."
+    tokens = lambda segments: sum(count_tokens(f"{label}: `{value}`" if label else value) for _, label, value, *_ in segments)
+    assert tokens(fitted) <= 1300
+    assert saved == tokens(segments) - tokens(fitted)
+
+def test_chapter_suggestions_fall_back_to_outlines_and_report_tokens_saved(monkeypatch, caplog):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    monkeypatch.setattr(prompt_layout, "LLM_PROMPT_TOKEN_BUDGET", 8000)
+    llm_client = LLMClient()
+    llm_client.cache = ResponseCache(directory=None)
+    llm_client.client.chat.completions.create = MagicMock(return_value=make_completion('[{"title": "T", "synopsis": "S", "act": 2}]'))
+    chapters = [{"title": f"Chapter {i}", "synopsis": "Things happen.", "act": 1, "content": "prose " * 3000} for i in range(3)]
+
+    with caplog.at_level(logging.WARNING, logger="core.prompt_layout"):
+        WritingService(llm_client).generate_chapter_suggestions(chapters, CONTEXT["parameters"], 1, 10)
+
+    assert "from the generate_chapter_suggestions prompt" in caplog.text
+    prompt = llm_client.client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+    assert "title: Chapter 2" in prompt
+    assert "prose" not in prompt
+    assert usage_stats()["generate_chapter_suggestions"]["tokens_saved"] > 3 * 3000
+
+def test_zero_budget_leaves_the_prompt_alone():
+    segments = [("screenplay", "Screenplay", "s" * 100000)]
+
+    assert fit_segments(segments, budget=0) == (segments, 0)
+    assert fit_segments(segments) == (segments, 0)
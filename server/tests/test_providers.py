@@ -0,0 +1,77 @@
+import time
+import httpx
+import pytest
+from core import providers, resilience
+from core.llm_client import LLMClient
+from core.providers import Provider, ProviderHealth, Router
+from fake_openai import FakeOpenAI, serve_in_thread
+
+@pytest.fixture(autouse=True)
+def fresh_health(monkeypatch):
+    monkeypatch.setattr(providers, "_health", {})
+    monkeypatch.setattr(resilience, "LLM_RETRY_BASE_DELAY", 0.01)
+
+def stand_in(name, **options):
+    fake = FakeOpenAI(tokens_per_second=2000, **options)
+    return fake, Provider(name, serve_in_thread(fake) + "/v1", "fake")
+
+def test_fastest_policy_settles_on_the_faster_provider():
+    slow, slow_provider = stand_in("slow", ttft=0.2)
+    fast, fast_provider = stand_in("fast", ttft=0.0)
+    llm_client = LLMClient(providers=[slow_provider, fast_provider], policies={"default": "fastest"})
+    llm_client.router.explore = 0
+
+    for i in range(6):
+        assert llm_client.generate_text(f"Write paragraph {i}.", "You write prose.", max_tokens=20)
+
+    assert slow.stats()["requests"] == 1
+    assert fast.stats()["requests"] == 5
+
+def test_calls_fall_back_when_a_provider_fails():
+    broken, broken_provider = stand_in("broken", ttft=0.0, error_rate=1.0)
+    working, working_provider = stand_in("working", ttft=0.0)
+    llm_client = LLMClient(providers=[broken_provider, working_provider])
+
+    chunks = list(llm_client.generate_streamed_text("Write a paragraph.", "You write prose.", max_tokens=20))
+
+    assert chunks[-1] == {"chunk": "[DONE]"}
+    assert broken.stats()["errors"] == 1 and working.stats()["requests"] == 1
+    assert llm_client.router.stats()["broken"]["consecutive_failures"] == 1
+
+def test_circuit_opens_after_failures_and_closes_after_a_trial():
+    health = ProviderHealth("hermes", failures=2, cooldown=0.05)
+    health.failed()
+    assert health.claim(time.monotonic())
+    health.failed()
+    assert health.state == "open" and not health.claim(time.monotonic())
+
+    time.sleep(0.06)
+    assert health.claim(time.monotonic()) and health.state == "half_open"
+    assert not health.claim(time.monotonic())
+    health.failed()
+    assert health.state == "open"
+
+    time.sleep(0.06)
+    assert health.claim(time.monotonic())
+    health.succeeded(0.3, streamed=True)
+    assert health.state == "closed" and health.latency[True] == 0.3
+
+def test_policies_and_model_names():
+    router = Router(
+        [
+            Provider("openai", "http://openai.test/v1", cost=1.0),
+            Provider("hermes", "http://hermes.test/v1", models={"*": "hermes-3"}, cost=0.2),
+            Provider("mini", "http://mini.test/v1", models={"gpt-4o-mini": "mini"}, cost=0.1),
+        ],
+        {"default": "cheapest", "generate_scene": "fixed:openai", "generate_title": "fixed"},
+    )
+
+    assert [(provider.name, model) for provider, model in router.route("generate_summary", "gpt-4o", False).candidates] == [("hermes", "hermes-3"), ("openai", "gpt-4o")]
+    assert router.route("generate_scene", "gpt-4o", True).next()[0].name == "openai"
+    assert router.route("generate_title", "gpt-4o-mini", True).next()[0].name == "openai"
+
+    for _ in range(providers.LLM_BREAKER_FAILURES):
+        router.failed(router.providers[1], httpx.ConnectError("refused"))
+    assert router.route("generate_summary", "gpt-4o", False).next()[0].name == "openai"
+    with pytest.raises(LookupError):
+        Router([Provider("mini", models={"gpt-4o-mini": "mini"})]).route(None, "gpt-4o", False)
@@ -0,0 +1,84 @@
+import time
+import asyncio
+import sqlite3
+import threading
+import pytest
+from types import SimpleNamespace
+from core import rate_limit
+from core.rate_limit import RateLimited, RateLimiter
+from core.usage import CallMetrics
+
+def limiters(tmp_path, **options):
+    """Two limiters on one file, as two workers on a host see it."""
+    path = str(tmp_path / "rate-limit.db")
+    return RateLimiter(path, **options), RateLimiter(path, **options)
+
+def test_workers_share_one_budget(tmp_path):
+    first, second = limiters(tmp_path, rpm=2, max_wait=0.5)
+    first.admit(10)
+    second.admit(10)
+
+    with pytest.raises(RateLimited) as error:
+        first.admit(10)
+    assert error.value.retry_after >= 1
+    assert first.stats()["buckets"]["requests"]["level"] < 1
+    assert second.stats()["queue_depth"] == 0
+
+def test_calls_wait_for_tokens_to_refill(tmp_path):
+    limiter, _ = limiters(tmp_path, tpm=6000, max_wait=5)
+    limiter.admit(6000)
+
+    start = time.monotonic()
+    limiter.admit(20)
+    assert 0.1 < time.monotonic() - start < 2
+
+def test_unused_estimates_are_refunded(tmp_path):
+    limiter, _ = limiters(tmp_path, tpm=1000)
+    admission = limiter.admit(800)
+    call = CallMetrics("test", "model", admission)
+    call.finish(SimpleNamespace(prompt_tokens=100, completion_tokens=50, prompt_tokens_details=None))
+
+    assert limiter.stats()["buckets"]["tokens"]["level"] == pytest.approx(850, abs=5)
+
+def test_provider_headers_and_429s_adapt_the_limit(tmp_path):
+    first, second = limiters(tmp_path, tpm=100000, max_wait=1)
+    first.observe(200, {"x-ratelimit-limit-tokens": "30000", "x-ratelimit-remaining-tokens": "500", "x-ratelimit-remaining-requests": "9"})
+
+    buckets = second.stats()["buckets"]
+    assert buckets["tokens"]["capacity"] == 30000 and buckets["tokens"]["level"] < 600
+    assert buckets["requests"]["capacity"] == 0
+
+    first.observe(429, {"retry-after": "20"})
+    with pytest.raises(RateLimited):
+        second.admit(1)
+    assert second.retry_after() >= 19
+
+def test_requests_are_turned_away_while_the_queue_is_full(monkeypatch, tmp_path):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    import app as app_module
+    monkeypatch.setattr(rate_limit, "_limiter", RateLimiter(str(tmp_path / "rate-limit.db"), max_queue=0))
+
+    response = app_module.app.test_client().post("/api/v1/chapters/outlines", json={"context": {}, "count": 3})
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.get_json()["retry_after"] >= 1
+
+def test_async_admission_does_not_block_the_event_loop(tmp_path):
+    limiter, _ = limiters(tmp_path, rpm=100)
+    other_worker = sqlite3.connect(str(tmp_path / "rate-limit.db"), check_same_thread=False)
+    other_worker.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.3, other_worker.commit).start()
+
+    async def main():
+        admitting = asyncio.ensure_future(limiter.aadmit(10))
+        gaps, last = [], time.monotonic()
+        while not admitting.done():
+            await asyncio.sleep(0.01)
+            gaps.append(time.monotonic() - last)
+            last = time.monotonic()
+        return await admitting, max(gaps)
+
+    admission, longest_gap = asyncio.run(main())
+    assert admission is not None
+    assert longest_gap < 0.1
@@ -0,0 +1,80 @@
+import threading
+import time
+import httpx
+import openai
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from core import resilience
+from core.llm_client import LLMClient
+from core.resilience import Hedging, hedged, with_retries
+
+@pytest.fixture(autouse=True)
+def quick_backoff(monkeypatch):
+    monkeypatch.setattr(resilience, "LLM_RETRY_BASE_DELAY", 0.01)
+
+def status_error(status, headers=None):
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "http://fake/v1/chat/completions"))
+    return openai.APIStatusError("failed", response=response, body=None)
+
+def test_transient_failures_are_retried_and_others_raised():
+    attempt = MagicMock(side_effect=[status_error(503), httpx.ReadTimeout("slow"), "done"])
+
+    assert with_retries(attempt, "test", attempts=3) == "done"
+    assert attempt.call_count == 3
+
+    bad_request = MagicMock(side_effect=status_error(400))
+    with pytest.raises(openai.APIStatusError):
+        with_retries(bad_request, "test", attempts=3)
+    assert bad_request.call_count == 1
+
+def test_backoff_is_jittered_and_honours_retry_after():
+    delays = {resilience.backoff(3, status_error(503)) for _ in range(20)}
+    assert len(delays) > 1 and all(0 <= delay <= 0.08 for delay in delays)
+    assert resilience.backoff(0, status_error(429, {"retry-after": "2"})) == 2
+
+def test_malformed_json_is_generated_again(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    llm_client = LLMClient()
+    replies = iter(['{"text": "Tit', '{"text": "Title"}'])
+    llm_client.client.chat.completions.create = MagicMock(
+        side_effect=lambda **kwargs: SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=next(replies)))], usage=None)
+    )
+
+    assert llm_client.generate_json("prompt", "system") == '{"text": "Title"}'
+    assert llm_client.client.chat.completions.create.call_count == 2
+
+def test_hedge_delay_follows_the_percentile_of_recent_first_tokens():
+    hedging = Hedging(percentile=90, window=10, min_samples=5, min_delay=0.05)
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        hedging.observe("scene", seconds)
+    assert hedging.delay("scene") is None
+
+    for seconds in (0.5, 0.6, 0.7, 0.8, 0.9, 1.0):
+        hedging.observe("scene", seconds)
+    assert hedging.delay("scene") == 1.0
+    assert Hedging(percentile=0).delay("scene") is None
+
+def test_a_slow_call_is_hedged_and_the_loser_cancelled():
+    started, closed = [], threading.Event()
+    release = threading.Event()
+
+    def start():
+        number = len(started)
+        started.append(number)
+        try:
+            if number == 0:
+                release.wait(5)
+            yield f"call {number}"
+            yield "more"
+        finally:
+            if number == 0:
+                closed.set()
+
+    begin = time.monotonic()
+    items = list(hedged(start, "test", delay=0.05))
+    release.set()
+
+    assert items == ["call 1", "more"]
+    assert time.monotonic() - begin < 1
+    assert closed.wait(1)
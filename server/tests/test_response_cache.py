@@ -0,0 +1,97 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from core.llm_client import LLMClient
+from core.response_cache import ResponseCache, cache_key
+
+def make_completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+def make_chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], usage=None)
+
+@pytest.fixture
+def llm_client(monkeypatch, tmp_path):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    client = LLMClient()
+    client.cache = ResponseCache(directory=str(tmp_path))
+    return client
+
+def test_lru_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2, directory=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_entries_expire(monkeypatch, tmp_path):
+    cache = ResponseCache(ttl=10, directory=str(tmp_path))
+    now = 1000.0
+    monkeypatch.setattr("core.response_cache.time.time", lambda: now)
+    cache.set("a", "value")
+    now = 1011.0
+
+    assert cache.get("a") is None
+    assert list(tmp_path.iterdir()) == []
+
+def test_disk_tier_survives_a_new_process(tmp_path):
+    ResponseCache(directory=str(tmp_path)).set("a", ["chunk"])
+    cache = ResponseCache(directory=str(tmp_path))
+
+    assert cache.get("a") == ["chunk"]
+    assert cache.stats()["disk_hits"] == 1
+
+def test_disk_tier_is_size_bounded(tmp_path):
+    cache = ResponseCache(max_entries=1, directory=str(tmp_path), max_disk_bytes=1000)
+    for i in range(20):
+        cache.set(str(i), "x" * 100)
+
+    assert sum(path.stat().st_size for path in tmp_path.iterdir()) <= 1000
+    assert cache.get("19") == "x" * 100
+
+def test_rewriting_an_entry_does_not_count_its_old_file(tmp_path):
+    cache = ResponseCache(max_entries=1, directory=str(tmp_path), max_disk_bytes=1000)
+    cache.set("kept", "x" * 100)
+    for _ in range(20):
+        cache.set("rewritten", "x" * 100)
+
+    assert (tmp_path / "kept.json").exists()
+    assert cache._disk_bytes == sum(path.stat().st_size for path in tmp_path.iterdir())
+
+def test_cache_key_covers_sampling_parameters():
+    assert cache_key("json", "m", "s", "p", 0.7, 100) != cache_key("json", "m", "s", "p", 0.2, 100)
+    assert cache_key("json", "m", "s", "p", 0.7, 100) != cache_key("streamed_json", "m", "s", "p", 0.7, 100)
+
+def test_generate_json_cache_opt_in(llm_client):
+    llm_client.client.chat.completions.create = MagicMock(return_value=make_completion('{"text": "Title"}'))
+
+    assert llm_client.generate_json("prompt", "system", cache=True) == '{"text": "Title"}'
+    assert llm_client.generate_json("prompt", "system", cache=True) == '{"text": "Title"}'
+    llm_client.generate_json("prompt", "system")
+
+    assert llm_client.client.chat.completions.create.call_count == 2
+    assert llm_client.cache.stats()["hits"] == 1
+
+def test_generate_streamed_json_replays_cached_chunks(llm_client):
+    pieces = ['{"elements": [{"type": "action", ', '"description": "A"}]}']
+    llm_client.client.chat.completions.create = MagicMock(side_effect=lambda **kwargs: iter(map(make_chunk, pieces)))
+
+    first = list(llm_client.generate_streamed_json("prompt", "system", cache=True))
+    second = list(llm_client.generate_streamed_json("prompt", "system", cache=True))
+
+    assert first == second
+    assert second[-1] == {"chunk": "[DONE]"}
+    assert llm_client.client.chat.completions.create.call_count == 1
+
+def test_failed_stream_is_not_cached(llm_client):
+    llm_client.client.chat.completions.create = MagicMock(side_effect=Exception("API Error"))
+
+    list(llm_client.generate_streamed_text("prompt", "system", cache=True))
+    list(llm_client.generate_streamed_text("prompt", "system", cache=True))
+
+    assert llm_client.client.chat.completions.create.call_count == 2
@@ -0,0 +1,61 @@
+import json
+import pytest
+from core.llm_client import LLMClient
+from core.scene_patch import ScenePatchError, apply_scene_patch
+from fake_openai import FakeOpenAI, serve_in_thread
+from fake_openai.outputs import scene_patch
+from services.writing_service import WritingService
+
+def line(character, text):
+    return {"type": "dialogue", "character": character, "line": text}
+
+SCENE = {
+    "meta": {"title": {"type": "title", "text": "Pitch"}},
+    "setting": {"location": "Conference room", "time": "Day"},
+    "elements": [{"type": "action", "description": "Emma stands."}] + [line("EMMA", f"Line {i}.") for i in range(1, 6)],
+}
+
+@pytest.fixture(scope="module")
+def fake_base_url():
+    return serve_in_thread(FakeOpenAI(ttft=0, tokens_per_second=100000)) + "/v1"
+
+def test_operations_address_the_scene_as_sent():
+    patched = apply_scene_patch(SCENE, [
+        {"op": "insert", "after": -1, "elements": [{"type": "transition", "description": "FADE IN."}]},
+        {"op": "replace", "from": 1, "to": 2, "elements": [line("JACK", "Stop.")]},
+        {"op": "insert", "after": 2, "elements": [line("EMMA", "Fine.")]},
+        {"op": "delete", "from": 4, "to": 4},
+        {"op": "set", "field": "title", "value": {"type": "title", "text": "Interrupted"}},
+        {"op": "set", "field": "setting", "value": {"location": "Lobby", "time": "Night"}},
+    ])
+
+    texts = [e.get("line", e.get("description")) for e in patched["elements"]]
+    assert texts == ["FADE IN.", "Emma stands.", "Stop.", "Fine.", "Line 3.", "Line 5."]
+    assert patched["meta"]["title"]["text"] == "Interrupted" and "title" not in patched
+    assert patched["setting"]["location"] == "Lobby"
+    assert SCENE["elements"][1] == line("EMMA", "Line 1.") and SCENE["meta"]["title"]["text"] == "Pitch"
+
+@pytest.mark.parametrize("operations, message", [
+    ([{"op": "replace", "from": 1, "to": 3, "elements": [line("A", "x")]}, {"op": "delete", "from": 3, "to": 4}], "overlapping"),
+    ([{"op": "delete", "from": 1, "to": 3}, {"op": "insert", "after": 2, "elements": [line("A", "x")]}], "inside"),
+    ([{"op": "delete", "from": 2, "to": 6}], "from 2 to 5"),
+    ([{"op": "replace", "from": 0, "to": 0, "elements": [{"type": "dialogue", "line": "No speaker."}]}], "character"),
+    ([{"op": "set", "field": "elements", "value": []}], "field"),
+    ([{"op": "rewrite"}], "unknown op"),
+])
+def test_invalid_patches_are_rejected(operations, message):
+    with pytest.raises(ScenePatchError, match=message):
+        apply_scene_patch(SCENE, operations)
+
+def test_rewrite_scene_patch_mode(monkeypatch, fake_base_url):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    service = WritingService(LLMClient(base_url=fake_base_url))
+    context = {"synopsis": "Emma pitches.", "current_screenplay": SCENE}
+    expected = apply_scene_patch(SCENE, json.loads(scene_patch()))
+
+    assert service.rewrite_scene(context, "Sharper dialogue.", 10, mode="patch") == expected
+
+    chunks = list(service.rewrite_scene(context, "Sharper dialogue, streamed.", 10, stream=True, mode="patch"))
+    assert chunks[0] == {"meta": {"title": expected["meta"]["title"], "setting": expected["setting"]}}
+    assert [json.loads(chunk["chunk"]) for chunk in chunks[1:-1]] == expected["elements"]
+    assert chunks[-1] == {"chunk": "[DONE]"}
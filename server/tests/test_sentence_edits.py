@@ -0,0 +1,99 @@
+import json
+import pytest
+from core.llm_client import LLMClient
+from core.sentence_edits import SentenceEditError, SentenceEditExpander, edits_to_actions, numbered_sentences, sentence_edit_chunks, split_sentences
+from fake_openai import FakeOpenAI, serve_in_thread
+from fake_openai.outputs import sentence_edits
+from services.writing_service import WritingService
+
+TEXT = 'Mr. Hale stopped. "Wait!" she said.\\n\\nThe goat looked up. It chewed. Rain fell.'
+
+@pytest.fixture(scope="module")
+def fake_base_url():
+    return serve_in_thread(FakeOpenAI(ttft=0, tokens_per_second=100000)) + "/v1"
+
+def test_sentences_are_numbered_across_paragraphs():
+    paragraphs = split_sentences(TEXT)
+
+    assert paragraphs == [["Mr. Hale stopped.", '"Wait!" she said.'], ["The goat looked up.", "It chewed.", "Rain fell."]]
+    assert numbered_sentences(paragraphs) == 'S1: Mr. Hale stopped.\nS2: "Wait!" she said.\n\nS3: The goat looked up.\nS4: It chewed.\nS5: Rain fell.'
+
+def test_edits_expand_to_the_full_action_list():
+    actions = edits_to_actions(split_sentences(TEXT), [
+        {"op": "add", "after": "S0", "text": "Thunder."},
+        {"op": "edit", "id": "S1", "text": "Mr. Hale stopped."},
+        {"op": "edit", "id": "S3", "text": "The goat looked up, unimpressed."},
+        {"op": "remove", "id": "S4"},
+        {"op": "join", "after": "S2"},
+        {"op": "break", "after": "S3"},
+        {"op": "add", "after": "S5", "text": "Nobody moved."},
+    ])
+
+    assert actions == [
+        {"action": "add", "rewritten_sentence": "Thunder."},
+        {"action": "no_change", "original_sentence": "Mr. Hale stopped."},
+        {"action": "no_change", "original_sentence": '"Wait!" she said.'},
+        {"action": "edit", "original_sentence": "The goat looked up.", "rewritten_sentence": "The goat looked up, unimpressed."},
+        {"action": "paragraph_break"},
+        {"action": "remove", "original_sentence": "It chewed."},
+        {"action": "no_change", "original_sentence": "Rain fell."},
+        {"action": "add", "rewritten_sentence": "Nobody moved."},
+        {"action": "paragraph_break"},
+    ]
+
+@pytest.mark.parametrize("edits, message", [
+    ([{"op": "edit", "id": "S9", "text": "x"}], "unknown sentence"),
+    ([{"op": "edit", "id": "S1", "text": "x"}, {"op": "remove", "id": "S1"}], "changed twice"),
+    ([{"op": "break", "after": "S2"}], "already ends"),
+    ([{"op": "join", "after": "S3"}], "no paragraph break"),
+    ([{"op": "add", "after": "S1", "text": " "}], "needs a text"),
+    ([{"op": "no_change", "id": "S1"}], "unknown op"),
+])
+def test_invalid_edits_are_rejected(edits, message):
+    with pytest.raises(SentenceEditError, match=message):
+        edits_to_actions(split_sentences(TEXT), edits)
+
+def test_rewrite_scene_paragraphs_edits_mode(monkeypatch, fake_base_url):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    service = WritingService(LLMClient(base_url=fake_base_url))
+    context = {"previous_paragraph": "Before.", "paragraph": TEXT, "next_paragraph": "After."}
+    expected = edits_to_actions(split_sentences(TEXT), json.loads(sentence_edits()))
+
+    assert service.rewrite_scene_paragraphs(context, "Make it funnier.", 1) == expected
+    chunks = list(service.rewrite_scene_paragraphs(context, "Make it funnier, streamed.", 1, stream=True))
+    assert [json.loads(chunk["chunk"]) for chunk in chunks[:-2]] == expected
+    assert [chunk["seq"] for chunk in chunks[:-2]] == list(range(1, len(expected) + 1))
+    assert chunks[-2]["summary"]["actions"] == len(expected)
+    assert chunks[-1] == {"chunk": "[DONE]"}
+
+def test_each_edit_settles_the_actions_before_it():
+    expander = SentenceEditExpander(split_sentences(TEXT))
+
+    assert expander.feed({"op": "edit", "id": "S3", "text": "The goat looked up, bored."}) == [
+        {"action": "no_change", "original_sentence": "Mr. Hale stopped."},
+        {"action": "no_change", "original_sentence": '"Wait!" she said.'},
+        {"action": "paragraph_break"},
+        {"action": "edit", "original_sentence": "The goat looked up.", "rewritten_sentence": "The goat looked up, bored."},
+    ]
+    assert expander.feed({"op": "break", "after": "S3"}) == []
+    assert expander.feed({"op": "remove", "id": "S4"}) == [{"action": "paragraph_break"}, {"action": "remove", "original_sentence": "It chewed."}]
+    with pytest.raises(SentenceEditError, match="out of sentence order"):
+        expander.feed({"op": "edit", "id": "S2", "text": "Late."})
+    assert expander.close() == [{"action": "no_change", "original_sentence": "Rain fell."}, {"action": "paragraph_break"}]
+
+def test_streamed_edits_are_numbered_and_summarized():
+    edits = [{"op": "edit", "id": "S2", "text": '"Wait," she said.'}, {"op": "add", "after": "S5", "text": "Nobody moved."}, {"op": "remove", "id": "S1"}]
+    stream = [{"chunk": json.dumps(edit)} for edit in edits] + [{"chunk": "[DONE]"}]
+
+    chunks = list(sentence_edit_chunks(split_sentences(TEXT), iter(stream)))
+
+    assert [chunk.get("seq") for chunk in chunks] == [1, 2, 3, 4, 5, 6, 7, None]
+    assert json.loads(chunks[6]["chunk"]) == {"action": "add", "rewritten_sentence": "Nobody moved."}
+    # S1 arrives after S2 was sent: the stream ends there rather than reorder what the client has applied
+    assert "out of sentence order" in chunks[-1]["error"]
+
+    chunks = list(sentence_edit_chunks(split_sentences(TEXT), iter(stream[:2] + stream[3:])))
+    assert chunks[-2:] == [
+        {"summary": {"edit": 1, "add": 1, "remove": 0, "no_change": 4, "paragraph_break": 2, "actions": 8}},
+        {"chunk": "[DONE]"},
+    ]
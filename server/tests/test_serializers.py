@@ -0,0 +1,45 @@
+import json
+import pytest
+from core.serializers import compact_format, json_format, serialize, SERIALIZERS
+from core.tokens import count_tokens
+
+with open("sample_scene.json") as f:
+    SCENE = json.load(f)
+
+def test_compact_scene_keeps_every_element_in_fewer_tokens():
+    text = compact_format(SCENE)
+
+    assert text.startswith("TITLE: The Big Pitch\nSETTING: SLEEK CONFERENCE ROOM, DAY. A modern")
+    assert "EMMA (30s, confident startup CEO); JACK (40s, skeptical investor)" in text
+    assert "JACK (leaning back, skeptical): We've heard that before" in text
+    assert "[action] ZOE startles, then stands, moving to the screen." in text
+    assert len(text.split("\n\n", 1)[1].splitlines()) == len(SCENE["elements"])
+    assert count_tokens(text) < 0.75 * count_tokens(json_format(SCENE))
+
+def test_scene_writer_layout_and_monologue():
+    scene = {
+        "meta": {"title": {"type": "title", "text": "Night"}, "setting": {"location": "Roof", "time": "Night"}},
+        "elements": [
+            {"type": "internal_monologue", "character": "Alex", "description": "Too late."},
+            "[3 earlier items omitted]",
+        ],
+    }
+
+    assert compact_format(scene) == "TITLE: Night\nSETTING: Roof, Night\n\n[thinks] Alex: Too late.\n[3 earlier items omitted]"
+
+def test_compact_records_are_ordered_and_indented():
+    summary = {"sequence": ["Met.", "Argued."], "currentScene": {"location": "Bleachers", "characters": [{"name": "Alex", "clothes": "Hoodie"}]}}
+
+    assert compact_format(summary) == (
+        "currentScene:\n  characters:\n    - clothes: Hoodie\n      name: Alex\n  location: Bleachers\n"
+        "sequence:\n  - Met.\n  - Argued."
+    )
+    assert compact_format(dict(reversed(list(summary.items())))) == compact_format(summary)
+
+def test_formats_are_pluggable(monkeypatch):
+    monkeypatch.setitem(SERIALIZERS, "upper", lambda value: json_format(value).upper())
+
+    assert serialize({"a": "b"}, "upper") == '{"A": "B"}'
+    assert serialize("as is", "upper") == "as is"
+    with pytest.raises(ValueError):
+        serialize({}, "yaml")
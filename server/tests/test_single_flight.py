@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from core.llm_client import LLMClient
+from core.single_flight import SingleFlight, AsyncSingleFlight
+
+def run_threads(target, count):
+    results = [None] * count
+
+    def worker(i):
+        results[i] = target()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+def test_concurrent_calls_share_one_upstream_call():
+    flights = SingleFlight()
+    upstream_calls = []
+
+    def upstream():
+        upstream_calls.append(1)
+        time.sleep(0.1)
+        return "result"
+
+    results = run_threads(lambda: flights.do("key", upstream), 5)
+
+    assert results == ["result"] * 5
+    assert len(upstream_calls) == 1
+    assert flights.stats()["coalesced"] == 4
+    assert flights.stats()["in_flight"] == 0
+
+def test_errors_reach_every_waiter():
+    flights = SingleFlight()
+
+    def upstream():
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flights.do("key", upstream)
+        except ValueError as e:
+            return str(e)
+
+    assert run_threads(call, 3) == ["boom"] * 3
+
+def test_stream_fans_out_the_same_chunks():
+    flights = SingleFlight()
+    started = []
+
+    def upstream():
+        started.append(1)
+        for i in range(5):
+            time.sleep(0.02)
+            yield {"chunk": str(i)}
+
+    results = run_threads(lambda: list(flights.stream("key", upstream)), 4)
+
+    assert len(started) == 1
+    assert results == [[{"chunk": str(i)} for i in range(5)]] * 4
+    assert flights.stats()["coalesced"] == 3
+
+def test_abandoned_stream_closes_upstream():
+    flights = SingleFlight()
+    closed = []
+
+    def upstream():
+        try:
+            for i in range(100):
+                yield i
+        finally:
+            closed.append(1)
+
+    stream = flights.stream("key", upstream)
+    assert next(stream) == 0
+    stream.close()
+
+    assert closed == [1]
+    assert flights.stats()["in_flight"] == 0
+
+def test_async_calls_and_streams_are_coalesced():
+    flights = AsyncSingleFlight()
+    upstream_calls = []
+
+    async def upstream():
+        upstream_calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def stream_upstream():
+        upstream_calls.append(1)
+        for i in range(3):
+            await asyncio.sleep(0.01)
+            yield i
+
+    async def collect():
+        return [item async for item in flights.stream("stream", stream_upstream)]
+
+    async def main():
+        results = await asyncio.gather(*(flights.do("key", upstream) for _ in range(3)))
+        streams = await asyncio.gather(*(collect() for _ in range(3)))
+        return results, streams
+
+    results, streams = asyncio.run(main())
+
+    assert results == ["result"] * 3
+    assert streams == [[0, 1, 2]] * 3
+    assert len(upstream_calls) == 2
+    assert flights.stats()["coalesced"] == 4
+
+def test_async_stream_survives_a_cancelled_subscriber():
+    flights = AsyncSingleFlight()
+    closed = []
+
+    async def upstream():
+        try:
+            for i in range(5):
+                await asyncio.sleep(0.02)
+                yield i
+        finally:
+            closed.append(1)
+
+    async def main():
+        # the first subscriber is the one reading from upstream when it is cancelled
+        leaving = asyncio.ensure_future(collect_stream(flights.stream("stream", upstream)))
+        await asyncio.sleep(0)
+        staying = asyncio.ensure_future(collect_stream(flights.stream("stream", upstream)))
+        await asyncio.sleep(0.03)
+        leaving.cancel()
+        return await staying
+
+    assert asyncio.run(main()) == [0, 1, 2, 3, 4]
+    assert closed == [1]
+    assert flights.stats()["in_flight"] == 0
+
+async def collect_stream(stream):
+    return [item async for item in stream]
+
+def test_llm_client_coalesces_identical_streams(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    llm_client = LLMClient()
+
+    def slow_stream(**kwargs):
+        for piece in ["One. ", "Two. ", "Three."]:
+            time.sleep(0.05)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None)
+
+    llm_client.client.chat.completions.create = MagicMock(side_effect=slow_stream)
+
+    results = run_threads(lambda: [r["chunk"] for r in llm_client.generate_streamed_text("prompt", "system")], 3)
+
+    assert results == [["One.", "Two.", "Three.", "[DONE]"]] * 3
+    assert llm_client.client.chat.completions.create.call_count == 1
@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from core import story_store
+from core.speculation import Speculator
+from core.story_store import StoryStore
+from tests.test_story_store import STORY
+
+def speculate(speculator, user, key, content):
+    speculator.submit(user, lambda: speculator.run(key, "prompt " * 10, lambda: content))
+    speculator.join()
+
+def test_results_are_taken_once_and_charged_to_the_user():
+    speculator = Speculator(enabled=True, budget=1000)
+    speculate(speculator, "alice", "k1", '{"summary": "done"}')
+
+    assert speculator.take("k1") == '{"summary": "done"}'
+    assert speculator.take("k1") is None
+    stats = speculator.stats()
+    assert (stats["calls"], stats["hits"], stats["hit_rate"]) == (1, 1, 1.0)
+    assert stats["tokens"] > 0 and stats["wasted_tokens"] == 0
+
+def test_users_over_budget_are_skipped():
+    speculator = Speculator(enabled=True, budget=1)
+    speculate(speculator, "alice", "k1", "x")
+
+    assert speculator.submit("alice", lambda: None) is False
+    assert speculator.submit("bob", lambda: None) is True
+    assert speculator.stats()["skipped"] == 1
+    assert Speculator(enabled=False).submit("alice", lambda: None) is False
+
+def test_unused_results_are_discarded_as_wasted():
+    speculator = Speculator(enabled=True, ttl=0)
+    speculate(speculator, "alice", "k1", "x")
+
+    stats = speculator.stats()
+    assert (stats["discarded"], stats["held"], stats["hit_rate"]) == (1, 0, 0.0)
+    assert stats["wasted_tokens"] == stats["tokens"] > 0
+    assert speculator.take("k1") is None
+
+def test_story_follow_ups_are_served_from_speculation(monkeypatch, tmp_path):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    import app as app_module
+    monkeypatch.setattr(story_store, "_store", StoryStore(str(tmp_path / "stories.db")))
+    speculator = Speculator(enabled=True)
+    monkeypatch.setattr(app_module.llm_client, "speculator", speculator)
+    create = MagicMock(return_value=SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content='{"summary": "done"}'))], usage=None,
+    ))
+    monkeypatch.setattr(app_module.llm_client.client.chat.completions, "create", create)
+    client = app_module.app.test_client()
+    client.put("/api/v1/stories/s1", json=STORY)
+    target = {"chapter_id": "c1", "section": 1, "scene": 1}
+
+    assert client.post("/api/v1/stories/s1/chapters/scene/new", json={"target": target, "instruction": "Storm off."}).status_code == 200
+    speculator.join()
+    assert create.call_count == 3
+
+    assert client.post("/api/v1/stories/s1/chapters/summary", json={"target": target}).get_json() == {"summary": {"summary": "done"}}
+    assert create.call_count == 3
+    # outlines with an instruction of the author's own were not predicted
+    client.post("/api/v1/stories/s1/chapters/outlines", json={"target": target, "instruction": "Something else."})
+    assert create.call_count == 4
+    assert speculator.stats()["hits"] == 1
+
+def test_new_paragraphs_are_in_the_predicted_summary(monkeypatch, tmp_path):
+    from services.prefetch import FollowUps
+    store = StoryStore(str(tmp_path / "stories.db"))
+    store.replace_story("s1", STORY)
+    monkeypatch.setattr(story_store, "_store", store)
+    service = MagicMock()
+    service.llm_client.speculator = Speculator(enabled=True)
+    follow_ups = FollowUps.start(service, "s1", "/chapters/scene/paragraph/new", {"target": {"chapter_id": "c1", "section": 1, "scene": 0}}, "alice")
+
+    for chunk in [{"chunk": "Alex left."}, {"chunk": "Rain."}, {"chunk": "\\n\\n", "paragraph_break": True}, {"chunk": "Samuel stayed."}, {"chunk": "[DONE]"}]:
+        follow_ups.feed(chunk)
+    follow_ups.done()
+    service.llm_client.speculator.join()
+
+    context = service.generate_section_summary.call_args.kwargs["context"]
+    assert context["paragraphs"] == ["P3.", "Alex left. Rain.", "Samuel stayed.", "P4.", "P5."]
+    assert service.generate_chapter_outlines.call_args.kwargs["instruction"] == ""
@@ -0,0 +1,28 @@
+from core.story_index import StoryIndex, tokenize
+
+def test_tokenize_drops_case_punctuation_and_stopwords():
+    assert tokenize("The goat, the GOAT and Alex's boat!") == ["goat", "goat", "alex", "s", "boat"]
+
+def test_search_ranks_rare_matching_words_first():
+    index = StoryIndex()
+    index.add("a", "Alex walked to the bleachers after practice.")
+    index.add("b", "Samuel hid the lighthouse key under the bleachers.")
+    index.add("c", "Rain fell on the empty field.")
+
+    assert [key for key, _ in index.search("where is the lighthouse key", k=2)] == ["b"]
+    assert [key for key, _ in index.search("bleachers practice")] == ["a", "b"]
+    assert index.search("bleachers", keep=lambda key: key != "b")[0][0] == "a"
+
+def test_passages_are_replaced_and_removed_incrementally():
+    index = StoryIndex()
+    index.add(("c1", 0, 0, 0), "The lighthouse was dark.")
+    index.add(("c1", 0, 0, 1), "Gulls circled.")
+    index.add(("c2", 0, 0, 0), "The lighthouse keeper returned.")
+
+    index.add(("c1", 0, 0, 0), "The harbour was dark.")
+    assert [key for key, _ in index.search("lighthouse")] == [("c2", 0, 0, 0)]
+
+    index.remove_prefix(("c2",))
+    assert index.search("lighthouse") == [] and len(index) == 2
+    assert "lighthouse" not in index.postings
+    assert index.total_length == sum(index.lengths.values())
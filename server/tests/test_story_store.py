@@ -0,0 +1,155 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from core import story_store
+from core.story_store import StoryNotFound, StoryStore, screenplay_text
+
+def make_scene(title, lines, paragraphs=()):
+    return {
+        "title": title,
+        "setting": {"location": "Bleachers", "time": "Dusk", "description": "An empty football field."},
+        "elements": [{"type": "dialogue", "character": "Alex", "line": line} for line in lines],
+        "paragraphs": list(paragraphs),
+    }
+
+STORY = {
+    "parameters": {"title": "Bleachers", "genre": "Drama"},
+    "chapters": [
+        {
+            "id": "c1", "title": "One", "synopsis": "Alex meets Samuel.", "act": 1,
+            "sections": [
+                {"outline": "They talk.", "summary": "They talked.", "scenes": [make_scene("Talk", ["Hi."], ["P1.", "P2."])]},
+                {"outline": "They argue.", "summary": None, "scenes": [
+                    make_scene("Argue", ["No."], ["P3."]),
+                    make_scene("Leave", ["Bye."], ["P4.", "P5."]),
+                ]},
+            ],
+        },
+        {"id": "c2", "title": "Two", "synopsis": "Alex decides.", "act": 2, "sections": []},
+    ],
+}
+
+@pytest.fixture
+def store(tmp_path):
+    store = StoryStore(str(tmp_path / "stories.db"))
+    store.replace_story("s1", STORY)
+    return store
+
+def test_story_round_trips(store):
+    story = store.story("s1")
+
+    assert story["parameters"] == STORY["parameters"]
+    assert [c["id"] for c in story["chapters"]] == ["c1", "c2"]
+    assert story["chapters"][0]["sections"][1] == STORY["chapters"][0]["sections"][1]
+
+def test_delta_updates_only_what_it_carries(store):
+    store.apply("s1", {
+        "chapters": [{"id": "c1", "synopsis": "Alex avoids Samuel."}],
+        "sections": [{"chapter_id": "c1", "index": 1, "summary": "They argued."}],
+        "paragraphs": [{"chapter_id": "c1", "section": 1, "scene": 1, "index": 2, "text": "P6."}],
+        "scenes": [{"chapter_id": "c1", "section": 1, "index": 0, "deleted": True}],
+    })
+
+    chapter = store.chapter("s1", "c1")
+    assert (chapter["title"], chapter["synopsis"]) == ("One", "Alex avoids Samuel.")
+    assert chapter["sections"][1]["outline"] == "They argue."
+    assert chapter["sections"][1]["summary"] == "They argued."
+    assert [s["title"] for s in chapter["sections"][1]["scenes"]] == ["Leave"]
+    assert chapter["sections"][1]["scenes"][0]["paragraphs"] == ["P4.", "P5.", "P6."]
+
+def test_unknown_story(store):
+    with pytest.raises(StoryNotFound):
+        store.apply("nope", {"chapters": []})
+
+def test_new_scene_context_matches_the_client(store):
+    body = store.resolve("s1", "/chapters/scene/new", {
+        "target": {"chapter_id": "c1", "section": 1}, "instruction": "Storm off.", "count": 5, "stream": True,
+    })
+
+    assert body["instruction"] == "Storm off." and body["count"] == 5 and body["stream"] is True
+    assert body["context"] == {
+        "parameters": STORY["parameters"],
+        "synopsis": "Alex meets Samuel.",
+        "overall_outline": "They argue.",
+        "previous_summary": "They talked.",
+        "previous_screenplay": screenplay_text(STORY["chapters"][0]["sections"][1]["scenes"][1]),
+        "story": {"id": "s1", "chapter_id": "c1", "section": 1},
+    }
+    assert body["context"]["previous_screenplay"].startswith("TITLE: Leave\nINT. BLEACHERS - DUSK")
+
+def test_paragraph_rewrite_context_crosses_into_the_previous_section(store):
+    body = store.resolve("s1", "/chapters/scene/paragraph/rewrite", {
+        "target": {"chapter_id": "c1", "section": 1, "paragraph": 0},
+        "delta": {"paragraphs": [{"chapter_id": "c1", "section": 1, "scene": 0, "index": 0, "text": "P3 edited."}]},
+    })
+
+    context = body["context"]
+    assert (context["previous_paragraph"], context["paragraph"], context["next_paragraph"]) == ("P2.", "P3 edited.", "P4.")
+
+def test_story_route_assembles_context_server_side(monkeypatch, tmp_path):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    import app as app_module
+    monkeypatch.setattr(story_store, "_store", StoryStore(str(tmp_path / "stories.db")))
+    create = MagicMock(return_value=SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content='{"summary": "done"}'))], usage=None,
+    ))
+    monkeypatch.setattr(app_module.llm_client.client.chat.completions, "create", create)
+    client = app_module.app.test_client()
+
+    assert client.put("/api/v1/stories/s1", json=STORY).status_code == 200
+    response = client.post("/api/v1/stories/s1/chapters/summary", json={"target": {"chapter_id": "c1", "section": 1}})
+
+    assert response.status_code == 200
+    prompt = create.call_args.kwargs["messages"][1]["content"]
+    assert "- P3.\n- P4.\n- P5." in prompt
+    assert client.post("/api/v1/stories/missing/chapters/summary", json={}).status_code == 404
+    assert client.post("/api/v1/stories/s1/metrics", json={}).status_code == 404
+
+def test_bad_bodies_and_ops_are_rejected(monkeypatch, tmp_path):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    import app as app_module
+    monkeypatch.setattr(story_store, "_store", StoryStore(str(tmp_path / "stories.db")))
+    client = app_module.app.test_client()
+
+    assert client.put("/api/v1/stories/s1", json=["not", "a", "story"]).status_code == 400
+    assert client.put("/api/v1/stories/s1", json={"chapters": "c1"}).status_code == 400
+    assert client.put("/api/v1/stories/s1", json=STORY).status_code == 200
+    assert client.patch("/api/v1/stories/s1", json="delta").status_code == 400
+    assert client.patch("/api/v1/stories/s1", json={"scenes": ["c1"]}).status_code == 400
+    assert client.patch("/api/v1/stories/s1", json={"paragraphs": [{"chapter_id": "c1", "text": "P6."}]}).status_code == 400
+    assert client.post("/api/v1/stories/s1/chapters/summary", json=[1, 2]).status_code == 400
+    assert client.post("/api/v1/stories/s1/chapters/summary", json={"delta": {"chapters": [1]}, "target": {"chapter_id": "c1"}}).status_code == 400
+    assert client.get("/api/v1/stories/s1").json["chapters"][0]["title"] == "One"
+
+def test_related_passages_come_from_earlier_in_the_story(store, tmp_path):
+    store.apply("s1", {"paragraphs": [{"chapter_id": "c1", "section": 0, "scene": 0, "index": 1, "text": "Samuel hid the lighthouse key."}]})
+    target = {"chapter_id": "c2", "section": 0}
+
+    assert store.related_passages("s1", "looking for the lighthouse key", target) == ["[Chapter 'One', section 1] Samuel hid the lighthouse key."]
+    assert store.related_passages("s1", "lighthouse key", {"chapter_id": "c1", "section": 0}) == []
+
+    # this process's writes update the index in place
+    index = store.index("s1")
+    store.apply("s1", {"sections": [{"chapter_id": "c1", "index": 1, "summary": "Alex found the key in the lighthouse."}]})
+    assert store.index("s1") is index
+    assert len(store.related_passages("s1", "lighthouse key", target)) == 2
+
+    # another process's write has it rebuilt
+    StoryStore(str(tmp_path / "stories.db")).apply("s1", {"paragraphs": [{"chapter_id": "c1", "section": 0, "scene": 0, "index": 1, "text": "Samuel hid."}]})
+    assert store.related_passages("s1", "lighthouse key", target) == ["[Chapter 'One', section 2 summary] Alex found the key in the lighthouse."]
+    assert store.index("s1") is not index
+
+def test_story_prompts_carry_related_passages(monkeypatch, store):
+    from services.writing_service import WritingService
+    monkeypatch.setattr(story_store, "_store", store)
+    store.apply("s1", {"paragraphs": [{"chapter_id": "c1", "section": 0, "scene": 0, "index": 1, "text": "Samuel hid the lighthouse key."}]})
+    body = store.resolve("s1", "/chapters/scene/new", {"target": {"chapter_id": "c2", "section": 0}})
+    llm_client = MagicMock()
+    llm_client.generate_json.return_value = "{}"
+
+    WritingService(llm_client).generate_new_scene(body["context"], "Alex finds the lighthouse key.", 5)
+
+    prompt = llm_client.generate_json.call_args.kwargs["prompt"]
+    assert "Relevant Earlier Passages" in prompt and "Samuel hid the lighthouse key." in prompt
+    WritingService(llm_client).generate_new_scene({"synopsis": "Alex decides."}, "Alex finds the lighthouse key.", 5)
+    assert "Relevant Earlier Passages" not in llm_client.generate_json.call_args.kwargs["prompt"]
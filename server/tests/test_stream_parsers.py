@@ -0,0 +1,137 @@
+import json
+import pytest
+from core.stream_parsers import JsonStreamParser, SentenceSegmenter, to_stream_chunk
+
+SCENE = {
+    "meta": {
+        "previous_screenplay_notes": {"type": "notes", "text": "They left the {old} bar."},
+        "title": {"type": "title", "text": "The \"Big\" Pitch"},
+        "setting": {"location": "CONFERENCE ROOM", "time": "DAY", "description": "Glass walls [and] a view."},
+        "characters": [
+            {"type": "character", "name": "EMMA", "description": "30s, confident"},
+            {"type": "character", "name": "JACK", "description": "40s, skeptical \\ tired"},
+        ],
+    },
+    "elements": [
+        {"type": "action", "description": "Emma clicks. {The screen} lights up."},
+        {"type": "dialogue", "character": "JACK", "line": "We've heard that before.", "parenthetical": "leaning back"},
+        {"type": "internal_monologue", "character": "ZOE", "description": "Don't mess this up, \"Zoe\"."},
+    ],
+}
+
+def run_parser(text, size):
+    parser = JsonStreamParser()
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    events.extend(parser.close())
+    return events
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64, 100000])
+def test_scene_events_independent_of_chunking(size):
+    events = run_parser(json.dumps(SCENE, indent=2), size)
+
+    meta = SCENE["meta"]
+    assert events == [
+        ("object", meta["previous_screenplay_notes"]),
+        ("object", meta["title"]),
+        ("object", meta["setting"]),
+        ("object", meta["characters"][0]),
+        ("object", meta["characters"][1]),
+        ("meta", meta),
+        *[("object", element) for element in SCENE["elements"]],
+    ]
+
+def test_top_level_array_items():
+    actions = [
+        {"action": "edit", "original_sentence": "A.", "rewritten_sentence": "B."},
+        {"action": "paragraph_break"},
+    ]
+    assert run_parser("```json\n" + json.dumps(actions) + "\n```", 5) == [("object", a) for a in actions]
+
+def test_nested_array_item_emitted_once():
+    data = {"elements": [{"type": "action", "beats": [{"n": 1}, {"n": 2}]}]}
+    assert run_parser(json.dumps(data), 4) == [("object", data["elements"][0])]
+
+def test_falls_back_to_whole_output_when_nothing_emitted():
+    assert run_parser('["one", "two"]', 3) == [("object", ["one", "two"])]
+
+def test_to_stream_chunk():
+    assert to_stream_chunk(("object", {"a": 1})) == {"chunk": '{"a": 1}'}
+    assert to_stream_chunk(("meta", {"a": 1})) == {"meta": {"a": 1}}
+
+def test_partial_mode_surfaces_field_text_before_element_closes():
+    scene = {"elements": [
+        {"type": "dialogue", "character": "JACK", "line": "We've heard \"that\" before.\nTwice."},
+        {"type": "action", "description": "Café lights flicker \\ hum."},
+    ]}
+    parser = JsonStreamParser(partial_key="elements")
+    text = json.dumps(scene)
+    events = []
+    for i in range(0, len(text), 3):
+        events.extend(parser.feed(text[i:i + 3]))
+    events.extend(parser.close())
+
+    partials = {}
+    for kind, value in events:
+        if kind == "partial":
+            partials.setdefault((value["index"], value["field"]), []).append(value["text"])
+    assert {k: "".join(v) for k, v in partials.items()} == {
+        (0, "type"): "dialogue",
+        (0, "character"): "JACK",
+        (0, "line"): "We've heard \"that\" before.\nTwice.",
+        (1, "type"): "action",
+        (1, "description"): "Café lights flicker \\ hum.",
+    }
+    assert len(partials[(0, "line")]) > 1
+
+    completes = [value for kind, value in events if kind == "complete"]
+    assert completes == [{"index": 0, "value": scene["elements"][0]}, {"index": 1, "value": scene["elements"][1]}]
+    first_line_partial = next(i for i, (kind, value) in enumerate(events) if kind == "partial" and value["field"] == "line")
+    first_complete = next(i for i, (kind, _) in enumerate(events) if kind == "complete")
+    assert first_line_partial < first_complete
+    assert to_stream_chunk(("complete", completes[0])) == {"chunk": json.dumps(scene["elements"][0]), "index": 0, "complete": True}
+
+PROSE = (
+    "Mr. Hale stepped into the rain. \"Stop!\" she yelled, but he kept walking. "
+    "J. R. Tolkien's books lay soaked on the bench... Was it over?\n\n"
+    "\"It isn't,\" he said. \"Not yet.\"\n\n\nThe end"
+)
+
+def segment(text, size):
+    segmenter = SentenceSegmenter()
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(segmenter.feed(text[i:i + size]))
+    events.extend(segmenter.close())
+    return events
+
+@pytest.mark.parametrize("size", [1, 2, 5, 17, 100000])
+def test_sentence_segmenter_independent_of_chunking(size):
+    assert segment(PROSE, size) == [
+        ("sentence", "Mr. Hale stepped into the rain."),
+        ("sentence", "\"Stop!\" she yelled, but he kept walking."),
+        ("sentence", "J. R. Tolkien's books lay soaked on the bench..."),
+        ("sentence", "Was it over?"),
+        ("paragraph_break", None),
+        ("sentence", "\"It isn't,\" he said."),
+        ("sentence", "\"Not yet.\""),
+        ("paragraph_break", None),
+        ("sentence", "The end"),
+    ]
+
+@pytest.mark.parametrize("size", [1, 3, 100000])
+def test_no_and_i_end_sentences_unless_abbreviated(size):
+    assert segment("She said no. Then she left. Turn to No. 5 now.", size) == [
+        ("sentence", "She said no."),
+        ("sentence", "Then she left."),
+        ("sentence", "Turn to No. 5 now."),
+    ]
+    assert segment("So did I. Then we went home.", size) == [
+        ("sentence", "So did I."),
+        ("sentence", "Then we went home."),
+    ]
+
+def test_paragraph_break_chunk_keeps_legacy_marker():
+    assert to_stream_chunk(("paragraph_break", None)) == {"chunk": "\\n\\n", "paragraph_break": True}
+    assert segment("\n\nLeading blank lines.", 4) == [("sentence", "Leading blank lines.")]
@@ -0,0 +1,25 @@
+from core import transport
+from core.llm_client import LLMClient
+
+def test_provider_clients_share_one_pool(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    openai_client = transport.create_openai_client(api_key="test")
+    hermes_client = transport.create_openai_client(api_key="test", base_url="https://api.lambdalabs.com/v1")
+
+    assert openai_client._client is hermes_client._client is transport.get_http_client()
+    assert str(hermes_client.base_url).startswith("https://api.lambdalabs.com/v1")
+    # LLMClient's calls are retried by core/resilience.py, so its clients leave it to that
+    assert openai_client.max_retries == 2 and LLMClient().client.max_retries == 0
+
+def test_connection_events_are_counted():
+    before = transport.transport_stats()
+    transport._count_connection("connection.connect_tcp.complete", {})
+    transport._count_connection("connection.start_tls.complete", {})
+    transport._count_connection("http11.send_request_headers.complete", {})
+    after = transport.transport_stats()
+
+    assert after["connections_opened"] == before["connections_opened"] + 1
+    assert after["tls_handshakes"] == before["tls_handshakes"] + 1
+
+def test_prewarm_disabled():
+    transport.prewarm(connections=0)
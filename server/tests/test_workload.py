@@ -0,0 +1,64 @@
+import json
+from core import workload
+from core.workload import SESSION_IDLE_SECONDS, WorkloadRecorder, anonymize, load_trace, synthesize
+
+BODY = {
+    "fieldType": "Title",
+    "context": {"synopsis": "Alex meets Samuel on the bleachers.", "paragraphs": ["One.", "Two two."]},
+    "count": 3,
+    "stream": True,
+}
+
+def test_anonymize_keeps_shape_but_not_text():
+    shape = anonymize(BODY)
+
+    assert shape == {
+        "fieldType": "Title",
+        "context": {"synopsis": {"$str": 35}, "paragraphs": [{"$str": 4}, {"$str": 8}]},
+        "count": 3,
+        "stream": True,
+    }
+    assert "Alex" not in json.dumps(shape)
+
+def test_synthesize_restores_lengths_deterministically_per_seed():
+    shape = anonymize(BODY)
+    body = synthesize(shape, "author-1")
+
+    assert anonymize(body) == shape
+    assert synthesize(shape, "author-1") == body
+    assert synthesize(shape, "author-2")["context"]["synopsis"] != body["context"]["synopsis"]
+
+def test_recorder_splits_sessions_on_idle_clients(monkeypatch, tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    now = 1000.0
+    monkeypatch.setattr("core.workload.time.time", lambda: now)
+    recorder = WorkloadRecorder(path)
+    recorder.record("10.0.0.1|ua", "/chapters/outlines", BODY)
+    now += 12.5
+    recorder.record("10.0.0.2|ua", "/chapters/summary", BODY)
+    recorder.record("10.0.0.1|ua", "/chapters/scene/new", BODY)
+    now += SESSION_IDLE_SECONDS + 1
+    WorkloadRecorder(path).record("10.0.0.1|ua", "/chapters/scene/rewrite", BODY)
+
+    sessions = sorted([(r["route"], r["at"]) for r in s] for s in load_trace(path))
+
+    assert sessions == [
+        [("/chapters/outlines", 0), ("/chapters/scene/new", 12.5)],
+        [("/chapters/scene/rewrite", 0)],
+        [("/chapters/summary", 0)],
+    ]
+    assert "10.0.0.1" not in open(path).read()
+
+def test_blueprint_records_posts_when_enabled(monkeypatch, tmp_path):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    from app import app
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(workload, "WORKLOAD_RECORD_PATH", str(path))
+    monkeypatch.setattr(workload, "_recorder", None)
+
+    app.test_client().post("/api/v1/chapters/scene/paragraph/continue", json=BODY, headers={"X-Session-Id": "abc"})
+    app.test_client().get("/api/v1/cache/stats")
+
+    [entry] = [json.loads(line) for line in path.read_text().splitlines()]
+    assert entry["route"] == "/chapters/scene/paragraph/continue"
+    assert entry["body"] == anonymize(BODY)